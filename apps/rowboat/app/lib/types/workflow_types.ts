@@ -20,6 +20,14 @@ export const WorkflowAgent = z.object({
     ragDataSources: z.array(z.string()).optional(),
     ragReturnType: z.enum(['chunks', 'content']).default('chunks'),
     ragK: z.number().default(3),
+    ragSearchMode: z.enum(['dense', 'hybrid']).default('dense'),
+    ragSearchPreset: z.enum(['fast', 'balanced', 'accurate']).default('balanced'),
+    ragSearchParams: z.object({
+        hnswEf: z.number().int().positive().optional(),
+        exact: z.boolean().optional(),
+        oversampling: z.number().positive().optional(),
+        rescore: z.boolean().optional(),
+    }).optional(),
     outputVisibility: z.enum(['user_facing', 'internal']).default('user_facing').optional(),
     controlType: z.enum([
         'retain',
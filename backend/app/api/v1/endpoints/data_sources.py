@@ -222,6 +222,7 @@ async def delete_data_source(
     删除数据源
     Delete a data source
     严格复刻原项目：先fetch，然后update status为deleted（软删除），不是真正的delete
+    向量、文档和数据源记录由导入worker异步清理
     
     Args:
         project_id: 项目ID
@@ -251,6 +252,7 @@ async def delete_data_source(
     update_data = {
         "status": DataSourceStatus.DELETED,
         "attempts": 0,
+        "lastAttemptAt": None,
         "billingError": None,
     }
     result = await repo.update(source_id, update_data, bump_version=True)
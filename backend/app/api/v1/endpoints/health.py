@@ -13,6 +13,7 @@ from app.core.database import (
     check_redis_connection,
     check_qdrant_connection,
 )
+from app.services.rag.embedding_cache import get_embedding_cache
 
 router = APIRouter(prefix="/health", tags=["Health"])
 
@@ -31,7 +32,7 @@ async def health_check():
     # 检查所有数据库连接
     mongodb_ok = await check_mongodb_connection()
     redis_ok = await check_redis_connection()
-    qdrant_ok = check_qdrant_connection() if settings.use_rag else True
+    qdrant_ok = await check_qdrant_connection() if settings.use_rag else True
     
     all_ok = mongodb_ok and redis_ok and qdrant_ok
     
@@ -47,7 +48,12 @@ async def health_check():
             "features": {
                 "rag": settings.use_rag,
                 "composio_tools": settings.use_composio_tools,
-            }
+            },
+            # 当前进程的缓存命中统计
+            "caches": {
+                "embedding": get_embedding_cache().stats()
+                if settings.use_rag and settings.embedding_cache_enabled else None,
+            },
         },
         message="服务运行正常" if all_ok else "部分服务不可用"
     )
@@ -4,13 +4,13 @@ Project management endpoints
 """
 
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status, Depends, Query
 from datetime import datetime
 import uuid
 
 from app.api import ResponseModel
 from app.api.dependencies import verify_api_key, get_optional_api_key
-from app.models.schemas import Project, Workflow
+from app.models.schemas import Project, Workflow, WorkflowTool
 from app.models.project_requests import (
     ProjectCreateRequest,
     ProjectUpdateRequest,
@@ -18,6 +18,9 @@ from app.models.project_requests import (
     WorkflowUpdateRequest,
 )
 from app.repositories.projects import ProjectsRepository
+from app.repositories.data_sources import DataSourcesRepository
+from app.services.mcp.mcp_client_manager import get_mcp_client_manager
+from app.services.rag.rag_service import get_rag_service
 from app.core.security import generate_project_secret
 
 router = APIRouter(prefix="/projects", tags=["Projects"])
@@ -268,15 +271,18 @@ async def update_project(
 @router.delete("/{project_id}", response_model=dict)
 async def delete_project(
     project_id: str,
+    background_tasks: BackgroundTasks,
     # 验证API Key（可选）
     # verified_project_id: Optional[str] = Depends(get_optional_api_key)
 ):
     """
     删除项目
     Delete a project
+    项目的数据源标记为deleted交由导入worker清理，项目下的向量在后台按过滤条件删除
     
     Args:
         project_id: 项目ID
+        background_tasks: 后台任务
         
     Returns:
         删除结果
@@ -299,11 +305,92 @@ async def delete_project(
             detail="项目删除失败"
         )
     
+    await DataSourcesRepository().mark_project_deleted(project_id)
+    background_tasks.add_task(_delete_project_embeddings, project_id)
+    # 关闭项目的池化MCP会话
+    await get_mcp_client_manager().close_project(project_id)
+    
     return ResponseModel.success(
         message="项目删除成功"
     )
 
 
+async def _delete_project_embeddings(project_id: str) -> None:
+    """
+    后台删除项目的所有向量
+    Delete all vectors of a deleted project in the background
+    """
+    try:
+        deleted = await get_rag_service().delete_embeddings(project_id)
+        print(f"[Projects] 已删除项目 {project_id} 的 {deleted} 个向量")
+    except Exception as e:
+        print(f"[Projects] 删除项目 {project_id} 的向量失败: {e}")
+
+
+@router.get("/{project_id}/mcp-servers/{server_name}/tools", response_model=dict)
+async def list_mcp_server_tools(
+    project_id: str,
+    server_name: str,
+    refresh: bool = Query(False, description="忽略缓存，重新获取工具列表"),
+):
+    """
+    获取项目自定义MCP服务器的工具列表（复用池化会话，结果按TTL缓存）
+    List the tools of a project's custom MCP server as workflow tools
+    
+    Args:
+        project_id: 项目ID
+        server_name: MCP服务器名称
+        refresh: 是否忽略缓存
+        
+    Returns:
+        工作流工具列表
+    """
+    project = await ProjectsRepository().get_by_id(project_id)
+    if project is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"项目 {project_id} 不存在"
+        )
+    
+    server = (project.custom_mcp_servers or {}).get(server_name)
+    if server is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"MCP服务器 {server_name} 不存在"
+        )
+    
+    try:
+        tools = await get_mcp_client_manager().list_tools(
+            project_id, server_name, server.server_url, refresh=refresh,
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"获取MCP服务器 {server_name} 的工具列表失败: {e}"
+        )
+    
+    workflow_tools = [
+        WorkflowTool(
+            name=tool.name,
+            description=tool.description or "",
+            parameters={
+                "type": "object",
+                "properties": (tool.inputSchema or {}).get("properties") or {},
+                "required": (tool.inputSchema or {}).get("required") or [],
+                "additionalProperties": True,
+            },
+            isMcp=True,
+            mcpServerName=server_name,
+        ).model_dump(by_alias=True, exclude_none=True)
+        for tool in tools
+    ]
+    
+    return ResponseModel.success(
+        data=workflow_tools,
+        message="MCP工具列表获取成功"
+    )
+
+
 @router.post("/{project_id}/rotate-secret", response_model=dict)
 async def rotate_secret(
     project_id: str,
@@ -3,8 +3,10 @@
 Cache service for performance optimization using Redis
 """
 
-from typing import Optional, Any
+from typing import Optional, Any, Callable, Hashable
+from collections import OrderedDict
 import json
+import time
 from datetime import timedelta
 
 from app.core.database import get_redis_client
@@ -138,6 +140,113 @@ class CacheService:
     def get_conversation_key(self, conversation_id: str) -> str:
         """获取对话缓存键"""
         return f"conversation:{conversation_id}"
+    
+    def get_data_source_key(self, source_id: str) -> str:
+        """获取数据源缓存键"""
+        return f"data_source:{source_id}"
+    
+    def get_composio_tool_key(self, tool_slug: str) -> str:
+        """获取Composio工具详情缓存键"""
+        return f"composio:tool:{tool_slug}"
+    
+    def get_composio_toolkit_key(self, toolkit_slug: str) -> str:
+        """获取Composio工具包缓存键"""
+        return f"composio:toolkit:{toolkit_slug}"
+    
+    def get_embedding_key(self, model: str, dtype: str, text_hash: str) -> str:
+        """获取查询嵌入向量缓存键"""
+        return f"embedding:{model}:{dtype}:{text_hash}"
+
+
+class LocalCache:
+    """
+    进程内LRU缓存（支持TTL）
+    In-process LRU cache with optional TTL, used in front of Redis for hot keys
+    
+    注意：非线程安全，仅在事件循环线程中使用
+    Note: not thread-safe, use from the event loop thread only
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        size_of: Optional[Callable[[Any], int]] = None,
+    ):
+        """
+        初始化进程内缓存
+        
+        Args:
+            max_entries: 最大条目数，超出时淘汰最久未使用的条目
+            ttl: 默认过期时间（秒），None表示不过期
+            max_bytes: 内存上限（字节），超出时淘汰最久未使用的条目；需要配合size_of使用
+            size_of: 计算缓存值占用字节数的函数
+        """
+        self.max_entries = max_entries
+        self.default_ttl = ttl
+        self.max_bytes = max_bytes
+        self._size_of = size_of
+        self._bytes = 0
+        self._data: "OrderedDict[Hashable, tuple[Optional[float], Any, int]]" = OrderedDict()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        获取缓存值（命中时刷新LRU顺序）
+        Get cached value, refreshing its LRU position on hit
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        
+        expires_at, value, _ = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.delete(key)
+            return None
+        
+        self._data.move_to_end(key)
+        return value
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        设置缓存值
+        Set cached value
+        """
+        ttl = ttl if ttl is not None else self.default_ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        size = self._size_of(value) if self._size_of is not None else 0
+        
+        self.delete(key)
+        self._data[key] = (expires_at, value, size)
+        self._bytes += size
+        while len(self._data) > self.max_entries or (
+            self.max_bytes is not None and self._bytes > self.max_bytes and len(self._data) > 1
+        ):
+            _, (_, _, evicted_size) = self._data.popitem(last=False)
+            self._bytes -= evicted_size
+    
+    def delete(self, key: Hashable) -> None:
+        """删除缓存值"""
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+    
+    def clear(self) -> None:
+        """清空缓存"""
+        self._data.clear()
+        self._bytes = 0
+    
+    @property
+    def size_bytes(self) -> int:
+        """当前占用的字节数（由size_of计算）"""
+        return self._bytes
+    
+    def keys(self) -> list:
+        """获取当前所有键（可能包含已过期但未清理的条目）"""
+        return list(self._data.keys())
+    
+    def __len__(self) -> int:
+        return len(self._data)
 
 
 # 全局缓存服务实例
@@ -36,15 +36,121 @@ class Settings(BaseSettings):
     embedding_model: str = Field(..., description="Embedding模型名称")
     embedding_base_url: str = Field(..., description="Embedding提供商基础URL")
     embedding_api_key: str = Field(..., description="Embedding API密钥")
+    embedding_batch_max_wait_ms: float = Field(default=5.0, description="Embedding微批处理最长等待时间（毫秒）")
+    embedding_batch_max_size: int = Field(default=64, description="Embedding微批处理最大文本数")
+    embedding_timeout: float = Field(default=30.0, description="Embedding请求超时（秒）")
+    embedding_rpm_limit: int = Field(default=0, description="Embedding每分钟请求数上限（所有worker共享，0表示不限制）")
+    embedding_tpm_limit: int = Field(default=0, description="Embedding每分钟token数上限（所有worker共享，0表示不限制）")
+    embedding_interactive_reserve: float = Field(default=0.1, description="RPM/TPM中为查询embedding保留的比例，后台导入不能使用这部分额度")
+    embedding_request_max_texts: int = Field(default=256, description="后台批量embedding每次请求的最大文本数")
+    embedding_request_max_tokens: int = Field(default=64_000, description="后台批量embedding每次请求的最大估算token数")
+    embedding_max_concurrent_requests: int = Field(default=8, description="同时发送的embedding请求数上限")
+    embedding_interactive_reserved_requests: int = Field(default=1, description="并发请求中为查询embedding保留的数量，后台导入不能占用")
+    embedding_max_retries: int = Field(default=5, description="Embedding请求遇到429时的最大重试次数")
+    embedding_retry_backoff: float = Field(default=1.0, description="429重试的初始退避时间（秒），无Retry-After时指数增长")
+    embedding_dimension: int = Field(default=1024, description="Embedding模型输出的向量维度（BAAI/bge-m3为1024），未启用降维时用于创建Qdrant集合")
+    embedding_projection_path: str = Field(default="", description="PCA降维投影文件路径（scripts.fit_embedding_projection生成），为空表示存储原始维度的向量")
+    embedding_cache_enabled: bool = Field(default=True, description="是否启用查询嵌入向量缓存")
+    embedding_cache_dtype: str = Field(default="float16", description="Redis中嵌入向量的存储精度（float16或float32）")
+    embedding_cache_ttl: int = Field(default=604800, description="查询嵌入向量Redis缓存时间（秒）")
+    embedding_cache_max_bytes: int = Field(default=64 * 1024 * 1024, description="查询嵌入向量进程内缓存内存上限（字节）")
     
     # Composio配置
     composio_api_key: str = Field(..., description="Composio API密钥")
+    composio_max_concurrency: int = Field(default=8, description="Composio并发请求上限")
+    composio_cache_ttl: int = Field(default=3600, description="Composio工具/工具包元数据缓存时间（秒）")
+    composio_search_timeout: float = Field(default=15.0, description="Composio工具搜索整体超时（秒）")
     
     # 数据库配置
     mongodb_connection_string: str = Field(..., description="MongoDB连接字符串")
     redis_url: str = Field(default="redis://localhost:6379", description="Redis连接URL")
     qdrant_url: str = Field(default="http://localhost:6333", description="Qdrant连接URL")
     qdrant_api_key: Optional[str] = Field(default=None, description="Qdrant API密钥")
+    qdrant_prefer_grpc: bool = Field(default=False, description="Qdrant是否优先使用gRPC传输")
+    qdrant_grpc_port: int = Field(default=6334, description="Qdrant gRPC端口")
+    qdrant_timeout: int = Field(default=10, description="Qdrant请求默认超时（秒）")
+    qdrant_search_timeout: int = Field(default=5, description="Qdrant向量搜索超时（秒）")
+    qdrant_upsert_timeout: float = Field(default=30.0, description="Qdrant写入超时（秒，每批）")
+    qdrant_upsert_concurrency: int = Field(default=4, description="同一文档并发写入Qdrant的批次数")
+    qdrant_upsert_wait: bool = Field(default=True, description="每批写入是否等待生效；False时批次异步提交，全部提交后轮询确认所有点可见（一致性屏障）")
+    qdrant_upsert_barrier_timeout: float = Field(default=120.0, description="异步写入后等待所有点可见的最长时间（秒）")
+    qdrant_upsert_poll_interval: float = Field(default=0.2, description="异步写入后确认点可见的轮询间隔（秒）")
+    qdrant_upsert_max_retries: int = Field(default=3, description="写入遇到网络错误、超时或5xx/429时的最大重试次数")
+    qdrant_upsert_retry_backoff: float = Field(default=0.5, description="写入重试的初始退避时间（秒），指数增长")
+    qdrant_max_connections: int = Field(default=50, description="Qdrant REST连接池最大连接数")
+    qdrant_max_keepalive: int = Field(default=20, description="Qdrant REST连接池最大keep-alive连接数")
+    qdrant_hnsw_m: int = Field(default=16, description="Qdrant全局HNSW图的m参数（0表示只构建按租户的子图）")
+    qdrant_hnsw_payload_m: int = Field(default=16, description="Qdrant按租户（projectId）构建HNSW子图的m参数")
+    qdrant_project_collection_threshold: int = Field(default=0, description="项目向量数超过该值时迁移到独立集合，0表示不拆分")
+    qdrant_storage_profile: str = Field(default="ram", description="新建向量集合的存储配置：ram、int8（int8量化+重排序）、int8_on_disk（原始向量在磁盘，量化向量常驻内存）")
+    qdrant_quantization_quantile: float = Field(default=0.99, description="int8量化时确定取值范围的分位数（排除极端值）")
+    qdrant_quantization_oversampling: float = Field(default=2.0, description="量化集合搜索时的候选倍数（用原始向量重排序）")
+    
+    # 出站HTTP（工具调用）配置
+    http2_enabled: bool = Field(default=True, description="出站请求是否启用HTTP/2（需要h2依赖）")
+    http_max_connections_per_host: int = Field(default=20, description="每个host的最大连接数")
+    http_max_keepalive_per_host: int = Field(default=10, description="每个host的最大keep-alive连接数")
+    http_keepalive_expiry: float = Field(default=60.0, description="keep-alive连接空闲过期时间（秒）")
+    tool_call_timeout: float = Field(default=30.0, description="Webhook工具调用超时（秒）")
+    tool_call_max_retries: int = Field(default=2, description="Webhook工具调用最大重试次数（只在连接失败或429/503时重试，避免重复执行）")
+    composio_tool_timeout: float = Field(default=60.0, description="Composio工具执行超时（秒）")
+    composio_tool_max_retries: int = Field(default=1, description="Composio工具执行最大重试次数（只在连接失败或429/503时重试，避免重复执行）")
+    
+    # MCP客户端配置
+    mcp_connect_timeout: float = Field(default=10.0, description="MCP服务器连接超时（秒）")
+    mcp_call_timeout: float = Field(default=60.0, description="MCP工具调用超时（秒）")
+    mcp_tools_cache_ttl: int = Field(default=300, description="MCP服务器工具列表缓存时间（秒）")
+    mcp_health_check_interval: float = Field(default=30.0, description="MCP会话空闲多久后在复用前做健康检查（秒）")
+    mcp_session_idle_timeout: float = Field(default=600.0, description="MCP会话空闲超时，超时后重新连接（秒）")
+    mcp_session_sweep_interval: float = Field(default=60.0, description="后台关闭空闲超时MCP会话的检查间隔（秒）")
+    
+    # 数据源导入（RAG ingestion worker）配置
+    rag_uploads_dir: str = Field(default="/uploads", description="本地上传文件目录（与前端RAG_UPLOADS_DIR一致）")
+    ingestion_poll_interval: float = Field(default=5.0, description="无任务时的轮询间隔（秒）")
+    ingestion_lease_seconds: int = Field(default=300, description="任务租约时长（秒），过期未续租的任务可被其他worker重新认领")
+    ingestion_max_attempts: int = Field(default=3, description="出错数据源的最大重试次数")
+    ingestion_queue_size: int = Field(default=8, description="流水线各阶段之间队列的容量")
+    ingestion_embed_concurrency: int = Field(default=2, description="并发执行embedding请求的数量")
+    ingestion_embed_batch_size: int = Field(default=64, description="每次embedding请求的文本块数量")
+    ingestion_upsert_batch_size: int = Field(default=256, description="每次写入Qdrant的点数量")
+    ingestion_progress_interval: float = Field(default=2.0, description="大文档写入期间把进度记录到文档（data.upsertProgress）的间隔（秒）")
+    ingestion_stream_min_bytes: int = Field(default=16 * 1024 * 1024, description="本地文件达到该大小（字节）时流式分块导入，不在内存和文档记录中保存全文")
+    ingestion_doc_content_max_bytes: int = Field(default=8 * 1024 * 1024, description="文档记录保存全文的上限（UTF-8编码后的字节数），超过时不保存全文，远低于MongoDB单个文档16MiB的限制")
+    crawler_max_connections: int = Field(default=32, description="URL抓取客户端的总连接数上限")
+    crawler_per_host_concurrency: int = Field(default=2, description="同一host的最大并发抓取数")
+    crawler_host_delay: float = Field(default=0.5, description="同一host相邻两次请求的最小间隔（秒）")
+    crawler_timeout: float = Field(default=20.0, description="URL抓取超时（秒）")
+    crawler_max_bytes: int = Field(default=10 * 1024 * 1024, description="单个页面的最大下载字节数")
+    crawler_max_retries: int = Field(default=2, description="URL抓取遇到传输错误或429/5xx时的最大重试次数")
+    crawler_user_agent: str = Field(default="RowboatCrawler/1.0", description="URL抓取使用的User-Agent")
+    crawler_respect_robots: bool = Field(default=True, description="是否遵守robots.txt")
+    ingestion_orphan_sweep_interval: float = Field(default=3600.0, description="孤儿向量清理间隔（秒），0表示不清理")
+    rag_extraction_cache_enabled: bool = Field(default=True, description="是否缓存本地文件的提取文本、分块和向量（按文件SHA-256寻址，跨数据源和项目复用）")
+    rag_extraction_cache_dir: str = Field(default="/uploads/.extraction-cache", description="文件提取结果缓存目录")
+    rag_extraction_cache_max_bytes: int = Field(default=2 * 1024 * 1024 * 1024, description="文件提取结果缓存总大小上限（字节），随孤儿清理一起按最久未使用淘汰，0表示不限制")
+    rag_delete_poll_interval: float = Field(default=0.5, description="过滤删除进度的轮询间隔（秒）")
+    rag_delete_timeout: float = Field(default=600.0, description="过滤删除的最长等待时间（秒）")
+    rag_chunk_size: int = Field(default=1024, description="文本块大小（单位见rag_chunk_size_unit）")
+    rag_chunk_overlap: int = Field(default=20, description="相邻文本块的重叠大小（单位同上）")
+    rag_chunk_size_unit: str = Field(default="chars", description="文本块大小的单位：chars（字符数）或tokens（估算的token数）；修改后已导入的文档会在下次导入时重新分块")
+    rag_split_parallel_min_chars: int = Field(default=2_000_000, description="批量分割的总字符数达到该值时使用进程池并行分割")
+    rag_split_pool_workers: int = Field(default=0, description="文本分割进程池大小，0表示CPU核数")
+    rag_sparse_enabled: bool = Field(default=True, description="导入时是否为文本块生成BM25稀疏向量（混合检索）")
+    rag_sparse_avg_doc_len: float = Field(default=200.0, description="BM25平均文本块长度（词元数）")
+    rag_hybrid_prefetch_limit: int = Field(default=30, description="混合检索中稠密/稀疏各自预取的候选数量")
+    rag_mmr_enabled: bool = Field(default=False, description="是否默认启用检索后处理（MMR多样化并合并相邻块）")
+    rag_mmr_lambda: float = Field(default=0.7, description="MMR相关性权重（1为纯相关性，0为纯多样性）")
+    rag_mmr_fetch_k_multiplier: int = Field(default=4, description="启用MMR时多取的候选倍数（k的倍数）")
+    rag_merge_adjacent_chunks: bool = Field(default=True, description="MMR后是否合并同一文档中的相邻块")
+    rag_score_threshold: Optional[float] = Field(default=None, description="向量相似度得分下限，低于该值的结果被丢弃")
+    rag_content_excerpt_tokens: int = Field(default=0, description="content返回类型时每个命中文档返回的片段token上限，0表示返回整篇文档")
+    rag_content_cache_max_bytes: int = Field(default=32 * 1024 * 1024, description="文档内容进程内缓存内存上限（字节）")
+    rag_content_cache_ttl: int = Field(default=300, description="文档内容进程内缓存时间（秒）")
+    rag_semantic_cache_enabled: bool = Field(default=True, description="是否启用rag_search工具的语义结果缓存（改写后的相似问题复用检索结果）")
+    rag_semantic_cache_threshold: float = Field(default=0.95, description="语义缓存命中的查询向量相似度下限（点积）")
+    rag_semantic_cache_ttl: int = Field(default=600, description="语义缓存条目有效期（秒）")
+    rag_semantic_cache_max_entries: int = Field(default=256, description="每个检索范围（项目+数据源+检索参数）缓存的查询数上限")
+    rag_semantic_cache_max_scopes: int = Field(default=1000, description="进程内缓存的检索范围数上限")
     
     # 功能开关
     use_rag: bool = Field(default=True, description="是否启用RAG功能")
@@ -3,20 +3,56 @@
 Database connection management for MongoDB, Redis, and Qdrant
 """
 
-from typing import Optional
+from typing import Any, Dict, List, Optional
+import httpx
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from redis.asyncio import Redis
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    Disabled,
+    Distance,
+    HnswConfigDiff,
+    KeywordIndexParams,
+    Modifier,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    SparseVectorParams,
+    VectorParams,
+    VectorParamsDiff,
+)
 
 from app.core.config import get_settings
 
 
+# Qdrant payload索引（每次搜索都按projectId + sourceId过滤，删除按docId过滤）
+# projectId作为租户分区键（is_tenant），Qdrant按租户组织存储以加速单租户查询
+QDRANT_PAYLOAD_INDEXES = {
+    "projectId": KeywordIndexParams(type="keyword", is_tenant=True),
+    "sourceId": KeywordIndexParams(type="keyword"),
+    "docId": KeywordIndexParams(type="keyword"),
+}
+
+
+# BM25稀疏向量名称（IDF由服务端按集合统计计算）
+QDRANT_SPARSE_VECTOR_NAME = "bm25"
+
+
+# 向量存储配置（新建集合使用配置项qdrant_storage_profile，已有集合用迁移脚本切换）
+# ram: 原始float32向量全部在内存
+# int8: int8标量量化副本（内存占用约为原始向量的1/4）用于HNSW搜索，原始向量在内存中重排序
+# int8_on_disk: 原始向量放在磁盘（mmap），只有量化副本常驻内存，重排序时读盘
+QDRANT_STORAGE_PROFILES = ("ram", "int8", "int8_on_disk")
+
+
 # 全局数据库连接实例
 _mongodb_client: Optional[AsyncIOMotorClient] = None
 _mongodb_db: Optional[AsyncIOMotorDatabase] = None
 _redis_client: Optional[Redis] = None
-_qdrant_client: Optional[QdrantClient] = None
+_redis_binary_client: Optional[Redis] = None
+_qdrant_client: Optional[AsyncQdrantClient] = None
 
 
 async def get_mongodb_client() -> AsyncIOMotorClient:
@@ -88,21 +124,52 @@ async def get_redis_client() -> Redis:
     return _redis_client
 
 
-def get_qdrant_client() -> QdrantClient:
+async def get_redis_binary_client() -> Redis:
+    """
+    获取不解码响应的Redis客户端实例（单例模式），用于存储二进制数据（如嵌入向量）
+    Get a Redis client that returns raw bytes (singleton), for binary blobs such as embeddings
+    """
+    global _redis_binary_client
+    if _redis_binary_client is None:
+        settings = get_settings()
+        _redis_binary_client = Redis.from_url(
+            settings.redis_url,
+            decode_responses=False,
+            max_connections=20,  # 最大连接数
+            socket_connect_timeout=5,  # 连接超时（5秒）
+            socket_timeout=5,  # Socket超时（5秒）
+            retry_on_timeout=True,  # 超时重试
+        )
+    return _redis_binary_client
+
+
+def get_qdrant_client() -> AsyncQdrantClient:
     """
-    获取Qdrant客户端实例（单例模式）
-    Get Qdrant client instance (singleton pattern)
+    获取Qdrant异步客户端实例（单例模式）
+    Get async Qdrant client instance (singleton pattern)
     
-    注意：Qdrant客户端是同步的
-    Note: Qdrant client is synchronous
+    优化：使用异步客户端避免阻塞事件循环，并配置连接池；可选gRPC传输。
+    QDRANT_URL设置为":memory:"时使用本地内存模式（用于测试）。
+    Optimization: async client with a tuned pool so searches never block the event loop;
+    gRPC is optional. QDRANT_URL=":memory:" runs qdrant-client's local in-memory mode.
     """
     global _qdrant_client
     if _qdrant_client is None:
         settings = get_settings()
-        _qdrant_client = QdrantClient(
-            url=settings.qdrant_url,
-            api_key=settings.qdrant_api_key if settings.qdrant_api_key else None,
-        )
+        if settings.qdrant_url == ":memory:":
+            _qdrant_client = AsyncQdrantClient(location=":memory:")
+        else:
+            _qdrant_client = AsyncQdrantClient(
+                url=settings.qdrant_url,
+                api_key=settings.qdrant_api_key if settings.qdrant_api_key else None,
+                prefer_grpc=settings.qdrant_prefer_grpc,
+                grpc_port=settings.qdrant_grpc_port,
+                timeout=settings.qdrant_timeout,
+                limits=httpx.Limits(
+                    max_connections=settings.qdrant_max_connections,  # 最大连接数
+                    max_keepalive_connections=settings.qdrant_max_keepalive,  # 最大keep-alive连接数
+                ),
+            )
     return _qdrant_client
 
 
@@ -123,20 +190,23 @@ async def close_redis_connection():
     关闭Redis连接
     Close Redis connection
     """
-    global _redis_client
+    global _redis_client, _redis_binary_client
     if _redis_client is not None:
         await _redis_client.close()
         _redis_client = None
+    if _redis_binary_client is not None:
+        await _redis_binary_client.close()
+        _redis_binary_client = None
 
 
-def close_qdrant_connection():
+async def close_qdrant_connection():
     """
     关闭Qdrant连接
     Close Qdrant connection
     """
     global _qdrant_client
     if _qdrant_client is not None:
-        _qdrant_client.close()
+        await _qdrant_client.close()
         _qdrant_client = None
 
 
@@ -147,7 +217,7 @@ async def close_all_connections():
     """
     await close_mongodb_connection()
     await close_redis_connection()
-    close_qdrant_connection()
+    await close_qdrant_connection()
 
 
 async def check_mongodb_connection() -> bool:
@@ -180,7 +250,7 @@ async def check_redis_connection() -> bool:
         return False
 
 
-def check_qdrant_connection() -> bool:
+async def check_qdrant_connection() -> bool:
     """
     检查Qdrant连接是否正常
     Check if Qdrant connection is working
@@ -188,17 +258,20 @@ def check_qdrant_connection() -> bool:
     try:
         client = get_qdrant_client()
         # 获取集合列表检查连接
-        client.get_collections()
+        await client.get_collections()
         return True
     except Exception as e:
         print(f"Qdrant连接失败: {e}")
         return False
 
 
-async def initialize_databases():
+async def initialize_databases(embedding_vector_size: Optional[int] = None):
     """
     初始化所有数据库连接
     Initialize all database connections
+    
+    Args:
+        embedding_vector_size: embeddings集合的稠密向量维度（启用PCA降维时由RAG层传入投影维度），默认为embedding_dimension
     """
     print("正在初始化数据库连接...")
     
@@ -215,11 +288,22 @@ async def initialize_databases():
         print("✗ Redis连接失败")
     
     # 检查Qdrant连接
-    if check_qdrant_connection():
+    if await check_qdrant_connection():
         print("✓ Qdrant连接成功")
         # 确保embeddings集合存在
-        # 注意：BAAI/bge-m3模型的向量维度是1024
-        create_qdrant_collection("embeddings", vector_size=1024)
+        # 维度为Embedding模型输出维度（BAAI/bge-m3为1024），启用PCA降维时取投影维度
+        await create_qdrant_collection(
+            "embeddings",
+            vector_size=embedding_vector_size or get_settings().embedding_dimension,
+        )
+        # 项目独立集合（按规模拆分出去的租户）同样需要payload索引
+        try:
+            for col in (await get_qdrant_client().get_collections()).collections:
+                if col.name.startswith("embeddings_"):
+                    await ensure_qdrant_payload_indexes(col.name)
+                    await check_qdrant_sparse_vectors(col.name)
+        except Exception as e:
+            print(f"✗ 对齐Qdrant payload索引失败: {e}")
     else:
         print("✗ Qdrant连接失败")
 
@@ -340,10 +424,120 @@ async def create_mongodb_indexes():
     except Exception as e:
         print(f"⚠ api_keys.createdAt 索引可能已存在: {e}")
     
+    # ==================== Sources 集合索引 ====================
+    sources_collection = db["sources"]
+    
+    # 复合索引：status + createdAt（用于导入worker轮询待处理的数据源）
+    try:
+        await sources_collection.create_index(
+            [("status", 1), ("createdAt", 1)],
+            name="idx_sources_status_created"
+        )
+        print("✓ 创建 sources (status, createdAt) 复合索引")
+    except Exception as e:
+        print(f"⚠ sources 复合索引可能已存在: {e}")
+    
+    # ==================== Source Docs 集合索引 ====================
+    source_docs_collection = db["source_docs"]
+    
+    # 复合索引：sourceId + status + _id（与原项目一致，用于按状态分页列出文档）
+    try:
+        await source_docs_collection.create_index(
+            [("sourceId", 1), ("status", 1), ("_id", -1)],
+            name="sourceId_status__id_desc"
+        )
+        print("✓ 创建 source_docs (sourceId, status, _id) 复合索引")
+    except Exception as e:
+        print(f"⚠ source_docs 复合索引可能已存在: {e}")
+    
+    # projectId字段索引（用于删除项目的文档）
+    try:
+        await source_docs_collection.create_index("projectId", name="projectId_idx")
+        print("✓ 创建 source_docs.projectId 索引")
+    except Exception as e:
+        print(f"⚠ source_docs.projectId 索引可能已存在: {e}")
+    
     print("\n✓ MongoDB索引创建完成")
 
 
-def create_qdrant_collection(collection_name: str, vector_size: int = 1536):
+def qdrant_storage_config(profile: str) -> Dict[str, Any]:
+    """
+    存储配置对应的向量参数
+    Vector storage parameters for a storage profile
+    
+    Args:
+        profile: 存储配置名称（见QDRANT_STORAGE_PROFILES）
+        
+    Returns:
+        {"on_disk": 原始向量是否放在磁盘, "quantization_config": 量化配置或None}
+    """
+    if profile not in QDRANT_STORAGE_PROFILES:
+        raise ValueError(f"未知的Qdrant存储配置: {profile}（可选: {', '.join(QDRANT_STORAGE_PROFILES)}）")
+    if profile == "ram":
+        return {"on_disk": False, "quantization_config": None}
+    quantization = ScalarQuantization(
+        scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8,
+            quantile=get_settings().qdrant_quantization_quantile,
+            always_ram=True,
+        ),
+    )
+    return {"on_disk": profile == "int8_on_disk", "quantization_config": quantization}
+
+
+def estimate_qdrant_vector_memory(points: int, vector_size: int, profile: str) -> int:
+    """
+    估算存储配置下向量常驻内存的字节数（按Qdrant文档的经验值，索引等额外开销计为1.5倍）
+    Estimate the RAM-resident vector bytes under a profile (Qdrant's rule of thumb: 1.5x
+    the raw vector bytes for index and bookkeeping overhead)
+    
+    Args:
+        points: 点数量
+        vector_size: 向量维度
+        profile: 存储配置名称
+    """
+    storage = qdrant_storage_config(profile)
+    per_point = 0 if storage["on_disk"] else vector_size * 4
+    if storage["quantization_config"] is not None:
+        per_point += vector_size
+    return int(points * per_point * 1.5)
+
+
+def qdrant_search_params(
+    hnsw_ef: Optional[int] = None,
+    exact: bool = False,
+    oversampling: Optional[float] = None,
+    rescore: bool = True,
+) -> SearchParams:
+    """
+    向量搜索参数：量化集合先用量化向量多取候选，再用原始向量重排序（未量化的集合忽略量化参数）
+    Search params: on quantized collections, oversample with the quantized vectors and
+    rescore with the originals (ignored by collections without quantization)
+    
+    Args:
+        hnsw_ef: HNSW搜索的候选列表大小（默认使用服务端配置）
+        exact: 是否做精确（暴力）搜索
+        oversampling: 量化搜索的候选倍数（默认取配置）
+        rescore: 是否用原始向量重排序
+    """
+    if oversampling is None:
+        oversampling = get_settings().qdrant_quantization_oversampling
+    return SearchParams(
+        hnsw_ef=hnsw_ef,
+        exact=exact,
+        quantization=QuantizationSearchParams(
+            rescore=rescore,
+            oversampling=oversampling,
+        ),
+    )
+
+
+async def create_qdrant_collection(
+    collection_name: str,
+    vector_size: int = 1536,
+    client: Optional[AsyncQdrantClient] = None,
+    profile: Optional[str] = None,
+):
     """
     创建Qdrant集合
     Create Qdrant collection
@@ -351,23 +545,132 @@ def create_qdrant_collection(collection_name: str, vector_size: int = 1536):
     Args:
         collection_name: 集合名称
         vector_size: 向量维度（默认1536，适用于OpenAI embeddings）
+        client: Qdrant客户端（默认全局客户端）
+        profile: 存储配置（默认取配置项qdrant_storage_profile）
     """
-    client = get_qdrant_client()
+    client = client or get_qdrant_client()
+    settings = get_settings()
+    storage = qdrant_storage_config(profile or settings.qdrant_storage_profile)
     
     try:
         # 检查集合是否存在
-        collections = client.get_collections().collections
+        collections = (await client.get_collections()).collections
         if any(col.name == collection_name for col in collections):
             print(f"Qdrant集合 '{collection_name}' 已存在")
-            return
+            vectors_config = (await client.get_collection(collection_name)).config.params.vectors
+            if isinstance(vectors_config, dict):
+                vectors_config = vectors_config[""]
+            if vectors_config.size != vector_size:
+                # 启用或修改降维后需要新建集合并重新导入，已有集合的维度不会改变
+                print(f"✗ Qdrant集合 '{collection_name}' 的向量维度为 {vectors_config.size}，当前配置为 {vector_size}")
+            await check_qdrant_sparse_vectors(collection_name, client=client)
+        else:
+            # 创建集合
+            # 注意：使用Dot距离（点积）而不是Cosine，因为原项目使用Dot
+            # payload_m为每个租户（projectId）单独构建HNSW子图，使按项目过滤的搜索不退化
+            await client.create_collection(
+                collection_name=collection_name,
+                vectors_config=VectorParams(
+                    size=vector_size,
+                    distance=Distance.DOT,
+                    on_disk=storage["on_disk"],
+                ),
+                quantization_config=storage["quantization_config"],
+                sparse_vectors_config={
+                    QDRANT_SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF),
+                },
+                hnsw_config=HnswConfigDiff(
+                    m=settings.qdrant_hnsw_m,
+                    payload_m=settings.qdrant_hnsw_payload_m,
+                ),
+            )
+            print(f"✓ Qdrant集合 '{collection_name}' 创建成功")
         
-        # 创建集合
-        # 注意：使用Dot距离（点积）而不是Cosine，因为原项目使用Dot
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config=VectorParams(size=vector_size, distance=Distance.DOT),
-        )
-        print(f"✓ Qdrant集合 '{collection_name}' 创建成功")
+        await ensure_qdrant_payload_indexes(collection_name, client=client)
     except Exception as e:
         print(f"✗ 创建Qdrant集合失败: {e}")
 
+
+async def check_qdrant_sparse_vectors(
+    collection_name: str,
+    client: Optional[AsyncQdrantClient] = None,
+) -> bool:
+    """
+    检查集合是否配置了BM25稀疏向量，缺失时打印警告（Qdrant不支持给已有集合添加稀疏向量，需要重建）
+    Check the collection has the BM25 sparse vector, warning if not; Qdrant cannot add one to an
+    existing collection, so it has to be rebuilt with scripts.migrate_qdrant_sparse_vectors
+    
+    Args:
+        collection_name: 集合名称
+        client: Qdrant客户端（默认全局客户端）
+        
+    Returns:
+        是否配置了稀疏向量
+    """
+    client = client or get_qdrant_client()
+    sparse_vectors = (await client.get_collection(collection_name)).config.params.sparse_vectors or {}
+    if QDRANT_SPARSE_VECTOR_NAME in sparse_vectors:
+        return True
+    print(
+        f"⚠️ Qdrant集合 '{collection_name}' 没有 '{QDRANT_SPARSE_VECTOR_NAME}' 稀疏向量，混合检索会退化为纯向量检索；"
+        f"运行 python -m scripts.migrate_qdrant_sparse_vectors 重建集合"
+    )
+    return False
+
+
+async def ensure_qdrant_payload_indexes(
+    collection_name: str,
+    client: Optional[AsyncQdrantClient] = None,
+) -> List[str]:
+    """
+    对齐Qdrant payload索引：创建缺失的keyword索引（已有集合也会补建）
+    Reconcile payload indexes, creating any missing keyword index (also for existing collections)
+    
+    Args:
+        collection_name: 集合名称
+        client: Qdrant客户端（默认全局客户端）
+        
+    Returns:
+        本次新建索引的字段列表
+    """
+    client = client or get_qdrant_client()
+    existing = (await client.get_collection(collection_name)).payload_schema or {}
+    
+    created = []
+    for field_name, field_schema in QDRANT_PAYLOAD_INDEXES.items():
+        if field_name in existing:
+            continue
+        await client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=field_schema,
+        )
+        created.append(field_name)
+        print(f"✓ 创建 Qdrant '{collection_name}'.{field_name} payload索引")
+    return created
+
+
+async def apply_qdrant_storage_profile(
+    collection_name: str,
+    profile: str,
+    client: Optional[AsyncQdrantClient] = None,
+) -> None:
+    """
+    将已有集合切换到指定存储配置（服务端在后台按新配置重建段，期间集合可正常读写）
+    Switch an existing collection to a storage profile; the server rebuilds segments in
+    the background while the collection stays readable and writable
+    
+    Args:
+        collection_name: 集合名称
+        profile: 存储配置名称
+        client: Qdrant客户端（默认全局客户端）
+    """
+    client = client or get_qdrant_client()
+    storage = qdrant_storage_config(profile)
+    await client.update_collection(
+        collection_name=collection_name,
+        vectors_config={"": VectorParamsDiff(on_disk=storage["on_disk"])},
+        # ram配置需要显式关闭已有的量化
+        quantization_config=storage["quantization_config"] or Disabled.DISABLED,
+    )
+
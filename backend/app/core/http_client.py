@@ -0,0 +1,171 @@
+"""
+共享HTTP客户端连接池
+Shared HTTP client pools for outbound tool calls
+"""
+
+import asyncio
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple, Type
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.config import get_settings
+
+
+# HTTP/2需要可选依赖h2（httpx[http2]），未安装时回退到HTTP/1.1
+try:
+    import h2  # noqa: F401
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+
+# 默认可重试的状态码
+RETRYABLE_STATUS_CODES = frozenset({429, 502, 503, 504})
+
+# 非幂等请求（如工具调用POST）只在确定服务端未处理时重试：连接未建立，或服务端明确拒绝（429/503）
+# 读超时等错误发生时请求可能已被处理，重试会重复执行副作用
+UNSENT_REQUEST_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+NON_IDEMPOTENT_RETRY_STATUS_CODES = frozenset({429, 503})
+
+# 全局客户端实例（按 scheme://host:port 分组，每个host一个连接池）
+_http_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def create_http_client(**kwargs: Any) -> httpx.AsyncClient:
+    """
+    创建带连接池配置的HTTP客户端
+    Create an AsyncClient with the configured pool limits, keep-alive and HTTP/2
+    
+    Args:
+        **kwargs: 传递给httpx.AsyncClient的其他参数（如base_url、headers、timeout）
+    
+    Returns:
+        HTTP客户端
+    """
+    settings = get_settings()
+    kwargs.setdefault(
+        "limits",
+        httpx.Limits(
+            max_connections=settings.http_max_connections_per_host,
+            max_keepalive_connections=settings.http_max_keepalive_per_host,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        ),
+    )
+    kwargs.setdefault("http2", settings.http2_enabled and _HTTP2_AVAILABLE)
+    kwargs.setdefault("timeout", settings.tool_call_timeout)
+    return httpx.AsyncClient(**kwargs)
+
+
+def _host_key(url: str) -> str:
+    """获取URL对应的连接池键（scheme://host:port）"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def get_http_client(url: str) -> httpx.AsyncClient:
+    """
+    获取目标host的共享HTTP客户端（单例模式，每个host一个连接池）
+    Get the shared client for the URL's host (one pool per host, so per-host connection limits apply)
+    
+    Args:
+        url: 目标URL
+    
+    Returns:
+        HTTP客户端
+    """
+    key = _host_key(url)
+    client = _http_clients.get(key)
+    if client is None or client.is_closed:
+        client = create_http_client()
+        _http_clients[key] = client
+    return client
+
+
+async def close_http_clients():
+    """
+    关闭所有共享HTTP客户端
+    Close all shared HTTP clients
+    """
+    clients = list(_http_clients.values())
+    _http_clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """解析Retry-After响应头（秒数或HTTP日期）"""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+async def request_with_retry(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    *,
+    max_retries: int = 0,
+    backoff: float = 0.5,
+    max_backoff: float = 10.0,
+    retry_statuses: Iterable[int] = RETRYABLE_STATUS_CODES,
+    idempotent: bool = True,
+    stream: bool = False,
+    **kwargs: Any,
+) -> httpx.Response:
+    """
+    发送HTTP请求，遇到传输错误或可重试状态码时按指数退避重试
+    Send a request, retrying transport errors and retryable status codes with exponential backoff
+    
+    Args:
+        client: HTTP客户端
+        method: HTTP方法
+        url: 请求URL
+        max_retries: 最大重试次数（0表示不重试）
+        backoff: 初始退避时间（秒）
+        max_backoff: 最大退避时间（秒）
+        retry_statuses: 可重试的状态码
+        idempotent: 请求是否幂等；False时只重试连接错误和429/503，避免重复执行副作用
+        stream: 是否流式读取响应体（调用方负责aclose）
+        **kwargs: 传递给client.request的其他参数
+    
+    Returns:
+        最后一次请求的响应
+    """
+    retry_statuses = frozenset(retry_statuses)
+    retry_errors: Tuple[Type[Exception], ...] = (httpx.TransportError,)
+    if not idempotent:
+        retry_statuses &= NON_IDEMPOTENT_RETRY_STATUS_CODES
+        retry_errors = UNSENT_REQUEST_ERRORS
+    attempt = 0
+    while True:
+        delay = min(max_backoff, backoff * (2 ** attempt))
+        try:
+            if stream:
+                response = await client.send(client.build_request(method, url, **kwargs), stream=True)
+            else:
+                response = await client.request(method, url, **kwargs)
+        except retry_errors:
+            if attempt >= max_retries:
+                raise
+        else:
+            if response.status_code not in retry_statuses or attempt >= max_retries:
+                return response
+            retry_after = _retry_after_seconds(response)
+            if retry_after is not None:
+                delay = min(max_backoff, retry_after)
+            await response.aclose()
+        
+        await asyncio.sleep(delay)
+        attempt += 1
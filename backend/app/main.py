@@ -16,6 +16,9 @@ from app.core.database import (
     close_all_connections,
     create_mongodb_indexes,
 )
+from app.core.http_client import close_http_clients
+from app.services.mcp.mcp_client_manager import close_mcp_client_manager
+from app.services.rag.embedding_projection import stored_vector_size
 from app.api import ResponseModel
 from app.api.v1.router import router as v1_router
 
@@ -30,8 +33,8 @@ async def lifespan(app: FastAPI):
     print("🚀 启动应用...")
     settings = get_settings()
     
-    # 初始化数据库连接
-    await initialize_databases()
+    # 初始化数据库连接（embeddings集合维度取决于是否启用PCA降维）
+    await initialize_databases(embedding_vector_size=stored_vector_size())
     
     # 创建数据库索引
     try:
@@ -47,6 +50,8 @@ async def lifespan(app: FastAPI):
     # 关闭时执行
     print("⏹ 关闭应用...")
     await close_all_connections()
+    await close_http_clients()
+    await close_mcp_client_manager()
     print("✓ 应用已关闭")
 
 
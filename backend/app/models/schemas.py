@@ -107,6 +107,30 @@ class RAGReturnType(str, Enum):
     CONTENT = "content"
 
 
+class RAGSearchMode(str, Enum):
+    """RAG检索方式"""
+    DENSE = "dense"
+    HYBRID = "hybrid"
+
+
+class RAGSearchPreset(str, Enum):
+    """RAG向量搜索速度/召回率预设"""
+    FAST = "fast"
+    BALANCED = "balanced"
+    ACCURATE = "accurate"
+
+
+class RAGSearchParams(BaseModel):
+    """RAG向量搜索参数（覆盖预设中的对应项，未设置的项沿用预设）"""
+    hnsw_ef: Optional[int] = Field(None, alias="hnswEf", description="HNSW搜索的候选列表大小，越大召回率越高、越慢")
+    exact: Optional[bool] = Field(None, description="是否跳过HNSW做精确（暴力）搜索")
+    oversampling: Optional[float] = Field(None, description="量化集合搜索时的候选倍数")
+    rescore: Optional[bool] = Field(None, description="量化集合是否用原始向量重排序")
+    
+    class Config:
+        populate_by_name = True
+
+
 class WorkflowAgent(BaseModel):
     """工作流智能体"""
     name: str
@@ -137,6 +161,21 @@ class WorkflowAgent(BaseModel):
         alias="ragReturnType"
     )
     rag_k: int = Field(default=3, alias="ragK")
+    rag_search_mode: RAGSearchMode = Field(
+        default=RAGSearchMode.DENSE,
+        alias="ragSearchMode",
+        description="dense为纯向量检索，hybrid为向量+BM25稀疏检索并按RRF融合"
+    )
+    rag_search_preset: RAGSearchPreset = Field(
+        default=RAGSearchPreset.BALANCED,
+        alias="ragSearchPreset",
+        description="向量搜索速度/召回率预设"
+    )
+    rag_search_params: Optional[RAGSearchParams] = Field(
+        None,
+        alias="ragSearchParams",
+        description="向量搜索参数，覆盖预设中的对应项"
+    )
     output_visibility: OutputVisibility = Field(
         default=OutputVisibility.USER_FACING,
         alias="outputVisibility"
@@ -363,6 +402,26 @@ class DataSource(BaseModel):
         use_enum_values = True
 
 
+class DataSourceDoc(BaseModel):
+    """数据源文档模型（集合source_docs）"""
+    id: str
+    source_id: str = Field(alias="sourceId")
+    project_id: str = Field(alias="projectId")
+    name: str
+    version: int
+    status: DataSourceStatus
+    content: Optional[str] = None
+    created_at: datetime = Field(alias="createdAt")
+    last_updated_at: Optional[datetime] = Field(None, alias="lastUpdatedAt")
+    attempts: int = 0
+    error: Optional[str] = None
+    data: Dict[str, Any]
+    
+    class Config:
+        populate_by_name = True
+        use_enum_values = True
+
+
 class JobStatus(str, Enum):
     """任务状态"""
     PENDING = "pending"
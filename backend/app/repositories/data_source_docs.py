@@ -0,0 +1,212 @@
+"""
+数据源文档数据访问层
+Data Source Docs Repository for database operations
+严格复刻原项目实现：使用MongoDB ObjectId作为_id，集合名为"source_docs"
+"""
+
+from typing import List, Optional, Dict, Any
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from app.core.database import get_mongodb_db
+from app.models.schemas import DataSourceDoc
+from app.repositories.timestamps import utc_iso
+
+
+class DataSourceDocsRepository:
+    """
+    数据源文档数据访问类
+    Repository for DataSourceDoc operations
+    严格复刻原项目：mongodb.data-source-docs.repository.ts
+    """
+    
+    def __init__(self):
+        """初始化Repository"""
+        self.collection_name = "source_docs"
+    
+    @staticmethod
+    def _to_model(doc: Dict[str, Any]) -> DataSourceDoc:
+        """移除_id，添加id字段（_id转换为字符串），转换为Pydantic模型"""
+        _id = doc.pop("_id")
+        doc["id"] = str(_id)
+        return DataSourceDoc(**doc)
+    
+    async def fetch(self, doc_id: str) -> Optional[DataSourceDoc]:
+        """
+        根据ID获取文档
+        Fetch doc by ID
+        
+        Args:
+            doc_id: 文档ID（ObjectId字符串）
+        
+        Returns:
+            文档对象，如果不存在则返回None
+        """
+        db = await get_mongodb_db()
+        collection = db[self.collection_name]
+        
+        try:
+            doc = await collection.find_one({"_id": ObjectId(doc_id)})
+        except Exception:
+            # ObjectId格式错误
+            return None
+        
+        if doc is None:
+            return None
+        return self._to_model(doc)
+    
+    async def list(
+        self,
+        source_id: str,
+        filters: Optional[Dict[str, Any]] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50
+    ) -> Dict[str, Any]:
+        """
+        列出数据源的文档
+        List docs of a data source
+        严格复刻原项目：默认排除deleted，使用_id作为游标，限制最多50条
+        
+        Args:
+            source_id: 数据源ID
+            filters: 过滤条件（status: 状态列表）
+            cursor: 分页游标（ObjectId字符串）
+            limit: 返回的最大记录数（默认50，最多50）
+        
+        Returns:
+            包含items和nextCursor的字典
+        """
+        db = await get_mongodb_db()
+        collection = db[self.collection_name]
+        
+        query: Dict[str, Any] = {"sourceId": source_id, "status": {"$ne": "deleted"}}
+        if filters and filters.get("status"):
+            query["status"] = {"$in": list(filters["status"])}
+        if cursor:
+            query["_id"] = {"$lt": ObjectId(cursor)}
+        
+        _limit = min(limit, 50)
+        results = [doc async for doc in collection.find(query).sort("_id", -1).limit(_limit + 1)]
+        
+        has_next_page = len(results) > _limit
+        next_cursor = str(results[_limit - 1]["_id"]) if has_next_page else None
+        
+        return {
+            "items": [self._to_model(doc) for doc in results[:_limit]],
+            "nextCursor": next_cursor,
+        }
+    
+    async def list_all(self, source_id: str, statuses: List[str]) -> List[DataSourceDoc]:
+        """
+        获取数据源中指定状态的所有文档（循环分页直到cursor为None）
+        List every doc of a data source with one of the given statuses
+        
+        Args:
+            source_id: 数据源ID
+            statuses: 状态列表
+        
+        Returns:
+            文档列表
+        """
+        docs: List[DataSourceDoc] = []
+        cursor = None
+        while True:
+            result = await self.list(source_id, filters={"status": statuses}, cursor=cursor)
+            docs.extend(result["items"])
+            cursor = result["nextCursor"]
+            if not cursor:
+                return docs
+    
+    async def bulk_fetch_content(self, doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        一次$in查询批量获取文档内容（原项目方法名：bulkFetch），只返回检索需要的字段
+        Fetch many docs in a single $in query, projecting only the fields retrieval needs
+        
+        Args:
+            doc_ids: 文档ID列表（ObjectId字符串）
+        
+        Returns:
+            文档ID到{name, content, sourceId}的映射（不存在或ID无效的文档不包含在内）
+        """
+        object_ids = [ObjectId(doc_id) for doc_id in doc_ids if ObjectId.is_valid(doc_id)]
+        if not object_ids:
+            return {}
+        
+        db = await get_mongodb_db()
+        collection = db[self.collection_name]
+        
+        cursor = collection.find(
+            {"_id": {"$in": object_ids}},
+            projection={"name": 1, "content": 1, "sourceId": 1},
+        )
+        return {str(doc.pop("_id")): doc async for doc in cursor}
+    
+    async def update_by_version(
+        self,
+        doc_id: str,
+        version: int,
+        data: Dict[str, Any],
+    ) -> Optional[DataSourceDoc]:
+        """
+        按版本号更新文档（原项目方法名：updateByVersion）
+        Update a doc only if its version matches
+        
+        Args:
+            doc_id: 文档ID（ObjectId字符串）
+            version: 期望的版本号
+            data: 要更新的字段（status, content, error）
+        
+        Returns:
+            更新后的文档，版本不匹配或不存在时返回None
+        """
+        db = await get_mongodb_db()
+        collection = db[self.collection_name]
+        
+        now = utc_iso()
+        result = await collection.find_one_and_update(
+            {"_id": ObjectId(doc_id), "version": version},
+            {"$set": {**data, "lastUpdatedAt": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+        
+        if result is None:
+            return None
+        return self._to_model(result)
+    
+    async def delete(self, doc_id: str) -> bool:
+        """
+        删除文档
+        Delete a doc
+        
+        Args:
+            doc_id: 文档ID（ObjectId字符串）
+        
+        Returns:
+            是否删除成功
+        """
+        db = await get_mongodb_db()
+        collection = db[self.collection_name]
+        
+        try:
+            result = await collection.delete_one({"_id": ObjectId(doc_id)})
+        except Exception:
+            return False
+        return result.deleted_count > 0
+    
+    async def delete_by_source_id(self, source_id: str) -> None:
+        """
+        删除数据源的所有文档
+        Delete all docs of a data source
+        """
+        db = await get_mongodb_db()
+        collection = db[self.collection_name]
+        await collection.delete_many({"sourceId": source_id})
+    
+    async def delete_by_project_id(self, project_id: str) -> None:
+        """
+        删除项目的所有文档
+        Delete all docs of a project
+        """
+        db = await get_mongodb_db()
+        collection = db[self.collection_name]
+        await collection.delete_many({"projectId": project_id})
@@ -5,12 +5,14 @@ Data Sources Repository for database operations
 """
 
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from bson import ObjectId
+from pymongo import ReturnDocument
 
 from app.core.database import get_mongodb_db
 from app.core.cache import get_cache_service
 from app.models.schemas import DataSource, DataSourceStatus
+from app.repositories.timestamps import utc_iso
 
 
 class DataSourcesRepository:
@@ -224,7 +226,7 @@ class DataSourcesRepository:
         db = await get_mongodb_db()
         collection = db[self.collection_name]
         
-        now = datetime.now().isoformat()
+        now = utc_iso()
         
         # 构建更新操作
         update_op: Dict[str, Any] = {
@@ -310,4 +312,233 @@ class DataSourcesRepository:
             return count > 0
         except Exception:
             return False
-
+    
+    async def poll_pending_job(self, lease_seconds: int, max_attempts: int = 3) -> Optional[DataSource]:
+        """
+        认领一个待处理的数据源（原项目方法名：pollPendingJob）
+        Claim the next pending data source with a lease
+        
+        使用find_one_and_update原子地设置lastAttemptAt并增加attempts，多个worker进程
+        可以同时轮询而不会重复认领；租约过期（lastAttemptAt早于lease_seconds）的任务可被重新认领。
+        租约过期且已用完重试次数的任务（如每次都让worker崩溃的文件）标记为error，不再认领。
+        find_one_and_update atomically stamps lastAttemptAt and bumps attempts, so workers in
+        several processes can poll concurrently; jobs whose lease expired can be reclaimed,
+        unless they have used up their attempts, in which case they are moved to error.
+        
+        Args:
+            lease_seconds: 租约时长（秒）
+            max_attempts: 最大尝试次数（包括租约过期后的重新认领）
+        
+        Returns:
+            认领到的数据源，没有可处理的任务时返回None
+        """
+        db = await get_mongodb_db()
+        collection = db[self.collection_name]
+        
+        now = datetime.now(timezone.utc)
+        lease_expired_before = utc_iso(now - timedelta(seconds=lease_seconds))
+        
+        await self._fail_exhausted_jobs(collection, lease_expired_before, max_attempts)
+        
+        doc = await collection.find_one_and_update(
+            {
+                "$or": [
+                    # 从未被处理过
+                    {"status": DataSourceStatus.PENDING.value, "attempts": 0},
+                    # 已被认领但租约过期（worker崩溃或失去心跳），且尚未达到最大尝试次数
+                    {
+                        "status": DataSourceStatus.PENDING.value,
+                        "lastAttemptAt": {"$lt": lease_expired_before},
+                        "attempts": {"$lt": max_attempts},
+                    },
+                    # 出错但尚未达到最大重试次数
+                    {"status": DataSourceStatus.ERROR.value, "attempts": {"$lt": max_attempts}},
+                ]
+            },
+            {
+                "$set": {
+                    "status": DataSourceStatus.PENDING.value,
+                    "lastAttemptAt": utc_iso(now),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("createdAt", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        
+        if doc is None:
+            return None
+        
+        _id = doc.pop("_id")
+        doc["id"] = str(_id)
+        return DataSource(**doc)
+    
+    async def _fail_exhausted_jobs(self, collection, lease_expired_before: str, max_attempts: int) -> None:
+        """
+        将租约过期且已用完尝试次数的待处理任务标记为error
+        Move pending jobs whose lease expired after their last allowed attempt to error
+        """
+        query = {
+            "status": DataSourceStatus.PENDING.value,
+            "lastAttemptAt": {"$lt": lease_expired_before},
+            "attempts": {"$gte": max_attempts},
+        }
+        source_ids = [doc["_id"] async for doc in collection.find(query, {"_id": 1})]
+        if not source_ids:
+            return
+        
+        await collection.update_many({**query, "_id": {"$in": source_ids}}, {
+            "$set": {
+                "status": DataSourceStatus.ERROR.value,
+                "error": f"Processing did not finish after {max_attempts} attempts",
+                "lastUpdatedAt": utc_iso(),
+            },
+        })
+        
+        for source_id in source_ids:
+            await self.cache_service.delete(self.cache_service.get_data_source_key(str(source_id)))
+    
+    async def poll_delete_job(self, lease_seconds: int, max_attempts: int = 3) -> Optional[DataSource]:
+        """
+        认领一个待删除的数据源（原项目方法名：pollDeleteJob）
+        Claim the next soft-deleted data source whose vectors and docs must be removed
+        
+        Args:
+            lease_seconds: 租约时长（秒），租约内不会被其他worker重复认领
+            max_attempts: 最大尝试次数
+            
+        Returns:
+            认领到的数据源，没有待删除的数据源时返回None
+        """
+        db = await get_mongodb_db()
+        collection = db[self.collection_name]
+        
+        now = datetime.now(timezone.utc)
+        lease_expired_before = utc_iso(now - timedelta(seconds=lease_seconds))
+        
+        doc = await collection.find_one_and_update(
+            {
+                "status": DataSourceStatus.DELETED.value,
+                "attempts": {"$lt": max_attempts},
+                "$or": [
+                    {"lastAttemptAt": None},
+                    {"lastAttemptAt": {"$lt": lease_expired_before}},
+                ],
+            },
+            {
+                "$set": {"lastAttemptAt": utc_iso(now)},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("createdAt", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        
+        if doc is None:
+            return None
+        
+        _id = doc.pop("_id")
+        doc["id"] = str(_id)
+        return DataSource(**doc)
+    
+    async def mark_project_deleted(self, project_id: str) -> int:
+        """
+        将项目的所有数据源标记为已删除（由导入worker级联清理向量和文档）
+        Soft-delete every data source of a project so the worker cascades the cleanup
+        
+        Args:
+            project_id: 项目ID
+            
+        Returns:
+            标记的数据源数量
+        """
+        db = await get_mongodb_db()
+        collection = db[self.collection_name]
+        
+        query = {"projectId": project_id, "status": {"$ne": DataSourceStatus.DELETED.value}}
+        source_ids = [str(doc["_id"]) async for doc in collection.find(query, {"_id": 1})]
+        if not source_ids:
+            return 0
+        
+        await collection.update_many(query, {
+            "$set": {
+                "status": DataSourceStatus.DELETED.value,
+                "attempts": 0,
+                "lastAttemptAt": None,
+                "lastUpdatedAt": utc_iso(),
+            },
+            "$inc": {"version": 1},
+        })
+        
+        for source_id in source_ids:
+            await self.cache_service.delete(self.cache_service.get_data_source_key(source_id))
+        return len(source_ids)
+    
+    async def find_existing_ids(self, source_ids: List[str]) -> set:
+        """
+        获取仍然存在记录的数据源ID（任意状态）
+        Return the subset of ids that still have a source record (any status)
+        
+        Args:
+            source_ids: 数据源ID列表
+            
+        Returns:
+            存在的数据源ID集合
+        """
+        object_ids = []
+        for source_id in source_ids:
+            try:
+                object_ids.append(ObjectId(source_id))
+            except Exception:
+                # 非ObjectId格式的ID不可能对应数据源记录
+                continue
+        if not object_ids:
+            return set()
+        
+        db = await get_mongodb_db()
+        collection = db[self.collection_name]
+        return {str(doc["_id"]) async for doc in collection.find({"_id": {"$in": object_ids}}, {"_id": 1})}
+    
+    async def renew_lease(self, source_id: str, version: int) -> bool:
+        """
+        续租（处理中的worker定期刷新lastAttemptAt）
+        Renew a claimed job's lease by refreshing lastAttemptAt
+        
+        Args:
+            source_id: 数据源ID
+            version: 认领时的版本号
+        
+        Returns:
+            是否续租成功（数据源被修改或删除时返回False）
+        """
+        db = await get_mongodb_db()
+        collection = db[self.collection_name]
+        
+        result = await collection.update_one(
+            {"_id": ObjectId(source_id), "version": version, "status": DataSourceStatus.PENDING.value},
+            {"$set": {"lastAttemptAt": utc_iso()}},
+        )
+        return result.matched_count > 0
+    
+    async def release(self, source_id: str, version: int, data: Dict[str, Any]) -> None:
+        """
+        释放任务并写入处理结果（原项目方法名：release）
+        Release a claimed job, recording its outcome
+        
+        只有版本号未变化时才会更新，避免覆盖处理期间用户做的修改。
+        Only applies if the version is unchanged, so edits made mid-run are not overwritten.
+        
+        Args:
+            source_id: 数据源ID
+            version: 认领时的版本号
+            data: 要更新的字段（status, error, billingError）
+        """
+        db = await get_mongodb_db()
+        collection = db[self.collection_name]
+        
+        await collection.update_one(
+            {"_id": ObjectId(source_id), "version": version},
+            {"$set": {**data, "lastUpdatedAt": utc_iso()}},
+        )
+        
+        cache_key = self.cache_service.get_data_source_key(source_id)
+        await self.cache_service.delete(cache_key)
@@ -0,0 +1,20 @@
+"""
+时间戳格式
+Timestamp format shared by repositories
+"""
+
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def utc_iso(dt: Optional[datetime] = None) -> str:
+    """
+    转换为与原项目一致的ISO时间字符串（UTC，毫秒，Z结尾，即JS的toISOString），可按字符串比较
+    Format as UTC with milliseconds and a "Z" suffix (JS toISOString), so values compare as strings
+    
+    Args:
+        dt: 时间（默认为当前时间）
+    """
+    if dt is None:
+        dt = datetime.now(timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
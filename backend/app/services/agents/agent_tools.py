@@ -3,7 +3,7 @@ Agent工具实现
 Agent tools implementation
 """
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 from langchain_core.tools import StructuredTool
 from langchain_core.pydantic_v1 import BaseModel as LCBaseModel, Field as LCField
 
@@ -84,42 +84,56 @@ class AgentToolsService:
         if not agent.rag_data_sources:
             return None
         
-        async def rag_search_func(query: str) -> str:
+        async def rag_search_func(query: Union[str, List[str]]) -> str:
             """
             搜索相关文档
             Search for relevant documents
             
             Args:
-                query: 搜索查询
+                query: 搜索查询；也可以传入多个查询（如改写后的查询、针对不同方面的查询），一次完成检索
                 
             Returns:
                 搜索结果（JSON格式）
+                多个查询时按查询分组：[{"query": ..., "results": [...]}]
             """
-            results = await self.rag_service.search(
+            queries = [query] if isinstance(query, str) else list(query)
+            batches = await self.rag_service.search_many(
                 project_id=project_id,
-                query=query,
+                queries=queries,
                 source_ids=agent.rag_data_sources or [],
                 return_type=agent.rag_return_type,
                 k=agent.rag_k,
+                search_mode=agent.rag_search_mode,
+                search_preset=agent.rag_search_preset,
+                search_params=agent.rag_search_params,
             )
             
             # 格式化结果
-            if not results:
+            if not any(batches):
                 return "No relevant documents found."
             
             # 将结果转换为字符串
             import json
-            results_dict = [
-                {
-                    "title": r.title,
-                    "name": r.name,
-                    "content": r.content,
-                    "docId": r.doc_id,
-                    "sourceId": r.source_id,
-                }
-                for r in results
+            results_dicts = [
+                [
+                    {
+                        "title": r.title,
+                        "name": r.name,
+                        "content": r.content,
+                        "docId": r.doc_id,
+                        "sourceId": r.source_id,
+                    }
+                    for r in results
+                ]
+                for results in batches
             ]
-            return json.dumps(results_dict, ensure_ascii=False, indent=2)
+            if isinstance(query, str):
+                return json.dumps(results_dicts[0], ensure_ascii=False, indent=2)
+            return json.dumps(
+                [{"query": q, "results": r} for q, r in zip(queries, results_dicts)],
+                ensure_ascii=False,
+                indent=2,
+            )
         
         return StructuredTool.from_function(
             func=rag_search_func,
@@ -3,8 +3,13 @@ OpenAI Agent SDK工具实现
 OpenAI Agent SDK tools implementation
 """
 
-from typing import List, Optional, Dict, Any, Callable
+from typing import List, Optional, Dict, Any, Union, Callable
+import asyncio
+import hashlib
+import json
 import sys
+import time
+import uuid
 
 # 解决命名冲突：确保导入openai-agents包而不是本地agents目录
 _original_path = sys.path.copy()
@@ -19,10 +24,21 @@ except ImportError as e:
 # 恢复原始路径
 sys.path = _original_path
 
+from jose import jwt
+
 from app.core.config import get_settings
-from app.models.schemas import WorkflowAgent, WorkflowTool
+from app.core.http_client import get_http_client, request_with_retry
+from app.models.schemas import ComposioToolData, DataSourceStatus, Project, WorkflowAgent, WorkflowTool
+from app.repositories.data_sources import DataSourcesRepository
+from app.repositories.projects import ProjectsRepository
 from app.services.composio.composio_service import get_composio_service
-from app.services.rag.rag_service import get_rag_service
+from app.services.mcp.mcp_client_manager import get_mcp_client_manager
+from app.services.rag.rag_service import RAGResult, get_rag_service
+from app.services.rag.semantic_cache import get_semantic_cache, semantic_cache_scope
+
+
+# Webhook签名JWT有效期（秒），与原项目一致为5分钟
+WEBHOOK_JWT_EXPIRY = 300
 
 
 class OpenAIAgentToolsService:
@@ -36,6 +52,11 @@ class OpenAIAgentToolsService:
         self.settings = get_settings()
         self.composio_service = get_composio_service()
         self.rag_service = get_rag_service()
+        self.mcp_client_manager = get_mcp_client_manager()
+        self.projects_repository = ProjectsRepository()
+        self.data_sources_repository = DataSourcesRepository()
+        # rag_search的语义结果缓存（相似的查询复用检索结果）
+        self.semantic_cache = get_semantic_cache() if self.settings.rag_semantic_cache_enabled else None
     
     def create_tools(
         self,
@@ -119,45 +140,111 @@ class OpenAIAgentToolsService:
             name_override="rag_search",
             description_override=agent.description or "Search for relevant documents using RAG",
         )
-        async def rag_search_func(query: str) -> str:
+        async def rag_search_func(query: Union[str, List[str]]) -> str:
             """
             搜索相关文档
             Search for relevant documents using RAG
             
             Args:
-                query: 搜索查询，描述要搜索的内容
+                query: 搜索查询，描述要搜索的内容；也可以传入多个查询（如改写后的查询、针对不同方面的查询），一次完成检索
                 
             Returns:
                 搜索结果（JSON格式），包含title、name、content、docId、sourceId等字段
+                多个查询时按查询分组：[{"query": ..., "results": [...]}]
             """
-            results = await self.rag_service.search(
-                project_id=project_id,
-                query=query,
-                source_ids=agent.rag_data_sources or [],
-                return_type=agent.rag_return_type,
-                k=agent.rag_k,
-            )
+            queries = [query] if isinstance(query, str) else list(query)
+            batches = await self._search_rag(project_id, agent, queries)
             
             # 格式化结果
-            if not results:
+            if not any(batches):
                 return "No relevant documents found."
             
             # 将结果转换为字符串
             import json
-            results_dict = [
-                {
-                    "title": r.title,
-                    "name": r.name,
-                    "content": r.content,
-                    "docId": r.doc_id,
-                    "sourceId": r.source_id,
-                }
-                for r in results
+            results_dicts = [
+                [
+                    {
+                        "title": r.title,
+                        "name": r.name,
+                        "content": r.content,
+                        "docId": r.doc_id,
+                        "sourceId": r.source_id,
+                    }
+                    for r in results
+                ]
+                for results in batches
             ]
-            return json.dumps(results_dict, ensure_ascii=False, indent=2)
+            if isinstance(query, str):
+                return json.dumps(results_dicts[0], ensure_ascii=False, indent=2)
+            return json.dumps(
+                [{"query": q, "results": r} for q, r in zip(queries, results_dicts)],
+                ensure_ascii=False,
+                indent=2,
+            )
         
         return rag_search_func
     
+    async def _search_rag(
+        self,
+        project_id: str,
+        agent: WorkflowAgent,
+        queries: List[str],
+    ) -> List[List[RAGResult]]:
+        """
+        执行RAG检索，相似查询命中语义缓存时复用之前的结果
+        Run the agent's RAG search, serving paraphrased queries from the semantic cache
+        
+        Args:
+            project_id: 项目ID
+            agent: 智能体配置
+            queries: 查询列表
+            
+        Returns:
+            与queries一一对应的搜索结果列表
+        """
+        options = {
+            "source_ids": agent.rag_data_sources or [],
+            "return_type": agent.rag_return_type,
+            "k": agent.rag_k,
+            "search_mode": agent.rag_search_mode,
+            "search_preset": agent.rag_search_preset,
+            "search_params": agent.rag_search_params,
+        }
+        signature = await self._rag_sources_signature(options["source_ids"]) if self.semantic_cache else None
+        if signature is None:
+            return await self.rag_service.search_many(project_id=project_id, queries=queries, **options)
+        
+        scope = semantic_cache_scope(project_id, **options)
+        embeddings = await self.rag_service.embed_queries(queries)
+        batches = [self.semantic_cache.lookup(scope, embedding, signature) for embedding in embeddings]
+        missing = [i for i, results in enumerate(batches) if results is None]
+        if missing:
+            fetched = await self.rag_service.search_many(
+                project_id=project_id,
+                queries=[queries[i] for i in missing],
+                embeddings=[embeddings[i] for i in missing],
+                **options,
+            )
+            for i, results in zip(missing, fetched):
+                batches[i] = results
+                self.semantic_cache.store(scope, embeddings[i], signature, results)
+        return batches
+    
+    async def _rag_sources_signature(self, source_ids: List[str]) -> Optional[str]:
+        """
+        数据源签名（版本号和更新时间）：数据源修改、重新导入或删除后签名变化，语义缓存随之失效
+        Signature of the sources' versions; returns None (do not cache) while any source
+        is missing or not ready, since its chunks may still be changing
+        """
+        try:
+            sources = await asyncio.gather(*(self.data_sources_repository.fetch(source_id) for source_id in source_ids))
+        except Exception as e:
+            print(f"[RAG] 获取数据源版本失败，跳过语义缓存: {e}")
+            return None
+        if not sources or any(source is None or source.status != DataSourceStatus.READY for source in sources):
+            return None
+        return "|".join(sorted(f"{source.id}:{source.version}:{source.last_updated_at}" for source in sources))
+    
     def _create_workflow_tool(
         self,
         project_id: str,
@@ -186,6 +273,10 @@ class OpenAIAgentToolsService:
         if workflow_tool.is_webhook:
             return self._create_webhook_tool(project_id, workflow_tool)
         
+        # 如果是MCP工具，创建MCP工具
+        if workflow_tool.is_mcp and workflow_tool.mcp_server_name:
+            return self._create_mcp_tool(project_id, workflow_tool)
+        
         # 其他类型的工具（暂时不支持）
         return None
     
@@ -221,6 +312,24 @@ class OpenAIAgentToolsService:
         
         return mock_tool_func
     
+    @staticmethod
+    def _params_json_schema(workflow_tool: WorkflowTool) -> Dict[str, Any]:
+        """构建工具参数JSON Schema（非strict模式，与原项目一致）"""
+        parameters = workflow_tool.parameters or {}
+        return {
+            "type": "object",
+            "properties": parameters.get("properties", {}),
+            "required": parameters.get("required", []),
+            "additionalProperties": True,
+        }
+    
+    async def _get_project(self, project_id: str) -> Project:
+        """获取项目（带缓存），不存在时抛出异常"""
+        project = await self.projects_repository.get_by_id(project_id)
+        if project is None:
+            raise ValueError(f"project {project_id} not found")
+        return project
+    
     def _create_composio_tool(
         self,
         project_id: str,
@@ -237,9 +346,106 @@ class OpenAIAgentToolsService:
         Returns:
             Composio工具
         """
-        # TODO: 实现Composio工具调用
-        # 这里暂时返回None
-        return None
+        composio_data = workflow_tool.composio_data
+        
+        async def on_invoke_tool(ctx: Any, input_json: str) -> str:
+            try:
+                arguments = json.loads(input_json) if input_json else {}
+                result = await self._invoke_composio_tool(project_id, composio_data, arguments)
+                return json.dumps(result, ensure_ascii=False, default=str)
+            except Exception as e:
+                print(f"❌ Composio工具 {workflow_tool.name} 执行失败: {e}")
+                return json.dumps({"error": "Tool execution failed!"})
+        
+        return FunctionTool(
+            name=workflow_tool.name,
+            description=workflow_tool.description,
+            params_json_schema=self._params_json_schema(workflow_tool),
+            on_invoke_tool=on_invoke_tool,
+            strict_json_schema=False,
+        )
+    
+    async def _invoke_composio_tool(
+        self,
+        project_id: str,
+        composio_data: ComposioToolData,
+        arguments: Dict[str, Any],
+    ) -> Any:
+        """
+        调用Composio工具
+        Invoke a Composio tool
+        
+        Args:
+            project_id: 项目ID
+            composio_data: Composio工具数据
+            arguments: 工具参数
+            
+        Returns:
+            工具执行结果数据
+        """
+        connected_account_id: Optional[str] = None
+        if not composio_data.no_auth:
+            project = await self._get_project(project_id)
+            connected_account = (project.composio_connected_accounts or {}).get(composio_data.toolkit_slug)
+            if connected_account is None:
+                raise ValueError(
+                    f"connected account id not found for project {project_id} and toolkit {composio_data.toolkit_slug}"
+                )
+            connected_account_id = connected_account.id
+        
+        result = await self.composio_service.execute_tool(
+            composio_data.slug,
+            arguments=arguments,
+            user_id=project_id,
+            connected_account_id=connected_account_id,
+            timeout=self.settings.composio_tool_timeout,
+            max_retries=self.settings.composio_tool_max_retries,
+        )
+        if not result.get("successful"):
+            raise RuntimeError(result.get("error") or "Unknown error")
+        return result.get("data")
+    
+    def _create_mcp_tool(
+        self,
+        project_id: str,
+        workflow_tool: WorkflowTool,
+    ) -> Optional[FunctionTool]:
+        """
+        创建MCP工具（通过池化会话调用自定义MCP服务器）
+        Create MCP tool backed by the pooled MCP session
+        
+        Args:
+            project_id: 项目ID
+            workflow_tool: 工作流工具配置
+            
+        Returns:
+            MCP工具
+        """
+        server_name = workflow_tool.mcp_server_name
+        
+        async def on_invoke_tool(ctx: Any, input_json: str) -> str:
+            try:
+                arguments = json.loads(input_json) if input_json else {}
+                project = await self._get_project(project_id)
+                server = (project.custom_mcp_servers or {}).get(server_name)
+                if server is None:
+                    raise ValueError(f"mcp server url not found for project {project_id} and server {server_name}")
+                
+                result = await self.mcp_client_manager.call_tool(
+                    project_id, server_name, server.server_url, workflow_tool.name, arguments,
+                )
+                return json.dumps(result.model_dump(mode="json", exclude_none=True), ensure_ascii=False)
+            except Exception as e:
+                print(f"❌ MCP工具 {workflow_tool.name} 执行失败: {e}")
+                return json.dumps({"error": "Tool execution failed!"})
+        
+        return FunctionTool(
+            name=workflow_tool.name,
+            description=workflow_tool.description,
+            params_json_schema=self._params_json_schema(workflow_tool),
+            on_invoke_tool=on_invoke_tool,
+            strict_json_schema=False,
+        )
     
     def _create_webhook_tool(
         self,
@@ -257,9 +463,113 @@ class OpenAIAgentToolsService:
         Returns:
             Webhook工具
         """
-        # TODO: 实现Webhook工具调用
-        # 这里暂时返回None
-        return None
+        async def on_invoke_tool(ctx: Any, input_json: str) -> str:
+            try:
+                arguments = json.loads(input_json) if input_json else {}
+                tool_call_id = getattr(ctx, "tool_call_id", None) or str(uuid.uuid4())
+                result = await self._invoke_webhook_tool(
+                    project_id, workflow_tool.name, arguments, tool_call_id
+                )
+                return json.dumps(result, ensure_ascii=False, default=str)
+            except Exception as e:
+                print(f"❌ Webhook工具 {workflow_tool.name} 执行失败: {e}")
+                return json.dumps({"error": "Tool execution failed!"})
+        
+        return FunctionTool(
+            name=workflow_tool.name,
+            description=workflow_tool.description,
+            params_json_schema=self._params_json_schema(workflow_tool),
+            on_invoke_tool=on_invoke_tool,
+            strict_json_schema=False,
+        )
+    
+    def _sign_webhook_request(
+        self,
+        project: Project,
+        body_hash: str,
+        tool_call_id: str,
+    ) -> tuple[str, str]:
+        """
+        生成Webhook请求签名JWT（每次调用签名一次，重试复用同一个JWT）
+        Sign a webhook request; retries of the same call reuse the token
+        
+        Args:
+            project: 项目
+            body_hash: 请求content的SHA256哈希
+            tool_call_id: 工具调用ID
+            
+        Returns:
+            (requestId, JWT)
+        """
+        request_id = str(uuid.uuid4())
+        now = int(time.time())
+        token = jwt.encode(
+            {
+                "requestId": request_id,
+                "projectId": project.id,
+                "bodyHash": body_hash,
+                "iss": "rowboat",
+                "aud": project.webhook_url,
+                "sub": f"tool-call-{tool_call_id}",
+                "jti": request_id,
+                "iat": now,
+                "exp": now + WEBHOOK_JWT_EXPIRY,
+            },
+            project.secret,
+            algorithm="HS256",
+        )
+        return request_id, token
+    
+    async def _invoke_webhook_tool(
+        self,
+        project_id: str,
+        name: str,
+        arguments: Dict[str, Any],
+        tool_call_id: str,
+    ) -> Any:
+        """
+        调用Webhook工具（请求格式与tools_webhook服务的签名校验一致）
+        Invoke a webhook tool (request format matches tools_webhook signature verification)
+        
+        Args:
+            project_id: 项目ID
+            name: 工具名称
+            arguments: 工具参数
+            tool_call_id: 工具调用ID
+            
+        Returns:
+            Webhook响应JSON
+        """
+        project = await self._get_project(project_id)
+        if not project.webhook_url:
+            raise ValueError("Webhook URL not found")
+        
+        content = json.dumps({
+            "toolCall": {
+                "id": tool_call_id,
+                "type": "function",
+                "function": {
+                    "name": name,
+                    "arguments": json.dumps(arguments),
+                },
+            },
+        })
+        body_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        request_id, token = self._sign_webhook_request(project, body_hash, tool_call_id)
+        
+        response = await request_with_retry(
+            get_http_client(project.webhook_url),
+            "POST",
+            project.webhook_url,
+            max_retries=self.settings.tool_call_max_retries,
+            idempotent=False,
+            json={"requestId": request_id, "content": content},
+            headers={"x-signature-jwt": token},
+            timeout=self.settings.tool_call_timeout,
+        )
+        if response.status_code >= 400:
+            raise RuntimeError(f"Failed to call webhook: {response.status_code}: {response.reason_phrase}")
+        return response.json()
 
 
 # 全局OpenAI Agent工具服务实例（单例模式）
@@ -3,12 +3,15 @@ Composio服务实现
 Composio service implementation
 """
 
+import asyncio
 import json
 import httpx
 from typing import Dict, List, Optional, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel
 
 from app.core.config import get_settings
+from app.core.cache import get_cache_service, LocalCache
+from app.core.http_client import create_http_client, request_with_retry
 
 
 class ComposioToolSuggestion(BaseModel):
@@ -47,7 +50,7 @@ class ComposioService:
         """初始化Composio服务"""
         self.settings = get_settings()
         self.api_key = self.settings.composio_api_key
-        self.client = httpx.AsyncClient(
+        self.client = create_http_client(
             base_url=self.BASE_URL,
             headers={
                 "x-api-key": self.api_key,
@@ -55,11 +58,67 @@ class ComposioService:
             },
             timeout=30.0,
         )
+        
+        # 工具详情/工具包元数据缓存（进程内 + Redis）
+        self.cache_service = get_cache_service()
+        self.cache_ttl = self.settings.composio_cache_ttl
+        self._tool_cache = LocalCache(max_entries=2048, ttl=self.cache_ttl)
+        self._toolkit_cache = LocalCache(max_entries=512, ttl=self.cache_ttl)
+        # 正在进行中的toolkit请求（同一toolkit的并发请求合并为一次）
+        self._inflight_toolkits: Dict[str, asyncio.Task] = {}
+    
+    async def execute_tool(
+        self,
+        tool_slug: str,
+        arguments: Dict[str, Any],
+        user_id: str,
+        connected_account_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_retries: int = 0,
+    ) -> Dict[str, Any]:
+        """
+        执行Composio工具（原生异步HTTP调用，不阻塞事件循环）
+        Execute a Composio tool via the async HTTP API (does not block the event loop)
+        
+        Args:
+            tool_slug: 工具slug
+            arguments: 工具参数
+            user_id: 用户ID
+            connected_account_id: 已连接账户ID（可选）
+            timeout: 请求超时（秒），默认使用客户端超时
+            max_retries: 连接错误或429/503时的最大重试次数（工具执行不幂等，请求可能已送达时不重试）
+            
+        Returns:
+            执行结果字典（包含data、successful、error字段）
+        """
+        body: Dict[str, Any] = {
+            "arguments": arguments,
+            "user_id": user_id,
+        }
+        if connected_account_id:
+            body["connected_account_id"] = connected_account_id
+        
+        response = await request_with_retry(
+            self.client,
+            "POST",
+            f"/tools/execute/{tool_slug}",
+            max_retries=max_retries,
+            idempotent=False,
+            json=body,
+            timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+        )
+        if response.status_code != 200:
+            return {
+                "data": None,
+                "successful": False,
+                "error": f"{response.status_code}: {response.text[:200]}",
+            }
+        return response.json()
     
     async def search_tools(self, query: str, user_id: str = "0000-0000-0000") -> List[ComposioToolSuggestion]:
         """
-        搜索相关工具
-        Search for relevant tools
+        搜索相关工具（带整体超时，超时返回空列表）
+        Search for relevant tools, bounded by composio_search_timeout
         
         Args:
             query: 搜索查询
@@ -69,124 +128,176 @@ class ComposioService:
             工具建议列表
         """
         try:
-            # 优先使用composio-core库（与原项目一致）
-            try:
-                from composio_core import Composio
-                composio_client = Composio(api_key=self.api_key)
-                
-                print(f"🔍 [composio-core] 使用 COMPOSIO_SEARCH_TOOLS 搜索工具，查询: {query}")
-                result = composio_client.tools.execute(
-                    tool_name="COMPOSIO_SEARCH_TOOLS",
-                    arguments={"use_case": query},
-                    entity_id=user_id,
-                )
-                
-                if result and hasattr(result, "successful") and result.successful:
-                    data = result.data if hasattr(result, "data") else result
-                    if isinstance(data, dict):
-                        try:
-                            search_response = ComposioToolSearchResponse(**data)
-                            tools = (
-                                search_response.main_tools or
-                                search_response.results or
-                                []
-                            )
-                            if tools:
-                                print(f"✅ [composio-core] COMPOSIO_SEARCH_TOOLS 找到 {len(tools)} 个工具")
-                                return tools
-                        except Exception as parse_error:
-                            print(f"⚠️ [composio-core] 解析响应失败: {parse_error}")
-                            print(f"⚠️ [composio-core] 响应数据: {json.dumps(data, indent=2)[:500]}")
-                else:
-                    error_msg = result.error if hasattr(result, "error") else "Unknown error"
-                    print(f"⚠️ [composio-core] COMPOSIO_SEARCH_TOOLS 执行失败: {error_msg}")
-                    
-            except ImportError as e:
-                print(f"⚠️ [composio-core] 库未安装: {e}")
-            except (AttributeError, TypeError) as e:
-                print(f"⚠️ [composio-core] API调用失败: {e}")
-                import traceback
-                print(f"⚠️ [composio-core] 错误详情:\n{traceback.format_exc()}")
-            
-            # 最后回退方案：遍历toolkits搜索（完整搜索，不提前返回）
-            print(f"🔍 [HTTP API] 回退到遍历toolkits搜索，查询: {query}")
-            try:
-                toolkit_response = await self.client.get("/toolkits", params={"sort_by": "usage"})
-                
-                if toolkit_response.status_code == 200:
-                    toolkit_data = toolkit_response.json()
-                    toolkits = toolkit_data.get("items", [])
-                    print(f"📦 [HTTP API] 获取到 {len(toolkits)} 个 toolkits，开始完整搜索")
-                    
-                    matching_tools = []
-                    query_lower = query.lower()
-                    
-                    # 完整搜索所有toolkits，不提前返回
-                    # 但限制搜索的toolkit数量以避免超时（最多搜索前30个）
-                    max_toolkits_to_search = 30
-                    for i, toolkit in enumerate(toolkits[:max_toolkits_to_search]):
-                        toolkit_slug = toolkit.get("slug")
-                        if not toolkit_slug:
-                            continue
-                        
-                        print(f"🔍 [HTTP API] 搜索 toolkit {i+1}/{min(len(toolkits), max_toolkits_to_search)}: {toolkit_slug}")
-                        try:
-                            tools_response = await self.client.get(
-                                "/tools",
-                                params={
-                                    "toolkit_slug": toolkit_slug,
-                                    "search": query
-                                },
-                                timeout=10.0
-                            )
-                            
-                            if tools_response.status_code == 200:
-                                tools_data = tools_response.json()
-                                tools = tools_data.get("items", [])
-                                if tools:
-                                    print(f"📦 [HTTP API] toolkit {toolkit_slug} 找到 {len(tools)} 个工具")
-                                    for tool in tools:
-                                        matching_tools.append(ComposioToolSuggestion(
-                                            toolkit=toolkit.get("name", toolkit_slug),
-                                            tool_slug=tool.get("slug", ""),
-                                            description=tool.get("description", "")
-                                        ))
-                            elif tools_response.status_code != 200:
-                                error_text = tools_response.text[:200] if hasattr(tools_response, 'text') else str(tools_response)
-                                print(f"⚠️ [HTTP API] toolkit {toolkit_slug} 搜索失败: {tools_response.status_code}")
-                        except Exception as toolkit_error:
-                            print(f"⚠️ [HTTP API] toolkit {toolkit_slug} 搜索异常: {type(toolkit_error).__name__}")
-                            continue
-                    
-                    if matching_tools:
-                        print(f"✅ [HTTP API] 完整搜索完成，找到 {len(matching_tools)} 个匹配的工具")
-                        # 返回前20个最相关的工具
-                        return matching_tools[:20]
-                    else:
-                        print(f"⚠️ [HTTP API] 完整搜索未找到匹配的工具")
-                else:
-                    error_text = toolkit_response.text[:200] if hasattr(toolkit_response, 'text') else str(toolkit_response)
-                    print(f"⚠️ [HTTP API] toolkits 请求失败: {toolkit_response.status_code}")
-                    
-            except Exception as http_error:
-                import traceback
-                print(f"❌ [HTTP API] 遍历toolkits搜索失败: {http_error}")
-                print(f"❌ [HTTP API] 错误详情:\n{traceback.format_exc()}")
-            
-            # 所有方法都失败，返回空列表
-            print(f"❌ [HTTP API] 所有搜索方法都失败，返回空列表")
+            return await asyncio.wait_for(
+                self._search_tools(query, user_id),
+                timeout=self.settings.composio_search_timeout,
+            )
+        except asyncio.TimeoutError:
+            print(f"⚠️ Composio工具搜索超时（{self.settings.composio_search_timeout}s），返回空列表")
             return []
-            
         except Exception as e:
             import traceback
             print(f"❌ Composio工具搜索失败: {e}")
             print(f"❌ 错误详情:\n{traceback.format_exc()}")
             return []
     
+    async def _search_tools(self, query: str, user_id: str) -> List[ComposioToolSuggestion]:
+        """
+        搜索相关工具（COMPOSIO_SEARCH_TOOLS，失败时回退到遍历toolkits）
+        Search for relevant tools (COMPOSIO_SEARCH_TOOLS, falling back to a toolkit scan)
+        """
+        # 优先使用COMPOSIO_SEARCH_TOOLS（与原项目一致），通过异步HTTP调用执行
+        try:
+            print(f"🔍 [HTTP API] 使用 COMPOSIO_SEARCH_TOOLS 搜索工具，查询: {query}")
+            result = await self.execute_tool(
+                "COMPOSIO_SEARCH_TOOLS",
+                arguments={"use_case": query},
+                user_id=user_id,
+            )
+            
+            if result.get("successful"):
+                data = result.get("data")
+                if isinstance(data, dict):
+                    try:
+                        search_response = ComposioToolSearchResponse(**data)
+                        tools = (
+                            search_response.main_tools or
+                            search_response.results or
+                            []
+                        )
+                        if tools:
+                            print(f"✅ [HTTP API] COMPOSIO_SEARCH_TOOLS 找到 {len(tools)} 个工具")
+                            return tools
+                    except Exception as parse_error:
+                        print(f"⚠️ [HTTP API] 解析响应失败: {parse_error}")
+                        print(f"⚠️ [HTTP API] 响应数据: {json.dumps(data, indent=2)[:500]}")
+            else:
+                print(f"⚠️ [HTTP API] COMPOSIO_SEARCH_TOOLS 执行失败: {result.get('error') or 'Unknown error'}")
+        except httpx.HTTPError as e:
+            print(f"⚠️ [HTTP API] COMPOSIO_SEARCH_TOOLS 请求失败: {type(e).__name__}: {e}")
+        
+        # 回退方案：并发遍历toolkits搜索（最多搜索前30个）
+        print(f"🔍 [HTTP API] 回退到遍历toolkits搜索，查询: {query}")
+        try:
+            toolkit_response = await self.client.get("/toolkits", params={"sort_by": "usage"})
+            
+            if toolkit_response.status_code != 200:
+                print(f"⚠️ [HTTP API] toolkits 请求失败: {toolkit_response.status_code}")
+                return []
+            
+            toolkits = toolkit_response.json().get("items", [])
+            max_toolkits_to_search = 30
+            toolkits = [toolkit for toolkit in toolkits[:max_toolkits_to_search] if toolkit.get("slug")]
+            print(f"📦 [HTTP API] 获取到 {len(toolkits)} 个 toolkits，开始并发搜索")
+            
+            semaphore = asyncio.Semaphore(max(1, self.settings.composio_max_concurrency))
+            
+            async def _search_toolkit(toolkit: Dict[str, Any]) -> List[ComposioToolSuggestion]:
+                toolkit_slug = toolkit["slug"]
+                async with semaphore:
+                    try:
+                        tools_response = await self.client.get(
+                            "/tools",
+                            params={
+                                "toolkit_slug": toolkit_slug,
+                                "search": query
+                            },
+                            timeout=10.0
+                        )
+                    except Exception as toolkit_error:
+                        print(f"⚠️ [HTTP API] toolkit {toolkit_slug} 搜索异常: {type(toolkit_error).__name__}")
+                        return []
+                
+                if tools_response.status_code != 200:
+                    print(f"⚠️ [HTTP API] toolkit {toolkit_slug} 搜索失败: {tools_response.status_code}")
+                    return []
+                
+                return [
+                    ComposioToolSuggestion(
+                        toolkit=toolkit.get("name", toolkit_slug),
+                        tool_slug=tool.get("slug", ""),
+                        description=tool.get("description", "")
+                    )
+                    for tool in tools_response.json().get("items", [])
+                ]
+            
+            # gather保持toolkit顺序（按使用量排序）
+            results = await asyncio.gather(*(_search_toolkit(toolkit) for toolkit in toolkits))
+            matching_tools = [tool for toolkit_tools in results for tool in toolkit_tools]
+            
+            if matching_tools:
+                print(f"✅ [HTTP API] 完整搜索完成，找到 {len(matching_tools)} 个匹配的工具")
+                # 返回前20个最相关的工具
+                return matching_tools[:20]
+            print("⚠️ [HTTP API] 完整搜索未找到匹配的工具")
+        except httpx.HTTPError as http_error:
+            print(f"❌ [HTTP API] 遍历toolkits搜索失败: {http_error}")
+        
+        # 所有方法都失败，返回空列表
+        print("❌ [HTTP API] 所有搜索方法都失败，返回空列表")
+        return []
+    
+    @staticmethod
+    def _compute_no_auth(toolkit_data: Dict[str, Any]) -> bool:
+        """根据toolkit信息计算no_auth"""
+        return (
+            "NO_AUTH" in toolkit_data.get("composio_managed_auth_schemes", []) or
+            any(
+                config.get("mode") == "NO_AUTH"
+                for config in toolkit_data.get("auth_config_details", [])
+            ) or
+            False
+        )
+    
+    async def _fetch_toolkit(self, toolkit_slug: str) -> Optional[Dict[str, Any]]:
+        """
+        获取toolkit元数据（Redis缓存 -> HTTP）
+        Fetch toolkit metadata (Redis cache -> HTTP)
+        """
+        cache_key = self.cache_service.get_composio_toolkit_key(toolkit_slug)
+        cached = await self.cache_service.get(cache_key)
+        if isinstance(cached, dict):
+            self._toolkit_cache.set(toolkit_slug, cached)
+            return cached
+        
+        response = await self.client.get(f"/toolkits/{toolkit_slug}")
+        if response.status_code != 200:
+            return None
+        
+        toolkit_data = response.json()
+        self._toolkit_cache.set(toolkit_slug, toolkit_data)
+        await self.cache_service.set(cache_key, toolkit_data, self.cache_ttl)
+        return toolkit_data
+    
+    async def get_toolkit(self, toolkit_slug: str) -> Optional[Dict[str, Any]]:
+        """
+        获取toolkit元数据（带缓存和并发去重）
+        Get toolkit metadata (cached, with in-flight request deduplication)
+        
+        Args:
+            toolkit_slug: toolkit slug
+            
+        Returns:
+            toolkit元数据，如果不存在则返回None
+        """
+        cached = self._toolkit_cache.get(toolkit_slug)
+        if cached is not None:
+            return cached
+        
+        # 同一toolkit的并发请求共享同一个任务
+        task = self._inflight_toolkits.get(toolkit_slug)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_toolkit(toolkit_slug))
+            self._inflight_toolkits[toolkit_slug] = task
+            task.add_done_callback(lambda _: self._inflight_toolkits.pop(toolkit_slug, None))
+        
+        # shield：单个调用方被取消时不影响其他等待者
+        return await asyncio.shield(task)
+    
     async def get_tool(self, tool_slug: str) -> Optional[ComposioTool]:
         """
-        获取工具详情
-        Get tool details
+        获取工具详情（带缓存）
+        Get tool details (cached in-process and in Redis)
         
         Args:
             tool_slug: 工具slug
@@ -195,6 +306,18 @@ class ComposioService:
             工具详情，如果不存在则返回None
         """
         try:
+            # 进程内缓存
+            tool_data = self._tool_cache.get(tool_slug)
+            if tool_data is not None:
+                return ComposioTool(**tool_data)
+            
+            # Redis缓存
+            cache_key = self.cache_service.get_composio_tool_key(tool_slug)
+            cached = await self.cache_service.get(cache_key)
+            if isinstance(cached, dict):
+                self._tool_cache.set(tool_slug, cached)
+                return ComposioTool(**cached)
+            
             # 获取工具详情
             response = await self.client.get(f"/tools/{tool_slug}")
             
@@ -207,27 +330,26 @@ class ComposioService:
             if "error" in tool_data:
                 return None
             
-            # 获取toolkit信息以计算no_auth
+            # 获取toolkit信息以计算no_auth（toolkit元数据有缓存，并发请求会合并）
             toolkit_slug = tool_data.get("toolkit", {}).get("slug")
             no_auth = False
+            toolkit_resolved = not toolkit_slug
             
             if toolkit_slug:
-                toolkit_response = await self.client.get(f"/toolkits/{toolkit_slug}")
-                if toolkit_response.status_code == 200:
-                    toolkit_data = toolkit_response.json()
-                    # 计算no_auth
-                    no_auth = (
-                        "NO_AUTH" in toolkit_data.get("composio_managed_auth_schemes", []) or
-                        any(
-                            config.get("mode") == "NO_AUTH"
-                            for config in toolkit_data.get("auth_config_details", [])
-                        ) or
-                        False
-                    )
+                toolkit_data = await self.get_toolkit(toolkit_slug)
+                if toolkit_data:
+                    no_auth = self._compute_no_auth(toolkit_data)
+                    toolkit_resolved = True
             
             tool_data["no_auth"] = no_auth
+            tool = ComposioTool(**tool_data)
             
-            return ComposioTool(**tool_data)
+            # toolkit获取失败时no_auth只是回退值，不缓存，避免临时错误在整个缓存期内影响工具
+            if toolkit_resolved:
+                self._tool_cache.set(tool_slug, tool_data)
+                await self.cache_service.set(cache_key, tool_data, self.cache_ttl)
+            
+            return tool
             
         except Exception as e:
             # 错误处理
@@ -236,21 +358,24 @@ class ComposioService:
     
     async def get_tools(self, tool_slugs: List[str]) -> List[ComposioTool]:
         """
-        批量获取工具详情
-        Get multiple tool details
+        批量获取工具详情（有界并发）
+        Get multiple tool details concurrently with bounded concurrency
         
         Args:
             tool_slugs: 工具slug列表
             
         Returns:
-            工具详情列表
+            工具详情列表（保持输入顺序，重复的slug只获取一次）
         """
-        tools = []
-        for slug in tool_slugs:
-            tool = await self.get_tool(slug)
-            if tool:
-                tools.append(tool)
-        return tools
+        unique_slugs = list(dict.fromkeys(tool_slugs))
+        semaphore = asyncio.Semaphore(max(1, self.settings.composio_max_concurrency))
+        
+        async def _bounded_get_tool(slug: str) -> Optional[ComposioTool]:
+            async with semaphore:
+                return await self.get_tool(slug)
+        
+        results = await asyncio.gather(*(_bounded_get_tool(slug) for slug in unique_slugs))
+        return [tool for tool in results if tool]
     
     async def search_relevant_tools(self, query: str, workflow: Optional[Dict[str, Any]] = None) -> str:
         """
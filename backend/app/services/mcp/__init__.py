@@ -0,0 +1,4 @@
+"""
+MCP服务
+MCP service
+"""
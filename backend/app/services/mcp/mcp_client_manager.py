@@ -0,0 +1,429 @@
+"""
+MCP客户端管理器实现
+MCP client manager with persistent, health-checked sessions per (project, server)
+"""
+
+import asyncio
+import time
+from contextlib import AsyncExitStack
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+from mcp.client.streamable_http import streamablehttp_client
+from mcp.shared.exceptions import McpError
+from mcp.types import CallToolResult, Tool as McpTool
+
+from app.core.cache import LocalCache
+from app.core.config import get_settings
+
+
+# 传输方式尝试顺序（与原项目一致：优先Streamable HTTP，失败时回退到SSE）
+TRANSPORTS = ("streamable_http", "sse")
+
+
+class McpSession:
+    """
+    持久MCP会话
+    A long-lived MCP client session
+    
+    MCP传输基于anyio上下文，必须在同一个任务中进入和退出，
+    因此每个会话由一个后台任务持有，直到close()被调用或连接断开。
+    The transport contexts must be entered and exited in the same task, so each
+    session is owned by a background task that lives until close() or disconnect.
+    """
+    
+    def __init__(self, server_url: str, transport: str, connect_timeout: float):
+        """
+        初始化会话（不建立连接，需调用start）
+        
+        Args:
+            server_url: MCP服务器URL
+            transport: 传输方式（streamable_http或sse）
+            connect_timeout: 连接超时（秒）
+        """
+        self.server_url = server_url
+        self.transport = transport
+        self.connect_timeout = connect_timeout
+        self.session: Optional[ClientSession] = None
+        self.last_used_at = time.monotonic()
+        self.last_checked_at = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Future] = None
+        self._closing = asyncio.Event()
+    
+    @property
+    def is_alive(self) -> bool:
+        """会话是否仍然可用"""
+        return self.session is not None and self._task is not None and not self._task.done()
+    
+    async def start(self) -> None:
+        """
+        建立连接并完成MCP初始化握手
+        Connect and complete the MCP initialize handshake
+        """
+        self._ready = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(asyncio.shield(self._ready), timeout=self.connect_timeout)
+        except BaseException:
+            await self.close()
+            raise
+    
+    async def _run(self) -> None:
+        """后台任务：持有传输和会话上下文，直到关闭"""
+        try:
+            async with AsyncExitStack() as stack:
+                if self.transport == "streamable_http":
+                    read_stream, write_stream, _ = await stack.enter_async_context(
+                        streamablehttp_client(self.server_url, timeout=self.connect_timeout)
+                    )
+                else:
+                    read_stream, write_stream = await stack.enter_async_context(
+                        sse_client(self.server_url, timeout=self.connect_timeout)
+                    )
+                session = await stack.enter_async_context(ClientSession(read_stream, write_stream))
+                await session.initialize()
+                self.session = session
+                self._ready.set_result(None)
+                await self._closing.wait()
+        except BaseException as e:
+            if not self._ready.done():
+                self._ready.set_exception(e if isinstance(e, Exception) else ConnectionError(str(e)))
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            self.session = None
+    
+    async def ping(self, timeout: float) -> bool:
+        """
+        健康检查
+        Health check with a ping request
+        """
+        if not self.is_alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=timeout)
+            self.last_checked_at = time.monotonic()
+            return True
+        except Exception:
+            return False
+    
+    async def close(self) -> None:
+        """
+        关闭会话
+        Close the session and wait for the background task to exit
+        """
+        self._closing.set()
+        if self._task is not None and not self._task.done():
+            try:
+                await asyncio.wait_for(self._task, timeout=self.connect_timeout)
+            except BaseException:
+                self._task.cancel()
+        self.session = None
+
+
+async def connect_mcp_session(server_url: str, connect_timeout: float) -> McpSession:
+    """
+    连接MCP服务器（依次尝试各传输方式）
+    Connect to an MCP server, trying each transport in order
+    
+    Args:
+        server_url: MCP服务器URL
+        connect_timeout: 连接超时（秒）
+    
+    Returns:
+        已初始化的MCP会话
+    """
+    last_error: Optional[Exception] = None
+    for transport in TRANSPORTS:
+        session = McpSession(server_url, transport, connect_timeout)
+        try:
+            await session.start()
+            print(f"[MCP] 使用 {transport} 连接到 {server_url}")
+            return session
+        except Exception as e:
+            print(f"[MCP] {transport} 连接 {server_url} 失败: {type(e).__name__}: {e}")
+            last_error = e
+    raise ConnectionError(f"无法连接MCP服务器 {server_url}: {last_error}")
+
+
+class McpClientManager:
+    """
+    MCP客户端管理器
+    Keeps one pooled session per (project, server); concurrent tool calls are
+    multiplexed over that session instead of reconnecting per invocation
+    """
+    
+    def __init__(self):
+        """初始化MCP客户端管理器"""
+        self.settings = get_settings()
+        self._sessions: Dict[Tuple[str, str], McpSession] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._tools_cache = LocalCache(max_entries=1024, ttl=self.settings.mcp_tools_cache_ttl)
+        self._sweeper: Optional[asyncio.Task] = None
+    
+    async def get_session(self, project_id: str, server_name: str, server_url: str) -> McpSession:
+        """
+        获取（或建立）会话，空闲超过检查间隔的会话会先做健康检查
+        Get or create the pooled session, health-checking it if it has been idle
+        
+        Args:
+            project_id: 项目ID
+            server_name: MCP服务器名称
+            server_url: MCP服务器URL
+        
+        Returns:
+            可用的MCP会话
+        """
+        self._ensure_sweeper()
+        key = (project_id, server_name)
+        session = self._sessions.get(key)
+        if session is not None and self._is_usable(session, server_url):
+            if time.monotonic() - session.last_checked_at < self.settings.mcp_health_check_interval:
+                return session
+        
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            session = self._sessions.get(key)
+            if session is not None and self._is_usable(session, server_url):
+                if time.monotonic() - session.last_checked_at < self.settings.mcp_health_check_interval:
+                    return session
+                if await session.ping(timeout=self.settings.mcp_connect_timeout):
+                    return session
+            
+            if session is not None:
+                await self._discard(key)
+            
+            session = await connect_mcp_session(server_url, self.settings.mcp_connect_timeout)
+            # 清理空闲会话时锁可能已被替换，另一个协程已建立会话时关闭多余的连接
+            existing = self._sessions.get(key)
+            if existing is not None and self._is_usable(existing, server_url):
+                await session.close()
+                return existing
+            if existing is not None:
+                await self._discard(key)
+            self._sessions[key] = session
+            return session
+    
+    def _is_usable(self, session: McpSession, server_url: str) -> bool:
+        """会话是否仍可复用（存活、URL未变化、未空闲超时）"""
+        idle_for = time.monotonic() - session.last_used_at
+        return (
+            session.is_alive
+            and session.server_url == server_url
+            and idle_for < self.settings.mcp_session_idle_timeout
+        )
+    
+    async def _discard(self, key: Tuple[str, str]) -> None:
+        """关闭并移除会话"""
+        session = self._sessions.pop(key, None)
+        if session is not None:
+            await session.close()
+    
+    def _ensure_sweeper(self) -> None:
+        """启动后台清理任务（首次获取会话时）"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+    
+    async def _sweep_loop(self) -> None:
+        """定期关闭空闲会话"""
+        while True:
+            await asyncio.sleep(self.settings.mcp_session_sweep_interval)
+            try:
+                await self.sweep_idle_sessions()
+            except Exception as e:
+                print(f"[MCP] 清理空闲会话失败: {e}")
+    
+    async def sweep_idle_sessions(self) -> int:
+        """
+        关闭空闲超时或已断开的会话，并移除没有会话的锁
+        Close sessions that are idle past the timeout or dead, and drop locks without a session
+        
+        Returns:
+            关闭的会话数量
+        """
+        now = time.monotonic()
+        expired = [
+            key for key, session in self._sessions.items()
+            if not session.is_alive or now - session.last_used_at >= self.settings.mcp_session_idle_timeout
+        ]
+        closed = 0
+        for key in expired:
+            lock = self._locks.get(key)
+            if lock is not None and lock.locked():
+                # 正在重连或健康检查，留给下一轮
+                continue
+            await self._discard(key)
+            closed += 1
+        
+        for key in [key for key, lock in self._locks.items() if key not in self._sessions and not lock.locked()]:
+            del self._locks[key]
+        return closed
+    
+    async def list_tools(
+        self,
+        project_id: str,
+        server_name: str,
+        server_url: str,
+        refresh: bool = False,
+    ) -> List[McpTool]:
+        """
+        获取服务器工具列表（带TTL缓存）
+        List the server's tools (cached with a TTL)
+        
+        Args:
+            project_id: 项目ID
+            server_name: MCP服务器名称
+            server_url: MCP服务器URL
+            refresh: 是否忽略缓存
+        
+        Returns:
+            工具列表
+        """
+        cache_key = (project_id, server_name, server_url)
+        if not refresh:
+            cached = self._tools_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        result = await self._with_session(
+            project_id, server_name, server_url,
+            lambda session: session.list_tools(),
+            retry=True,
+        )
+        self._tools_cache.set(cache_key, result.tools)
+        return result.tools
+    
+    async def call_tool(
+        self,
+        project_id: str,
+        server_name: str,
+        server_url: str,
+        tool_name: str,
+        arguments: Optional[Dict[str, Any]] = None,
+    ) -> CallToolResult:
+        """
+        调用MCP工具（复用池化会话）
+        Call a tool over the pooled session
+        
+        Args:
+            project_id: 项目ID
+            server_name: MCP服务器名称
+            server_url: MCP服务器URL
+            tool_name: 工具名称
+            arguments: 工具参数
+        
+        Returns:
+            工具调用结果
+        """
+        timeout = timedelta(seconds=self.settings.mcp_call_timeout)
+        return await self._with_session(
+            project_id, server_name, server_url,
+            lambda session: session.call_tool(tool_name, arguments or {}, read_timeout_seconds=timeout),
+            retry=False,
+        )
+    
+    async def _with_session(
+        self,
+        project_id: str,
+        server_name: str,
+        server_url: str,
+        operation,
+        retry: bool,
+    ) -> Any:
+        """
+        在池化会话上执行操作；连接层错误时丢弃会话，只读操作（retry=True）重连后重试一次
+        Run an operation on the pooled session; on transport failure the session is discarded and
+        only read-only operations are retried, since a tool call may already have run on the server
+        
+        Args:
+            project_id: 项目ID
+            server_name: MCP服务器名称
+            server_url: MCP服务器URL
+            operation: 接收ClientSession的协程函数
+            retry: 请求发出后失败时是否重试（工具调用不幂等，必须为False）
+        """
+        key = (project_id, server_name)
+        attempts = 2 if retry else 1
+        for attempt in range(attempts):
+            session = await self.get_session(project_id, server_name, server_url)
+            # 调用开始时即刷新使用时间，避免长时间调用中的会话被当作空闲清理
+            session.last_used_at = time.monotonic()
+            try:
+                result = await operation(session.session)
+                session.last_used_at = time.monotonic()
+                session.last_checked_at = session.last_used_at
+                return result
+            except McpError:
+                # 服务器返回的协议错误，会话本身仍然可用
+                session.last_used_at = time.monotonic()
+                raise
+            except Exception:
+                if self._sessions.get(key) is session:
+                    await self._discard(key)
+                if attempt == attempts - 1:
+                    raise
+    
+    def invalidate_tools(self, project_id: str, server_name: Optional[str] = None) -> None:
+        """
+        使工具列表缓存失效
+        Invalidate cached tool lists for a project (optionally one server)
+        """
+        for key in self._tools_cache.keys():
+            if key[0] == project_id and (server_name is None or key[1] == server_name):
+                self._tools_cache.delete(key)
+    
+    async def close_project(self, project_id: str) -> None:
+        """
+        关闭项目的所有会话
+        Close all sessions for a project
+        """
+        for key in [key for key in self._sessions if key[0] == project_id]:
+            await self._discard(key)
+        self.invalidate_tools(project_id)
+    
+    async def close_all(self) -> None:
+        """
+        关闭所有会话
+        Close all sessions
+        """
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        for key in list(self._sessions.keys()):
+            await self._discard(key)
+        self._locks.clear()
+        self._tools_cache.clear()
+
+
+# 全局MCP客户端管理器实例（单例模式）
+_mcp_client_manager: Optional[McpClientManager] = None
+
+
+def get_mcp_client_manager() -> McpClientManager:
+    """
+    获取MCP客户端管理器实例（单例）
+    Get MCP client manager instance (singleton)
+    
+    Returns:
+        MCP客户端管理器实例
+    """
+    global _mcp_client_manager
+    
+    if _mcp_client_manager is None:
+        _mcp_client_manager = McpClientManager()
+    
+    return _mcp_client_manager
+
+
+async def close_mcp_client_manager():
+    """
+    关闭MCP客户端管理器的所有会话
+    Close all sessions held by the MCP client manager
+    """
+    global _mcp_client_manager
+    if _mcp_client_manager is not None:
+        await _mcp_client_manager.close_all()
+        _mcp_client_manager = None
@@ -0,0 +1,155 @@
+"""
+查询嵌入向量缓存
+Two-tier cache for query embeddings: in-process LRU in front of Redis
+"""
+
+import hashlib
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.core.cache import LocalCache, get_cache_service
+from app.core.config import get_settings
+from app.core.database import get_redis_binary_client
+
+
+# 支持的存储精度
+SUPPORTED_DTYPES = ("float16", "float32")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    归一化查询文本（NFKC + 合并空白 + 去除首尾空白），不改变大小写
+    Normalize query text (NFKC, collapse whitespace, strip); case is preserved
+    since embeddings are case-sensitive
+    """
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class EmbeddingCache:
+    """
+    查询嵌入向量缓存
+    Embedding cache keyed by (model, normalized text)
+    
+    进程内LRU按字节数限制内存，Redis中存储紧凑的float16/float32二进制数据而不是JSON。
+    The in-process LRU is capped by bytes; Redis stores compact float16/float32 blobs, not JSON.
+    """
+    
+    def __init__(self):
+        """初始化嵌入向量缓存"""
+        self.settings = get_settings()
+        self.cache_service = get_cache_service()
+        self.dtype = self.settings.embedding_cache_dtype
+        if self.dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"不支持的嵌入向量缓存精度: {self.dtype}")
+        self.ttl = self.settings.embedding_cache_ttl
+        
+        # 进程内缓存以float32二进制存储，命中时无精度损失
+        self._local = LocalCache(
+            max_entries=1_000_000,
+            max_bytes=self.settings.embedding_cache_max_bytes,
+            size_of=len,
+        )
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+    
+    def _key(self, model: str, text: str) -> str:
+        """获取缓存键"""
+        text_hash = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return self.cache_service.get_embedding_key(model, self.dtype, text_hash)
+    
+    async def get(self, model: str, text: str) -> Optional[List[float]]:
+        """
+        获取缓存的嵌入向量
+        Get a cached embedding (local LRU first, then Redis)
+        
+        Args:
+            model: Embedding模型名称
+            text: 查询文本
+        
+        Returns:
+            嵌入向量，未命中时返回None
+        """
+        key = self._key(model, text)
+        
+        blob = self._local.get(key)
+        if blob is not None:
+            self.local_hits += 1
+            return np.frombuffer(blob, dtype=np.float32).tolist()
+        
+        try:
+            client = await get_redis_binary_client()
+            blob = await client.get(key)
+        except Exception as e:
+            # 缓存失败不应影响主流程
+            print(f"嵌入向量缓存获取失败: {e}")
+            blob = None
+        
+        if blob is None:
+            self.misses += 1
+            return None
+        
+        self.redis_hits += 1
+        vector = np.frombuffer(blob, dtype=self.dtype).astype(np.float32)
+        self._local.set(key, vector.tobytes())
+        return vector.tolist()
+    
+    async def set(self, model: str, text: str, embedding: List[float]) -> None:
+        """
+        缓存嵌入向量
+        Store an embedding in both tiers
+        
+        Args:
+            model: Embedding模型名称
+            text: 查询文本
+            embedding: 嵌入向量
+        """
+        key = self._key(model, text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        self._local.set(key, vector.tobytes())
+        
+        try:
+            client = await get_redis_binary_client()
+            await client.setex(key, self.ttl, vector.astype(self.dtype).tobytes())
+        except Exception as e:
+            print(f"嵌入向量缓存设置失败: {e}")
+    
+    def stats(self) -> Dict[str, float]:
+        """
+        获取命中统计
+        Hit/miss counters
+        """
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (self.local_hits + self.redis_hits) / lookups if lookups else 0.0,
+            "local_entries": len(self._local),
+            "local_bytes": self._local.size_bytes,
+        }
+
+
+# 全局嵌入向量缓存实例（单例模式）
+_embedding_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    获取嵌入向量缓存实例（单例）
+    Get embedding cache instance (singleton)
+    
+    Returns:
+        嵌入向量缓存实例
+    """
+    global _embedding_cache
+    
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache()
+    
+    return _embedding_cache
@@ -0,0 +1,171 @@
+"""
+Embedding降维投影
+PCA projection that stores lower-dimensional embeddings in Qdrant
+"""
+
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+from app.core.config import get_settings
+
+
+class EmbeddingProjection:
+    """
+    Embedding的PCA降维投影（按模型拟合，保存为npz文件）
+    PCA projection fitted per embedding model and persisted as an .npz artifact
+    
+    文档向量写入Qdrant前和查询向量检索前使用同一投影：减去样本均值，投影到前dim个主成分，
+    再归一化（集合使用点积距离，归一化后点积即余弦相似度）。
+    Document and query vectors go through the same projection: centre on the sample mean,
+    project onto the top principal components, then L2-normalise (collections use DOT distance).
+    """
+    
+    def __init__(
+        self,
+        model: str,
+        mean: np.ndarray,
+        components: np.ndarray,
+        explained_variance_ratio: float = 0.0,
+    ):
+        """
+        初始化投影
+        
+        Args:
+            model: 拟合时使用的Embedding模型
+            mean: 样本均值，形状(input_dim,)
+            components: 主成分，形状(dim, input_dim)
+            explained_variance_ratio: 保留的主成分解释的方差比例
+        """
+        self.model = model
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+        self.explained_variance_ratio = float(explained_variance_ratio)
+    
+    @property
+    def input_dim(self) -> int:
+        """原始向量维度"""
+        return self.components.shape[1]
+    
+    @property
+    def dim(self) -> int:
+        """投影后的向量维度"""
+        return self.components.shape[0]
+    
+    @classmethod
+    def fit(cls, model: str, vectors: Sequence[Sequence[float]], dim: int) -> "EmbeddingProjection":
+        """
+        在样本向量上拟合PCA投影
+        Fit a PCA projection on a sample of embeddings
+        
+        Args:
+            model: Embedding模型名称
+            vectors: 样本向量（数量不少于dim）
+            dim: 投影后的维度
+        
+        Returns:
+            投影
+        """
+        sample = np.asarray(vectors, dtype=np.float64)
+        if sample.ndim != 2:
+            raise ValueError("样本向量必须是二维数组")
+        if not 0 < dim < sample.shape[1]:
+            raise ValueError(f"投影维度必须在1到{sample.shape[1] - 1}之间: {dim}")
+        if sample.shape[0] < dim:
+            raise ValueError(f"样本数({sample.shape[0]})少于投影维度({dim})")
+        
+        mean = sample.mean(axis=0)
+        _, singular_values, vt = np.linalg.svd(sample - mean, full_matrices=False)
+        variance = singular_values ** 2
+        ratio = variance[:dim].sum() / variance.sum() if variance.sum() > 0 else 1.0
+        return cls(model, mean, vt[:dim], ratio)
+    
+    def project(self, vectors: Sequence[Sequence[float]]) -> List[List[float]]:
+        """
+        投影并归一化向量
+        Project and L2-normalise a batch of embeddings
+        """
+        if len(vectors) == 0:
+            return []
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.shape[1] != self.input_dim:
+            raise ValueError(f"向量维度({matrix.shape[1]})与投影输入维度({self.input_dim})不一致")
+        projected = (matrix - self.mean) @ self.components.T
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        return (projected / np.where(norms > 0, norms, 1.0)).tolist()
+    
+    def save(self, path: Union[str, Path]) -> None:
+        """原子写入投影文件"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                np.savez(
+                    file,
+                    model=np.asarray(self.model),
+                    mean=self.mean,
+                    components=self.components,
+                    explained_variance_ratio=np.asarray(self.explained_variance_ratio),
+                )
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "EmbeddingProjection":
+        """读取投影文件"""
+        with np.load(path, allow_pickle=False) as archive:
+            return cls(
+                str(archive["model"]),
+                archive["mean"],
+                archive["components"],
+                float(archive["explained_variance_ratio"]),
+            )
+
+
+# 全局投影实例（单例模式，未配置时为None）
+_embedding_projection: Optional[EmbeddingProjection] = None
+_embedding_projection_loaded = False
+
+
+def get_embedding_projection() -> Optional[EmbeddingProjection]:
+    """
+    获取配置的降维投影（单例）
+    Get the configured embedding projection (singleton), or None when disabled
+    
+    Returns:
+        投影，未配置embedding_projection_path时为None
+    """
+    global _embedding_projection, _embedding_projection_loaded
+    
+    if not _embedding_projection_loaded:
+        settings = get_settings()
+        if settings.embedding_projection_path:
+            projection = EmbeddingProjection.load(settings.embedding_projection_path)
+            # 投影按模型拟合，换模型后继续使用会静默地破坏检索质量
+            if projection.model != settings.embedding_model:
+                raise ValueError(
+                    f"降维投影是为模型 {projection.model} 拟合的，当前Embedding模型为 {settings.embedding_model}"
+                )
+            print(
+                f"[Embedding] 使用PCA降维投影: {projection.input_dim} -> {projection.dim}维，"
+                f"保留方差 {projection.explained_variance_ratio:.1%}"
+            )
+            _embedding_projection = projection
+        _embedding_projection_loaded = True
+    
+    return _embedding_projection
+
+
+def stored_vector_size() -> int:
+    """
+    Qdrant集合中稠密向量的维度（启用降维时取投影维度）
+    Dense vector size for new Qdrant collections
+    """
+    projection = get_embedding_projection()
+    return projection.dim if projection is not None else get_settings().embedding_dimension
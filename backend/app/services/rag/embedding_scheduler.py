@@ -0,0 +1,377 @@
+"""
+Embedding请求调度
+Embedding request scheduler: token-aware batching, shared RPM/TPM budgets, 429 backoff, priorities
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from enum import Enum
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+import openai
+
+from app.core.config import get_settings
+from app.core.database import get_redis_client
+from app.services.rag.tokens import estimate_tokens
+
+
+# 发送一批文本，返回(向量列表, token数)
+SendBatch = Callable[[List[str]], Awaitable[Tuple[List[List[float]], int]]]
+
+
+class EmbeddingPriority(str, Enum):
+    """Embedding请求优先级"""
+    INTERACTIVE = "interactive"  # 查询embedding（用户在等待）
+    BACKGROUND = "background"  # 数据源导入
+
+
+# 原子地检查并扣减请求桶和token桶（使用Redis服务器时间，避免各worker时钟不一致）
+# KEYS: 请求桶、token桶；ARGV: 保留比例、RPM、请求数、TPM、token数
+# 返回需要等待的秒数（字符串，Lua数字转换为Redis整数会丢失小数），"0"表示已扣减
+_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local reserve = tonumber(ARGV[1])
+local wait = 0
+local levels = {}
+for i = 1, 2 do
+    local capacity = tonumber(ARGV[2 * i])
+    local cost = tonumber(ARGV[2 * i + 1])
+    if capacity > 0 then
+        local state = redis.call('HMGET', KEYS[i], 'level', 'ts')
+        local level = tonumber(state[1]) or capacity
+        local ts = tonumber(state[2]) or now
+        level = math.min(capacity, level + math.max(0, now - ts) * capacity / 60)
+        local floor = capacity * reserve
+        cost = math.min(cost, capacity - floor)
+        if level - cost < floor then
+            wait = math.max(wait, (cost + floor - level) * 60 / capacity)
+        end
+        levels[i] = level - cost
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i = 1, 2 do
+    if levels[i] then
+        redis.call('HSET', KEYS[i], 'level', tostring(levels[i]), 'ts', tostring(now))
+        redis.call('EXPIRE', KEYS[i], 120)
+    end
+end
+return '0'
+"""
+
+
+class LocalTokenBucket:
+    """
+    进程内的RPM/TPM令牌桶（与Redis脚本的算法相同，Redis不可用时使用）
+    In-process RPM/TPM token buckets mirroring the Redis script
+    """
+    
+    def __init__(self, rpm: int, tpm: int, clock: Callable[[], float] = time.monotonic):
+        self.limits = (rpm, tpm)
+        self._clock = clock
+        self._levels: List[Optional[float]] = [None, None]
+        self._updated_at = clock()
+    
+    def try_acquire(self, requests: int, tokens: int, reserve: float) -> float:
+        """尝试扣减，成功返回0，否则返回需要等待的秒数（不扣减）"""
+        now = self._clock()
+        elapsed = max(0.0, now - self._updated_at)
+        self._updated_at = now
+        wait = 0.0
+        costs = []
+        for i, (capacity, cost) in enumerate(zip(self.limits, (requests, tokens))):
+            if capacity <= 0:
+                costs.append(0.0)
+                continue
+            level = capacity if self._levels[i] is None else self._levels[i]
+            level = self._levels[i] = min(capacity, level + elapsed * capacity / 60)
+            floor = capacity * reserve
+            cost = min(cost, capacity - floor)
+            if level - cost < floor:
+                wait = max(wait, (cost + floor - level) * 60 / capacity)
+            costs.append(cost)
+        if wait > 0:
+            return wait
+        for i, cost in enumerate(costs):
+            if self._levels[i] is not None:
+                self._levels[i] -= cost
+        return 0.0
+
+
+class PrioritySlots:
+    """
+    按优先级分配的并发槽位
+    Concurrency slots granted by priority
+    
+    排队的查询请求总是先于后台请求获得空出的槽位，且后台请求不能占用为查询保留的槽位，
+    查询embedding不会排在大批导入请求之后。同一优先级内先来先得。
+    Queued interactive requests always get the next free slot, and background requests cannot
+    take the slots reserved for interactive ones; within a priority, first come first served.
+    """
+    
+    def __init__(self, capacity: int, interactive_reserved: int = 0):
+        self.capacity = max(1, capacity)
+        self.background_limit = max(1, self.capacity - max(0, interactive_reserved))
+        self._in_use = 0
+        self._background_in_use = 0
+        self._waiters: Dict[EmbeddingPriority, Deque[asyncio.Future]] = {
+            priority: deque() for priority in EmbeddingPriority
+        }
+    
+    def _available(self, priority: EmbeddingPriority) -> bool:
+        if self._in_use >= self.capacity:
+            return False
+        return priority == EmbeddingPriority.INTERACTIVE or self._background_in_use < self.background_limit
+    
+    def _take(self, priority: EmbeddingPriority) -> None:
+        self._in_use += 1
+        if priority == EmbeddingPriority.BACKGROUND:
+            self._background_in_use += 1
+    
+    async def acquire(self, priority: EmbeddingPriority) -> None:
+        """等待并占用一个槽位"""
+        waiting_first = self._waiters[EmbeddingPriority.INTERACTIVE] or self._waiters[priority]
+        if not waiting_first and self._available(priority):
+            self._take(priority)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已分配到槽位后被取消，归还槽位
+                self.release(priority)
+            elif future in self._waiters[priority]:
+                self._waiters[priority].remove(future)
+            raise
+    
+    def release(self, priority: EmbeddingPriority) -> None:
+        """归还槽位，并按优先级唤醒等待者"""
+        self._in_use -= 1
+        if priority == EmbeddingPriority.BACKGROUND:
+            self._background_in_use -= 1
+        for waiting_priority in (EmbeddingPriority.INTERACTIVE, EmbeddingPriority.BACKGROUND):
+            waiters = self._waiters[waiting_priority]
+            while waiters and self._available(waiting_priority):
+                future = waiters.popleft()
+                if not future.done():
+                    self._take(waiting_priority)
+                    future.set_result(None)
+
+
+class SchedulerMetrics:
+    """
+    调度器指标：滑动窗口内的持续吞吐量、限流等待和429重试
+    Scheduler counters, including sustained throughput over a sliding window
+    """
+    
+    def __init__(self, window: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self._clock = clock
+        self._started_at = clock()
+        self._recent: Deque[Tuple[float, int, int]] = deque()
+        self.requests = 0
+        self.texts = 0
+        self.tokens = 0
+        self.throttled_seconds = 0.0
+        self.rate_limited_retries = 0
+        self.errors = 0
+    
+    def record(self, texts: int, tokens: int) -> None:
+        """记录一次成功的请求"""
+        now = self._clock()
+        self.requests += 1
+        self.texts += texts
+        self.tokens += tokens
+        self._recent.append((now, texts, tokens))
+        while self._recent and self._recent[0][0] < now - self.window:
+            self._recent.popleft()
+    
+    def snapshot(self) -> Dict[str, float]:
+        """获取指标快照（吞吐量按窗口内的请求计算，不足一个窗口时按已运行时间计算）"""
+        now = self._clock()
+        while self._recent and self._recent[0][0] < now - self.window:
+            self._recent.popleft()
+        span = max(1e-9, min(self.window, now - self._started_at))
+        return {
+            "requests": self.requests,
+            "texts": self.texts,
+            "tokens": self.tokens,
+            "texts_per_sec": sum(texts for _, texts, _ in self._recent) / span,
+            "tokens_per_sec": sum(tokens for _, _, tokens in self._recent) / span,
+            "throttled_seconds": self.throttled_seconds,
+            "rate_limited_retries": self.rate_limited_retries,
+            "errors": self.errors,
+        }
+
+
+def pack_batches(texts: Sequence[str], max_texts: int, max_tokens: int) -> List[Tuple[int, int]]:
+    """
+    按估算token数把文本依次装入批次（保持顺序；超过上限的单个文本独占一批）
+    Greedily pack consecutive texts into batches bounded by count and estimated tokens
+    
+    Returns:
+        每个批次的(起始下标, 结束下标)
+    """
+    batches = []
+    start = 0
+    total = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if i > start and (i - start >= max_texts or total + tokens > max_tokens):
+            batches.append((start, i))
+            start, total = i, 0
+        total += tokens
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def _retry_after(error: openai.APIStatusError) -> Optional[float]:
+    """读取429响应中的Retry-After（秒）或retry-after-ms"""
+    headers = error.response.headers if error.response is not None else {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class EmbeddingScheduler:
+    """
+    Embedding请求调度器
+    Schedules embedding requests under provider RPM/TPM limits
+    
+    - 按估算token数打包批次，避免单次请求过大
+    - 发送前从Redis中的令牌桶扣减请求数和token数，所有worker共享同一额度
+    - 后台导入只能使用(1 - interactive_reserve)的额度，查询embedding不会被导入挤占
+    - 并发槽位按优先级分配：查询请求先于排队的导入批次，且有保留的槽位
+    - 429时按Retry-After或指数退避重试，只重试失败的批次
+    """
+    
+    def __init__(self, send: SendBatch, model: str):
+        """
+        初始化调度器
+        
+        Args:
+            send: 实际发送一批文本的函数（抛出openai异常）
+            model: Embedding模型名称（令牌桶按模型区分）
+        """
+        self.settings = get_settings()
+        self._send = send
+        self.model = model
+        self.rpm = self.settings.embedding_rpm_limit
+        self.tpm = self.settings.embedding_tpm_limit
+        self.metrics = SchedulerMetrics()
+        self._local_bucket = LocalTokenBucket(self.rpm, self.tpm)
+        self._redis_failed_at: Optional[float] = None
+        self._slots = PrioritySlots(
+            self.settings.embedding_max_concurrent_requests,
+            self.settings.embedding_interactive_reserved_requests,
+        )
+        # 同一优先级内按先来先得扣减额度，不同优先级互不排队
+        self._acquire_locks = {priority: asyncio.Lock() for priority in EmbeddingPriority}
+    
+    async def run(
+        self,
+        texts: List[str],
+        priority: EmbeddingPriority = EmbeddingPriority.BACKGROUND,
+    ) -> Tuple[List[List[float]], int]:
+        """
+        分批发送文本并按输入顺序返回向量
+        Embed texts in token-bounded batches under the shared rate limits
+        
+        Args:
+            texts: 文本列表
+            priority: 优先级
+        
+        Returns:
+            (向量列表, token总数)
+        """
+        if not texts:
+            return [], 0
+        batches = pack_batches(
+            texts, self.settings.embedding_request_max_texts, self.settings.embedding_request_max_tokens,
+        )
+        results = await asyncio.gather(*[
+            self._run_batch(texts[start:end], priority) for start, end in batches
+        ])
+        embeddings: List[List[float]] = []
+        for vectors, _ in results:
+            embeddings.extend(vectors)
+        return embeddings, sum(tokens for _, tokens in results)
+    
+    async def _run_batch(self, batch: List[str], priority: EmbeddingPriority) -> Tuple[List[List[float]], int]:
+        """发送一个批次（扣减额度，429时退避重试）"""
+        estimated = sum(estimate_tokens(text) for text in batch)
+        attempt = 0
+        while True:
+            await self._acquire(estimated, priority)
+            try:
+                embeddings, tokens = await self._send_in_slot(batch, priority)
+            except openai.RateLimitError as e:
+                if attempt >= self.settings.embedding_max_retries:
+                    self.metrics.errors += 1
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(60.0, self.settings.embedding_retry_backoff * (2 ** attempt))
+                    delay *= random.uniform(0.8, 1.2)
+                self.metrics.rate_limited_retries += 1
+                print(f"[Embedding] 触发限流(429)，{delay:.1f}秒后重试（第{attempt + 1}次）")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except Exception:
+                self.metrics.errors += 1
+                raise
+            self.metrics.record(len(batch), tokens)
+            return embeddings, tokens
+    
+    async def _send_in_slot(self, batch: List[str], priority: EmbeddingPriority) -> Tuple[List[List[float]], int]:
+        """占用一个并发槽位发送批次（429退避期间不占用槽位）"""
+        await self._slots.acquire(priority)
+        try:
+            return await self._send(batch)
+        finally:
+            self._slots.release(priority)
+    
+    async def _acquire(self, tokens: int, priority: EmbeddingPriority) -> None:
+        """等待直到令牌桶中有足够的请求数和token数"""
+        if self.rpm <= 0 and self.tpm <= 0:
+            return
+        reserve = self.settings.embedding_interactive_reserve if priority == EmbeddingPriority.BACKGROUND else 0.0
+        async with self._acquire_locks[priority]:
+            while True:
+                wait = await self._try_acquire(tokens, reserve)
+                if wait <= 0:
+                    return
+                self.metrics.throttled_seconds += wait
+                await asyncio.sleep(wait)
+    
+    async def _try_acquire(self, tokens: int, reserve: float) -> float:
+        """在Redis中扣减额度；Redis不可用时退回进程内令牌桶（30秒后再尝试Redis）"""
+        if self._redis_failed_at is None or time.monotonic() - self._redis_failed_at > 30:
+            try:
+                client = await get_redis_client()
+                wait = await client.eval(
+                    _ACQUIRE_SCRIPT, 2,
+                    f"embedding:ratelimit:{self.model}:requests", f"embedding:ratelimit:{self.model}:tokens",
+                    reserve, self.rpm, 1, self.tpm, tokens,
+                )
+                self._redis_failed_at = None
+                return float(wait)
+            except Exception as e:
+                if self._redis_failed_at is None:
+                    print(f"[Embedding] Redis限流不可用，使用进程内限流: {e}")
+                self._redis_failed_at = time.monotonic()
+        return self._local_bucket.try_acquire(1, tokens, reserve)
@@ -3,92 +3,184 @@ Embedding服务实现
 Embedding service implementation
 """
 
-from typing import List, Optional
-from openai import OpenAI
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+from openai import AsyncOpenAI
 
 from app.core.config import get_settings
+from app.services.rag.embedding_scheduler import EmbeddingPriority, EmbeddingScheduler
+
+
+class EmbeddingBatchMetrics:
+    """
+    Embedding微批处理指标
+    Counters for batch size and queue wait of the embedding micro-batcher
+    """
+    
+    def __init__(self):
+        """初始化指标"""
+        self.batches = 0
+        self.texts = 0
+        self.max_batch_size = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.errors = 0
+    
+    def record(self, batch_size: int, queue_waits: List[float]) -> None:
+        """
+        记录一次批量请求
+        
+        Args:
+            batch_size: 批次中的文本数
+            queue_waits: 每个文本在队列中的等待时间（秒）
+        """
+        self.batches += 1
+        self.texts += batch_size
+        self.max_batch_size = max(self.max_batch_size, batch_size)
+        self.total_queue_wait += sum(queue_waits)
+        self.max_queue_wait = max(self.max_queue_wait, max(queue_waits, default=0.0))
+    
+    def snapshot(self) -> Dict[str, float]:
+        """获取指标快照"""
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "errors": self.errors,
+            "avg_batch_size": self.texts / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "avg_queue_wait_ms": self.total_queue_wait / self.texts * 1000 if self.texts else 0.0,
+            "max_queue_wait_ms": self.max_queue_wait * 1000,
+        }
 
 
 class EmbeddingService:
     """
     Embedding服务
     Embedding service for generating embeddings
+    
+    并发的embed()调用会在最多max_wait_ms内或凑满max_size个文本后合并为一次批量请求，
+    结果再分发给各个调用方。所有请求经过EmbeddingScheduler（RPM/TPM限流、429重试、优先级）。
+    Concurrent embed() calls are collected for up to max_wait_ms or max_size texts,
+    sent as one batched request, and the results fanned back out. All requests go
+    through the EmbeddingScheduler (RPM/TPM budgets, 429 retries, priorities).
     """
     
     def __init__(self):
         """初始化Embedding服务"""
         self.settings = get_settings()
         
-        # 初始化OpenAI客户端（兼容API）
-        self.client = OpenAI(
+        # 初始化OpenAI异步客户端（兼容API）
+        self.client = AsyncOpenAI(
             api_key=self.settings.embedding_api_key,
             base_url=self.settings.embedding_base_url,
+            timeout=self.settings.embedding_timeout,
+            # 429由调度器按共享额度退避重试
+            max_retries=0,
         )
         self.model = self.settings.embedding_model
+        self.max_batch_wait = self.settings.embedding_batch_max_wait_ms / 1000
+        self.max_batch_size = self.settings.embedding_batch_max_size
+        self.metrics = EmbeddingBatchMetrics()
+        self.scheduler = EmbeddingScheduler(self._create, self.model)
+        
+        # 待发送队列：(文本, future, 入队时间)
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # 持有发送中的批次任务引用，避免被垃圾回收
+        self._batch_tasks: set[asyncio.Task] = set()
     
     async def embed(self, text: str) -> tuple[List[float], int]:
         """
-        生成单个文本的嵌入向量
-        Generate embedding for a single text
+        生成单个文本的嵌入向量（与并发调用合并为批量请求）
+        Generate embedding for a single text, micro-batched with concurrent calls
         
         Args:
             text: 文本内容
-            
+        
         Returns:
             (embedding向量, token数量)
         """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.monotonic()))
+        
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_batch_wait, self._flush)
+        
+        return await future
+    
+    def _flush(self) -> None:
+        """取出当前队列并发送批量请求"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._send_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+    
+    async def _send_batch(self, batch: List[Tuple[str, asyncio.Future, float]]) -> None:
+        """
+        发送一次批量请求并把结果分发给各个future
+        Send one batched request and resolve each caller's future
+        """
+        sent_at = time.monotonic()
+        # 同一批次中的重复文本只请求一次
+        unique_texts = list(dict.fromkeys(text for text, _, _ in batch))
+        self.metrics.record(len(unique_texts), [sent_at - enqueued_at for _, _, enqueued_at in batch])
+        
         try:
-            # 调用OpenAI兼容的API（注意：OpenAI客户端是同步的，需要在异步环境中使用）
-            import asyncio
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.client.embeddings.create(
-                    model=self.model,
-                    input=text,
-                )
-            )
-            
-            # 提取嵌入向量和token数量
-            embedding = response.data[0].embedding
-            tokens = response.usage.total_tokens
-            
-            return embedding, tokens
-            
+            vectors, total_tokens = await self.scheduler.run(unique_texts, EmbeddingPriority.INTERACTIVE)
         except Exception as e:
-            raise Exception(f"生成嵌入向量失败: {e}")
+            self.metrics.errors += 1
+            error = Exception(f"生成嵌入向量失败: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        
+        embeddings = dict(zip(unique_texts, vectors))
+        # 批量请求只返回总token数，按文本长度估算每个文本的token数
+        total_chars = sum(len(text) for text in unique_texts) or 1
+        for text, future, _ in batch:
+            if not future.done():
+                tokens = round(total_tokens * len(text) / total_chars)
+                future.set_result((embeddings[text], tokens))
     
-    async def embed_many(self, texts: List[str]) -> tuple[List[List[float]], int]:
+    async def embed_many(
+        self,
+        texts: List[str],
+        priority: EmbeddingPriority = EmbeddingPriority.BACKGROUND,
+    ) -> tuple[List[List[float]], int]:
         """
-        批量生成文本的嵌入向量
-        Generate embeddings for multiple texts
+        批量生成文本的嵌入向量（按token数分批，受RPM/TPM限制）
+        Generate embeddings for multiple texts through the rate-limited scheduler
         
         Args:
             texts: 文本列表
-            
+            priority: 优先级（查询embedding使用INTERACTIVE，导入使用默认的BACKGROUND）
+        
         Returns:
             (嵌入向量列表, token总数)
         """
         try:
-            # 调用OpenAI兼容的API（注意：OpenAI客户端是同步的，需要在异步环境中使用）
-            import asyncio
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.client.embeddings.create(
-                    model=self.model,
-                    input=texts,
-                )
-            )
-            
-            # 提取嵌入向量列表和token数量
-            embeddings = [item.embedding for item in response.data]
-            tokens = response.usage.total_tokens
-            
-            return embeddings, tokens
-            
+            return await self.scheduler.run(texts, priority)
         except Exception as e:
             raise Exception(f"批量生成嵌入向量失败: {e}")
+    
+    async def _create(self, texts: List[str]) -> tuple[List[List[float]], int]:
+        """发送一次embedding请求（按index排序以保持输入顺序）"""
+        response = await self.client.embeddings.create(
+            model=self.model,
+            input=texts,
+        )
+        embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        return embeddings, response.usage.total_tokens
 
 
 # 全局Embedding服务实例（单例模式）
@@ -109,4 +201,3 @@ def get_embedding_service() -> EmbeddingService:
         _embedding_service = EmbeddingService()
     
     return _embedding_service
-
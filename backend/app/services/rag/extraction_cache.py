@@ -0,0 +1,195 @@
+"""
+文件提取结果缓存
+Content-addressed cache of extracted text, chunks and embeddings, keyed by file SHA-256
+"""
+
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.rag.file_reader import iter_file_bytes
+
+
+# 提取逻辑（file_reader的输出格式）变化时递增，使旧的文本和分块缓存失效
+EXTRACTION_VERSION = 1
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9._-]")
+
+
+def file_sha256(path: Union[str, Path]) -> str:
+    """流式计算文件的SHA-256（内存映射分块读取）"""
+    digest = hashlib.sha256()
+    for block in iter_file_bytes(path):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def _safe_name(value: str) -> str:
+    """把模型名等转换为可用作文件名的字符串"""
+    return _UNSAFE_CHARS.sub("_", value)
+
+
+class ExtractionCache:
+    """
+    文件提取结果缓存（本地目录，按文件内容寻址）
+    Content-addressed blob directory mapping a file's SHA-256 to its extracted text,
+    chunk lists (per splitter config) and chunk embeddings (per embedding model)
+    
+    同一文件重新上传到其他数据源或项目时，跳过文本提取和分块，embedding模型相同时复用向量。
+    目录结构 / Layout: <root>/<sha[:2]>/<sha>/{text-*.txt, chunks-*.json, embeddings-*.npz}
+    
+    所有方法都是同步文件IO，在事件循环中通过asyncio.to_thread调用。
+    All methods do blocking file IO; call them through asyncio.to_thread.
+    """
+    
+    def __init__(self, root_dir: Union[str, Path], max_bytes: int = 0):
+        """
+        初始化缓存
+        
+        Args:
+            root_dir: 缓存目录
+            max_bytes: 缓存总大小上限（字节），prune时按最久未使用淘汰，0表示不限制
+        """
+        self.root_dir = Path(root_dir)
+        self.max_bytes = max_bytes
+    
+    def _entry_dir(self, file_hash: str) -> Path:
+        return self.root_dir / file_hash[:2] / file_hash
+    
+    def _read(self, file_hash: str, name: str) -> Optional[bytes]:
+        """读取缓存文件，命中时更新条目的访问时间（用于LRU淘汰）"""
+        entry = self._entry_dir(file_hash)
+        try:
+            data = (entry / name).read_bytes()
+        except FileNotFoundError:
+            return None
+        os.utime(entry)
+        return data
+    
+    def _write(self, file_hash: str, name: str, data: bytes) -> None:
+        """原子写入缓存文件（先写临时文件再重命名，并发写入同一条目时不会读到半个文件）"""
+        entry = self._entry_dir(file_hash)
+        entry.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=entry, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, entry / name)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    
+    def get_text(self, file_hash: str, fmt: str) -> Optional[str]:
+        """获取提取的文本"""
+        data = self._read(file_hash, f"text-v{EXTRACTION_VERSION}-{fmt}.txt")
+        return None if data is None else data.decode("utf-8")
+    
+    def put_text(self, file_hash: str, fmt: str, text: str) -> None:
+        """保存提取的文本"""
+        self._write(file_hash, f"text-v{EXTRACTION_VERSION}-{fmt}.txt", text.encode("utf-8"))
+    
+    def get_chunks(self, file_hash: str, fmt: str, splitter_key: str) -> Optional[List[str]]:
+        """获取分块结果（splitter_key为分块配置的标识）"""
+        data = self._read(file_hash, f"chunks-v{EXTRACTION_VERSION}-{fmt}-{_safe_name(splitter_key)}.json")
+        return None if data is None else json.loads(data)
+    
+    def put_chunks(self, file_hash: str, fmt: str, splitter_key: str, chunks: List[str]) -> None:
+        """保存分块结果"""
+        self._write(
+            file_hash,
+            f"chunks-v{EXTRACTION_VERSION}-{fmt}-{_safe_name(splitter_key)}.json",
+            json.dumps(chunks, ensure_ascii=False).encode("utf-8"),
+        )
+    
+    def get_embeddings(self, file_hash: str, model: str) -> Dict[str, List[float]]:
+        """
+        获取文本块向量
+        
+        Returns:
+            文本块哈希 -> 向量（没有缓存时为空字典）
+        """
+        data = self._read(file_hash, f"embeddings-{_safe_name(model)}.npz")
+        if data is None:
+            return {}
+        return self._decode_embeddings(data)
+    
+    def put_embeddings(self, file_hash: str, model: str, embeddings: Dict[str, Sequence[float]]) -> None:
+        """合并保存文本块向量（与已有的向量合并，同一文件用不同分块配置导入时也能累积）"""
+        name = f"embeddings-{_safe_name(model)}.npz"
+        existing = self._read(file_hash, name)
+        merged = {**(self._decode_embeddings(existing) if existing is not None else {}), **embeddings}
+        if not merged:
+            return
+        hashes = list(merged)
+        vectors = np.asarray([merged[key] for key in hashes], dtype=np.float32)
+        buffer = io.BytesIO()
+        np.savez(buffer, hashes=np.asarray(hashes), vectors=vectors)
+        self._write(file_hash, name, buffer.getvalue())
+    
+    @staticmethod
+    def _decode_embeddings(data: bytes) -> Dict[str, List[float]]:
+        with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+            return dict(zip(archive["hashes"].tolist(), archive["vectors"].tolist()))
+    
+    def prune(self, max_bytes: Optional[int] = None) -> int:
+        """
+        按最久未使用淘汰条目，直到总大小不超过上限
+        Evict least-recently-used entries until the cache fits in max_bytes
+        
+        Returns:
+            删除的条目数
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        if max_bytes <= 0 or not self.root_dir.exists():
+            return 0
+        
+        entries = []
+        total = 0
+        for entry in self.root_dir.glob("*/*"):
+            if not entry.is_dir():
+                continue
+            size = sum(path.stat().st_size for path in entry.iterdir() if path.is_file())
+            entries.append((entry.stat().st_mtime, size, entry))
+            total += size
+        
+        removed = 0
+        for _, size, entry in sorted(entries):
+            if total <= max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+# 全局提取结果缓存实例（单例模式）
+_extraction_cache: Optional[ExtractionCache] = None
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """
+    获取文件提取结果缓存实例（单例）
+    Get extraction cache instance (singleton)
+    
+    Returns:
+        提取结果缓存实例
+    """
+    global _extraction_cache
+    
+    if _extraction_cache is None:
+        settings = get_settings()
+        _extraction_cache = ExtractionCache(
+            settings.rag_extraction_cache_dir,
+            max_bytes=settings.rag_extraction_cache_max_bytes,
+        )
+    
+    return _extraction_cache
@@ -0,0 +1,228 @@
+"""
+本地文件流式读取
+Memory-mapped streaming reader for local upload files (UTF-8 text, Markdown, CSV, JSONL)
+"""
+
+import codecs
+import csv
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Optional, Union
+
+
+# 每次从映射中读取的字节数
+BLOCK_SIZE = 1 << 20
+
+# 非UTF-8文本的回退编码（中文Excel/Windows导出的文件常见）
+FALLBACK_ENCODING = "gb18030"
+
+_EXTENSION_FORMATS = {
+    ".txt": "text",
+    ".text": "text",
+    ".log": "text",
+    ".md": "markdown",
+    ".markdown": "markdown",
+    ".csv": "csv",
+    ".tsv": "tsv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+}
+
+_MIME_FORMATS = {
+    "text/plain": "text",
+    "text/markdown": "markdown",
+    "text/x-markdown": "markdown",
+    "text/csv": "csv",
+    "text/tab-separated-values": "tsv",
+    "application/jsonl": "jsonl",
+    "application/x-jsonlines": "jsonl",
+    "application/x-ndjson": "jsonl",
+}
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def detect_format(name: Optional[str] = None, mime_type: Optional[str] = None) -> str:
+    """
+    根据文件名扩展名（优先）或MIME类型判断文件格式
+    Detect the file format from the file name extension, then the MIME type
+    
+    Returns:
+        text、markdown、csv、tsv或jsonl（无法判断时按text处理）
+    """
+    if name:
+        fmt = _EXTENSION_FORMATS.get(Path(name).suffix.lower())
+        if fmt:
+            return fmt
+    if mime_type:
+        fmt = _MIME_FORMATS.get(mime_type.split(";")[0].strip().lower())
+        if fmt:
+            return fmt
+    return "text"
+
+
+def iter_file_bytes(path: Union[str, Path], block_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+    """
+    内存映射读取文件，按块输出字节
+    Memory-map a file and yield it block by block
+    
+    已处理的页通过madvise(MADV_DONTNEED)归还，常驻内存不随文件大小增长。
+    Consumed pages are dropped with MADV_DONTNEED so resident memory stays flat.
+    """
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            # 已归还的字节数（madvise的起点必须按页对齐，只归还完整读完的页）
+            released = 0
+            for start in range(0, size, block_size):
+                end = min(start + block_size, size)
+                yield mapped[start:end]
+                consumed = end - end % mmap.PAGESIZE
+                if hasattr(mmap, "MADV_DONTNEED") and consumed > released:
+                    mapped.madvise(mmap.MADV_DONTNEED, released, consumed - released)
+                    released = consumed
+
+
+def iter_decoded(blocks: Iterable[bytes]) -> Iterator[str]:
+    """
+    增量解码：有BOM时按BOM解码，否则按UTF-8解码，遇到非UTF-8字节时剩余部分改用GB18030
+    Decode incrementally: BOM first, else UTF-8, switching the rest to GB18030 at the
+    first invalid UTF-8 sequence
+    
+    Raises:
+        ValueError: 文件是二进制文件
+    """
+    decoder = None
+    encoding = "utf-8"
+    for block in blocks:
+        if decoder is None:
+            encoding = next((name for bom, name in _BOMS if block.startswith(bom)), "utf-8")
+            if encoding == "utf-8" and b"\x00" in block[:8192]:
+                raise ValueError("暂不支持的文件类型（二进制文件）")
+            decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            text = decoder.decode(block)
+        except UnicodeDecodeError:
+            if encoding != "utf-8":
+                raise ValueError(f"文件不是有效的{encoding}文本")
+            # 解码失败时解码器状态不变，未完成的多字节序列仍在缓冲区中
+            pending = decoder.getstate()[0]
+            encoding = FALLBACK_ENCODING
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+            text = decoder.decode(pending + block)
+        if text:
+            yield text
+    if decoder is not None:
+        # 文件末尾被截断的多字节序列用替换字符表示
+        decoder.errors = "replace"
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+
+def _iter_lines(blocks: Iterable[str]) -> Iterator[str]:
+    """把文本块切成行（保留换行符，只按\\n切分，CSV引号内的换行由csv模块处理）"""
+    # 未结束的行按块累积，遇到换行时才拼接一次；超长单行（压缩JSON等）不会被反复复制和扫描
+    pending: List[str] = []
+    for block in blocks:
+        lines = block.split("\n")
+        if len(lines) == 1:
+            pending.append(block)
+            continue
+        pending.append(lines[0])
+        yield "".join(pending) + "\n"
+        for line in lines[1:-1]:
+            yield line + "\n"
+        pending = [lines[-1]]
+    tail = "".join(pending)
+    if tail:
+        yield tail
+
+
+def _iter_csv_records(lines: Iterable[str], delimiter: str) -> Iterator[str]:
+    """
+    CSV每行渲染为"列名: 值; 列名: 值"，记录之间空一行（每个文本块都带有列名上下文）
+    Render each CSV row as "column: value; ..." paragraphs so chunks keep column context
+    """
+    reader = csv.reader(lines, delimiter=delimiter)
+    try:
+        header = [name.strip() for name in next(reader, [])]
+        for row in reader:
+            fields = [
+                f"{header[i] if i < len(header) and header[i] else f'列{i + 1}'}: {value.strip()}"
+                for i, value in enumerate(row)
+                if value.strip()
+            ]
+            if fields:
+                yield "; ".join(fields) + "\n\n"
+    except csv.Error as e:
+        raise ValueError(f"CSV解析失败（第{reader.line_num}行）: {e}")
+
+
+def _flatten(value: Any, prefix: str = "") -> List[str]:
+    """把JSON对象展开为"a.b: 值"形式的字段列表"""
+    if isinstance(value, dict):
+        fields = []
+        for key, item in value.items():
+            fields.extend(_flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return fields
+    if value is None or value == "" or value == [] or value == {}:
+        return []
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return [f"{prefix}: {text}" if prefix else text]
+
+
+def _iter_jsonl_records(lines: Iterable[str]) -> Iterator[str]:
+    """JSONL每条记录展开为字段文本，记录之间空一行（无法解析的行原样保留）"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            fields = _flatten(json.loads(line))
+        except ValueError:
+            fields = [line]
+        if fields:
+            yield "; ".join(fields) + "\n\n"
+
+
+def iter_file_text(
+    path: Union[str, Path],
+    fmt: Optional[str] = None,
+    block_size: int = BLOCK_SIZE,
+) -> Iterator[str]:
+    """
+    流式读取本地文件文本（用于流式分块）
+    Stream the text of a local file, ready for the streaming splitter
+    
+    Args:
+        path: 文件路径
+        fmt: 文件格式（默认按路径扩展名判断）
+        block_size: 每次读取的字节数
+    
+    Yields:
+        文本块
+    """
+    fmt = fmt or detect_format(str(path))
+    text_blocks = iter_decoded(iter_file_bytes(path, block_size))
+    if fmt in ("csv", "tsv"):
+        yield from _iter_csv_records(_iter_lines(text_blocks), delimiter="\t" if fmt == "tsv" else ",")
+    elif fmt == "jsonl":
+        yield from _iter_jsonl_records(_iter_lines(text_blocks))
+    else:
+        yield from text_blocks
+
+
+def read_file_text(path: Union[str, Path], fmt: Optional[str] = None) -> str:
+    """读取整个本地文件的文本（小文件）"""
+    return "".join(iter_file_text(path, fmt))
@@ -0,0 +1,180 @@
+"""
+RAG检索后处理
+Post-retrieval processing: vectorized MMR diversification and adjacent-chunk merging
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from app.services.rag.tokens import estimate_tokens
+
+
+def mmr_select(
+    query_vector: Sequence[float],
+    candidate_vectors: Sequence[Sequence[float]],
+    k: int,
+    lambda_mult: float = 0.7,
+    relevance: Optional[Sequence[float]] = None,
+) -> List[int]:
+    """
+    最大边际相关性（MMR）选择：在与查询相关的同时，惩罚与已选结果相似的候选
+    Maximal marginal relevance: trade query relevance against similarity to already-picked results
+    
+    候选间相似度矩阵只计算一次，每轮只用新选中行更新"与已选集合的最大相似度"，
+    总计算量为O(n·d + k·n)的向量运算。
+    The candidate similarity matrix is computed once; each round folds only the newly
+    picked row into the running max-similarity vector.
+    
+    Args:
+        query_vector: 查询向量
+        candidate_vectors: 候选向量（按检索得分排序）
+        k: 选择数量
+        lambda_mult: 相关性权重（1为纯相关性，0为纯多样性）
+        relevance: 候选的相关性得分（可选，如RRF融合分；默认使用与查询的余弦相似度）
+    
+    Returns:
+        选中候选的下标（按选择顺序）
+    """
+    if not candidate_vectors or k <= 0:
+        return []
+    
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    query = np.asarray(query_vector, dtype=np.float32)
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    
+    if relevance is None:
+        relevance = candidates @ query
+    else:
+        # 融合分与余弦相似度量纲不同，归一化到[0, 1]
+        relevance = np.asarray(relevance, dtype=np.float32)
+        spread = float(relevance.max() - relevance.min())
+        relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones_like(relevance)
+    similarity = candidates @ candidates.T
+    
+    k = min(k, len(candidates))
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    available = np.ones(len(candidates), dtype=bool)
+    available[selected[0]] = False
+    
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    
+    return selected
+
+
+def excerpt_window(content: str, hit: str, max_tokens: int) -> str:
+    """
+    截取命中块周围的片段，使片段总token数不超过上限
+    Cut a window of at most max_tokens around the hit chunk inside the full content
+    
+    Args:
+        content: 文档全文
+        hit: 命中的文本块
+        max_tokens: 片段token上限
+    
+    Returns:
+        片段（两端被截断时以"…"标记）；命中块不在全文中时返回命中块本身
+    """
+    if estimate_tokens(content) <= max_tokens:
+        return content
+    start = content.find(hit)
+    if start < 0:
+        return hit
+    
+    chars_per_token = len(content) / max(1, estimate_tokens(content))
+    budget = int(max_tokens * chars_per_token)
+    end = start + len(hit)
+    if end - start >= budget:
+        return hit
+    
+    # 剩余预算平均分给两侧，一侧到达边界时把剩余部分让给另一侧
+    spare = budget - (end - start)
+    left = min(start, spare // 2)
+    right = min(len(content) - end, spare - left)
+    left = min(start, spare - right)
+    window_start, window_end = start - left, end + right
+    
+    # 尽量在空白处截断，避免截断单词
+    if window_start > 0:
+        space = content.find(" ", window_start, start)
+        if space >= 0:
+            window_start = space + 1
+    if window_end < len(content):
+        space = content.rfind(" ", end, window_end)
+        if space >= 0:
+            window_end = space
+    
+    prefix = "…" if window_start > 0 else ""
+    suffix = "…" if window_end < len(content) else ""
+    return prefix + content[window_start:window_end] + suffix
+
+
+def _join_chunks(left: str, right: str, min_overlap: int = 5, max_overlap: int = 256) -> str:
+    """
+    拼接相邻块：去掉right开头与left结尾重复的部分（文本分割时的块重叠），
+    没有重叠时以换行分隔（过短的重叠视为巧合）
+    """
+    for size in range(min(len(left), len(right), max_overlap), min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    if not left or not right or left[-1].isspace() or right[0].isspace():
+        return left + right
+    return left + "\n" + right
+
+
+def merge_adjacent_chunks(payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    合并同一文档中相邻（chunkIndex连续）的文本块，合并结果位于其中排名最靠前的块的位置
+    Merge chunks of the same doc with consecutive chunkIndex; each merged run takes the place
+    of its best-ranked member
+    
+    同一文档的块按chunkIndex排序后划分连续区间，因此按任意顺序到达（如3、1、2）的块也会合并为一段。
+    没有chunkIndex的块（旧版本写入）不参与合并。
+    Chunks are sorted by index per (sourceId, docId) and split into consecutive runs, so arrival
+    order does not matter. Chunks without a chunkIndex (older versions) are left as they are.
+    
+    Args:
+        payloads: 点payload列表（按排序后的结果顺序）
+    
+    Returns:
+        合并后的payload列表（content为合并后的文本，chunkIndex为区间起点）
+    """
+    positions_by_doc: Dict[Tuple[Any, Any], List[int]] = {}
+    for position, payload in enumerate(payloads):
+        if payload.get("chunkIndex") is not None:
+            positions_by_doc.setdefault((payload.get("sourceId"), payload.get("docId")), []).append(position)
+    
+    merged_at: Dict[int, Dict[str, Any]] = {}
+    absorbed: Set[int] = set()
+    for positions in positions_by_doc.values():
+        ordered = sorted(positions, key=lambda position: payloads[position]["chunkIndex"])
+        runs = [[ordered[0]]]
+        for position in ordered[1:]:
+            if payloads[position]["chunkIndex"] <= payloads[runs[-1][-1]]["chunkIndex"] + 1:
+                runs[-1].append(position)
+            else:
+                runs.append([position])
+        
+        for run in runs:
+            content = payloads[run[0]].get("content", "")
+            for previous, position in zip(run, run[1:]):
+                # 同一位置的重复块只保留一次
+                if payloads[position]["chunkIndex"] != payloads[previous]["chunkIndex"]:
+                    content = _join_chunks(content, payloads[position].get("content", ""))
+            first = min(run)
+            merged_at[first] = {**payloads[first], "content": content, "chunkIndex": payloads[run[0]]["chunkIndex"]}
+            absorbed.update(run)
+    
+    return [
+        merged_at[position] if position in merged_at else payload
+        for position, payload in enumerate(payloads)
+        if position in merged_at or position not in absorbed
+    ]
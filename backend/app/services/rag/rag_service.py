@@ -3,21 +3,109 @@ RAG服务实现
 RAG service implementation for vector search and retrieval
 """
 
+import asyncio
+import hashlib
+import sys
+import time
 import uuid
-from typing import List, Optional, Dict, Any
+from typing import Callable, List, Optional, Dict, Any, Set, Tuple
+import httpx
 from pydantic import BaseModel, Field
+from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
 from qdrant_client.models import (
     Filter,
     FieldCondition,
+    HasIdCondition,
     MatchValue,
     MatchAny,
     PointStruct,
+    PointIdsList,
+    FilterSelector,
+    SetPayload,
+    SetPayloadOperation,
+    Fusion,
+    FusionQuery,
+    Prefetch,
+    QueryRequest,
+    SearchParams,
+    SearchRequest,
 )
 
+from app.core.cache import LocalCache
 from app.core.config import get_settings
-from app.core.database import get_qdrant_client
+from app.core.http_client import RETRYABLE_STATUS_CODES
+from app.core.database import (
+    QDRANT_SPARSE_VECTOR_NAME,
+    create_qdrant_collection,
+    get_qdrant_client,
+    qdrant_search_params,
+)
 from app.services.rag.embedding_service import get_embedding_service
-from app.models.schemas import RAGReturnType
+from app.services.rag.embedding_cache import get_embedding_cache
+from app.services.rag.embedding_scheduler import EmbeddingPriority
+from app.services.rag.embedding_projection import get_embedding_projection
+from app.services.rag.sparse_encoder import get_sparse_encoder_service
+from app.services.rag.postprocess import excerpt_window, merge_adjacent_chunks, mmr_select
+from app.repositories.data_source_docs import DataSourceDocsRepository
+from app.models.schemas import RAGReturnType, RAGSearchMode, RAGSearchParams, RAGSearchPreset
+
+
+# 确定性点ID的命名空间（uuid5）
+POINT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "rowboat:rag:chunk")
+
+
+def chunk_hash(chunk: str) -> str:
+    """计算文本块的内容哈希"""
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+def chunk_point_id(project_id: str, source_id: str, doc_id: str, content_hash: str) -> str:
+    """
+    根据(projectId, sourceId, docId, 文本块哈希)生成确定性点ID，重复导入同一内容会覆盖而不是新增
+    Deterministic point id, so re-ingesting the same chunk overwrites instead of duplicating
+    """
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{project_id}:{source_id}:{doc_id}:{content_hash}"))
+
+
+def _is_transient_qdrant_error(error: BaseException) -> bool:
+    """写入错误是否可以重试（超时、网络错误、429/5xx）"""
+    if isinstance(error, (asyncio.TimeoutError, ResponseHandlingException, httpx.TransportError)):
+        return True
+    return isinstance(error, UnexpectedResponse) and error.status_code in RETRYABLE_STATUS_CODES
+
+
+# 向量搜索预设：hnsw_ef越大召回率越高、延迟越高（oversampling未设置时取配置）
+SEARCH_PRESETS: Dict[RAGSearchPreset, RAGSearchParams] = {
+    RAGSearchPreset.FAST: RAGSearchParams(hnsw_ef=32, exact=False, oversampling=1.0, rescore=False),
+    RAGSearchPreset.BALANCED: RAGSearchParams(hnsw_ef=128, exact=False, rescore=True),
+    RAGSearchPreset.ACCURATE: RAGSearchParams(hnsw_ef=512, exact=False, oversampling=3.0, rescore=True),
+}
+
+
+def resolve_search_params(
+    preset: RAGSearchPreset = RAGSearchPreset.BALANCED,
+    overrides: Optional[RAGSearchParams] = None,
+) -> SearchParams:
+    """
+    合并预设和智能体覆盖的搜索参数
+    Merge a preset with per-agent overrides into Qdrant search params
+    
+    Args:
+        preset: 搜索预设
+        overrides: 覆盖项（未设置的项沿用预设）
+        
+    Returns:
+        Qdrant搜索参数
+    """
+    params = SEARCH_PRESETS[preset].model_dump()
+    if overrides is not None:
+        params.update(overrides.model_dump(exclude_none=True))
+    return qdrant_search_params(
+        hnsw_ef=params["hnsw_ef"],
+        exact=bool(params["exact"]),
+        oversampling=params["oversampling"],
+        rescore=params["rescore"] is not False,
+    )
 
 
 class RAGResult(BaseModel):
@@ -39,12 +127,81 @@ class RAGService:
     """
     
     COLLECTION_NAME = "embeddings"
+    PROJECT_COLLECTION_PREFIX = "embeddings_"
     
     def __init__(self):
         """初始化RAG服务"""
         self.settings = get_settings()
         self.qdrant_client = get_qdrant_client()
         self.embedding_service = get_embedding_service()
+        self.embedding_cache = get_embedding_cache() if self.settings.embedding_cache_enabled else None
+        # PCA降维投影（缓存中保存原始向量，写入和检索Qdrant前投影）
+        self.projection = get_embedding_projection()
+        self.sparse_encoder = get_sparse_encoder_service()
+        self.docs_repository = DataSourceDocsRepository()
+        # 文档ID -> {name, content, sourceId}（content返回类型的热点文档）
+        self._doc_content_cache = LocalCache(
+            max_entries=10000,
+            ttl=self.settings.rag_content_cache_ttl,
+            max_bytes=self.settings.rag_content_cache_max_bytes,
+            size_of=lambda doc: sys.getsizeof(doc.get("content") or ""),
+        )
+        # 项目ID -> 所在集合（其他进程可能拆分项目，使用短TTL）
+        self._project_collections = LocalCache(max_entries=10000, ttl=60)
+        # 集合名称 -> 是否配置了BM25稀疏向量
+        self._sparse_collections = LocalCache(max_entries=10000, ttl=60)
+    
+    def project_collection_name(self, project_id: str) -> str:
+        """项目独立集合的名称"""
+        return f"{self.PROJECT_COLLECTION_PREFIX}{project_id}"
+    
+    async def collection_for(self, project_id: str, fresh: bool = False) -> str:
+        """
+        获取项目向量所在的集合：已拆分到独立集合的项目返回独立集合，否则返回共享集合
+        Resolve the collection holding a project's vectors (dedicated if promoted, else shared)
+        
+        Args:
+            project_id: 项目ID
+            fresh: 缓存为共享集合时重新检查（写入使用，避免其他进程拆分后仍写入共享集合）
+            
+        Returns:
+            集合名称
+        """
+        collection_name = self._project_collections.get(project_id)
+        if fresh and collection_name == self.COLLECTION_NAME:
+            # 拆分是单向的，只有缓存为共享集合时才可能过期
+            collection_name = None
+        if collection_name is None:
+            dedicated = self.project_collection_name(project_id)
+            if await self.qdrant_client.collection_exists(dedicated):
+                collection_name = dedicated
+            else:
+                collection_name = self.COLLECTION_NAME
+            self._project_collections.set(project_id, collection_name)
+        return collection_name
+    
+    async def has_sparse_vectors(self, collection_name: str) -> bool:
+        """
+        集合是否配置了BM25稀疏向量（升级前创建的集合没有，需要重建集合才能启用混合检索）
+        Whether the collection has the BM25 sparse vector (collections created before it was
+        introduced must be recreated to enable hybrid search)
+        """
+        has_sparse = self._sparse_collections.get(collection_name)
+        if has_sparse is None:
+            try:
+                info = await self.qdrant_client.get_collection(collection_name)
+                has_sparse = QDRANT_SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+            except Exception:
+                return False
+            self._sparse_collections.set(collection_name, has_sparse)
+        return has_sparse
+    
+    async def _all_collections(self) -> List[str]:
+        """共享集合和所有项目独立集合"""
+        collections = (await self.qdrant_client.get_collections()).collections
+        return [self.COLLECTION_NAME] + sorted(
+            col.name for col in collections if col.name.startswith(self.PROJECT_COLLECTION_PREFIX)
+        )
     
     async def search(
         self,
@@ -53,6 +210,10 @@ class RAGService:
         source_ids: List[str],
         return_type: RAGReturnType = RAGReturnType.CHUNKS,
         k: int = 3,
+        search_mode: RAGSearchMode = RAGSearchMode.DENSE,
+        diversify: Optional[bool] = None,
+        search_preset: RAGSearchPreset = RAGSearchPreset.BALANCED,
+        search_params: Optional[RAGSearchParams] = None,
     ) -> List[RAGResult]:
         """
         搜索相关文档
@@ -64,12 +225,65 @@ class RAGService:
             source_ids: 数据源ID列表
             return_type: 返回类型（chunks或content）
             k: 返回结果数量
+            search_mode: 检索方式（dense或hybrid）
+            diversify: 是否启用后处理（多取候选后做MMR多样化并合并相邻块，默认取配置）
+            search_preset: 向量搜索速度/召回率预设
+            search_params: 覆盖预设的搜索参数（hnsw_ef、exact、oversampling、rescore）
             
         Returns:
             搜索结果列表
         """
-        # 生成查询嵌入向量
-        embedding, _ = await self.embedding_service.embed(query)
+        results = await self.search_many(
+            project_id,
+            [query],
+            source_ids,
+            return_type=return_type,
+            k=k,
+            search_mode=search_mode,
+            diversify=diversify,
+            search_preset=search_preset,
+            search_params=search_params,
+        )
+        return results[0]
+    
+    async def search_many(
+        self,
+        project_id: str,
+        queries: List[str],
+        source_ids: List[str],
+        return_type: RAGReturnType = RAGReturnType.CHUNKS,
+        k: int = 3,
+        search_mode: RAGSearchMode = RAGSearchMode.DENSE,
+        diversify: Optional[bool] = None,
+        search_preset: RAGSearchPreset = RAGSearchPreset.BALANCED,
+        search_params: Optional[RAGSearchParams] = None,
+        embeddings: Optional[List[List[float]]] = None,
+    ) -> List[List[RAGResult]]:
+        """
+        批量搜索：所有查询合并为一次embedding请求和一次Qdrant批量检索
+        Search several queries at once: one embedding request and one Qdrant batch call
+        
+        Args:
+            project_id: 项目ID
+            queries: 查询文本列表
+            source_ids: 数据源ID列表
+            return_type: 返回类型（chunks或content）
+            k: 每个查询返回的结果数量
+            search_mode: 检索方式（dense或hybrid）
+            diversify: 是否启用后处理（多取候选后做MMR多样化并合并相邻块，默认取配置）
+            search_preset: 向量搜索速度/召回率预设
+            search_params: 覆盖预设的搜索参数（hnsw_ef、exact、oversampling、rescore）
+            embeddings: 已生成的查询嵌入向量（embed_queries的结果，默认在此生成）
+            
+        Returns:
+            与queries一一对应的搜索结果列表
+        """
+        if not queries:
+            return []
+        
+        # 生成查询嵌入向量（优先使用缓存）
+        if embeddings is None:
+            embeddings = await self.embed_queries(queries)
         
         # 构建过滤器
         filter_conditions = [
@@ -84,44 +298,301 @@ class RAGService:
         ]
         filter_condition = Filter(must=filter_conditions)
         
-        # 执行向量搜索
+        if diversify is None:
+            diversify = self.settings.rag_mmr_enabled
+        fetch_k = k * max(1, self.settings.rag_mmr_fetch_k_multiplier) if diversify else k
+        params = resolve_search_params(search_preset, search_params)
+        
+        # 执行向量搜索（异步客户端，不阻塞事件循环；带服务端超时）
+        collection_name = await self.collection_for(project_id)
+        search_args = (queries, embeddings, filter_condition, fetch_k, diversify, params, search_mode)
+        batch_results, hybrid = await self._search_points(collection_name, *search_args)
+        if collection_name == self.COLLECTION_NAME and any(not points for points in batch_results):
+            # 其他进程可能刚把项目拆分到独立集合，共享集合中的点正在删除，而集合缓存最长60秒后才过期
+            promoted = await self.collection_for(project_id, fresh=True)
+            if promoted != collection_name:
+                batch_results, hybrid = await self._search_points(promoted, *search_args)
+        
+        # 处理搜索结果
+        # 注意：每个查询对应一个ScoredPoint列表
+        all_results = []
+        for embedding, search_results in zip(embeddings, batch_results):
+            if diversify:
+                payloads = self._diversify(embedding, search_results, k, fused=hybrid)
+            else:
+                payloads = [scored_point.payload for scored_point in search_results]
+            
+            results = []
+            for payload in payloads:
+                if payload:
+                    result = RAGResult(
+                        title=payload.get("title", ""),
+                        name=payload.get("name", ""),
+                        content=payload.get("content", ""),
+                        doc_id=payload.get("docId", ""),
+                        source_id=payload.get("sourceId", ""),
+                    )
+                    results.append(result)
+            all_results.append(results)
+        
+        # 如果返回类型是chunks，直接返回
+        if return_type == RAGReturnType.CHUNKS:
+            return all_results
+        
+        # 如果返回类型是content，需要从MongoDB获取完整内容（所有查询命中的文档一次获取）
+        docs = await self._load_docs(list(dict.fromkeys(
+            result.doc_id for results in all_results for result in results
+        )))
+        return [self._resolve_content(results, docs) for results in all_results]
+    
+    async def _search_points(
+        self,
+        collection_name: str,
+        queries: List[str],
+        embeddings: List[List[float]],
+        filter_condition: Filter,
+        fetch_k: int,
+        diversify: bool,
+        params: Optional[SearchParams],
+        search_mode: RAGSearchMode,
+    ) -> Tuple[List[List[Any]], bool]:
+        """
+        在指定集合中执行批量检索
+        Run the batch search against one collection
+        
+        Returns:
+            (与queries一一对应的命中点列表, 是否使用了混合检索)
+        """
+        hybrid = search_mode == RAGSearchMode.HYBRID and await self.has_sparse_vectors(collection_name)
         try:
-            search_results = self.qdrant_client.search(
-                collection_name=self.COLLECTION_NAME,
-                query_vector=embedding,
-                query_filter=filter_condition,
-                limit=k,
-                with_payload=True,
-            )
+            if hybrid:
+                batch_results = await self._hybrid_search(
+                    collection_name, queries, embeddings, filter_condition, fetch_k,
+                    with_vectors=diversify, params=params,
+                )
+            else:
+                batch_results = await self.qdrant_client.search_batch(
+                    collection_name=collection_name,
+                    requests=[
+                        SearchRequest(
+                            vector=embedding,
+                            filter=filter_condition,
+                            limit=fetch_k,
+                            with_payload=True,
+                            with_vector=diversify,
+                            score_threshold=self.settings.rag_score_threshold,
+                            params=params,
+                        )
+                        for embedding in embeddings
+                    ],
+                    timeout=self.settings.qdrant_search_timeout,
+                )
         except Exception as e:
             # 如果集合不存在，返回空列表
             if "not found" in str(e).lower() or "does not exist" in str(e).lower():
-                return []
+                return [[] for _ in queries], hybrid
             raise Exception(f"向量搜索失败: {e}")
         
-        # 处理搜索结果
-        # 注意：search方法返回的是ScoredPoint列表
-        results = []
-        for scored_point in search_results:
-            payload = scored_point.payload
-            if payload:
-                result = RAGResult(
-                    title=payload.get("title", ""),
-                    name=payload.get("name", ""),
-                    content=payload.get("content", ""),
-                    doc_id=payload.get("docId", ""),
-                    source_id=payload.get("sourceId", ""),
+        return batch_results, hybrid
+    
+    async def _load_docs(self, doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        获取文档全文：热点文档走进程内LRU，未命中的文档一次$in查询批量获取
+        Load full documents; hot docs come from an in-process LRU, misses are fetched
+        with a single $in query
+        
+        Args:
+            doc_ids: 文档ID列表
+            
+        Returns:
+            文档ID -> {name, content, sourceId}（不存在的文档不包含在内）
+        """
+        docs: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        for doc_id in doc_ids:
+            cached = self._doc_content_cache.get(doc_id)
+            if cached is None:
+                missing.append(doc_id)
+            else:
+                docs[doc_id] = cached
+        if missing:
+            for doc_id, doc in (await self.docs_repository.bulk_fetch_content(missing)).items():
+                self._doc_content_cache.set(doc_id, doc)
+                docs[doc_id] = doc
+        return docs
+    
+    def _resolve_content(self, results: List[RAGResult], docs: Dict[str, Dict[str, Any]]) -> List[RAGResult]:
+        """
+        content返回类型：按docId去重并替换为文档全文，配置了片段上限时只返回命中块周围的片段
+        Replace hits with their full documents (one result per doc), optionally cut to an
+        excerpt window around the best hit
+        
+        Args:
+            results: 检索到的文本块（按相关性排序）
+            docs: 文档ID -> 文档（由_load_docs获取）
+            
+        Returns:
+            每个文档一条结果，顺序与文档首次命中的顺序一致
+        """
+        # 每个文档保留得分最高的命中块，用于定位片段
+        hits: Dict[str, RAGResult] = {}
+        for result in results:
+            hits.setdefault(result.doc_id, result)
+        
+        max_tokens = self.settings.rag_content_excerpt_tokens
+        resolved = []
+        for doc_id, hit in hits.items():
+            doc = docs.get(doc_id)
+            if doc is None or not doc.get("content"):
+                # 文档已删除或全文尚未写入时保留命中块
+                resolved.append(hit)
+                continue
+            content = doc["content"]
+            if max_tokens > 0:
+                content = excerpt_window(content, hit.content, max_tokens)
+            resolved.append(RAGResult(
+                title=doc.get("name") or hit.title,
+                name=doc.get("name") or hit.name,
+                content=content,
+                doc_id=doc_id,
+                source_id=doc.get("sourceId") or hit.source_id,
+            ))
+        return resolved
+    
+    async def _hybrid_search(
+        self,
+        collection_name: str,
+        queries: List[str],
+        embeddings: List[List[float]],
+        filter_condition: Filter,
+        k: int,
+        with_vectors: bool = False,
+        params: Optional[SearchParams] = None,
+    ) -> List[List[Any]]:
+        """
+        混合检索：稠密向量和BM25稀疏向量分别预取候选，服务端按倒数排名融合（RRF）
+        Hybrid search: prefetch dense and BM25 candidates, fused server-side with RRF;
+        all queries go in one batch request
+        """
+        prefetch_limit = max(k, self.settings.rag_hybrid_prefetch_limit)
+        responses = await self.qdrant_client.query_batch_points(
+            collection_name=collection_name,
+            requests=[
+                QueryRequest(
+                    prefetch=[
+                        Prefetch(
+                            query=embedding,
+                            filter=filter_condition,
+                            limit=prefetch_limit,
+                            score_threshold=self.settings.rag_score_threshold,
+                            params=params,
+                        ),
+                        Prefetch(
+                            query=self.sparse_encoder.encode_query(query),
+                            using=QDRANT_SPARSE_VECTOR_NAME,
+                            filter=filter_condition,
+                            limit=prefetch_limit,
+                        ),
+                    ],
+                    query=FusionQuery(fusion=Fusion.RRF),
+                    limit=k,
+                    with_payload=True,
+                    with_vector=with_vectors,
                 )
-                results.append(result)
+                for query, embedding in zip(queries, embeddings)
+            ],
+            timeout=self.settings.qdrant_search_timeout,
+        )
+        return [response.points for response in responses]
+    
+    def _diversify(
+        self,
+        query_vector: List[float],
+        scored_points: List[Any],
+        k: int,
+        fused: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        对多取的候选做MMR多样化，并合并同一文档中的相邻块
+        Apply MMR to the over-fetched candidates, then merge adjacent chunks of the same doc
         
-        # 如果返回类型是chunks，直接返回
-        if return_type == RAGReturnType.CHUNKS:
-            return results
+        Args:
+            query_vector: 查询向量
+            scored_points: 带向量的候选点（按得分排序）
+            k: 保留数量
+            fused: 得分是否为RRF融合分（是则作为MMR的相关性，而不是只看稠密相似度）
+            
+        Returns:
+            处理后的payload列表
+        """
+        candidates = []
+        for point in scored_points:
+            vector = point.vector
+            if isinstance(vector, dict):
+                # 带稀疏向量的集合返回命名向量，未命名的稠密向量名称为""
+                vector = vector.get("")
+            if point.payload and vector is not None:
+                candidates.append((point.payload, vector, point.score))
+        if not candidates:
+            return []
         
-        # 如果返回类型是content，需要从MongoDB获取完整内容
-        # 注意：这里暂时返回chunks，后续需要从MongoDB获取完整内容
-        # TODO: 从MongoDB获取完整内容
-        return results
+        selected = mmr_select(
+            query_vector,
+            [vector for _, vector, _ in candidates],
+            k,
+            lambda_mult=self.settings.rag_mmr_lambda,
+            relevance=[score for _, _, score in candidates] if fused else None,
+        )
+        payloads = [candidates[i][0] for i in selected]
+        if self.settings.rag_merge_adjacent_chunks:
+            payloads = merge_adjacent_chunks(payloads)
+        return payloads
+    
+    async def _embed_query(self, query: str) -> List[float]:
+        """
+        生成查询嵌入向量，命中缓存时跳过远程调用
+        Embed a query, skipping the remote round trip on cache hit
+        """
+        model = self.embedding_service.model
+        if self.embedding_cache is not None:
+            cached = await self.embedding_cache.get(model, query)
+            if cached is not None:
+                return self._project([cached])[0]
+        
+        embedding, _ = await self.embedding_service.embed(query)
+        
+        if self.embedding_cache is not None:
+            await self.embedding_cache.set(model, query, embedding)
+        return self._project([embedding])[0]
+    
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        生成多个查询的嵌入向量：先查缓存，未命中的查询合并为一次embedding请求
+        Embed several queries; cache misses are embedded in a single request
+        """
+        if len(queries) == 1:
+            return [await self._embed_query(queries[0])]
+        
+        model = self.embedding_service.model
+        if self.embedding_cache is not None:
+            embeddings = list(await asyncio.gather(*(self.embedding_cache.get(model, query) for query in queries)))
+        else:
+            embeddings = [None] * len(queries)
+        
+        missing = list(dict.fromkeys(query for query, embedding in zip(queries, embeddings) if embedding is None))
+        if missing:
+            vectors, _ = await self.embedding_service.embed_many(missing, priority=EmbeddingPriority.INTERACTIVE)
+            fetched = dict(zip(missing, vectors))
+            embeddings = [fetched.get(query, embedding) for query, embedding in zip(queries, embeddings)]
+            if self.embedding_cache is not None:
+                await asyncio.gather(*(self.embedding_cache.set(model, query, vector) for query, vector in fetched.items()))
+        return self._project(embeddings)
+    
+    def _project(self, embeddings: List[List[float]]) -> List[List[float]]:
+        """按配置的PCA投影降维（未启用时原样返回）"""
+        if self.projection is None:
+            return embeddings
+        return self.projection.project(embeddings)
     
     async def upsert_embeddings(
         self,
@@ -131,10 +602,12 @@ class RAGService:
         doc_name: str,
         chunks: List[str],
         embeddings: List[List[float]],
+        chunk_indices: Optional[List[int]] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
     ) -> None:
         """
-        存储嵌入向量
-        Store embeddings in Qdrant
+        存储嵌入向量（分批并发写入，失败的批次重试）
+        Store embeddings in Qdrant in concurrent batches, retrying transient failures
         
         Args:
             project_id: 项目ID
@@ -143,14 +616,26 @@ class RAGService:
             doc_name: 文档名称
             chunks: 文本块列表
             embeddings: 嵌入向量列表
+            chunk_indices: 文本块在文档中的位置（用于合并相邻块，默认按列表顺序）
+            on_progress: 进度回调(已写入数量, 总数量)，每批写入成功后调用
         """
-        # 准备点数据
+        if chunk_indices is None:
+            chunk_indices = list(range(len(chunks)))
+        collection_name = await self.collection_for(project_id, fresh=True)
+        with_sparse = self.settings.rag_sparse_enabled and await self.has_sparse_vectors(collection_name)
+        embeddings = self._project(embeddings)
+        
+        # 准备点数据（点ID由内容哈希确定）
         points = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            point_id = str(uuid.uuid4())
+        for chunk, embedding, chunk_index in zip(chunks, embeddings, chunk_indices):
+            content_hash = chunk_hash(chunk)
+            vector: Any = embedding
+            if with_sparse:
+                # 未命名的稠密向量名称为""
+                vector = {"": embedding, QDRANT_SPARSE_VECTOR_NAME: self.sparse_encoder.encode_document(chunk)}
             point = PointStruct(
-                id=point_id,
-                vector=embedding,
+                id=chunk_point_id(project_id, source_id, doc_id, content_hash),
+                vector=vector,
                 payload={
                     "projectId": project_id,
                     "sourceId": source_id,
@@ -158,33 +643,182 @@ class RAGService:
                     "content": chunk,
                     "title": doc_name,
                     "name": doc_name,
+                    "chunkHash": content_hash,
+                    "chunkIndex": chunk_index,
                 },
             )
             points.append(point)
         
-        # 存储到Qdrant
+        # 分批并发写入；wait=False时批次只提交不等待生效，全部提交后统一确认可见
+        batch_size = max(1, self.settings.ingestion_upsert_batch_size)
+        batches = [points[i:i + batch_size] for i in range(0, len(points), batch_size)]
+        wait = self.settings.qdrant_upsert_wait
+        semaphore = asyncio.Semaphore(max(1, self.settings.qdrant_upsert_concurrency))
+        upserted = 0
+        
+        async def write(batch: List[PointStruct]) -> None:
+            nonlocal upserted
+            async with semaphore:
+                await self._upsert_batch(collection_name, batch, wait)
+            upserted += len(batch)
+            if on_progress is not None:
+                on_progress(upserted, len(points))
+        
         try:
-            self.qdrant_client.upsert(
-                collection_name=self.COLLECTION_NAME,
-                points=points,
-            )
+            await asyncio.gather(*(write(batch) for batch in batches))
+            if not wait and points:
+                await self._wait_until_visible(collection_name, [point.id for point in points])
         except Exception as e:
             raise Exception(f"存储嵌入向量失败: {e}")
     
+    async def _upsert_batch(self, collection_name: str, points: List[PointStruct], wait: bool) -> None:
+        """
+        写入一批点，超时、网络错误和429/5xx按指数退避重试（点ID由内容确定，重复写入是幂等的）
+        Upsert one batch, retrying transient failures; point ids are content-derived so retries are idempotent
+        """
+        attempt = 0
+        while True:
+            try:
+                # 写入接口没有服务端超时参数，使用客户端截止时间
+                await asyncio.wait_for(
+                    self.qdrant_client.upsert(
+                        collection_name=collection_name,
+                        points=points,
+                        wait=wait,
+                    ),
+                    timeout=self.settings.qdrant_upsert_timeout,
+                )
+                return
+            except Exception as e:
+                if attempt >= self.settings.qdrant_upsert_max_retries or not _is_transient_qdrant_error(e):
+                    raise
+                delay = self.settings.qdrant_upsert_retry_backoff * (2 ** attempt)
+                attempt += 1
+                print(f"[RAG] Qdrant写入失败，{delay:.1f}秒后重试({attempt}/{self.settings.qdrant_upsert_max_retries}): {e!r}")
+                await asyncio.sleep(delay)
+    
+    async def _wait_until_visible(self, collection_name: str, point_ids: List[Any]) -> None:
+        """
+        一致性屏障：轮询直到异步提交的点全部可见
+        Consistency barrier: poll until every point submitted with wait=False is visible
+        """
+        ids = list(dict.fromkeys(point_ids))
+        deadline = time.monotonic() + self.settings.qdrant_upsert_barrier_timeout
+        visible_filter = Filter(must=[HasIdCondition(has_id=ids)])
+        while True:
+            visible = (await self.qdrant_client.count(
+                collection_name=collection_name,
+                count_filter=visible_filter,
+                exact=True,
+            )).count
+            if visible >= len(ids):
+                return
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"等待写入生效超时：{visible}/{len(ids)}个点可见")
+            await asyncio.sleep(self.settings.qdrant_upsert_poll_interval)
+    
+    async def get_doc_manifest(self, project_id: str, source_id: str, doc_id: str) -> Dict[str, Dict[str, Any]]:
+        """
+        获取文档已有的点清单
+        Get the manifest of points already stored for a doc
+        
+        Args:
+            project_id: 项目ID
+            source_id: 数据源ID
+            doc_id: 文档ID
+            
+        Returns:
+            点ID到{chunkHash, chunkIndex}的映射（旧版本写入的点可能缺少这两个字段）
+        """
+        doc_filter = Filter(must=[
+            FieldCondition(key="projectId", match=MatchValue(value=project_id)),
+            FieldCondition(key="sourceId", match=MatchValue(value=source_id)),
+            FieldCondition(key="docId", match=MatchValue(value=doc_id)),
+        ])
+        
+        collection_name = await self.collection_for(project_id, fresh=True)
+        manifest: Dict[str, Dict[str, Any]] = {}
+        offset = None
+        while True:
+            points, offset = await self.qdrant_client.scroll(
+                collection_name=collection_name,
+                scroll_filter=doc_filter,
+                limit=1000,
+                offset=offset,
+                with_payload=["chunkHash", "chunkIndex"],
+                with_vectors=False,
+            )
+            for point in points:
+                manifest[str(point.id)] = point.payload or {}
+            if offset is None:
+                return manifest
+    
+    async def set_chunk_indices(self, project_id: str, chunk_indices: Dict[str, int]) -> None:
+        """
+        更新复用块的位置（文档中间插入内容后，未变化的块位置会后移）
+        Update the position of reused chunks, which shift when content is inserted above them
+        
+        Args:
+            project_id: 项目ID
+            chunk_indices: 点ID到新位置的映射
+        """
+        if not chunk_indices:
+            return
+        try:
+            await asyncio.wait_for(
+                self.qdrant_client.batch_update_points(
+                    collection_name=await self.collection_for(project_id, fresh=True),
+                    update_operations=[
+                        SetPayloadOperation(set_payload=SetPayload(payload={"chunkIndex": index}, points=[point_id]))
+                        for point_id, index in chunk_indices.items()
+                    ],
+                ),
+                timeout=self.settings.qdrant_upsert_timeout,
+            )
+        except Exception as e:
+            raise Exception(f"更新文本块位置失败: {e}")
+    
+    async def delete_points(self, project_id: str, point_ids: List[str]) -> None:
+        """
+        按ID删除点
+        Delete points by id
+        
+        Args:
+            project_id: 项目ID
+            point_ids: 点ID列表
+        """
+        if not point_ids:
+            return
+        try:
+            await asyncio.wait_for(
+                self.qdrant_client.delete(
+                    collection_name=await self.collection_for(project_id, fresh=True),
+                    points_selector=PointIdsList(points=point_ids),
+                ),
+                timeout=self.settings.qdrant_upsert_timeout,
+            )
+        except Exception as e:
+            raise Exception(f"删除嵌入向量失败: {e}")
+    
     async def delete_embeddings(
         self,
         project_id: str,
         source_id: Optional[str] = None,
         doc_id: Optional[str] = None,
-    ) -> None:
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> int:
         """
-        删除嵌入向量
-        Delete embeddings from Qdrant
+        按过滤条件删除嵌入向量
+        Delete embeddings from Qdrant by filter
         
         Args:
             project_id: 项目ID
             source_id: 数据源ID（可选）
             doc_id: 文档ID（可选）
+            on_progress: 进度回调(已删除数量, 总数量)
+            
+        Returns:
+            删除的点数量
         """
         # 构建过滤器
         filter_conditions = [
@@ -212,14 +846,222 @@ class RAGService:
         
         filter_condition = Filter(must=filter_conditions)
         
-        # 删除点
+        collection_name = await self.collection_for(project_id, fresh=True)
+        deleted = await self.delete_by_filter(
+            filter_condition, on_progress=on_progress, collection_name=collection_name,
+        )
+        
+        # 整个项目被删除时，同时删除其独立集合
+        if collection_name != self.COLLECTION_NAME and not source_id and not doc_id:
+            await self.qdrant_client.delete_collection(collection_name)
+            self._project_collections.delete(project_id)
+        return deleted
+    
+    async def delete_by_filter(
+        self,
+        filter_condition: Filter,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        collection_name: Optional[str] = None,
+    ) -> int:
+        """
+        提交服务端过滤删除（wait=False异步执行），并轮询剩余数量跟踪进度
+        Submit a server-side filter delete without waiting, then poll the remaining
+        count to report progress
+        
+        Args:
+            filter_condition: 过滤条件
+            on_progress: 进度回调(已删除数量, 总数量)
+            collection_name: 集合名称（默认共享集合）
+            
+        Returns:
+            删除的点数量
+        """
+        collection_name = collection_name or self.COLLECTION_NAME
         try:
-            # 注意：Qdrant的删除操作需要先查询点ID
-            # 这里暂时不实现，后续需要完善
-            # TODO: 实现删除操作
-            pass
+            total = (await self.qdrant_client.count(
+                collection_name=collection_name,
+                count_filter=filter_condition,
+                exact=True,
+            )).count
+            if total == 0:
+                return 0
+            
+            await self.qdrant_client.delete(
+                collection_name=collection_name,
+                points_selector=FilterSelector(filter=filter_condition),
+                wait=False,
+            )
+            
+            deadline = time.monotonic() + self.settings.rag_delete_timeout
+            while True:
+                remaining = (await self.qdrant_client.count(
+                    collection_name=collection_name,
+                    count_filter=filter_condition,
+                    exact=True,
+                )).count
+                if on_progress is not None:
+                    on_progress(total - remaining, total)
+                if remaining == 0:
+                    return total
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"删除超时，剩余 {remaining}/{total} 个点")
+                await asyncio.sleep(self.settings.rag_delete_poll_interval)
         except Exception as e:
+            if "not found" in str(e).lower() or "does not exist" in str(e).lower():
+                return 0
             raise Exception(f"删除嵌入向量失败: {e}")
+    
+    async def delete_source_embeddings(
+        self,
+        source_id: str,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> int:
+        """
+        删除某个数据源的所有嵌入向量（不限项目，用于清理孤儿数据）
+        Delete every embedding of a source regardless of project (orphan cleanup)
+        
+        Args:
+            source_id: 数据源ID
+            on_progress: 进度回调(已删除数量, 总数量)
+            
+        Returns:
+            删除的点数量
+        """
+        source_filter = Filter(must=[FieldCondition(key="sourceId", match=MatchValue(value=source_id))])
+        deleted = 0
+        for collection_name in await self._all_collections():
+            deleted += await self.delete_by_filter(
+                source_filter, on_progress=on_progress, collection_name=collection_name,
+            )
+        return deleted
+    
+    async def list_indexed_source_ids(self) -> Set[str]:
+        """
+        获取Qdrant中出现过的所有sourceId
+        List every sourceId present in Qdrant payloads
+        
+        优先使用facet聚合（需要sourceId的keyword索引），失败时回退到滚动读取payload。
+        Uses the facet API (needs a keyword index on sourceId) and falls back to scrolling.
+        """
+        source_ids: Set[str] = set()
+        for collection_name in await self._all_collections():
+            source_ids |= await self._collection_source_ids(collection_name)
+        return source_ids
+    
+    async def _collection_source_ids(self, collection_name: str) -> Set[str]:
+        """获取单个集合中出现过的所有sourceId"""
+        try:
+            response = await self.qdrant_client.facet(
+                collection_name=collection_name,
+                key="sourceId",
+                limit=1_000_000,
+                exact=True,
+            )
+            return {str(hit.value) for hit in response.hits}
+        except Exception as e:
+            print(f"[RAG] facet聚合sourceId失败，回退到滚动读取: {e}")
+        
+        source_ids: Set[str] = set()
+        offset = None
+        while True:
+            points, offset = await self.qdrant_client.scroll(
+                collection_name=collection_name,
+                limit=10000,
+                offset=offset,
+                with_payload=["sourceId"],
+                with_vectors=False,
+            )
+            source_ids.update(str((point.payload or {}).get("sourceId")) for point in points)
+            if offset is None:
+                source_ids.discard("None")
+                return source_ids
+    
+    async def promote_project_collection(self, project_id: str) -> bool:
+        """
+        项目在共享集合中的向量数超过阈值时，迁移到项目独立集合
+        Move a project out of the shared collection once it exceeds the size threshold
+        
+        先创建独立集合（写入路由以集合是否存在为准，见collection_for的fresh），再分页复制点，
+        只从共享集合删除已复制的点ID，重复直到共享集合中没有该项目的点。迁移期间其他进程已开始的
+        写入可能在复制之后落到共享集合，这些点不会被删除，而是在下一轮（或下次调用）被搬到独立集合。
+        The dedicated collection is created first, which fences writers (they re-check it before
+        writing). Points are then copied page by page and only the copied ids are deleted from the
+        shared collection, repeating until none are left, so a write that raced the switch is moved
+        on a later pass rather than lost. Already promoted projects just drain such leftovers.
+        
+        Args:
+            project_id: 项目ID
+            
+        Returns:
+            是否进行了迁移
+        """
+        threshold = self.settings.qdrant_project_collection_threshold
+        if threshold <= 0:
+            return False
+        dedicated = self.project_collection_name(project_id)
+        if await self.collection_for(project_id, fresh=True) == dedicated:
+            moved = await self._move_shared_points(project_id, dedicated)
+            if moved:
+                print(f"[RAG] 项目 {project_id} 迁移后写入共享集合的 {moved} 个向量已移到 {dedicated}")
+            return False
+        
+        project_filter = Filter(must=[FieldCondition(key="projectId", match=MatchValue(value=project_id))])
+        total = (await self.qdrant_client.count(
+            collection_name=self.COLLECTION_NAME,
+            count_filter=project_filter,
+            exact=True,
+        )).count
+        if total < threshold:
+            return False
+        
+        vectors_config = (await self.qdrant_client.get_collection(self.COLLECTION_NAME)).config.params.vectors
+        await create_qdrant_collection(dedicated, vector_size=vectors_config.size, client=self.qdrant_client)
+        self._project_collections.set(project_id, dedicated)
+        
+        moved = 0
+        while True:
+            batch_moved = await self._move_shared_points(project_id, dedicated)
+            if not batch_moved:
+                break
+            moved += batch_moved
+        print(f"[RAG] 项目 {project_id} 的 {moved} 个向量已迁移到独立集合 {dedicated}")
+        return True
+    
+    async def _move_shared_points(self, project_id: str, dedicated: str) -> int:
+        """
+        把共享集合中该项目的点复制到独立集合，并只删除已复制的点ID
+        Copy the project's points from the shared collection, deleting exactly the ids copied
+        
+        Returns:
+            移动的点数量
+        """
+        project_filter = Filter(must=[FieldCondition(key="projectId", match=MatchValue(value=project_id))])
+        moved = 0
+        offset = None
+        while True:
+            points, offset = await self.qdrant_client.scroll(
+                collection_name=self.COLLECTION_NAME,
+                scroll_filter=project_filter,
+                limit=1000,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            if points:
+                await self.qdrant_client.upsert(
+                    collection_name=dedicated,
+                    points=[
+                        PointStruct(id=point.id, vector=point.vector, payload=point.payload)
+                        for point in points
+                    ],
+                )
+                await self.qdrant_client.delete(
+                    collection_name=self.COLLECTION_NAME,
+                    points_selector=PointIdsList(points=[point.id for point in points]),
+                )
+                moved += len(points)
+            if offset is None:
+                return moved
 
 
 # 全局RAG服务实例（单例模式）
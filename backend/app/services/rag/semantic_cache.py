@@ -0,0 +1,184 @@
+"""
+RAG检索结果语义缓存
+Semantic cache of RAG search results keyed by query embedding similarity
+"""
+
+import hashlib
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.cache import LocalCache
+from app.core.config import get_settings
+
+
+def semantic_cache_scope(project_id: str, **search_options: Any) -> str:
+    """
+    检索范围的缓存键：同一项目、数据源和检索参数下的查询才能互相复用结果
+    Scope key: results are only shared between queries with the same project, sources and options
+    
+    Args:
+        project_id: 项目ID
+        search_options: 检索参数（source_ids、k、search_mode等，值需要可JSON序列化或为pydantic模型）
+    """
+    options = {
+        name: value.model_dump() if hasattr(value, "model_dump") else value
+        for name, value in search_options.items()
+    }
+    if "source_ids" in options:
+        options["source_ids"] = sorted(options["source_ids"] or [])
+    digest = hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return f"{project_id}:{digest[:32]}"
+
+
+class _ScopeEntries:
+    """一个检索范围内缓存的查询向量矩阵和结果"""
+    
+    def __init__(self, signature: str):
+        self.signature = signature
+        self.vectors: Optional[np.ndarray] = None
+        self.results: List[Any] = []
+        self.stored_at: List[float] = []
+
+
+class SemanticSearchCache:
+    """
+    检索结果语义缓存（进程内，按检索范围分组的NumPy矩阵）
+    In-process semantic cache: per scope, a matrix of normalised query embeddings and their results
+    
+    查询向量与已缓存查询的点积超过阈值，且数据源签名（版本号、更新时间）未变化时返回缓存的结果。
+    数据源重新导入或修改后签名变化，该范围内的条目全部失效。
+    A lookup hits when the best dot product clears the threshold and the data source signature
+    (versions and update times) is unchanged; any source change drops the whole scope.
+    
+    注意：非线程安全，仅在事件循环线程中使用
+    """
+    
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl: float = 600,
+        max_entries: int = 256,
+        max_scopes: int = 1000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        初始化缓存
+        
+        Args:
+            threshold: 命中的相似度下限
+            ttl: 条目有效期（秒）
+            max_entries: 每个范围的条目数上限（超出时淘汰最早的条目）
+            max_scopes: 范围数上限（超出时淘汰最久未使用的范围）
+            clock: 时钟（测试用）
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._scopes = LocalCache(max_entries=max_scopes)
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def lookup(self, scope: str, embedding: Sequence[float], signature: str) -> Optional[Any]:
+        """
+        查找相似查询的缓存结果
+        Return the cached results of the most similar query, or None
+        
+        Args:
+            scope: 检索范围（semantic_cache_scope）
+            embedding: 查询向量
+            signature: 当前数据源签名
+        """
+        entries: Optional[_ScopeEntries] = self._scopes.get(scope)
+        if entries is not None and entries.signature != signature:
+            # 数据源已变化，整个范围失效
+            self._scopes.delete(scope)
+            entries = None
+        if entries is None or entries.vectors is None or entries.vectors.shape[1] != len(embedding):
+            self.misses += 1
+            return None
+        
+        similarities = entries.vectors @ self._normalize(embedding)
+        expired = np.asarray(entries.stored_at) <= self._clock() - self.ttl
+        similarities[expired] = -np.inf
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entries.results[best]
+    
+    def store(self, scope: str, embedding: Sequence[float], signature: str, results: Any) -> None:
+        """
+        缓存一个查询的结果
+        Cache the results of one query
+        
+        Args:
+            scope: 检索范围
+            embedding: 查询向量
+            signature: 检索时的数据源签名
+            results: 检索结果
+        """
+        entries: Optional[_ScopeEntries] = self._scopes.get(scope)
+        if entries is None or entries.signature != signature:
+            entries = _ScopeEntries(signature)
+            self._scopes.set(scope, entries)
+        
+        vector = self._normalize(embedding)[np.newaxis, :]
+        now = self._clock()
+        # 丢弃过期条目，超出上限时淘汰最早的条目
+        keep = [i for i, stored_at in enumerate(entries.stored_at) if stored_at > now - self.ttl]
+        keep = keep[-(self.max_entries - 1):] if self.max_entries > 1 else []
+        if entries.vectors is not None and keep and entries.vectors.shape[1] == vector.shape[1]:
+            entries.vectors = np.concatenate([entries.vectors[keep], vector])
+            entries.results = [entries.results[i] for i in keep] + [results]
+            entries.stored_at = [entries.stored_at[i] for i in keep] + [now]
+        else:
+            entries.vectors = vector
+            entries.results = [results]
+            entries.stored_at = [now]
+    
+    def snapshot(self) -> Dict[str, float]:
+        """获取指标快照"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "scopes": len(self._scopes),
+        }
+
+
+# 全局语义缓存实例（单例模式）
+_semantic_cache: Optional[SemanticSearchCache] = None
+
+
+def get_semantic_cache() -> SemanticSearchCache:
+    """
+    获取检索结果语义缓存实例（单例）
+    Get semantic search cache instance (singleton)
+    
+    Returns:
+        语义缓存实例
+    """
+    global _semantic_cache
+    
+    if _semantic_cache is None:
+        settings = get_settings()
+        _semantic_cache = SemanticSearchCache(
+            threshold=settings.rag_semantic_cache_threshold,
+            ttl=settings.rag_semantic_cache_ttl,
+            max_entries=settings.rag_semantic_cache_max_entries,
+            max_scopes=settings.rag_semantic_cache_max_scopes,
+        )
+    
+    return _semantic_cache
@@ -0,0 +1,147 @@
+"""
+稀疏向量编码服务实现（BM25）
+BM25-style sparse vector encoder for hybrid retrieval
+"""
+
+import hashlib
+import re
+from collections import Counter
+from typing import List, Optional
+
+from qdrant_client.models import SparseVector
+
+from app.core.config import get_settings
+
+
+# 英文/数字词元，允许内部带连接符（零件号如 AB-1234/X、型号如 v2.1）
+_WORD_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+# CJK连续字符
+_CJK_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+_CONNECTORS = re.compile(r"[-_./]")
+
+_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "was", "were", "with",
+})
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    分词：英文按词（带连接符的编号额外拆分并生成去连接符形式），中文按字二元组
+    Tokenize: words for latin text (compound codes also yield their parts and a joined
+    form), character bigrams for CJK runs
+    
+    Args:
+        text: 文本
+    
+    Returns:
+        词元列表（保留重复，用于词频）
+    """
+    text = text.lower()
+    tokens: List[str] = []
+    
+    for match in _WORD_PATTERN.finditer(text):
+        word = match.group()
+        if word in _STOPWORDS:
+            continue
+        tokens.append(word)
+        parts = _CONNECTORS.split(word)
+        if len(parts) > 1:
+            tokens.append("".join(parts))
+            tokens.extend(part for part in parts if part not in _STOPWORDS)
+    
+    for match in _CJK_PATTERN.finditer(text):
+        run = match.group()
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    
+    return tokens
+
+
+def token_index(token: str) -> int:
+    """词元到稀疏向量维度的稳定哈希（uint32，与进程无关）"""
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+class SparseEncoderService:
+    """
+    BM25稀疏向量编码服务
+    BM25 sparse encoder
+    
+    文档向量存储BM25的词频饱和项，IDF由Qdrant集合的IDF modifier在服务端计算，
+    因此新增文档不需要重新计算已有向量。
+    Document vectors hold the BM25 term-frequency component; IDF is applied server-side
+    by the collection's IDF modifier, so adding documents never rewrites existing vectors.
+    """
+    
+    def __init__(self, k1: float = 1.2, b: float = 0.75, avg_doc_len: float = 200.0):
+        """
+        初始化编码服务
+        
+        Args:
+            k1: BM25词频饱和参数
+            b: BM25文档长度归一化参数
+            avg_doc_len: 平均文档长度（词元数）
+        """
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_len = avg_doc_len
+    
+    def encode_document(self, text: str) -> SparseVector:
+        """
+        编码文档（文本块）
+        Encode a document chunk
+        
+        Args:
+            text: 文本块
+        
+        Returns:
+            稀疏向量
+        """
+        counts = self._counts(tokenize(text))
+        doc_len = sum(counts.values())
+        norm = self.k1 * (1 - self.b + self.b * doc_len / self.avg_doc_len)
+        indices = sorted(counts)
+        values = [counts[i] * (self.k1 + 1) / (counts[i] + norm) for i in indices]
+        return SparseVector(indices=indices, values=values)
+    
+    def encode_query(self, text: str) -> SparseVector:
+        """
+        编码查询（每个词元权重为1，IDF由服务端加权）
+        Encode a query; each distinct token weighs 1 and the server applies IDF
+        
+        Args:
+            text: 查询文本
+        
+        Returns:
+            稀疏向量
+        """
+        indices = sorted(self._counts(tokenize(text)))
+        return SparseVector(indices=indices, values=[1.0] * len(indices))
+    
+    @staticmethod
+    def _counts(tokens: List[str]) -> Counter:
+        """按维度统计词频（哈希冲突的词元合并计数）"""
+        return Counter(token_index(token) for token in tokens)
+
+
+# 全局稀疏编码服务实例（单例模式）
+_sparse_encoder_service: Optional[SparseEncoderService] = None
+
+
+def get_sparse_encoder_service() -> SparseEncoderService:
+    """
+    获取稀疏编码服务实例（单例）
+    Get sparse encoder service instance (singleton)
+    
+    Returns:
+        稀疏编码服务实例
+    """
+    global _sparse_encoder_service
+    
+    if _sparse_encoder_service is None:
+        _sparse_encoder_service = SparseEncoderService(avg_doc_len=get_settings().rag_sparse_avg_doc_len)
+    
+    return _sparse_encoder_service
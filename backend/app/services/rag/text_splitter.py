@@ -1,16 +1,118 @@
 """
 文本分割服务实现
-Text splitter service implementation
+Text splitter service implementation (streaming recursive splitter, no langchain dependency)
 """
 
-from typing import List, Optional
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import hashlib
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Deque, Iterable, Iterator, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.services.rag.tokens import estimate_tokens
+
+
+# 块大小的度量单位
+LENGTH_FUNCTIONS = {
+    "chars": len,
+    "tokens": estimate_tokens,
+}
+
+
+class _ChunkMerger:
+    """
+    把小片段依次合并为不超过chunk_size的块，块之间保留不超过chunk_overlap的重叠
+    Greedily merge small pieces into chunks of at most chunk_size, carrying up to
+    chunk_overlap worth of trailing pieces into the next chunk
+    """
+    
+    def __init__(self, chunk_size: int, chunk_overlap: int, length_function: Callable[[str], int]):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self._length = length_function
+        self._pieces: Deque[Tuple[str, int]] = deque()
+        self._total = 0
+    
+    def add(self, piece: str) -> Iterator[str]:
+        """加入一个片段，返回因此完成的块"""
+        length = self._length(piece)
+        if self._total + length > self.chunk_size and self._pieces:
+            chunk = self._join()
+            if chunk:
+                yield chunk
+            # 从头部丢弃片段，直到剩余部分不超过重叠上限且能容纳新片段
+            while self._pieces and (
+                self._total > self.chunk_overlap or self._total + length > self.chunk_size
+            ):
+                self._total -= self._pieces.popleft()[1]
+        self._pieces.append((piece, length))
+        self._total += length
+    
+    def flush(self) -> Iterator[str]:
+        """输出剩余片段组成的块，并清空状态"""
+        chunk = self._join()
+        if chunk:
+            yield chunk
+        self._pieces.clear()
+        self._total = 0
+    
+    def _join(self) -> str:
+        return "".join(piece for piece, _ in self._pieces).strip()
+
+
+def _split_keep_separator(text: str, separator: str) -> List[str]:
+    """按分隔符切分，分隔符保留在后一个片段的开头（空分隔符按字符切分）"""
+    if not separator:
+        return list(text)
+    parts = text.split(separator)
+    pieces = [parts[0]] + [separator + part for part in parts[1:]]
+    return [piece for piece in pieces if piece]
+
+
+def _iter_pieces(buffer: str, blocks: Iterator[str], separator: str) -> Iterator[str]:
+    """
+    从文本流中惰性切出片段（与_split_keep_separator结果一致，跨块的分隔符也能识别）
+    Lazily cut pieces out of a text stream, matching _split_keep_separator on the whole text
+    """
+    if not separator:
+        yield from buffer
+        for block in blocks:
+            yield from block
+        return
+    
+    # start为当前片段在buffer中的起点，scan之前的位置已确认没有新的分隔符
+    start = scan = 0
+    while True:
+        position = buffer.find(separator, scan)
+        if position >= 0:
+            if position > start:
+                yield buffer[start:position]
+            start = position
+            scan = position + len(separator)
+            continue
+        block = next(blocks, None)
+        if block is None:
+            if len(buffer) > start:
+                yield buffer[start:]
+            return
+        # 丢弃已输出的部分；分隔符可能跨越块边界，从末尾回退len(separator)-1个字符继续查找
+        buffer = buffer[start:]
+        scan = max(scan - start, len(buffer) - len(separator) + 1)
+        start = 0
+        buffer += block
 
 
 class TextSplitterService:
     """
     文本分割服务
     Text splitter service for splitting documents into chunks
+    
+    递归按分隔符切分（先按段落，过长的段落再按行、句子、字符切分），再把小片段合并为块。
+    字符模式下的结果与langchain的RecursiveCharacterTextSplitter一致，已有向量的内容哈希不变。
+    Recursive separator splitting followed by greedy merging; in "chars" mode the output
+    matches langchain's RecursiveCharacterTextSplitter, so existing chunk hashes are stable.
     """
     
     def __init__(
@@ -18,6 +120,10 @@ class TextSplitterService:
         chunk_size: int = 1024,
         chunk_overlap: int = 20,
         separators: Optional[List[str]] = None,
+        length_unit: str = "chars",
+        lookahead_chars: int = 1_000_000,
+        parallel_min_chars: int = 2_000_000,
+        max_workers: Optional[int] = None,
     ):
         """
         初始化文本分割服务
@@ -27,15 +133,73 @@ class TextSplitterService:
             chunk_size: 块大小（默认1024）
             chunk_overlap: 块重叠大小（默认20）
             separators: 分隔符列表（默认：['\n\n', '\n', '. ', '.', '']）
+            length_unit: 块大小的单位（chars为字符数，tokens为估算的token数）
+            lookahead_chars: 流式切分时为确定顶层分隔符最多预读的字符数
+            parallel_min_chars: 批量分割的总字符数达到该值时使用进程池
+            max_workers: 进程池大小（默认为CPU核数）
         """
         if separators is None:
             separators = ['\n\n', '\n', '. ', '.', '']
+        if length_unit not in LENGTH_FUNCTIONS:
+            raise ValueError(f"未知的块大小单位: {length_unit}（可选: {', '.join(LENGTH_FUNCTIONS)}）")
         
-        self.splitter = RecursiveCharacterTextSplitter(
-            separators=separators,
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-        )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = separators
+        self.length_unit = length_unit
+        self.lookahead_chars = lookahead_chars
+        self.parallel_min_chars = parallel_min_chars
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+    
+    def __getstate__(self):
+        # 进程池不随实例发送到子进程
+        state = self.__dict__.copy()
+        state["_process_pool"] = None
+        return state
+    
+    @property
+    def _length(self) -> Callable[[str], int]:
+        return LENGTH_FUNCTIONS[self.length_unit]
+    
+    @property
+    def config_key(self) -> str:
+        """分块配置的标识（配置相同则同一文本的分块结果相同，用于缓存分块结果）"""
+        separators = hashlib.sha1(json.dumps(self.separators).encode("utf-8")).hexdigest()[:8]
+        return f"{self.length_unit}-{self.chunk_size}-{self.chunk_overlap}-{separators}"
+    
+    def iter_chunks(self, stream: Iterable[str]) -> Iterator[str]:
+        """
+        流式分割：惰性读取文本块，边读边输出完成的文本块
+        Split a text stream lazily, yielding chunks as soon as they are complete
+        
+        顶层分隔符取文本中出现的优先级最高的分隔符，需要预读到第一个分隔符（最多lookahead_chars字符）
+        才能确定；超过预读上限仍未出现时按预读部分选择（仅此时与整段分割的结果可能不同）。
+        The top-level separator is the highest-priority one present in the text, so the
+        stream is read ahead until it appears (capped at lookahead_chars).
+        
+        Args:
+            stream: 文本流（任意大小的字符串块）
+        
+        Yields:
+            文本块
+        """
+        blocks = iter(stream)
+        buffer = ""
+        top = self.separators[0]
+        found = top == ""
+        while not found and len(buffer) < self.lookahead_chars:
+            block = next(blocks, None)
+            if block is None:
+                # 整个文本都在缓冲区中
+                yield from self._split(buffer, self.separators)
+                return
+            searched = max(0, len(buffer) - len(top) + 1)
+            buffer += block
+            found = buffer.find(top, searched) >= 0
+        
+        separator, rest = self._choose_separator(buffer, self.separators)
+        yield from self._merge(_iter_pieces(buffer, blocks, separator), rest)
     
     def split_text(self, text: str) -> List[str]:
         """
@@ -44,29 +208,70 @@ class TextSplitterService:
         
         Args:
             text: 文本内容
-            
+        
         Returns:
             文本块列表
         """
-        documents = self.splitter.create_documents([text])
-        return [doc.page_content for doc in documents]
+        return list(self._split(text, self.separators))
     
     def split_documents(self, texts: List[str]) -> List[str]:
         """
-        批量分割文本
-        Split multiple texts into chunks
+        批量分割文本（总量较大时分发到进程池并行分割）
+        Split multiple texts into chunks, fanning out to a process pool for large batches
         
         Args:
             texts: 文本列表
-            
+        
         Returns:
             文本块列表
         """
+        if len(texts) > 1 and sum(len(text) for text in texts) >= self.parallel_min_chars:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            chunksize = max(1, len(texts) // (self.max_workers * 4))
+            results = self._process_pool.map(self.split_text, texts, chunksize=chunksize)
+        else:
+            results = map(self.split_text, texts)
+        
         all_chunks = []
-        for text in texts:
-            chunks = self.split_text(text)
+        for chunks in results:
             all_chunks.extend(chunks)
         return all_chunks
+    
+    def close(self) -> None:
+        """关闭进程池"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown()
+            self._process_pool = None
+    
+    @staticmethod
+    def _choose_separator(text: str, separators: List[str]) -> Tuple[str, List[str]]:
+        """选择文本中出现的优先级最高的分隔符，返回(分隔符, 更细的分隔符)"""
+        for i, separator in enumerate(separators):
+            if separator == "":
+                return separator, []
+            if separator in text:
+                return separator, separators[i + 1:]
+        return separators[-1], []
+    
+    def _split(self, text: str, separators: List[str]) -> Iterator[str]:
+        """递归分割一段完整的文本"""
+        separator, rest = self._choose_separator(text, separators)
+        yield from self._merge(_split_keep_separator(text, separator), rest)
+    
+    def _merge(self, pieces: Iterable[str], rest: List[str]) -> Iterator[str]:
+        """合并片段为块；超过块大小的片段用更细的分隔符递归分割"""
+        merger = _ChunkMerger(self.chunk_size, self.chunk_overlap, self._length)
+        for piece in pieces:
+            if self._length(piece) < self.chunk_size:
+                yield from merger.add(piece)
+                continue
+            yield from merger.flush()
+            if rest:
+                yield from self._split(piece, rest)
+            else:
+                yield piece
+        yield from merger.flush()
 
 
 # 全局文本分割服务实例（单例模式）
@@ -84,7 +289,13 @@ def get_text_splitter_service() -> TextSplitterService:
     global _text_splitter_service
     
     if _text_splitter_service is None:
-        _text_splitter_service = TextSplitterService()
+        settings = get_settings()
+        _text_splitter_service = TextSplitterService(
+            chunk_size=settings.rag_chunk_size,
+            chunk_overlap=settings.rag_chunk_overlap,
+            length_unit=settings.rag_chunk_size_unit,
+            parallel_min_chars=settings.rag_split_parallel_min_chars,
+            max_workers=settings.rag_split_pool_workers or None,
+        )
     
     return _text_splitter_service
-
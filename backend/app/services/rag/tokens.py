@@ -0,0 +1,15 @@
+"""
+Token估算
+Cheap token-count estimate shared by chunking, rate limiting and excerpting
+"""
+
+import re
+
+
+_CJK_CHAR = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+
+
+def estimate_tokens(text: str) -> int:
+    """估算token数：中文约每字1个token，其他文本约每4个字符1个token"""
+    cjk = len(_CJK_CHAR.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
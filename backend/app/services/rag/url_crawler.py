@@ -0,0 +1,348 @@
+"""
+URL数据源抓取
+Async crawler for URL data sources: pooled client, per-host politeness, conditional GET
+"""
+
+import asyncio
+import codecs
+import hashlib
+import re
+import time
+from html.parser import HTMLParser
+from typing import AsyncIterator, Dict, List, Optional
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+
+from app.core.config import get_settings
+from app.core.http_client import create_http_client, request_with_retry
+
+
+# 不输出文本的元素（内容为脚本、样式或不可见部分）
+_SKIP_TAGS = frozenset({"script", "style", "noscript", "template", "svg", "iframe", "head"})
+
+# 块级元素：前后换段
+_BLOCK_TAGS = frozenset({
+    "p", "div", "section", "article", "main", "header", "footer", "aside", "nav",
+    "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "table", "blockquote", "pre",
+    "figure", "form", "hr", "dl",
+})
+
+# 行级换行的元素
+_LINE_TAGS = frozenset({"br", "li", "tr", "dt", "dd"})
+
+_WHITESPACE = re.compile(r"\s+")
+_BLANK_LINES = re.compile(r"\n\s*\n\s*")
+
+_TEXT_TYPES = ("text/plain", "text/markdown", "text/x-markdown")
+_HTML_TYPES = ("text/html", "application/xhtml+xml")
+
+
+def content_hash(text: str) -> str:
+    """提取文本的SHA-256哈希（判断页面内容是否变化）"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class _TextExtractor(HTMLParser):
+    """
+    增量HTML文本提取：跳过脚本和样式，块级元素之间空一行
+    Incremental HTML → text extraction; feed() body pieces and drain() text as it is ready
+    """
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self._skip_depth = 0
+        self._pre_depth = 0
+        self._in_title = False
+        self._parts: List[str] = []
+    
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self._in_title = True
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "pre":
+            self._pre_depth += 1
+        if tag in _BLOCK_TAGS:
+            self._parts.append("\n\n")
+        elif tag in _LINE_TAGS:
+            self._parts.append("\n")
+    
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == "pre":
+            self._pre_depth = max(0, self._pre_depth - 1)
+        if tag in _BLOCK_TAGS:
+            self._parts.append("\n\n")
+    
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        if self._skip_depth:
+            return
+        self._parts.append(data if self._pre_depth else _WHITESPACE.sub(" ", data))
+    
+    def drain(self) -> str:
+        """取出已提取的文本"""
+        text = "".join(self._parts)
+        self._parts.clear()
+        return text
+
+
+def _normalize(text: str) -> str:
+    """整理空白：行首尾空格去除，多个空行合并为一个"""
+    lines = [line.strip() for line in text.split("\n")]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+class CrawlResult:
+    """
+    单个URL的抓取结果
+    Outcome of fetching one URL
+    """
+    
+    def __init__(
+        self,
+        url: str,
+        status_code: int,
+        text: str = "",
+        title: str = "",
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        truncated: bool = False,
+    ):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.title = title
+        self.etag = etag
+        self.last_modified = last_modified
+        self.truncated = truncated
+        self.content_hash = content_hash(text) if status_code != 304 else None
+    
+    @property
+    def not_modified(self) -> bool:
+        """服务器返回304（页面未变化）"""
+        return self.status_code == 304
+
+
+class _HostState:
+    """单个host的并发限制、请求间隔和robots.txt规则"""
+    
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.lock = asyncio.Lock()
+        self.next_request_at = 0.0
+        self.robots: Optional[RobotFileParser] = None
+
+
+class UrlCrawler:
+    """
+    URL抓取器
+    Async URL crawler sharing one pooled httpx client across hosts
+    
+    同一host的请求受并发数和最小间隔限制，并遵守robots.txt；带上次的ETag/Last-Modified
+    发送条件请求，页面未变化时服务器返回304，不下载也不重新处理。
+    Requests to one host are capped by concurrency and spaced by a minimum delay; the
+    previous ETag/Last-Modified are sent so unchanged pages come back as 304.
+    """
+    
+    def __init__(
+        self,
+        per_host_concurrency: Optional[int] = None,
+        host_delay: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        """
+        初始化抓取器（参数默认取配置）
+        
+        Args:
+            per_host_concurrency: 同一host的最大并发抓取数
+            host_delay: 同一host相邻两次请求的最小间隔（秒）
+            max_bytes: 单个页面的最大下载字节数（超出部分被截断）
+            client: HTTP客户端（默认创建带连接池的客户端）
+        """
+        self.settings = get_settings()
+        self.per_host_concurrency = per_host_concurrency or self.settings.crawler_per_host_concurrency
+        self.host_delay = self.settings.crawler_host_delay if host_delay is None else host_delay
+        self.max_bytes = max_bytes or self.settings.crawler_max_bytes
+        self._client = client
+        self._hosts: Dict[str, _HostState] = {}
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = create_http_client(
+                limits=httpx.Limits(
+                    max_connections=self.settings.crawler_max_connections,
+                    max_keepalive_connections=self.settings.crawler_max_connections,
+                ),
+                timeout=self.settings.crawler_timeout,
+                follow_redirects=True,
+                headers={"User-Agent": self.settings.crawler_user_agent},
+            )
+        return self._client
+    
+    async def close(self) -> None:
+        """关闭HTTP客户端"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def fetch(
+        self,
+        url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> CrawlResult:
+        """
+        抓取URL并提取文本
+        Fetch a URL (conditionally, when validators are given) and extract its text
+        
+        Args:
+            url: 页面URL
+            etag: 上次抓取的ETag
+            last_modified: 上次抓取的Last-Modified
+        
+        Returns:
+            抓取结果（not_modified为True时text为空）
+        
+        Raises:
+            ValueError: URL无效、被robots.txt禁止、请求失败或内容类型不支持
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.netloc:
+            raise ValueError(f"无效的URL: {url}")
+        host = f"{parts.scheme}://{parts.netloc}".lower()
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.per_host_concurrency)
+        
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        
+        async with state.semaphore:
+            if self.settings.crawler_respect_robots and not await self._allowed(host, state, url):
+                raise ValueError(f"robots.txt禁止抓取: {url}")
+            await self._wait_turn(state)
+            response = await request_with_retry(
+                self.client, "GET", url, headers=headers, stream=True,
+                max_retries=self.settings.crawler_max_retries,
+            )
+            try:
+                return await self._read(url, response)
+            finally:
+                await response.aclose()
+    
+    async def _wait_turn(self, state: _HostState) -> None:
+        """按最小间隔为同一host的请求排队"""
+        async with state.lock:
+            now = time.monotonic()
+            start_at = max(now, state.next_request_at)
+            state.next_request_at = start_at + self.host_delay
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+    
+    async def _allowed(self, host: str, state: _HostState, url: str) -> bool:
+        """检查robots.txt（每个host只获取一次，获取失败视为不限制）"""
+        async with state.lock:
+            if state.robots is None:
+                robots = RobotFileParser(f"{host}/robots.txt")
+                try:
+                    response = await self.client.get(f"{host}/robots.txt")
+                    if response.status_code in (401, 403):
+                        robots.disallow_all = True
+                    elif response.status_code == 200:
+                        robots.parse(response.text.splitlines())
+                    else:
+                        robots.allow_all = True
+                except httpx.HTTPError:
+                    robots.allow_all = True
+                state.robots = robots
+        return state.robots.can_fetch(self.settings.crawler_user_agent, url)
+    
+    async def _read(self, url: str, response: httpx.Response) -> CrawlResult:
+        """读取响应体（不超过max_bytes）并提取文本"""
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if response.status_code == 304:
+            return CrawlResult(url, 304, etag=etag, last_modified=last_modified)
+        if response.status_code >= 400:
+            raise ValueError(f"抓取失败: {url} 返回 {response.status_code}")
+        
+        content_type = response.headers.get("content-type", "text/html").split(";")[0].strip().lower()
+        if content_type not in _HTML_TYPES and content_type not in _TEXT_TYPES:
+            raise ValueError(f"暂不支持的页面类型: {content_type}")
+        
+        extractor = _TextExtractor() if content_type in _HTML_TYPES else None
+        parts: List[str] = []
+        truncated = False
+        async for text in self._iter_body_text(response):
+            if text is None:
+                truncated = True
+                continue
+            if extractor is None:
+                parts.append(text)
+            else:
+                extractor.feed(text)
+                parts.append(extractor.drain())
+        
+        title = ""
+        if extractor is not None:
+            extractor.close()
+            parts.append(extractor.drain())
+            title = _WHITESPACE.sub(" ", extractor.title).strip()
+        if truncated:
+            print(f"[Crawler] {url} 超过 {self.max_bytes} 字节，已截断")
+        
+        return CrawlResult(
+            str(response.url), response.status_code, _normalize("".join(parts)), title,
+            etag=etag, last_modified=last_modified, truncated=truncated,
+        )
+    
+    async def _iter_body_text(self, response: httpx.Response) -> AsyncIterator[Optional[str]]:
+        """增量解码响应体；超过max_bytes时输出None后结束"""
+        encoding = response.charset_encoding or "utf-8"
+        try:
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        received = 0
+        async for data in response.aiter_bytes():
+            remaining = self.max_bytes - received
+            received += len(data)
+            if received > self.max_bytes:
+                yield decoder.decode(data[:remaining], final=True)
+                yield None
+                return
+            yield decoder.decode(data)
+        yield decoder.decode(b"", final=True)
+
+
+# 全局URL抓取器实例（单例模式）
+_url_crawler: Optional[UrlCrawler] = None
+
+
+def get_url_crawler() -> UrlCrawler:
+    """
+    获取URL抓取器实例（单例）
+    Get URL crawler instance (singleton)
+    
+    Returns:
+        URL抓取器实例
+    """
+    global _url_crawler
+    
+    if _url_crawler is None:
+        _url_crawler = UrlCrawler()
+    
+    return _url_crawler
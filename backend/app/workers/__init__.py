@@ -0,0 +1,4 @@
+"""
+后台任务
+Background workers
+"""
@@ -0,0 +1,743 @@
+"""
+数据源导入Worker
+Data source ingestion worker: fetch → split → diff → embed → upsert
+
+用法 / Usage:
+    python -m app.workers.ingestion_worker
+
+可以在多个进程/机器上同时运行，数据源通过MongoDB租约认领，不会被重复处理。
+Run as many processes as needed; sources are claimed through MongoDB leases.
+"""
+
+import asyncio
+import os
+import signal
+import socket
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.config import get_settings
+from app.models.schemas import DataSource, DataSourceDoc, DataSourceStatus
+from app.repositories.data_sources import DataSourcesRepository
+from app.repositories.data_source_docs import DataSourceDocsRepository
+from app.services.rag.embedding_service import get_embedding_service
+from app.services.rag.extraction_cache import file_sha256, get_extraction_cache
+from app.services.rag.file_reader import detect_format, iter_file_text, read_file_text
+from app.services.rag.rag_service import chunk_hash, chunk_point_id, get_rag_service
+from app.services.rag.text_splitter import get_text_splitter_service
+from app.services.rag.url_crawler import get_url_crawler
+
+
+# 队列结束标记
+_DONE = object()
+
+
+async def _gather_or_cancel(*aws: Awaitable[Any]) -> None:
+    """
+    并发运行，任意一个失败时取消其余任务（避免阻塞在队列上的消费者永远挂起）
+    Run concurrently; the first failure cancels the rest instead of leaving them blocked on queues
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class DocWork:
+    """
+    流水线中单个文档的处理状态
+    Per-document state carried between pipeline stages
+    """
+    
+    def __init__(self, doc: DataSourceDoc):
+        self.doc = doc
+        self.content: str = ""
+        # 本地文件的内容哈希和格式（用于提取结果缓存）
+        self.file_hash: Optional[str] = None
+        self.file_format: Optional[str] = None
+        # 需要embedding并写入的新文本块（已去除清单中存在的块）及其在文档中的位置
+        self.chunks: List[str] = []
+        self.chunk_indices: List[int] = []
+        self.embeddings: List[List[float]] = []
+        # 复用但位置变化的块：点ID -> 新位置
+        self.moved_indices: Dict[str, int] = {}
+        # 内容已消失、需要删除的点
+        self.stale_point_ids: List[str] = []
+        self.reused = 0
+        # 标记ready时一并写入的文档字段（如URL的条件请求校验值）
+        self.doc_updates: Dict[str, Any] = {}
+
+
+class IngestionWorker:
+    """
+    数据源导入Worker
+    Claims pending data sources and streams their docs through bounded
+    fetch → split → diff → embed → upsert stages
+    
+    diff阶段对比文档已有的文本块哈希清单，只embedding新增或变化的块，并删除消失的块，
+    重新同步的成本与变化量成正比。
+    The diff stage checks the doc's existing chunk-hash manifest so only new or
+    changed chunks are embedded and vanished ones deleted.
+    """
+    
+    def __init__(self, worker_id: Optional[str] = None):
+        """
+        初始化Worker
+        
+        Args:
+            worker_id: Worker标识（用于日志），默认使用主机名和进程ID
+        """
+        self.settings = get_settings()
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.data_sources_repository = DataSourcesRepository()
+        self.docs_repository = DataSourceDocsRepository()
+        self.embedding_service = get_embedding_service()
+        self.rag_service = get_rag_service()
+        self.text_splitter = get_text_splitter_service()
+        self.url_crawler = get_url_crawler()
+        self.extraction_cache = get_extraction_cache() if self.settings.rag_extraction_cache_enabled else None
+        self._stopping = asyncio.Event()
+    
+    def stop(self) -> None:
+        """请求停止（处理完当前数据源后退出）"""
+        self._stopping.set()
+    
+    async def run_forever(self) -> None:
+        """
+        持续轮询并处理数据源
+        Poll and process data sources until stop() is called
+        """
+        print(f"[Ingestion:{self.worker_id}] 已启动")
+        last_sweep_at = time.monotonic()
+        while not self._stopping.is_set():
+            sweep_interval = self.settings.ingestion_orphan_sweep_interval
+            if sweep_interval > 0 and time.monotonic() - last_sweep_at >= sweep_interval:
+                last_sweep_at = time.monotonic()
+                try:
+                    await self.sweep_orphans()
+                except Exception as e:
+                    print(f"[Ingestion:{self.worker_id}] 孤儿向量清理失败: {e}")
+                if self.extraction_cache is not None:
+                    removed = await self._cache_io(self.extraction_cache.prune)
+                    if removed:
+                        print(f"[Ingestion:{self.worker_id}] 提取结果缓存淘汰 {removed} 个文件")
+            
+            try:
+                processed = await self.run_once()
+            except Exception as e:
+                print(f"[Ingestion:{self.worker_id}] 轮询失败: {e}")
+                processed = False
+            
+            if not processed:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.settings.ingestion_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        print(f"[Ingestion:{self.worker_id}] 已停止")
+    
+    async def run_once(self) -> bool:
+        """
+        认领并处理一个数据源（优先处理待删除的数据源）
+        Claim and process a single data source, deletions first
+        
+        Returns:
+            是否认领到了数据源
+        """
+        source = await self.data_sources_repository.poll_delete_job(
+            lease_seconds=self.settings.ingestion_lease_seconds,
+            max_attempts=self.settings.ingestion_max_attempts,
+        )
+        if source is not None:
+            await self.process_deleted_source(source)
+            return True
+        
+        source = await self.data_sources_repository.poll_pending_job(
+            lease_seconds=self.settings.ingestion_lease_seconds,
+            max_attempts=self.settings.ingestion_max_attempts,
+        )
+        if source is None:
+            return False
+        
+        await self.process_source(source)
+        return True
+    
+    async def process_deleted_source(self, source: DataSource) -> None:
+        """
+        清理已软删除的数据源：按过滤条件删除向量、删除文档和数据源记录
+        Clean up a soft-deleted source: filter-delete its vectors, then its docs and record
+        
+        Args:
+            source: 已认领的待删除数据源
+        """
+        prefix = f"[Ingestion:{self.worker_id}] {source.id}-{source.version}"
+        print(f"{prefix} 开始删除，第{source.attempts}次尝试")
+        
+        def on_progress(deleted: int, total: int) -> None:
+            print(f"{prefix} 删除向量进度: {deleted}/{total}")
+        
+        try:
+            deleted = await self.rag_service.delete_embeddings(
+                source.project_id, source_id=source.id, on_progress=on_progress,
+            )
+            await self.docs_repository.delete_by_source_id(source.id)
+            await self.data_sources_repository.delete(source.id)
+        except Exception as e:
+            # 租约过期后会被重新认领
+            print(f"{prefix} 删除失败，将重试: {e}")
+            return
+        print(f"{prefix} 删除完成，共删除 {deleted} 个向量")
+    
+    async def sweep_orphans(self) -> int:
+        """
+        清理孤儿向量：Qdrant中sourceId对应的数据源记录已不存在
+        Delete vectors whose sourceId no longer has a data source record
+        
+        Returns:
+            清理的数据源数量
+        """
+        indexed_ids = await self.rag_service.list_indexed_source_ids()
+        if not indexed_ids:
+            return 0
+        
+        existing_ids = await self.data_sources_repository.find_existing_ids(list(indexed_ids))
+        orphan_ids = sorted(indexed_ids - existing_ids)
+        for source_id in orphan_ids:
+            deleted = await self.rag_service.delete_source_embeddings(source_id)
+            print(f"[Ingestion:{self.worker_id}] 清理孤儿数据源 {source_id} 的 {deleted} 个向量")
+        return len(orphan_ids)
+    
+    async def process_source(self, source: DataSource) -> None:
+        """
+        处理一个已认领的数据源，并释放租约
+        Process a claimed data source and release its lease with the outcome
+        
+        Args:
+            source: 已认领的数据源
+        """
+        prefix = f"[Ingestion:{self.worker_id}] {source.id}-{source.version}"
+        print(f"{prefix} 开始处理，类型: {source.data.type}，第{source.attempts}次尝试")
+        
+        heartbeat = asyncio.create_task(self._heartbeat(source))
+        try:
+            docs = await self.docs_repository.list_all(
+                source.id, [DataSourceStatus.PENDING.value, DataSourceStatus.ERROR.value]
+            )
+            print(f"{prefix} 找到 {len(docs)} 个待处理文档")
+            failed = await self.run_pipeline(source, docs)
+            failed += await self._delete_removed_docs(source)
+        except Exception as e:
+            print(f"{prefix} 处理失败，将重试: {e}")
+            await self.data_sources_repository.release(source.id, source.version, {
+                "status": DataSourceStatus.ERROR.value,
+                "error": str(e),
+            })
+            return
+        finally:
+            heartbeat.cancel()
+        
+        print(f"{prefix} 处理完成，失败文档数: {failed}")
+        scheduler = getattr(self.embedding_service, "scheduler", None)
+        if scheduler is not None:
+            stats = scheduler.metrics.snapshot()
+            print(
+                f"{prefix} Embedding吞吐（近{scheduler.metrics.window:.0f}秒）: "
+                f"{stats['texts_per_sec']:.1f} 块/秒，{stats['tokens_per_sec']:.0f} tokens/秒，"
+                f"限流等待 {stats['throttled_seconds']:.1f} 秒，429重试 {stats['rate_limited_retries']} 次"
+            )
+        await self.data_sources_repository.release(source.id, source.version, {
+            "status": DataSourceStatus.ERROR.value if failed else DataSourceStatus.READY.value,
+            "error": "There were some errors processing this job" if failed else None,
+        })
+        
+        # 项目规模超过阈值时拆分到独立集合
+        try:
+            await self.rag_service.promote_project_collection(source.project_id)
+        except Exception as e:
+            print(f"{prefix} 迁移项目独立集合失败: {e}")
+    
+    async def _delete_removed_docs(self, source: DataSource) -> int:
+        """
+        删除数据源中已标记为deleted的文档及其向量（原项目runDeletionPipeline）
+        Remove docs marked deleted within a source, together with their vectors
+        
+        Returns:
+            删除失败的文档数量
+        """
+        failed = 0
+        for doc in await self.docs_repository.list_all(source.id, [DataSourceStatus.DELETED.value]):
+            try:
+                await self.rag_service.delete_embeddings(source.project_id, source_id=source.id, doc_id=doc.id)
+                await self.docs_repository.delete(doc.id)
+            except Exception as e:
+                failed += 1
+                print(f"[Ingestion:{self.worker_id}] {source.id} 文档 {doc.id} 删除失败: {e}")
+                await self.docs_repository.update_by_version(doc.id, doc.version, {
+                    "status": DataSourceStatus.ERROR.value,
+                    "error": "Error deleting doc",
+                })
+        return failed
+    
+    async def _heartbeat(self, source: DataSource) -> None:
+        """处理期间定期续租，避免长任务被其他worker重新认领"""
+        interval = max(1.0, self.settings.ingestion_lease_seconds / 3)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self.data_sources_repository.renew_lease(source.id, source.version):
+                    print(f"[Ingestion:{self.worker_id}] {source.id} 续租失败（数据源已被修改）")
+            except Exception as e:
+                print(f"[Ingestion:{self.worker_id}] {source.id} 续租出错: {e}")
+    
+    async def run_pipeline(self, source: DataSource, docs: List[DataSourceDoc]) -> int:
+        """
+        通过有界队列串联各阶段处理文档
+        Stream docs through the bounded fetch → split → diff → embed → upsert stages
+        
+        Args:
+            source: 数据源
+            docs: 待处理文档
+        
+        Returns:
+            处理失败的文档数量
+        """
+        size = self.settings.ingestion_queue_size
+        fetch_queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        split_queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        diff_queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        embed_queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        upsert_queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        failures: List[str] = []
+        
+        async def feed() -> None:
+            for doc in docs:
+                await fetch_queue.put(DocWork(doc))
+            await fetch_queue.put(_DONE)
+        
+        async def fetch(work: DocWork) -> Optional[DocWork]:
+            local_file = self._local_file(work.doc)
+            if local_file is not None:
+                size = (await asyncio.to_thread(local_file[0].stat)).st_size
+                if size >= self.settings.ingestion_stream_min_bytes:
+                    # 大文件在本阶段内流式完成全部处理，不进入后续阶段
+                    await self._ingest_file_stream(source, work, *local_file)
+                    return None
+            if work.doc.data.get("type") == "url":
+                return work if await self._fetch_url(source, work) else None
+            if local_file is not None and self.extraction_cache is not None:
+                work.content = await self._read_local_file(work, *local_file)
+                return work
+            work.content = await self._fetch_content(work.doc)
+            return work
+        
+        async def split(work: DocWork) -> DocWork:
+            await self._split(work)
+            return work
+        
+        async def diff(work: DocWork) -> DocWork:
+            await self._diff_against_manifest(source, work)
+            return work
+        
+        async def embed(work: DocWork) -> DocWork:
+            await self._embed(work)
+            return work
+        
+        async def upsert(work: DocWork) -> None:
+            await self._upsert_doc(source, work)
+        
+        async def on_error(work: DocWork, error: Exception) -> None:
+            failures.append(work.doc.id)
+            print(f"[Ingestion:{self.worker_id}] {source.id} 文档 {work.doc.id} 处理失败: {error}")
+            try:
+                await self.docs_repository.update_by_version(work.doc.id, work.doc.version, {
+                    "status": DataSourceStatus.ERROR.value,
+                    "error": f"Error processing doc: {error}",
+                })
+            except Exception as e:
+                # 状态写入失败不能让消费者退出，否则下游阶段收不到结束标记
+                print(f"[Ingestion:{self.worker_id}] {source.id} 文档 {work.doc.id} 错误状态写入失败: {e}")
+        
+        await _gather_or_cancel(
+            feed(),
+            self._run_stage(fetch_queue, split_queue, fetch, on_error, concurrency=2),
+            self._run_stage(split_queue, diff_queue, split, on_error, concurrency=1),
+            self._run_stage(diff_queue, embed_queue, diff, on_error, concurrency=2),
+            self._run_stage(embed_queue, upsert_queue, embed, on_error,
+                            concurrency=self.settings.ingestion_embed_concurrency),
+            self._run_stage(upsert_queue, None, upsert, on_error, concurrency=1),
+        )
+        return len(failures)
+    
+    @staticmethod
+    async def _run_stage(
+        inbox: asyncio.Queue,
+        outbox: Optional[asyncio.Queue],
+        handler: Callable[[DocWork], Awaitable[Any]],
+        on_error: Callable[[DocWork, Exception], Awaitable[None]],
+        concurrency: int,
+    ) -> None:
+        """
+        运行一个流水线阶段：并发消费inbox，把结果放入outbox（队列满时反压）
+        Run one stage with `concurrency` consumers; a full outbox applies back-pressure
+        """
+        async def consume() -> None:
+            while True:
+                work = await inbox.get()
+                if work is _DONE:
+                    # 让同一阶段的其他消费者也能看到结束标记
+                    await inbox.put(_DONE)
+                    return
+                try:
+                    result = await handler(work)
+                except Exception as e:
+                    await on_error(work, e)
+                    continue
+                # 返回None表示该文档已在本阶段处理完毕
+                if outbox is not None and result is not None:
+                    await outbox.put(result)
+        
+        await _gather_or_cancel(*[consume() for _ in range(max(1, concurrency))])
+        if outbox is not None:
+            await outbox.put(_DONE)
+    
+    async def _fetch_content(self, doc: DataSourceDoc) -> str:
+        """
+        获取文档内容
+        Get the text content of a doc
+        
+        Args:
+            doc: 文档
+        
+        Returns:
+            文本内容
+        """
+        doc_type = doc.data.get("type")
+        if doc_type == "text":
+            return doc.data.get("content") or ""
+        
+        if doc_type == "file_local":
+            file_path, fmt = self._local_file(doc)
+            return await asyncio.to_thread(read_file_text, file_path, fmt)
+        
+        raise ValueError(f"暂不支持的文档类型: {doc_type}")
+    
+    async def _fetch_url(self, source: DataSource, work: DocWork) -> bool:
+        """
+        抓取URL文档；页面未变化（304或内容哈希相同）时直接标记ready，跳过分块和embedding
+        Crawl a URL doc; unchanged pages (304 or same content hash) are marked ready directly
+        
+        Returns:
+            页面是否需要继续处理
+        """
+        data = work.doc.data
+        result = await self.url_crawler.fetch(data["url"], data.get("etag"), data.get("lastModified"))
+        validators = {"data.etag": result.etag, "data.lastModified": result.last_modified}
+        if result.not_modified:
+            # 304通常不带Last-Modified（也可能不带ETag），缺少的校验值沿用已保存的，否则之后每次都会全量下载
+            validators = {
+                "data.etag": result.etag or data.get("etag"),
+                "data.lastModified": result.last_modified or data.get("lastModified"),
+            }
+        
+        if result.not_modified or result.content_hash == data.get("contentHash"):
+            print(
+                f"[Ingestion:{self.worker_id}] {source.id} 文档 {work.doc.id}: 页面未变化"
+                f"（{'304' if result.not_modified else '内容哈希相同'}），跳过"
+            )
+            await self.docs_repository.update_by_version(work.doc.id, work.doc.version, {
+                "status": DataSourceStatus.READY.value,
+                "error": None,
+                **validators,
+            })
+            return False
+        
+        work.content = result.text
+        work.doc_updates = {**validators, "data.contentHash": result.content_hash}
+        return True
+    
+    async def _read_local_file(self, work: DocWork, file_path: Path, fmt: str) -> str:
+        """读取本地文件文本，优先使用提取结果缓存（按文件SHA-256）"""
+        work.file_hash = await asyncio.to_thread(file_sha256, file_path)
+        work.file_format = fmt
+        text = await self._cache_io(self.extraction_cache.get_text, work.file_hash, fmt)
+        if text is None:
+            text = await asyncio.to_thread(read_file_text, file_path, fmt)
+            await self._cache_io(self.extraction_cache.put_text, work.file_hash, fmt, text)
+        return text
+    
+    async def _split(self, work: DocWork) -> None:
+        """分块（本地文件优先使用缓存的分块结果）"""
+        cache_key = None
+        if work.file_hash is not None:
+            cache_key = (work.file_hash, work.file_format, self.text_splitter.config_key)
+            chunks = await self._cache_io(self.extraction_cache.get_chunks, *cache_key)
+            if chunks is not None:
+                work.chunks = chunks
+                return
+        work.chunks = await asyncio.to_thread(self.text_splitter.split_text, work.content)
+        if cache_key is not None:
+            await self._cache_io(self.extraction_cache.put_chunks, *cache_key, work.chunks)
+    
+    async def _embed(self, work: DocWork) -> None:
+        """
+        分批embedding新块；本地文件的块优先复用缓存中同一模型的向量，新算出的向量写回缓存
+        Embed new chunks in batches, reusing cached vectors from the same model for local files
+        """
+        model = self.embedding_service.model
+        cached: Dict[str, List[float]] = {}
+        if work.file_hash is not None:
+            cached = await self._cache_io(self.extraction_cache.get_embeddings, work.file_hash, model) or {}
+        
+        hashes = [chunk_hash(chunk) for chunk in work.chunks]
+        missing = [chunk for chunk, key in zip(work.chunks, hashes) if key not in cached]
+        fetched: Dict[str, List[float]] = {}
+        batch_size = self.settings.ingestion_embed_batch_size
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i:i + batch_size]
+            embeddings, _ = await self.embedding_service.embed_many(batch)
+            fetched.update(zip((chunk_hash(chunk) for chunk in batch), embeddings))
+        work.embeddings = [cached[key] if key in cached else fetched[key] for key in hashes]
+        
+        if work.file_hash is not None and fetched:
+            await self._cache_io(self.extraction_cache.put_embeddings, work.file_hash, model, fetched)
+    
+    async def _cache_io(self, func: Callable[..., Any], *args: Any) -> Any:
+        """在线程中执行缓存读写；缓存不可用（如目录不可写）时记录日志并视为未命中"""
+        try:
+            return await asyncio.to_thread(func, *args)
+        except (OSError, ValueError) as e:
+            print(f"[Ingestion:{self.worker_id}] 提取结果缓存不可用: {e}")
+            return None
+    
+    def _local_file(self, doc: DataSourceDoc) -> Optional[Tuple[Path, str]]:
+        """返回file_local文档在上传目录中的路径和文件格式（其他类型返回None）"""
+        if doc.data.get("type") != "file_local":
+            return None
+        # 与前端LocalUploadsStorageService一致：path形如 /api/uploads/<key>
+        relative_path = doc.data["path"].split("/api/uploads/")[-1]
+        file_path = Path(self.settings.rag_uploads_dir) / relative_path
+        # 上传文件以key保存，没有扩展名，按原文件名和MIME类型判断格式
+        return file_path, detect_format(doc.data.get("name") or doc.name, doc.data.get("mimeType"))
+    
+    async def _ingest_file_stream(self, source: DataSource, work: DocWork, file_path: Path, fmt: str) -> None:
+        """
+        流式导入大文件：边读边分块，按窗口diff、embedding并写入，内存占用与文件大小无关
+        Stream a large local file through split → diff → embed → upsert window by window,
+        so memory stays bounded regardless of file size
+        
+        文档记录不保存全文（content为None），content检索结果回退为命中的文本块。
+        The doc record keeps no full text; content-type results fall back to the hit chunk.
+        """
+        manifest = await self.rag_service.get_doc_manifest(source.project_id, source.id, work.doc.id)
+        current_ids: Set[str] = set()
+        batch_size = self.settings.ingestion_embed_batch_size
+        window = batch_size * max(1, self.settings.ingestion_embed_concurrency)
+        
+        chunks = self.text_splitter.iter_chunks(iter_file_text(file_path, fmt))
+        start_index = added = 0
+        try:
+            while True:
+                part = DocWork(work.doc)
+                part.chunks = await asyncio.to_thread(list, islice(chunks, window))
+                if not part.chunks:
+                    break
+                count = len(part.chunks)
+                self._diff_chunks(source, part, manifest, current_ids, start_index)
+                start_index += count
+                
+                results = await asyncio.gather(*[
+                    self.embedding_service.embed_many(part.chunks[i:i + batch_size])
+                    for i in range(0, len(part.chunks), batch_size)
+                ])
+                for embeddings, _ in results:
+                    part.embeddings.extend(embeddings)
+                await self._write_chunks(source, part, offset=added)
+                added += len(part.chunks)
+                work.reused += part.reused
+        finally:
+            chunks.close()
+        
+        work.stale_point_ids = [point_id for point_id in manifest if point_id not in current_ids]
+        await self.rag_service.delete_points(source.project_id, work.stale_point_ids)
+        print(
+            f"[Ingestion:{self.worker_id}] {source.id} 文档 {work.doc.id}（流式，{start_index}块）: "
+            f"新增 {added}，复用 {work.reused}，删除 {len(work.stale_point_ids)}"
+        )
+        
+        await self.docs_repository.update_by_version(work.doc.id, work.doc.version, {
+            "status": DataSourceStatus.READY.value,
+            "content": None,
+            "error": None,
+        })
+    
+    async def _diff_against_manifest(self, source: DataSource, work: DocWork) -> None:
+        """
+        与已有的点清单对比：保留未变化的块，只留下需要embedding的新块，记录需要删除的旧点
+        Diff chunks against the stored manifest, keeping only new chunks to embed
+        """
+        manifest = await self.rag_service.get_doc_manifest(source.project_id, source.id, work.doc.id)
+        current_ids: Set[str] = set()
+        self._diff_chunks(source, work, manifest, current_ids)
+        work.stale_point_ids = [point_id for point_id in manifest if point_id not in current_ids]
+    
+    @staticmethod
+    def _diff_chunks(
+        source: DataSource,
+        work: DocWork,
+        manifest: Dict[str, Dict[str, Any]],
+        current_ids: Set[str],
+        start_index: int = 0,
+    ) -> None:
+        """
+        对比一段文本块（位置从start_index开始）与清单，current_ids累计已出现的点ID
+        Diff a run of chunks starting at start_index, accumulating seen point IDs
+        """
+        new_chunks: List[str] = []
+        new_indices: List[int] = []
+        for index, chunk in enumerate(work.chunks, start_index):
+            point_id = chunk_point_id(source.project_id, source.id, work.doc.id, chunk_hash(chunk))
+            if point_id in current_ids:
+                # 同一文档中的重复块只存储一次
+                continue
+            current_ids.add(point_id)
+            if point_id in manifest:
+                work.reused += 1
+                if manifest[point_id].get("chunkIndex") != index:
+                    work.moved_indices[point_id] = index
+            else:
+                new_chunks.append(chunk)
+                new_indices.append(index)
+        
+        work.chunks = new_chunks
+        work.chunk_indices = new_indices
+    
+    async def _upsert_doc(self, source: DataSource, work: DocWork) -> None:
+        """
+        写入新向量，删除消失的旧块，并把文档标记为ready
+        Upsert new points in chunks, delete vanished ones, then mark the doc ready
+        """
+        await self._write_chunks(source, work, total=len(work.chunks))
+        
+        # 新块写入后再删除旧块，避免搜索期间出现空窗
+        await self.rag_service.delete_points(source.project_id, work.stale_point_ids)
+        print(
+            f"[Ingestion:{self.worker_id}] {source.id} 文档 {work.doc.id}: "
+            f"新增 {len(work.chunks)}，复用 {work.reused}，删除 {len(work.stale_point_ids)}"
+        )
+        
+        await self.docs_repository.update_by_version(work.doc.id, work.doc.version, {
+            "status": DataSourceStatus.READY.value,
+            "content": self._storable_content(work.content),
+            "error": None,
+            **work.doc_updates,
+        })
+    
+    def _storable_content(self, content: str) -> Optional[str]:
+        """
+        文档记录中保存的全文：UTF-8编码后超过上限时不保存（与流式导入相同），避免超出MongoDB文档大小限制
+        Full text to keep on the doc record, or None when its UTF-8 size exceeds the limit
+        
+        按文件大小判断不够：GB18030等编码解码后再按UTF-8保存会变大约1.5倍。
+        File size alone is not enough: GB18030 text grows about 1.5x when re-encoded as UTF-8.
+        """
+        limit = self.settings.ingestion_doc_content_max_bytes
+        # 每个字符最多4字节，短文本不必编码
+        if len(content) * 4 > limit and len(content.encode("utf-8")) > limit:
+            return None
+        return content
+    
+    async def _write_chunks(
+        self,
+        source: DataSource,
+        work: DocWork,
+        offset: int = 0,
+        total: Optional[int] = None,
+    ) -> None:
+        """
+        写入新块的向量（分批并发），并更新复用块的位置；写入较慢时定期把进度记录到文档的data.upsertProgress
+        Upsert new chunks (batched and concurrent inside the RAG service), periodically recording
+        progress on the doc, then update positions of reused chunks
+        
+        Args:
+            source: 数据源
+            work: 文档任务
+            offset: 之前已写入的块数（流式导入按窗口多次调用）
+            total: 文档需要写入的总块数（流式导入时未知）
+        """
+        upserted = 0
+        reported = False
+        
+        def on_progress(done: int, _: int) -> None:
+            nonlocal upserted
+            upserted = done
+        
+        async def report() -> None:
+            nonlocal reported
+            try:
+                await self.docs_repository.update_by_version(work.doc.id, work.doc.version, {
+                    "data.upsertProgress": {"upserted": offset + upserted, "total": total},
+                })
+                reported = True
+            except Exception as e:
+                # 进度只用于展示，记录失败不影响导入
+                print(f"[Ingestion:{self.worker_id}] {source.id} 文档 {work.doc.id} 进度记录失败: {e}")
+        
+        async def reporter() -> None:
+            while True:
+                await asyncio.sleep(self.settings.ingestion_progress_interval)
+                await report()
+        
+        reporter_task = asyncio.create_task(reporter())
+        try:
+            await self.rag_service.upsert_embeddings(
+                project_id=source.project_id,
+                source_id=source.id,
+                doc_id=work.doc.id,
+                doc_name=work.doc.name,
+                chunks=work.chunks,
+                embeddings=work.embeddings,
+                chunk_indices=work.chunk_indices,
+                on_progress=on_progress,
+            )
+        finally:
+            reporter_task.cancel()
+            try:
+                await reporter_task
+            except asyncio.CancelledError:
+                pass
+        if reported:
+            # 只有写入足够慢、已经记录过进度时才写最终进度，小文档不多一次数据库写入
+            await report()
+        await self.rag_service.set_chunk_indices(source.project_id, work.moved_indices)
+
+
+async def main() -> None:
+    """Worker入口"""
+    from app.core.database import initialize_databases, close_all_connections
+    from app.services.rag.embedding_projection import stored_vector_size
+    
+    await initialize_databases(embedding_vector_size=stored_vector_size())
+    worker = IngestionWorker()
+    
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except NotImplementedError:
+            # Windows不支持add_signal_handler
+            pass
+    
+    try:
+        await worker.run_forever()
+    finally:
+        await worker.url_crawler.close()
+        await close_all_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
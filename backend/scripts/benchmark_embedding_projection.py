@@ -0,0 +1,138 @@
+"""
+Embedding PCA降维基准测试脚本
+Recall loss, brute-force latency and RAM of PCA-projected embeddings versus full dimension
+
+用法 / Usage（在backend目录下，完全离线）:
+    # 使用fit_embedding_projection --save-sample导出的真实向量样本（推荐）
+    python -m scripts.benchmark_embedding_projection --vectors sample.npy --dims 256 512
+    # 使用合成向量（主成分方差按幂律衰减，只用于观察趋势）
+    python -m scripts.benchmark_embedding_projection --points 50000 --dim 1024
+
+以原始维度的精确top-k为基准，统计投影后精确top-k的召回率，因此召回损失只来自降维本身，
+不包含HNSW近似误差。投影只在基础向量的一个子集上拟合，查询为留出向量加少量噪声。
+Ground truth is exact top-k at full dimension, so the reported loss is due to the projection
+alone (no HNSW error). The PCA is fitted on a subset of the base vectors; queries are
+held-out vectors with a little noise.
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.database import estimate_qdrant_vector_memory
+from app.services.rag.embedding_projection import EmbeddingProjection
+from scripts.benchmark_qdrant_storage_profiles import _ground_truth
+
+
+def _synthetic(points: int, dim: int, alpha: float, clusters: int, seed: int) -> np.ndarray:
+    """生成主成分方差按幂律衰减、带聚类结构的归一化向量"""
+    rng = np.random.default_rng(seed)
+    spectrum = (np.arange(1, dim + 1, dtype=np.float32) ** -alpha)
+    rotation, _ = np.linalg.qr(rng.standard_normal((dim, dim)))
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32) * spectrum
+    latent = centers[rng.integers(0, clusters, points)] + 0.5 * rng.standard_normal((points, dim), dtype=np.float32) * spectrum
+    vectors = (latent @ rotation.T.astype(np.float32)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def projection_recall(projected_base: np.ndarray, projected_queries: np.ndarray, truth: np.ndarray, k: int) -> float:
+    """投影后精确top-k相对于原始维度精确top-k（truth）的召回率"""
+    found = _ground_truth(projected_base, projected_queries, k)
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)]))
+
+
+def _search_latency(base: np.ndarray, queries: np.ndarray, k: int) -> float:
+    """单个查询暴力检索的平均延迟（毫秒，近似反映向量维度对距离计算开销的影响）"""
+    started = time.perf_counter()
+    for query in queries:
+        scores = base @ query
+        np.argpartition(-scores, k - 1)[:k]
+    return (time.perf_counter() - started) / len(queries) * 1000
+
+
+def run_benchmark(
+    vectors_path: Optional[Path],
+    points: int,
+    dim: int,
+    alpha: float,
+    dims: List[int],
+    queries: int,
+    fit_sample: int,
+    k: int,
+    noise: float,
+    seed: int,
+) -> None:
+    """
+    在不同投影维度下比较召回率、延迟和内存
+    Compare recall, latency and RAM across projection dimensions
+    """
+    if vectors_path is not None:
+        vectors = np.load(vectors_path).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        source = vectors_path.name
+    else:
+        vectors = _synthetic(points, dim, alpha, clusters=max(10, points // 250), seed=seed)
+        source = f"合成向量（alpha={alpha}）"
+    
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    held_out, base = vectors[order[:queries]], vectors[order[queries:]]
+    query_vectors = held_out + noise * rng.standard_normal(held_out.shape, dtype=np.float32) / np.sqrt(vectors.shape[1])
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    fit_vectors = base[:fit_sample]
+    truth = _ground_truth(base, query_vectors, k)
+    
+    print(f"向量: {source}，基础向量 {len(base)}，查询 {len(query_vectors)}，原始维度 {vectors.shape[1]}，"
+          f"拟合样本 {len(fit_vectors)}")
+    print(f"\n{'dim':>6}{'variance':>10}{'recall@' + str(k):>11}{'loss':>8}{'latency':>11}{'RAM(ram)':>11}{'RAM(int8)':>11}")
+    
+    full_latency = _search_latency(base, query_vectors, k)
+    for target in [*sorted(dims), vectors.shape[1]]:
+        if target == vectors.shape[1]:
+            variance, recall, latency = 1.0, 1.0, full_latency
+        else:
+            projection = EmbeddingProjection.fit("benchmark", fit_vectors, target)
+            variance = projection.explained_variance_ratio
+            projected_base = np.asarray(projection.project(base), dtype=np.float32)
+            projected_queries = np.asarray(projection.project(query_vectors), dtype=np.float32)
+            recall = projection_recall(projected_base, projected_queries, truth, k)
+            latency = _search_latency(projected_base, projected_queries, k)
+        ram = estimate_qdrant_vector_memory(len(base), target, "ram") / 2**20
+        int8 = estimate_qdrant_vector_memory(len(base), target, "int8") / 2**20
+        print(f"{target:>6}{variance:>10.1%}{recall:>11.3f}{1 - recall:>8.3f}{latency:>9.2f}ms{ram:>9.1f}MB{int8:>9.1f}MB")
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="Embedding PCA降维基准测试（召回损失/延迟/内存）")
+    parser.add_argument("--vectors", type=Path, default=None, help="向量样本.npy文件（默认使用合成向量）")
+    parser.add_argument("--points", type=int, default=50_000, help="合成向量数")
+    parser.add_argument("--dim", type=int, default=1024, help="合成向量维度（bge-m3为1024）")
+    parser.add_argument("--alpha", type=float, default=0.6, help="合成向量主成分方差的幂律衰减指数")
+    parser.add_argument("--dims", type=int, nargs="+", default=[128, 256, 512], help="投影维度")
+    parser.add_argument("--queries", type=int, default=500, help="查询数")
+    parser.add_argument("--fit-sample", type=int, default=10_000, help="拟合PCA使用的样本数")
+    parser.add_argument("-k", type=int, default=10, help="每次查询返回的结果数")
+    parser.add_argument("--noise", type=float, default=0.3, help="查询向量噪声")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+    
+    run_benchmark(
+        vectors_path=args.vectors,
+        points=args.points,
+        dim=args.dim,
+        alpha=args.alpha,
+        dims=args.dims,
+        queries=args.queries,
+        fit_sample=args.fit_sample,
+        k=args.k,
+        noise=args.noise,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+本地文件流式分块的内存基准测试脚本
+Peak-RSS benchmark for streaming local files through the reader and splitter
+
+用法 / Usage（在backend目录下）:
+    python -m scripts.benchmark_file_reader_rss --sizes-mb 16 64 256
+
+每个文件大小在独立子进程中生成临时文件并流式分块，报告子进程的峰值常驻内存。
+流式读取的峰值应与文件大小基本无关；--whole-file 对比整体读取后再分块的峰值。
+Each size runs in a fresh subprocess so peak RSS is measured per run; the streaming
+peak should stay flat as the file grows, while --whole-file grows with it.
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+_PARAGRAPH = "流式读取的基准测试段落，包含中文与 ASCII text mixed together. " * 8 + "\n\n"
+
+
+def _write_file(path: str, size_mb: int) -> None:
+    """生成约size_mb大小的文本文件"""
+    paragraph = _PARAGRAPH.encode("utf-8")
+    block = paragraph * (1024 * 1024 // len(paragraph))
+    with open(path, "wb") as file:
+        for _ in range(size_mb):
+            file.write(block)
+
+
+def _child(path: str, whole_file: bool) -> None:
+    """子进程：分块整个文件并打印块数"""
+    from app.services.rag.file_reader import iter_file_text, read_file_text
+    from app.services.rag.text_splitter import TextSplitterService
+    
+    splitter = TextSplitterService()
+    if whole_file:
+        count = len(splitter.split_text(read_file_text(path)))
+    else:
+        count = sum(1 for _ in splitter.iter_chunks(iter_file_text(path)))
+    print(count)
+
+
+def _run(path: str, whole_file: bool) -> tuple:
+    """在子进程中运行一次，返回(块数, 耗时, 峰值RSS MB)"""
+    started = time.perf_counter()
+    command = [sys.executable, "-m", "scripts.benchmark_file_reader_rss", "--child", path]
+    if whole_file:
+        command.append("--whole-file")
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return int(output.strip()), elapsed, peak / 1024
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="本地文件流式分块的峰值内存基准测试")
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[16, 64, 256], help="测试的文件大小（MB）")
+    parser.add_argument("--whole-file", action="store_true", help="整体读取后再分块（对比基线）")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        _child(args.child, args.whole_file)
+        return
+    
+    mode = "whole-file" if args.whole_file else "streaming"
+    print(f"{'size_mb':>8}{'chunks':>10}{'seconds':>10}{'peak_rss_mb':>14}  ({mode})")
+    # 从小到大运行，RUSAGE_CHILDREN的累计峰值即为当前大小的峰值（内存不随大小增长时保持不变）
+    for size_mb in sorted(args.sizes_mb):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bench.txt")
+            _write_file(path, size_mb)
+            chunks, elapsed, peak = _run(path, args.whole_file)
+        print(f"{size_mb:>8}{chunks:>10}{elapsed:>10.2f}{peak:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Qdrant过滤搜索延迟基准测试脚本
+Benchmark filtered-search latency on a local Qdrant, with and without payload indexes
+
+用法 / Usage（在backend目录下，先启动本地Qdrant：docker run -p 6333:6333 qdrant/qdrant）:
+    python -m scripts.benchmark_qdrant_filtered_search --url http://localhost:6333 --points 1000000
+
+注意：本地内存模式（:memory:）不支持payload索引，结果没有参考意义，请使用Qdrant服务端。
+Note: the in-process ":memory:" mode ignores payload indexes; run against a Qdrant server.
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    CollectionStatus,
+    Distance,
+    FieldCondition,
+    Filter,
+    HnswConfigDiff,
+    MatchAny,
+    MatchValue,
+    PointStruct,
+    VectorParams,
+)
+
+from app.core.database import QDRANT_PAYLOAD_INDEXES
+
+
+def _tenant_sizes(points: int, projects: int) -> np.ndarray:
+    """按Zipf分布分配每个项目的点数（少数大租户、大量小租户）"""
+    weights = 1.0 / np.arange(1, projects + 1)
+    sizes = np.floor(weights / weights.sum() * points).astype(int)
+    sizes[0] += points - sizes.sum()
+    return sizes
+
+
+async def _create_collection(
+    client: AsyncQdrantClient,
+    name: str,
+    dim: int,
+    indexed: bool,
+) -> None:
+    """创建基准测试集合（indexed=True时与生产配置一致：payload_m + keyword索引）"""
+    if await client.collection_exists(name):
+        await client.delete_collection(name)
+    await client.create_collection(
+        collection_name=name,
+        vectors_config=VectorParams(size=dim, distance=Distance.DOT),
+        hnsw_config=HnswConfigDiff(m=16, payload_m=16) if indexed else None,
+    )
+    if indexed:
+        for field_name, field_schema in QDRANT_PAYLOAD_INDEXES.items():
+            await client.create_payload_index(name, field_name=field_name, field_schema=field_schema)
+
+
+async def _load(
+    client: AsyncQdrantClient,
+    name: str,
+    sizes: np.ndarray,
+    sources_per_project: int,
+    dim: int,
+    batch_size: int,
+    seed: int,
+) -> None:
+    """写入随机归一化向量（同一seed保证两个集合数据相同）"""
+    rng = np.random.default_rng(seed)
+    project_ids = np.repeat(np.arange(len(sizes)), sizes)
+    total = len(project_ids)
+    started = time.perf_counter()
+    for start in range(0, total, batch_size):
+        projects = project_ids[start:start + batch_size]
+        vectors = rng.standard_normal((len(projects), dim), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        sources = rng.integers(0, sources_per_project, len(projects))
+        await client.upsert(
+            collection_name=name,
+            points=[
+                PointStruct(
+                    id=start + i,
+                    vector=vectors[i].tolist(),
+                    payload={
+                        "projectId": f"proj-{project}",
+                        "sourceId": f"src-{project}-{source}",
+                        "docId": f"doc-{project}-{(start + i) % 100}",
+                    },
+                )
+                for i, (project, source) in enumerate(zip(projects, sources))
+            ],
+            wait=False,
+        )
+        if (start // batch_size) % 100 == 0:
+            print(f"  {name}: 已写入 {min(start + batch_size, total)}/{total}")
+    print(f"  {name}: 写入完成，用时 {time.perf_counter() - started:.1f}s")
+
+
+async def _wait_until_indexed(client: AsyncQdrantClient, name: str, timeout: float = 3600) -> None:
+    """等待集合优化/建索引完成（状态变为green）"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        info = await client.get_collection(name)
+        if info.status == CollectionStatus.GREEN:
+            return
+        await asyncio.sleep(2)
+    raise TimeoutError(f"集合 {name} 建索引超时")
+
+
+async def _run_queries(
+    client: AsyncQdrantClient,
+    name: str,
+    sizes: np.ndarray,
+    sources_per_project: int,
+    dim: int,
+    queries: int,
+    k: int,
+    seed: int,
+) -> Dict[str, List[float]]:
+    """执行与RAGService.search相同形状的过滤搜索，按租户规模分组记录延迟（毫秒）"""
+    rng = np.random.default_rng(seed + 1)
+    large_cutoff = max(1, len(sizes) // 10)
+    latencies: Dict[str, List[float]] = {"all": [], "large": [], "small": []}
+    for _ in range(queries):
+        project = int(rng.integers(0, len(sizes)))
+        source_count = int(rng.integers(1, min(3, sources_per_project) + 1))
+        sources = rng.choice(sources_per_project, source_count, replace=False)
+        vector = rng.standard_normal(dim, dtype=np.float32)
+        vector /= np.linalg.norm(vector)
+        query_filter = Filter(must=[
+            FieldCondition(key="projectId", match=MatchValue(value=f"proj-{project}")),
+            FieldCondition(key="sourceId", match=MatchAny(any=[f"src-{project}-{s}" for s in sources])),
+        ])
+        
+        started = time.perf_counter()
+        await client.search(
+            collection_name=name,
+            query_vector=vector.tolist(),
+            query_filter=query_filter,
+            limit=k,
+            with_payload=True,
+        )
+        elapsed = (time.perf_counter() - started) * 1000
+        latencies["all"].append(elapsed)
+        latencies["large" if project < large_cutoff else "small"].append(elapsed)
+    return latencies
+
+
+def _report(name: str, latencies: Dict[str, List[float]]) -> None:
+    """打印延迟分位数"""
+    for group, values in latencies.items():
+        if not values:
+            continue
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        print(
+            f"  {name:<28} {group:<6} n={len(values):<5} "
+            f"mean={np.mean(values):7.2f}ms p50={p50:7.2f}ms p95={p95:7.2f}ms p99={p99:7.2f}ms"
+        )
+
+
+async def run_benchmark(
+    url: str,
+    api_key: Optional[str],
+    points: int,
+    projects: int,
+    sources_per_project: int,
+    dim: int,
+    queries: int,
+    k: int,
+    batch_size: int,
+    seed: int,
+    keep: bool,
+) -> None:
+    """
+    运行基准测试：无索引集合 vs 生产配置集合（租户索引 + payload_m）
+    Compare a collection without payload indexes against the production layout
+    """
+    if url == ":memory:":
+        print("⚠ 本地内存模式不支持payload索引，两组结果不会有差异")
+        client = AsyncQdrantClient(location=":memory:")
+    else:
+        client = AsyncQdrantClient(url=url, api_key=api_key, timeout=600)
+    sizes = _tenant_sizes(points, projects)
+    print(f"点数: {points}，项目数: {projects}（最大项目 {sizes[0]} 点），向量维度: {dim}")
+    
+    variants = {
+        "bench_filtered_noindex": False,
+        "bench_filtered_tenant": True,
+    }
+    try:
+        for name, indexed in variants.items():
+            print(f"\n准备集合 {name}（payload索引: {'是' if indexed else '否'}）")
+            await _create_collection(client, name, dim, indexed)
+            await _load(client, name, sizes, sources_per_project, dim, batch_size, seed)
+            await _wait_until_indexed(client, name)
+        
+        print(f"\n过滤搜索延迟（{queries} 次查询，k={k}；large为前10%的大租户）")
+        for name in variants:
+            # 预热
+            await _run_queries(client, name, sizes, sources_per_project, dim, min(20, queries), k, seed + 100)
+            _report(name, await _run_queries(client, name, sizes, sources_per_project, dim, queries, k, seed))
+    finally:
+        if not keep:
+            for name in variants:
+                await client.delete_collection(name)
+        await client.close()
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="Qdrant过滤搜索延迟基准测试")
+    parser.add_argument("--url", default="http://localhost:6333", help="Qdrant URL（:memory:为本地内存模式）")
+    parser.add_argument("--api-key", default=None, help="Qdrant API密钥")
+    parser.add_argument("--points", type=int, default=1_000_000, help="总点数")
+    parser.add_argument("--projects", type=int, default=1000, help="项目（租户）数")
+    parser.add_argument("--sources-per-project", type=int, default=5, help="每个项目的数据源数")
+    parser.add_argument("--dim", type=int, default=256, help="向量维度")
+    parser.add_argument("--queries", type=int, default=500, help="查询次数")
+    parser.add_argument("-k", type=int, default=3, help="每次查询返回的结果数")
+    parser.add_argument("--batch-size", type=int, default=1000, help="写入批大小")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--keep", action="store_true", help="结束后保留测试集合")
+    args = parser.parse_args()
+    
+    asyncio.run(run_benchmark(
+        url=args.url,
+        api_key=args.api_key,
+        points=args.points,
+        projects=args.projects,
+        sources_per_project=args.sources_per_project,
+        dim=args.dim,
+        queries=args.queries,
+        k=args.k,
+        batch_size=args.batch_size,
+        seed=args.seed,
+        keep=args.keep,
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Qdrant向量存储配置基准测试脚本
+Recall/latency benchmark of the vector storage profiles (ram / int8 / int8_on_disk)
+
+用法 / Usage（在backend目录下，先启动本地Qdrant：docker run -p 6333:6333 qdrant/qdrant）:
+    python -m scripts.benchmark_qdrant_storage_profiles --url http://localhost:6333 --points 200000 --dim 1024
+
+召回率以numpy暴力检索的精确top-k为基准；量化配置分别测试重排序开启/关闭。
+注意：本地内存模式（:memory:）不支持量化和磁盘存储，结果没有参考意义，请使用Qdrant服务端。
+Recall is measured against exact brute-force top-k; quantized profiles run with and without
+rescoring. The in-process ":memory:" mode ignores quantization, so use a Qdrant server.
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import (
+    Distance,
+    HnswConfigDiff,
+    PointStruct,
+    QuantizationSearchParams,
+    SearchParams,
+    VectorParams,
+)
+
+from app.core.database import QDRANT_STORAGE_PROFILES, estimate_qdrant_vector_memory, qdrant_storage_config
+from scripts.benchmark_qdrant_filtered_search import _wait_until_indexed
+
+
+def _dataset(points: int, dim: int, queries: int, clusters: int, seed: int):
+    """
+    生成带聚类结构的归一化向量（比纯随机向量更接近真实embedding分布）和查询
+    Clustered, normalized vectors plus queries drawn near existing points
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = centers[rng.integers(0, clusters, points)] + 0.6 * rng.standard_normal((points, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    query_vectors = vectors[rng.integers(0, points, queries)] + 0.3 * rng.standard_normal((queries, dim), dtype=np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return vectors, query_vectors
+
+
+def _ground_truth(vectors: np.ndarray, query_vectors: np.ndarray, k: int, block: int = 50_000) -> np.ndarray:
+    """暴力计算精确top-k（分块计算点积，控制内存）"""
+    best_scores = np.full((len(query_vectors), k), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((len(query_vectors), k), dtype=np.int64)
+    for start in range(0, len(vectors), block):
+        scores = query_vectors @ vectors[start:start + block].T
+        ids = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+        scores = np.concatenate([best_scores, scores], axis=1)
+        ids = np.concatenate([best_ids, ids], axis=1)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_ids = np.take_along_axis(ids, top, axis=1)
+    return best_ids
+
+
+async def _create_and_load(
+    client: AsyncQdrantClient,
+    name: str,
+    profile: str,
+    vectors: np.ndarray,
+    batch_size: int,
+) -> None:
+    """按存储配置创建集合并写入向量（与生产集合的创建参数一致）"""
+    storage = qdrant_storage_config(profile)
+    if await client.collection_exists(name):
+        await client.delete_collection(name)
+    await client.create_collection(
+        collection_name=name,
+        vectors_config=VectorParams(size=vectors.shape[1], distance=Distance.DOT, on_disk=storage["on_disk"]),
+        quantization_config=storage["quantization_config"],
+        hnsw_config=HnswConfigDiff(m=16),
+    )
+    started = time.perf_counter()
+    for start in range(0, len(vectors), batch_size):
+        await client.upsert(
+            collection_name=name,
+            points=[
+                PointStruct(id=start + i, vector=vector.tolist())
+                for i, vector in enumerate(vectors[start:start + batch_size])
+            ],
+            wait=False,
+        )
+    print(f"  {name}: 写入 {len(vectors)} 点，用时 {time.perf_counter() - started:.1f}s")
+
+
+async def _run_queries(
+    client: AsyncQdrantClient,
+    name: str,
+    query_vectors: np.ndarray,
+    truth: np.ndarray,
+    k: int,
+    params: SearchParams,
+) -> Dict[str, float]:
+    """执行查询，返回recall@k和延迟分位数（毫秒）"""
+    latencies: List[float] = []
+    recalls: List[float] = []
+    for vector, expected in zip(query_vectors, truth):
+        started = time.perf_counter()
+        points = await client.search(
+            collection_name=name,
+            query_vector=vector.tolist(),
+            limit=k,
+            search_params=params,
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalls.append(len({point.id for point in points} & set(expected.tolist())) / k)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {"recall": float(np.mean(recalls)), "mean": float(np.mean(latencies)), "p50": p50, "p95": p95, "p99": p99}
+
+
+async def run_benchmark(
+    url: str,
+    api_key: Optional[str],
+    profiles: List[str],
+    points: int,
+    dim: int,
+    queries: int,
+    clusters: int,
+    k: int,
+    hnsw_ef: int,
+    oversampling: float,
+    batch_size: int,
+    seed: int,
+    keep: bool,
+) -> None:
+    """
+    运行基准测试：每个存储配置一个集合，数据相同
+    Load the same data into one collection per profile and compare recall and latency
+    """
+    if url == ":memory:":
+        print("⚠ 本地内存模式不支持量化和磁盘存储，各配置结果不会有差异")
+        client = AsyncQdrantClient(location=":memory:")
+    else:
+        client = AsyncQdrantClient(url=url, api_key=api_key, timeout=600)
+    
+    vectors, query_vectors = _dataset(points, dim, queries, clusters, seed)
+    truth = _ground_truth(vectors, query_vectors, k)
+    print(f"点数: {points}，向量维度: {dim}，查询数: {queries}，k={k}，hnsw_ef={hnsw_ef}")
+    
+    names = {profile: f"bench_profile_{profile}" for profile in profiles}
+    try:
+        for profile, name in names.items():
+            print(f"\n准备集合 {name}（存储配置: {profile}）")
+            await _create_and_load(client, name, profile, vectors, batch_size)
+            await _wait_until_indexed(client, name)
+        
+        print(f"\n{'profile':<14}{'rescore':<9}{'recall@' + str(k):>10}{'mean':>10}{'p50':>10}"
+              f"{'p95':>10}{'p99':>10}{'est. RAM':>12}")
+        for profile, name in names.items():
+            quantized = qdrant_storage_config(profile)["quantization_config"] is not None
+            memory = estimate_qdrant_vector_memory(points, dim, profile) / 2**20
+            for rescore in ([True, False] if quantized else [None]):
+                params = SearchParams(
+                    hnsw_ef=hnsw_ef,
+                    quantization=QuantizationSearchParams(rescore=rescore, oversampling=oversampling) if quantized else None,
+                )
+                # 预热
+                await _run_queries(client, name, query_vectors[:min(20, queries)], truth, k, params)
+                stats = await _run_queries(client, name, query_vectors, truth, k, params)
+                label = "-" if rescore is None else ("on" if rescore else "off")
+                print(
+                    f"{profile:<14}{label:<9}{stats['recall']:>10.3f}{stats['mean']:>8.2f}ms{stats['p50']:>8.2f}ms"
+                    f"{stats['p95']:>8.2f}ms{stats['p99']:>8.2f}ms{memory:>10.1f}MB"
+                )
+    finally:
+        if not keep:
+            for name in names.values():
+                await client.delete_collection(name)
+        await client.close()
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="Qdrant向量存储配置基准测试（召回率/延迟/内存）")
+    parser.add_argument("--url", default="http://localhost:6333", help="Qdrant URL（:memory:为本地内存模式）")
+    parser.add_argument("--api-key", default=None, help="Qdrant API密钥")
+    parser.add_argument("--profiles", nargs="+", default=list(QDRANT_STORAGE_PROFILES),
+                        choices=QDRANT_STORAGE_PROFILES, help="要测试的存储配置")
+    parser.add_argument("--points", type=int, default=200_000, help="点数")
+    parser.add_argument("--dim", type=int, default=1024, help="向量维度（bge-m3为1024）")
+    parser.add_argument("--queries", type=int, default=500, help="查询次数")
+    parser.add_argument("--clusters", type=int, default=200, help="数据聚类数")
+    parser.add_argument("-k", type=int, default=10, help="每次查询返回的结果数")
+    parser.add_argument("--hnsw-ef", type=int, default=128, help="HNSW搜索候选列表大小")
+    parser.add_argument("--oversampling", type=float, default=2.0, help="量化搜索的候选倍数")
+    parser.add_argument("--batch-size", type=int, default=500, help="写入批大小")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--keep", action="store_true", help="结束后保留测试集合")
+    args = parser.parse_args()
+    
+    asyncio.run(run_benchmark(
+        url=args.url,
+        api_key=args.api_key,
+        profiles=args.profiles,
+        points=args.points,
+        dim=args.dim,
+        queries=args.queries,
+        clusters=args.clusters,
+        k=args.k,
+        hnsw_ef=args.hnsw_ef,
+        oversampling=args.oversampling,
+        batch_size=args.batch_size,
+        seed=args.seed,
+        keep=args.keep,
+    ))
+
+
+if __name__ == "__main__":
+    main()
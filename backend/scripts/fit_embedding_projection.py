@@ -0,0 +1,116 @@
+"""
+Embedding PCA降维投影拟合脚本
+Fit the PCA projection used to store lower-dimensional embeddings
+
+用法 / Usage（在backend目录下，使用.env中的Qdrant和Embedding配置）:
+    python -m scripts.fit_embedding_projection --dim 256 --output /uploads/.embedding-projection/bge-m3-256.npz
+    # 同时导出向量样本，用于离线评估不同维度的召回损失
+    python -m scripts.fit_embedding_projection --dim 256 --output proj.npz --save-sample sample.npy
+    python -m scripts.benchmark_embedding_projection --vectors sample.npy --dims 256 512
+
+样本文本取自已导入的文本块（payload中的content，点ID为哈希值，按ID顺序扫描近似随机抽样），
+用当前Embedding模型重新生成原始维度的向量，因此已有集合是否降维不影响拟合。
+拟合后设置EMBEDDING_PROJECTION_PATH；已有集合的维度不会改变，需要新建集合并重新导入数据源。
+Sample texts come from already-ingested chunks and are re-embedded at full dimension with the
+current model. After fitting, set EMBEDDING_PROJECTION_PATH; existing collections keep their
+dimension, so recreate them and re-ingest the sources.
+"""
+
+import argparse
+import asyncio
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from app.services.rag.embedding_projection import EmbeddingProjection
+from app.services.rag.rag_service import RAGService
+from scripts.benchmark_embedding_projection import projection_recall
+from scripts.benchmark_qdrant_storage_profiles import _ground_truth
+
+
+async def _sample_texts(service: RAGService, sample: int) -> List[str]:
+    """从所有集合中抽取文本块内容（去重）"""
+    texts: List[str] = []
+    seen = set()
+    for collection_name in await service._all_collections():
+        if not await service.qdrant_client.collection_exists(collection_name):
+            continue
+        offset = None
+        while len(texts) < sample:
+            points, offset = await service.qdrant_client.scroll(
+                collection_name=collection_name,
+                limit=min(1000, sample - len(texts)),
+                offset=offset,
+                with_payload=["content"],
+                with_vectors=False,
+            )
+            for point in points:
+                content = (point.payload or {}).get("content")
+                if content and content not in seen:
+                    seen.add(content)
+                    texts.append(content)
+            if offset is None:
+                break
+    return texts
+
+
+async def fit(dim: int, output: Path, sample: int, holdout: float, k: int, save_sample: Optional[Path]) -> None:
+    """
+    抽样、生成原始向量、拟合并保存投影
+    Sample chunks, embed them at full dimension, fit and save the projection
+    """
+    service = RAGService()
+    model = service.embedding_service.model
+    texts = await _sample_texts(service, sample)
+    if len(texts) <= dim:
+        raise SystemExit(f"样本文本数({len(texts)})不足，至少需要多于投影维度({dim})")
+    print(f"抽样文本块: {len(texts)}，Embedding模型: {model}")
+    
+    vectors, _ = await service.embedding_service.embed_many(texts)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    if save_sample is not None:
+        np.save(save_sample, vectors)
+        print(f"向量样本已保存: {save_sample}")
+    
+    # 留出一部分样本估计召回损失（以原始维度的精确top-k为基准）
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(vectors))
+    held_out = order[:int(len(vectors) * holdout)]
+    base = vectors[order[len(held_out):]]
+    if len(base) > dim:
+        projection = EmbeddingProjection.fit(model, base, dim)
+        if len(held_out) and len(base) >= k:
+            truth = _ground_truth(base, vectors[held_out], k)
+            recall = projection_recall(
+                np.asarray(projection.project(base), dtype=np.float32),
+                np.asarray(projection.project(vectors[held_out]), dtype=np.float32),
+                truth, k,
+            )
+            print(f"留出样本 recall@{k}: {recall:.3f}（召回损失 {1 - recall:.3f}）")
+    
+    # 保存的投影使用全部样本拟合
+    projection = EmbeddingProjection.fit(model, vectors, dim)
+    projection.save(output)
+    print(f"✓ 投影已保存: {output}（{projection.input_dim} -> {projection.dim}维，"
+          f"保留方差 {projection.explained_variance_ratio:.1%}）")
+    print(f"设置 EMBEDDING_PROJECTION_PATH={output} 后新建集合并重新导入数据源")
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="拟合Embedding PCA降维投影")
+    parser.add_argument("--dim", type=int, default=256, help="投影维度（如256或512）")
+    parser.add_argument("--output", type=Path, required=True, help="投影文件路径（.npz）")
+    parser.add_argument("--sample", type=int, default=8000, help="抽样文本块数")
+    parser.add_argument("--holdout", type=float, default=0.1, help="用于估计召回损失的留出比例")
+    parser.add_argument("-k", type=int, default=10, help="召回率评估的k值")
+    parser.add_argument("--save-sample", type=Path, default=None, help="保存原始向量样本（.npy）")
+    args = parser.parse_args()
+    
+    asyncio.run(fit(args.dim, args.output, args.sample, args.holdout, args.k, args.save_sample))
+
+
+if __name__ == "__main__":
+    main()
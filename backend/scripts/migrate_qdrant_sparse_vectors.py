@@ -0,0 +1,167 @@
+"""
+Qdrant稀疏向量迁移脚本
+Rebuild embeddings collections created before the BM25 sparse vector existed
+
+用法 / Usage（在backend目录下，使用.env中的Qdrant配置；迁移期间请停止导入worker）:
+    # 列出缺少稀疏向量的集合
+    python -m scripts.migrate_qdrant_sparse_vectors --dry-run
+    # 重建共享集合和所有项目独立集合
+    python -m scripts.migrate_qdrant_sparse_vectors
+
+Qdrant不支持给已有集合添加稀疏向量，因此先把点连同根据content计算的BM25稀疏向量复制到临时集合，
+再删除原集合、按当前配置（QDRANT_STORAGE_PROFILE）重新创建并复制回来。复制回来期间该集合的检索结果不完整。
+脚本中断后可直接重新运行：临时集合完整时从复制回原集合这一步继续。
+Qdrant cannot add a sparse vector to an existing collection, so points are copied (with BM25
+vectors computed from their content) into a temporary collection, the original is recreated
+with the current config and the points copied back. Searches on that collection are incomplete
+while copying back; rerunning after an interruption resumes from the copy-back step.
+"""
+
+import argparse
+import asyncio
+from typing import Any, List, Optional
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import PointStruct
+
+from app.core.database import (
+    QDRANT_SPARSE_VECTOR_NAME,
+    check_qdrant_sparse_vectors,
+    create_qdrant_collection,
+    get_qdrant_client,
+)
+from app.services.rag.rag_service import RAGService
+from app.services.rag.sparse_encoder import get_sparse_encoder_service
+
+
+# 临时集合名称前缀（不能以embeddings_开头，否则会被当作项目独立集合）
+REBUILD_PREFIX = "sparse_rebuild__"
+
+
+def _with_sparse(point: Any) -> Any:
+    """为未配置稀疏向量的点补上BM25稀疏向量"""
+    dense = point.vector[""] if isinstance(point.vector, dict) else point.vector
+    content = (point.payload or {}).get("content") or ""
+    return {"": dense, QDRANT_SPARSE_VECTOR_NAME: get_sparse_encoder_service().encode_document(content)}
+
+
+async def _copy_points(
+    client: AsyncQdrantClient,
+    source: str,
+    target: str,
+    add_sparse: bool,
+    batch_size: int,
+) -> int:
+    """分页复制点，返回复制的数量"""
+    copied = 0
+    offset = None
+    while True:
+        points, offset = await client.scroll(
+            collection_name=source,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if points:
+            await client.upsert(
+                collection_name=target,
+                points=[
+                    PointStruct(
+                        id=point.id,
+                        vector=_with_sparse(point) if add_sparse else point.vector,
+                        payload=point.payload,
+                    )
+                    for point in points
+                ],
+            )
+            copied += len(points)
+            print(f"  {source} -> {target}: {copied}")
+        if offset is None:
+            return copied
+
+
+async def _vector_size(client: AsyncQdrantClient, collection_name: str) -> int:
+    """集合的稠密向量维度"""
+    vectors_config = (await client.get_collection(collection_name)).config.params.vectors
+    if isinstance(vectors_config, dict):
+        vectors_config = vectors_config[""]
+    return vectors_config.size
+
+
+async def _count(client: AsyncQdrantClient, collection_name: str) -> int:
+    """集合中的点数量（精确计数）"""
+    return (await client.count(collection_name=collection_name, exact=True)).count
+
+
+async def rebuild(client: AsyncQdrantClient, name: str, batch_size: int) -> None:
+    """
+    重建一个集合，使其带有BM25稀疏向量
+    Rebuild one collection with the BM25 sparse vector
+    """
+    temp = f"{REBUILD_PREFIX}{name}"
+    original_exists = await client.collection_exists(name)
+    
+    if await client.collection_exists(temp) and original_exists and not await check_qdrant_sparse_vectors(name, client=client):
+        # 上次在复制到临时集合时中断，原集合仍完整，重新开始
+        await client.delete_collection(temp)
+    
+    if not await client.collection_exists(temp):
+        await create_qdrant_collection(temp, vector_size=await _vector_size(client, name), client=client)
+        expected = await _count(client, name)
+        copied = await _copy_points(client, name, temp, add_sparse=True, batch_size=batch_size)
+        if await _count(client, temp) != expected:
+            raise RuntimeError(f"{temp} 点数量 {copied} 与原集合 {expected} 不一致，未删除原集合")
+        await client.delete_collection(name)
+        original_exists = False
+    
+    # 临时集合已完整：重建原集合并复制回来（可从中断处重新运行）
+    if not original_exists:
+        await create_qdrant_collection(name, vector_size=await _vector_size(client, temp), client=client)
+    await _copy_points(client, temp, name, add_sparse=False, batch_size=batch_size)
+    if await _count(client, name) != await _count(client, temp):
+        raise RuntimeError(f"{name} 复制回来的点数量不一致，保留临时集合 {temp}")
+    await client.delete_collection(temp)
+    print(f"✓ {name} 已重建，混合检索可用")
+
+
+async def migrate(collections: Optional[List[str]], dry_run: bool, batch_size: int) -> None:
+    """
+    重建缺少稀疏向量的集合
+    Rebuild the given (or all embeddings) collections that lack the sparse vector
+    """
+    client = get_qdrant_client()
+    if not collections:
+        existing = {col.name for col in (await client.get_collections()).collections}
+        interrupted = {name[len(REBUILD_PREFIX):] for name in existing if name.startswith(REBUILD_PREFIX)}
+        collections = sorted(
+            name for name in set(await RAGService()._all_collections()) | interrupted
+            if name in existing or name in interrupted
+        )
+    
+    for name in collections:
+        temp = f"{REBUILD_PREFIX}{name}"
+        if await client.collection_exists(name) and await check_qdrant_sparse_vectors(name, client=client) \
+                and not await client.collection_exists(temp):
+            print(f"{name}: 已有稀疏向量，跳过")
+            continue
+        if dry_run:
+            continue
+        await rebuild(client, name, batch_size)
+    
+    await client.close()
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="为Qdrant集合添加BM25稀疏向量（重建集合）")
+    parser.add_argument("--collection", nargs="+", default=None, help="集合名称（默认为共享集合和所有项目独立集合）")
+    parser.add_argument("--dry-run", action="store_true", help="只列出缺少稀疏向量的集合")
+    parser.add_argument("--batch-size", type=int, default=500, help="每次复制的点数量")
+    args = parser.parse_args()
+    
+    asyncio.run(migrate(args.collection, args.dry_run, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Qdrant向量存储配置迁移脚本
+Switch existing embeddings collections to another storage profile (ram / int8 / int8_on_disk)
+
+用法 / Usage（在backend目录下，使用.env中的Qdrant配置）:
+    # 查看当前配置和预估内存
+    python -m scripts.migrate_qdrant_storage_profile --profile int8_on_disk --dry-run
+    # 切换共享集合和所有项目独立集合，并等待服务端重建完成
+    python -m scripts.migrate_qdrant_storage_profile --profile int8_on_disk --wait
+
+Qdrant在后台按新配置重建段（量化副本、向量存储位置），期间集合可正常读写，不需要停机或重新导入。
+新建集合使用的配置由QDRANT_STORAGE_PROFILE决定，迁移后请同步修改该配置。
+Qdrant rebuilds segments in the background while the collection stays online; remember to
+set QDRANT_STORAGE_PROFILE too so newly created collections use the same profile.
+"""
+
+import argparse
+import asyncio
+import time
+from typing import List, Optional
+
+from qdrant_client.models import CollectionStatus
+
+from app.core.database import (
+    QDRANT_STORAGE_PROFILES,
+    apply_qdrant_storage_profile,
+    estimate_qdrant_vector_memory,
+    get_qdrant_client,
+)
+from app.services.rag.rag_service import RAGService
+
+
+def _current_profile(vectors_config, quantization_config) -> str:
+    """根据集合配置推断当前存储配置"""
+    if quantization_config is None:
+        return "ram" if not vectors_config.on_disk else "on_disk（无量化）"
+    return "int8_on_disk" if vectors_config.on_disk else "int8"
+
+
+async def _wait_until_green(collection_name: str, timeout: float) -> bool:
+    """等待服务端按新配置重建完成（集合状态变为green）"""
+    client = get_qdrant_client()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if (await client.get_collection(collection_name)).status == CollectionStatus.GREEN:
+            return True
+        await asyncio.sleep(5)
+    return False
+
+
+async def migrate(profile: str, collections: Optional[List[str]], dry_run: bool, wait: bool, timeout: float) -> None:
+    """
+    将集合切换到指定存储配置
+    Apply a storage profile to the given (or all embeddings) collections
+    """
+    client = get_qdrant_client()
+    if not collections:
+        collections = [
+            name for name in await RAGService()._all_collections()
+            if await client.collection_exists(name)
+        ]
+    
+    for name in collections:
+        info = await client.get_collection(name)
+        vectors_config = info.config.params.vectors
+        if isinstance(vectors_config, dict):
+            vectors_config = vectors_config[""]
+        points = info.points_count or 0
+        current = _current_profile(vectors_config, info.config.quantization_config)
+        before = "未知"
+        if current in QDRANT_STORAGE_PROFILES:
+            before = f"{estimate_qdrant_vector_memory(points, vectors_config.size, current) / 2**20:.1f}MB"
+        after = estimate_qdrant_vector_memory(points, vectors_config.size, profile) / 2**20
+        print(
+            f"{name}: {points} 点，维度 {vectors_config.size}，当前配置 {current} -> {profile}，"
+            f"预估向量内存 {before} -> {after:.1f}MB"
+        )
+        if dry_run or current == profile:
+            continue
+        
+        await apply_qdrant_storage_profile(name, profile, client=client)
+        print("  ✓ 已提交新配置，服务端后台重建中")
+        if wait:
+            if await _wait_until_green(name, timeout):
+                print(f"  ✓ {name} 重建完成")
+            else:
+                print(f"  ⚠ {name} 在 {timeout:.0f}s 内未完成重建，请稍后检查集合状态")
+    
+    await client.close()
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="Qdrant向量存储配置迁移")
+    parser.add_argument("--profile", required=True, choices=QDRANT_STORAGE_PROFILES, help="目标存储配置")
+    parser.add_argument("--collection", nargs="+", default=None, help="集合名称（默认为共享集合和所有项目独立集合）")
+    parser.add_argument("--dry-run", action="store_true", help="只打印当前配置和预估内存")
+    parser.add_argument("--wait", action="store_true", help="等待服务端重建完成")
+    parser.add_argument("--timeout", type=float, default=3600, help="等待重建的最长时间（秒）")
+    args = parser.parse_args()
+    
+    asyncio.run(migrate(args.profile, args.collection, args.dry_run, args.wait, args.timeout))
+
+
+if __name__ == "__main__":
+    main()
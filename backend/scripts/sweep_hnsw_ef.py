@@ -0,0 +1,173 @@
+"""
+HNSW ef参数扫描脚本
+Sweep hnsw_ef against exact search on a project's own vectors and recommend a search preset
+
+用法 / Usage（在backend目录下，使用.env中的Qdrant配置）:
+    python -m scripts.sweep_hnsw_ef --project <projectId> [<projectId> ...]
+    python -m scripts.sweep_hnsw_ef --all-projects --target-recall 0.95
+
+查询向量取自项目中已有的点（加少量噪声），以同一过滤条件下的精确搜索（exact=True）结果为基准，
+因此召回率反映的是该项目实际语料规模和分布下HNSW的近似误差。
+Queries are perturbed copies of the project's own vectors; ground truth is Qdrant's exact
+search under the same filter, so recall reflects the project's real corpus size and shape.
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from qdrant_client.models import FieldCondition, Filter, MatchValue, SearchParams
+
+from app.core.database import qdrant_search_params
+from app.models.schemas import RAGSearchPreset
+from app.services.rag.rag_service import SEARCH_PRESETS, RAGService
+
+
+async def _sample_queries(service: RAGService, collection_name: str, project_filter: Filter,
+                          queries: int, noise: float, seed: int) -> np.ndarray:
+    """从项目已有的点中抽样查询向量（加噪声后归一化）"""
+    points, _ = await service.qdrant_client.scroll(
+        collection_name=collection_name,
+        scroll_filter=project_filter,
+        limit=queries * 5,
+        with_payload=False,
+        with_vectors=True,
+    )
+    vectors = []
+    for point in points:
+        vector = point.vector
+        if isinstance(vector, dict):
+            vector = vector.get("")
+        if vector is not None:
+            vectors.append(vector)
+    if not vectors:
+        return np.empty((0, 0), dtype=np.float32)
+    
+    rng = np.random.default_rng(seed)
+    sample = np.asarray(vectors, dtype=np.float32)[rng.choice(len(vectors), min(queries, len(vectors)), replace=False)]
+    sample += noise * rng.standard_normal(sample.shape, dtype=np.float32) / np.sqrt(sample.shape[1])
+    return sample / np.linalg.norm(sample, axis=1, keepdims=True)
+
+
+async def _search_ids(service: RAGService, collection_name: str, project_filter: Filter,
+                      query_vectors: np.ndarray, k: int, params: SearchParams) -> tuple:
+    """执行查询，返回每个查询的结果ID集合和延迟（毫秒）"""
+    ids, latencies = [], []
+    for vector in query_vectors:
+        started = time.perf_counter()
+        points = await service.qdrant_client.search(
+            collection_name=collection_name,
+            query_vector=vector.tolist(),
+            query_filter=project_filter,
+            limit=k,
+            search_params=params,
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+        ids.append({point.id for point in points})
+    return ids, latencies
+
+
+def recommend_preset(recalls: Dict[int, float], target_recall: float) -> Optional[RAGSearchPreset]:
+    """
+    推荐满足目标召回率的最快预设
+    Pick the fastest preset whose hnsw_ef reaches the target recall
+    
+    Args:
+        recalls: hnsw_ef -> 召回率
+        target_recall: 目标召回率
+    
+    Returns:
+        推荐的预设；所有ef都达不到目标时返回None（建议使用exact搜索）
+    """
+    reached = [ef for ef, recall in sorted(recalls.items()) if recall >= target_recall]
+    if not reached:
+        return None
+    for preset, params in SEARCH_PRESETS.items():
+        if params.hnsw_ef is not None and params.hnsw_ef >= reached[0]:
+            return preset
+    return None
+
+
+async def sweep_project(service: RAGService, project_id: str, ef_values: List[int], queries: int,
+                        k: int, noise: float, target_recall: float, seed: int) -> None:
+    """扫描单个项目的ef取值并打印推荐预设"""
+    collection_name = await service.collection_for(project_id)
+    project_filter = Filter(must=[FieldCondition(key="projectId", match=MatchValue(value=project_id))])
+    total = (await service.qdrant_client.count(collection_name, count_filter=project_filter, exact=True)).count
+    query_vectors = await _sample_queries(service, collection_name, project_filter, queries, noise, seed)
+    print(f"\n项目 {project_id}（集合 {collection_name}，{total} 点，{len(query_vectors)} 个查询，k={k}）")
+    if not len(query_vectors):
+        print("  无向量，跳过")
+        return
+    
+    truth, exact_latencies = await _search_ids(
+        service, collection_name, project_filter, query_vectors, k, qdrant_search_params(exact=True),
+    )
+    print(f"  {'exact':>8}  recall=1.000  p50={np.percentile(exact_latencies, 50):7.2f}ms "
+          f"p95={np.percentile(exact_latencies, 95):7.2f}ms")
+    
+    recalls: Dict[int, float] = {}
+    for ef in ef_values:
+        ids, latencies = await _search_ids(
+            service, collection_name, project_filter, query_vectors, k, qdrant_search_params(hnsw_ef=ef),
+        )
+        recalls[ef] = float(np.mean([
+            len(found & expected) / max(1, len(expected)) for found, expected in zip(ids, truth)
+        ]))
+        print(f"  {'ef=' + str(ef):>8}  recall={recalls[ef]:.3f}  p50={np.percentile(latencies, 50):7.2f}ms "
+              f"p95={np.percentile(latencies, 95):7.2f}ms")
+    
+    preset = recommend_preset(recalls, target_recall)
+    if preset is None:
+        print(f"  → 所有ef都达不到召回率 {target_recall}，建议 ragSearchParams.exact=true 或增大ef")
+    else:
+        print(f"  → 推荐预设: {preset.value}（hnsw_ef={SEARCH_PRESETS[preset].hnsw_ef}，目标召回率 {target_recall}）")
+
+
+async def _all_project_ids(service: RAGService) -> List[str]:
+    """共享集合中的项目和所有已拆分到独立集合的项目"""
+    response = await service.qdrant_client.facet(
+        collection_name=service.COLLECTION_NAME, key="projectId", limit=1_000_000, exact=True,
+    )
+    project_ids = {str(hit.value) for hit in response.hits}
+    for name in await service._all_collections():
+        if name.startswith(service.PROJECT_COLLECTION_PREFIX):
+            project_ids.add(name[len(service.PROJECT_COLLECTION_PREFIX):])
+    return sorted(project_ids)
+
+
+async def run_sweep(project_ids: Optional[List[str]], ef_values: List[int], queries: int, k: int,
+                    noise: float, target_recall: float, seed: int) -> None:
+    """对指定项目（或所有项目）执行ef扫描"""
+    service = RAGService()
+    if not project_ids:
+        project_ids = await _all_project_ids(service)
+    for project_id in project_ids:
+        await sweep_project(service, project_id, ef_values, queries, k, noise, target_recall, seed)
+    await service.qdrant_client.close()
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="HNSW ef参数扫描（按项目推荐搜索预设）")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--project", nargs="+", help="项目ID")
+    target.add_argument("--all-projects", action="store_true", help="扫描所有项目")
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128, 256, 512], help="扫描的hnsw_ef取值")
+    parser.add_argument("--queries", type=int, default=100, help="每个项目的查询数")
+    parser.add_argument("-k", type=int, default=10, help="每次查询返回的结果数")
+    parser.add_argument("--noise", type=float, default=0.3, help="查询向量相对噪声")
+    parser.add_argument("--target-recall", type=float, default=0.95, help="目标召回率")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+    
+    asyncio.run(run_sweep(
+        None if args.all_projects else args.project,
+        sorted(args.ef), args.queries, args.k, args.noise, args.target_recall, args.seed,
+    ))
+
+
+if __name__ == "__main__":
+    main()
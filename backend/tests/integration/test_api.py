@@ -6,7 +6,7 @@ API integration tests
 import os
 import pytest
 from httpx import AsyncClient, ASGITransport
-from unittest.mock import patch, AsyncMock, MagicMock
+from unittest.mock import patch, AsyncMock
 
 # 在导入app之前设置环境变量
 os.environ.update({
@@ -58,7 +58,7 @@ class TestHealthEndpoints:
         # Mock数据库连接检查
         with patch("app.api.v1.endpoints.health.check_mongodb_connection", new=AsyncMock(return_value=True)), \
              patch("app.api.v1.endpoints.health.check_redis_connection", new=AsyncMock(return_value=True)), \
-             patch("app.api.v1.endpoints.health.check_qdrant_connection", return_value=True):
+             patch("app.api.v1.endpoints.health.check_qdrant_connection", new=AsyncMock(return_value=True)):
             
             transport = ASGITransport(app=app)
             async with AsyncClient(transport=transport, base_url="http://test") as client:
@@ -70,6 +70,7 @@ class TestHealthEndpoints:
                 assert data["data"]["status"] == "healthy"
                 assert data["data"]["services"]["mongodb"] == "connected"
                 assert data["data"]["services"]["redis"] == "connected"
+                assert {"local_hits", "redis_hits", "misses", "hit_rate"} <= set(data["data"]["caches"]["embedding"])
     
     @pytest.mark.asyncio
     async def test_health_check_with_failures(self):
@@ -77,7 +78,7 @@ class TestHealthEndpoints:
         # Mock数据库连接检查（Redis失败）
         with patch("app.api.v1.endpoints.health.check_mongodb_connection", new=AsyncMock(return_value=True)), \
              patch("app.api.v1.endpoints.health.check_redis_connection", new=AsyncMock(return_value=False)), \
-             patch("app.api.v1.endpoints.health.check_qdrant_connection", return_value=True):
+             patch("app.api.v1.endpoints.health.check_qdrant_connection", new=AsyncMock(return_value=True)):
             
             transport = ASGITransport(app=app)
             async with AsyncClient(transport=transport, base_url="http://test") as client:
@@ -338,6 +338,27 @@ class TestProjectEndpoints:
                 data = response.json()
                 assert data["success"] is True
     
+    @pytest.mark.asyncio
+    async def test_delete_project_closes_mcp_sessions(self):
+        """测试：删除项目时关闭项目的池化MCP会话"""
+        with patch("app.api.v1.endpoints.projects.ProjectsRepository") as mock_repo, \
+             patch("app.api.v1.endpoints.projects.DataSourcesRepository") as mock_sources, \
+             patch("app.api.v1.endpoints.projects.get_mcp_client_manager") as mock_manager:
+            mock_repo_instance = AsyncMock()
+            mock_repo_instance.exists = AsyncMock(return_value=True)
+            mock_repo_instance.delete = AsyncMock(return_value=True)
+            mock_repo.return_value = mock_repo_instance
+            mock_sources.return_value = AsyncMock()
+            mock_manager.return_value.close_project = AsyncMock()
+            
+            transport = ASGITransport(app=app)
+            async with AsyncClient(transport=transport, base_url="http://test") as client:
+                with patch("app.api.v1.endpoints.projects._delete_project_embeddings", new=AsyncMock()):
+                    response = await client.delete("/api/v1/projects/proj123")
+                
+                assert response.status_code == 200
+                mock_manager.return_value.close_project.assert_awaited_once_with("proj123")
+    
     @pytest.mark.asyncio
     async def test_delete_project_not_found(self):
         """测试：删除项目失败（不存在）"""
@@ -352,4 +373,37 @@ class TestProjectEndpoints:
                 response = await client.delete("/api/v1/projects/nonexistent")
                 
                 assert response.status_code == 404
-
+    
+    @pytest.mark.asyncio
+    async def test_list_mcp_server_tools(self):
+        """测试：获取自定义MCP服务器的工具列表（转换为工作流工具）"""
+        from mcp.types import Tool as McpTool
+        
+        mock_project = MagicMock()
+        mock_project.custom_mcp_servers = {"tickets": MagicMock(server_url="http://mcp.test/mcp")}
+        tool = McpTool(
+            name="create_ticket",
+            description="Create a ticket",
+            inputSchema={"type": "object", "properties": {"title": {"type": "string"}}, "required": ["title"]},
+        )
+        
+        with patch("app.api.v1.endpoints.projects.ProjectsRepository") as mock_repo, \
+             patch("app.api.v1.endpoints.projects.get_mcp_client_manager") as mock_manager:
+            mock_repo.return_value.get_by_id = AsyncMock(return_value=mock_project)
+            mock_manager.return_value.list_tools = AsyncMock(return_value=[tool])
+            
+            transport = ASGITransport(app=app)
+            async with AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.get("/api/v1/projects/proj123/mcp-servers/tickets/tools")
+                missing = await client.get("/api/v1/projects/proj123/mcp-servers/other/tools")
+            
+            assert response.status_code == 200
+            tools = response.json()["data"]
+            assert tools[0]["name"] == "create_ticket"
+            assert tools[0]["isMcp"] is True
+            assert tools[0]["mcpServerName"] == "tickets"
+            assert tools[0]["parameters"]["required"] == ["title"]
+            mock_manager.return_value.list_tools.assert_awaited_once_with(
+                "proj123", "tickets", "http://mcp.test/mcp", refresh=False,
+            )
+            assert missing.status_code == 404
@@ -0,0 +1,222 @@
+"""
+Composio服务单元测试
+Unit tests for Composio Service
+"""
+
+import os
+import asyncio
+import pytest
+import httpx
+from unittest.mock import AsyncMock
+
+# 设置环境变量
+os.environ.update({
+    "LLM_API_KEY": "test-llm-key",
+    "LLM_BASE_URL": "https://test-llm.com",
+    "LLM_MODEL_ID": "test-model",
+    "EMBEDDING_MODEL": "test-embedding",
+    "EMBEDDING_BASE_URL": "https://test-embedding.com",
+    "EMBEDDING_API_KEY": "test-embedding-key",
+    "COMPOSIO_API_KEY": "test-composio-key",
+    "MONGODB_CONNECTION_STRING": "mongodb://test:27017/testdb",
+    "REDIS_URL": "redis://test:6379",
+    "QDRANT_URL": "http://test:6333",
+})
+
+from app.core.cache import LocalCache
+from app.services.composio.composio_service import ComposioService
+
+
+def _build_service(handler) -> ComposioService:
+    """创建使用MockTransport的ComposioService（Redis缓存被mock为未命中）"""
+    service = ComposioService()
+    service.client = httpx.AsyncClient(
+        base_url=ComposioService.BASE_URL,
+        transport=httpx.MockTransport(handler),
+    )
+    service.cache_service = AsyncMock()
+    service.cache_service.get = AsyncMock(return_value=None)
+    service.cache_service.set = AsyncMock(return_value=True)
+    service.cache_service.get_composio_tool_key = lambda slug: f"composio:tool:{slug}"
+    service.cache_service.get_composio_toolkit_key = lambda slug: f"composio:toolkit:{slug}"
+    return service
+
+
+class TestComposioToolFetching:
+    """Composio工具详情获取测试"""
+    
+    @pytest.fixture
+    def request_log(self):
+        """记录请求路径和并发数"""
+        return {"paths": [], "in_flight": 0, "max_in_flight": 0}
+    
+    @pytest.fixture
+    def service(self, request_log):
+        """创建ComposioService实例"""
+        async def handler(request: httpx.Request) -> httpx.Response:
+            request_log["paths"].append(request.url.path)
+            request_log["in_flight"] += 1
+            request_log["max_in_flight"] = max(request_log["max_in_flight"], request_log["in_flight"])
+            await asyncio.sleep(0.01)
+            request_log["in_flight"] -= 1
+            
+            path = request.url.path
+            if path.startswith("/api/v3/tools/"):
+                slug = path.rsplit("/", 1)[-1]
+                toolkit = "gmail" if slug.startswith("GMAIL") else "github"
+                return httpx.Response(200, json={
+                    "slug": slug,
+                    "name": slug.lower(),
+                    "description": f"{slug} tool",
+                    "toolkit": {"slug": toolkit, "name": toolkit},
+                    "input_parameters": {"properties": {}, "required": []},
+                })
+            if path.startswith("/api/v3/toolkits/"):
+                slug = path.rsplit("/", 1)[-1]
+                schemes = ["NO_AUTH"] if slug == "github" else ["OAUTH2"]
+                return httpx.Response(200, json={"slug": slug, "composio_managed_auth_schemes": schemes})
+            return httpx.Response(404, json={"error": "not found"})
+        
+        return _build_service(handler)
+    
+    @pytest.mark.asyncio
+    async def test_get_tools_fetches_concurrently(self, service, request_log):
+        """测试：批量获取工具是并发执行的，且保持输入顺序"""
+        slugs = [f"GMAIL_TOOL_{i}" for i in range(5)] + [f"GITHUB_TOOL_{i}" for i in range(5)]
+        
+        tools = await service.get_tools(slugs)
+        
+        assert [tool.slug for tool in tools] == slugs
+        assert request_log["max_in_flight"] > 1
+        assert request_log["max_in_flight"] <= service.settings.composio_max_concurrency
+    
+    @pytest.mark.asyncio
+    async def test_toolkit_requests_are_deduplicated(self, service, request_log):
+        """测试：同一toolkit只请求一次"""
+        slugs = [f"GMAIL_TOOL_{i}" for i in range(5)] + [f"GITHUB_TOOL_{i}" for i in range(5)]
+        
+        tools = await service.get_tools(slugs)
+        
+        toolkit_requests = [p for p in request_log["paths"] if "/toolkits/" in p]
+        assert sorted(toolkit_requests) == ["/api/v3/toolkits/github", "/api/v3/toolkits/gmail"]
+        assert {tool.slug: tool.no_auth for tool in tools}["GITHUB_TOOL_0"] is True
+        assert {tool.slug: tool.no_auth for tool in tools}["GMAIL_TOOL_0"] is False
+    
+    @pytest.mark.asyncio
+    async def test_tool_details_are_cached(self, service, request_log):
+        """测试：工具详情命中进程内缓存后不再发起请求"""
+        await service.get_tools(["GMAIL_TOOL_0", "GMAIL_TOOL_0"])
+        first_count = len(request_log["paths"])
+        
+        tool = await service.get_tool("GMAIL_TOOL_0")
+        
+        assert tool is not None
+        assert first_count == 2
+        assert len(request_log["paths"]) == first_count
+        service.cache_service.set.assert_any_await(
+            "composio:tool:GMAIL_TOOL_0", service._tool_cache.get("GMAIL_TOOL_0"), service.cache_ttl
+        )
+    
+    @pytest.mark.asyncio
+    async def test_tool_is_not_cached_when_toolkit_lookup_fails(self):
+        """测试：toolkit获取失败时no_auth回退为False但不缓存工具，恢复后重新计算"""
+        toolkit_status = {"code": 503}
+        
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path.startswith("/api/v3/tools/"):
+                return httpx.Response(200, json={
+                    "slug": "GITHUB_TOOL_0", "name": "github_tool_0", "description": "",
+                    "toolkit": {"slug": "github"}, "input_parameters": {},
+                })
+            return httpx.Response(toolkit_status["code"], json={"composio_managed_auth_schemes": ["NO_AUTH"]})
+        
+        service = _build_service(handler)
+        
+        assert (await service.get_tool("GITHUB_TOOL_0")).no_auth is False
+        assert service._tool_cache.get("GITHUB_TOOL_0") is None
+        service.cache_service.set.assert_not_awaited()
+        
+        toolkit_status["code"] = 200
+        assert (await service.get_tool("GITHUB_TOOL_0")).no_auth is True
+    
+    @pytest.mark.asyncio
+    async def test_tool_details_from_redis(self, service, request_log):
+        """测试：Redis缓存命中时不发起请求"""
+        service.cache_service.get = AsyncMock(return_value={
+            "slug": "GMAIL_TOOL_0",
+            "name": "gmail_tool_0",
+            "description": "cached",
+            "toolkit": {"slug": "gmail"},
+            "input_parameters": {},
+            "no_auth": False,
+        })
+        
+        tool = await service.get_tool("GMAIL_TOOL_0")
+        
+        assert tool.description == "cached"
+        assert request_log["paths"] == []
+
+
+class TestComposioToolSearch:
+    """Composio工具搜索测试"""
+    
+    @pytest.mark.asyncio
+    async def test_search_uses_async_execute_endpoint(self):
+        """测试：通过异步HTTP执行COMPOSIO_SEARCH_TOOLS"""
+        captured = {}
+        
+        async def handler(request: httpx.Request) -> httpx.Response:
+            captured["path"] = request.url.path
+            captured["body"] = request.content
+            return httpx.Response(200, json={
+                "successful": True,
+                "data": {"main_tools": [
+                    {"toolkit": "gmail", "tool_slug": "GMAIL_SEND_EMAIL", "description": "Send email"},
+                ]},
+            })
+        
+        service = _build_service(handler)
+        
+        tools = await service.search_tools("send an email")
+        
+        assert captured["path"] == "/api/v3/tools/execute/COMPOSIO_SEARCH_TOOLS"
+        assert b"send an email" in captured["body"]
+        assert [tool.tool_slug for tool in tools] == ["GMAIL_SEND_EMAIL"]
+    
+    @pytest.mark.asyncio
+    async def test_search_deadline_returns_empty(self, monkeypatch):
+        """测试：超过搜索截止时间时返回空列表而不是阻塞"""
+        async def handler(request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(5)
+            return httpx.Response(200, json={})
+        
+        service = _build_service(handler)
+        monkeypatch.setattr(service.settings, "composio_search_timeout", 0.05)
+        
+        tools = await service.search_tools("anything")
+        
+        assert tools == []
+
+
+class TestLocalCache:
+    """进程内缓存测试"""
+    
+    def test_lru_eviction(self):
+        """测试：超出容量时淘汰最久未使用的条目"""
+        cache = LocalCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+    
+    def test_ttl_expiry(self):
+        """测试：过期条目不再返回"""
+        cache = LocalCache(max_entries=2)
+        cache.set("a", 1, ttl=-1)
+        
+        assert cache.get("a") is None
+        assert len(cache) == 0
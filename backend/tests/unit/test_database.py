@@ -5,6 +5,7 @@ Tests for database connections
 
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
+from qdrant_client import AsyncQdrantClient
 
 from app.core.database import (
     get_mongodb_client,
@@ -17,6 +18,11 @@ from app.core.database import (
     close_mongodb_connection,
     close_redis_connection,
     close_qdrant_connection,
+    apply_qdrant_storage_profile,
+    check_qdrant_sparse_vectors,
+    create_qdrant_collection,
+    ensure_qdrant_payload_indexes,
+    qdrant_storage_config,
 )
 
 
@@ -195,7 +201,8 @@ class TestRedisConnection:
 class TestQdrantConnection:
     """Qdrant连接测试"""
     
-    def test_get_qdrant_client(self, monkeypatch):
+    @pytest.mark.asyncio
+    async def test_get_qdrant_client(self, monkeypatch):
         """测试：获取Qdrant客户端"""
         test_env_vars = {
             "QDRANT_URL": "http://test:6333",
@@ -221,9 +228,10 @@ class TestQdrantConnection:
         assert client is not None
         
         # 清理
-        close_qdrant_connection()
+        await close_qdrant_connection()
     
-    def test_check_qdrant_connection_success(self, monkeypatch):
+    @pytest.mark.asyncio
+    async def test_check_qdrant_connection_success(self, monkeypatch):
         """测试：检查Qdrant连接成功"""
         test_env_vars = {
             "QDRANT_URL": "http://test:6333",
@@ -245,18 +253,98 @@ class TestQdrantConnection:
         database._qdrant_client = None
         
         # Mock get_collections
-        with patch("qdrant_client.QdrantClient") as mock_qdrant:
+        with patch("qdrant_client.AsyncQdrantClient") as mock_qdrant:
             mock_instance = MagicMock()
-            mock_instance.get_collections = MagicMock(return_value=MagicMock(collections=[]))
+            mock_instance.get_collections = AsyncMock(return_value=MagicMock(collections=[]))
+            mock_instance.close = AsyncMock()
             mock_qdrant.return_value = mock_instance
             
             # 重新注入mock的客户端
             database._qdrant_client = mock_instance
             
-            result = check_qdrant_connection()
+            result = await check_qdrant_connection()
             
             assert result is True
         
         # 清理
-        close_qdrant_connection()
+        await close_qdrant_connection()
+    
+    @pytest.mark.asyncio
+    async def test_create_qdrant_collection_in_memory(self, monkeypatch):
+        """测试：在本地内存模式下创建集合（幂等）"""
+        from app.core import database
+        monkeypatch.setattr(database, "_qdrant_client", AsyncQdrantClient(location=":memory:"))
+        
+        await create_qdrant_collection("test_embeddings", vector_size=4)
+        await create_qdrant_collection("test_embeddings", vector_size=4)
+        
+        collections = (await database._qdrant_client.get_collections()).collections
+        assert [col.name for col in collections] == ["test_embeddings"]
+        
+        # 清理
+        await close_qdrant_connection()
+    
+    @pytest.mark.asyncio
+    async def test_existing_collection_without_sparse_vectors_is_reported(self, capsys):
+        """测试：升级前创建的集合没有BM25稀疏向量时打印警告并提示迁移脚本"""
+        from qdrant_client.models import Distance, VectorParams
+        client = AsyncQdrantClient(location=":memory:")
+        await client.create_collection("embeddings", vectors_config=VectorParams(size=4, distance=Distance.DOT))
+        await create_qdrant_collection("embeddings_new", vector_size=4, client=client)
+        
+        await create_qdrant_collection("embeddings", vector_size=4, client=client)
+        
+        assert "scripts.migrate_qdrant_sparse_vectors" in capsys.readouterr().out
+        assert await check_qdrant_sparse_vectors("embeddings", client=client) is False
+        assert await check_qdrant_sparse_vectors("embeddings_new", client=client) is True
+        await client.close()
+    
+    @pytest.mark.asyncio
+    async def test_ensure_payload_indexes_creates_missing(self, monkeypatch):
+        """测试：只创建缺失的payload索引，projectId作为租户键"""
+        from app.core import database
+        mock_client = MagicMock()
+        mock_client.get_collection = AsyncMock(return_value=MagicMock(payload_schema={"sourceId": MagicMock()}))
+        mock_client.create_payload_index = AsyncMock()
+        monkeypatch.setattr(database, "_qdrant_client", mock_client)
+        
+        created = await ensure_qdrant_payload_indexes("embeddings")
+        
+        assert created == ["projectId", "docId"]
+        project_call = mock_client.create_payload_index.await_args_list[0].kwargs
+        assert project_call["field_schema"].is_tenant is True
+        monkeypatch.setattr(database, "_qdrant_client", None)
+    
+    @pytest.mark.asyncio
+    async def test_create_collection_with_on_disk_int8_profile(self):
+        """测试：int8_on_disk配置下原始向量放在磁盘，int8量化副本常驻内存"""
+        mock_client = MagicMock()
+        mock_client.get_collections = AsyncMock(return_value=MagicMock(collections=[]))
+        mock_client.create_collection = AsyncMock()
+        mock_client.get_collection = AsyncMock(return_value=MagicMock(payload_schema={}))
+        mock_client.create_payload_index = AsyncMock()
+        
+        await create_qdrant_collection("embeddings", vector_size=4, client=mock_client, profile="int8_on_disk")
+        
+        kwargs = mock_client.create_collection.await_args.kwargs
+        assert kwargs["vectors_config"].on_disk is True
+        assert kwargs["quantization_config"].scalar.type == "int8"
+        assert kwargs["quantization_config"].scalar.always_ram is True
+    
+    @pytest.mark.asyncio
+    async def test_apply_ram_profile_disables_quantization(self):
+        """测试：切换回ram配置时关闭量化并把向量移回内存"""
+        mock_client = MagicMock()
+        mock_client.update_collection = AsyncMock()
+        
+        await apply_qdrant_storage_profile("embeddings", "ram", client=mock_client)
+        
+        kwargs = mock_client.update_collection.await_args.kwargs
+        assert kwargs["vectors_config"][""].on_disk is False
+        assert kwargs["quantization_config"] == "Disabled"
+    
+    def test_unknown_storage_profile_is_rejected(self):
+        """测试：未知的存储配置直接报错"""
+        with pytest.raises(ValueError):
+            qdrant_storage_config("binary")
 
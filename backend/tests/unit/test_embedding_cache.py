@@ -0,0 +1,101 @@
+"""
+查询嵌入向量缓存单元测试
+Unit tests for the two-tier query embedding cache
+"""
+
+import os
+import pytest
+from unittest.mock import AsyncMock, patch
+
+# 设置环境变量
+os.environ.update({
+    "LLM_API_KEY": "test-llm-key",
+    "LLM_BASE_URL": "https://test-llm.com",
+    "LLM_MODEL_ID": "test-model",
+    "EMBEDDING_MODEL": "test-embedding",
+    "EMBEDDING_BASE_URL": "https://test-embedding.com",
+    "EMBEDDING_API_KEY": "test-embedding-key",
+    "COMPOSIO_API_KEY": "test-composio-key",
+    "MONGODB_CONNECTION_STRING": "mongodb://test:27017/testdb",
+    "REDIS_URL": "redis://test:6379",
+    "QDRANT_URL": "http://test:6333",
+})
+
+from app.core.cache import LocalCache
+from app.services.rag.embedding_cache import EmbeddingCache, normalize_text
+
+
+VECTOR = [0.5, -0.25, 0.125, 1.0]
+
+
+@pytest.fixture
+def redis_store():
+    """模拟Redis（二进制值）"""
+    return {}
+
+
+@pytest.fixture
+def embedding_cache(redis_store):
+    """创建EmbeddingCache实例（Redis被mock）"""
+    client = AsyncMock()
+    client.get = AsyncMock(side_effect=lambda key: redis_store.get(key))
+    client.setex = AsyncMock(side_effect=lambda key, ttl, value: redis_store.__setitem__(key, value))
+    with patch("app.services.rag.embedding_cache.get_redis_binary_client", new=AsyncMock(return_value=client)):
+        yield EmbeddingCache()
+
+
+class TestEmbeddingCache:
+    """查询嵌入向量缓存测试"""
+    
+    @pytest.mark.asyncio
+    async def test_miss_then_local_hit(self, embedding_cache):
+        """测试：写入后命中进程内缓存"""
+        assert await embedding_cache.get("model", "what is rag") is None
+        
+        await embedding_cache.set("model", "what is rag", VECTOR)
+        
+        assert await embedding_cache.get("model", "  what   is rag ") == VECTOR
+        stats = embedding_cache.stats()
+        assert stats["misses"] == 1
+        assert stats["local_hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_redis_stores_compact_blob(self, embedding_cache, redis_store):
+        """测试：Redis中存储紧凑的二进制向量，进程内缓存未命中时从Redis读取"""
+        await embedding_cache.set("model", "query", VECTOR)
+        embedding_cache._local.clear()
+        
+        result = await embedding_cache.get("model", "query")
+        
+        (blob,) = redis_store.values()
+        assert isinstance(blob, bytes)
+        assert len(blob) == len(VECTOR) * 2
+        assert result == VECTOR
+        assert embedding_cache.stats()["redis_hits"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_model_is_part_of_key(self, embedding_cache):
+        """测试：不同模型的缓存互不影响"""
+        await embedding_cache.set("model-a", "query", VECTOR)
+        
+        assert await embedding_cache.get("model-b", "query") is None
+    
+    def test_normalize_text(self):
+        """测试：归一化合并空白但保留大小写"""
+        assert normalize_text("  Hello\n\tWorld ") == "Hello World"
+        assert normalize_text("ＡＢＣ") == "ABC"
+
+
+class TestLocalCacheMemoryCap:
+    """进程内缓存内存上限测试"""
+    
+    def test_evicts_by_bytes(self):
+        """测试：超出字节上限时淘汰最久未使用的条目"""
+        cache = LocalCache(max_entries=100, max_bytes=10, size_of=len)
+        cache.set("a", b"12345")
+        cache.set("b", b"12345")
+        cache.set("c", b"12345")
+        
+        assert cache.get("a") is None
+        assert cache.get("c") == b"12345"
+        assert cache.size_bytes == 10
@@ -0,0 +1,109 @@
+"""
+Embedding降维投影单元测试
+Unit tests for the PCA embedding projection
+"""
+
+import os
+import pytest
+from unittest.mock import patch
+
+import numpy as np
+
+# 设置环境变量
+os.environ.update({
+    "LLM_API_KEY": "test-llm-key",
+    "LLM_BASE_URL": "https://test-llm.com",
+    "LLM_MODEL_ID": "test-model",
+    "EMBEDDING_MODEL": "test-embedding",
+    "EMBEDDING_BASE_URL": "https://test-embedding.com",
+    "EMBEDDING_API_KEY": "test-embedding-key",
+    "COMPOSIO_API_KEY": "test-composio-key",
+    "MONGODB_CONNECTION_STRING": "mongodb://test:27017/testdb",
+    "REDIS_URL": "redis://test:6379",
+    "QDRANT_URL": "http://test:6333",
+})
+
+from app.core.config import get_settings
+from app.services.rag import embedding_projection
+from app.services.rag.embedding_projection import EmbeddingProjection, get_embedding_projection, stored_vector_size
+
+
+def _sample(points: int = 400, dim: int = 32, rank: int = 4, seed: int = 0) -> np.ndarray:
+    """生成集中在低维子空间中的归一化向量"""
+    rng = np.random.default_rng(seed)
+    basis = rng.standard_normal((rank, dim))
+    vectors = rng.standard_normal((points, rank)) @ basis + 0.01 * rng.standard_normal((points, dim))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def reset_projection():
+    """每个测试重新加载投影单例"""
+    with patch.object(embedding_projection, "_embedding_projection", None), \
+         patch.object(embedding_projection, "_embedding_projection_loaded", False):
+        yield
+
+
+class TestEmbeddingProjection:
+    """PCA投影测试"""
+    
+    def test_fit_preserves_neighbours(self):
+        """测试：投影后向量已归一化，低秩数据的方差基本保留，最近邻基本不变"""
+        vectors = _sample()
+        projection = EmbeddingProjection.fit("test-embedding", vectors[:300], 8)
+        
+        projected = np.asarray(projection.project(vectors), dtype=np.float32)
+        
+        assert projected.shape == (400, 8)
+        assert np.allclose(np.linalg.norm(projected, axis=1), 1.0, atol=1e-5)
+        assert projection.explained_variance_ratio > 0.99
+        queries = projected[300:]
+        base = projected[:300]
+        agreement = np.mean(np.argmax(queries @ base.T, axis=1) == np.argmax(vectors[300:] @ vectors[:300].T, axis=1))
+        assert agreement >= 0.9
+    
+    def test_fit_rejects_invalid_dimensions(self):
+        """测试：投影维度不小于原始维度或样本不足时报错"""
+        with pytest.raises(ValueError):
+            EmbeddingProjection.fit("test-embedding", _sample(dim=8), 8)
+        with pytest.raises(ValueError):
+            EmbeddingProjection.fit("test-embedding", _sample(points=4), 8)
+        projection = EmbeddingProjection.fit("test-embedding", _sample(), 4)
+        with pytest.raises(ValueError):
+            projection.project([[1.0, 0.0]])
+    
+    def test_save_and_load(self, tmp_path):
+        """测试：保存后加载的投影结果一致"""
+        vectors = _sample()
+        projection = EmbeddingProjection.fit("test-embedding", vectors, 4)
+        path = tmp_path / "projection" / "test-4.npz"
+        
+        projection.save(path)
+        loaded = EmbeddingProjection.load(path)
+        
+        assert loaded.model == "test-embedding"
+        assert (loaded.input_dim, loaded.dim) == (32, 4)
+        assert loaded.explained_variance_ratio == pytest.approx(projection.explained_variance_ratio)
+        assert np.allclose(loaded.project(vectors[:5]), projection.project(vectors[:5]))
+    
+    def test_configured_projection_sets_collection_size(self, tmp_path, reset_projection):
+        """测试：配置投影文件后集合维度取投影维度，未配置时取模型维度"""
+        assert get_embedding_projection() is None
+        assert stored_vector_size() == get_settings().embedding_dimension
+        
+        path = tmp_path / "test-4.npz"
+        EmbeddingProjection.fit("test-embedding", _sample(), 4).save(path)
+        settings = get_settings().model_copy(update={"embedding_projection_path": str(path)})
+        with patch.object(embedding_projection, "_embedding_projection_loaded", False), \
+             patch("app.services.rag.embedding_projection.get_settings", return_value=settings):
+            assert stored_vector_size() == 4
+    
+    def test_projection_for_other_model_is_rejected(self, tmp_path, reset_projection):
+        """测试：投影文件与当前Embedding模型不一致时拒绝加载"""
+        path = tmp_path / "other-4.npz"
+        EmbeddingProjection.fit("other-model", _sample(), 4).save(path)
+        settings = get_settings().model_copy(update={"embedding_projection_path": str(path)})
+        
+        with patch("app.services.rag.embedding_projection.get_settings", return_value=settings):
+            with pytest.raises(ValueError):
+                get_embedding_projection()
@@ -0,0 +1,251 @@
+"""
+Embedding请求调度器单元测试
+Unit tests for the embedding scheduler: packing, token buckets, 429 retries, throughput
+"""
+
+import asyncio
+import os
+import pytest
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import openai
+
+# 设置环境变量
+os.environ.update({
+    "LLM_API_KEY": "test-llm-key",
+    "LLM_BASE_URL": "https://test-llm.com",
+    "LLM_MODEL_ID": "test-model",
+    "EMBEDDING_MODEL": "test-embedding",
+    "EMBEDDING_BASE_URL": "https://test-embedding.com",
+    "EMBEDDING_API_KEY": "test-embedding-key",
+    "COMPOSIO_API_KEY": "test-composio-key",
+    "MONGODB_CONNECTION_STRING": "mongodb://test:27017/testdb",
+    "REDIS_URL": "redis://test:6379",
+    "QDRANT_URL": "http://test:6333",
+})
+
+from app.services.rag.embedding_scheduler import (
+    EmbeddingPriority,
+    EmbeddingScheduler,
+    LocalTokenBucket,
+    PrioritySlots,
+    SchedulerMetrics,
+    pack_batches,
+)
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+def _rate_limit_error(headers=None) -> openai.RateLimitError:
+    """构造429错误"""
+    response = httpx.Response(429, headers=headers or {}, request=httpx.Request("POST", "https://test/embeddings"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def _scheduler(send, **settings) -> EmbeddingScheduler:
+    """创建使用指定配置的调度器"""
+    scheduler = EmbeddingScheduler(send, "test-embedding")
+    scheduler.settings = scheduler.settings.model_copy(update=settings)
+    scheduler.rpm = scheduler.settings.embedding_rpm_limit
+    scheduler.tpm = scheduler.settings.embedding_tpm_limit
+    scheduler._local_bucket = LocalTokenBucket(scheduler.rpm, scheduler.tpm)
+    scheduler._slots = PrioritySlots(
+        scheduler.settings.embedding_max_concurrent_requests,
+        scheduler.settings.embedding_interactive_reserved_requests,
+    )
+    return scheduler
+
+
+async def _echo(texts):
+    """按文本长度返回向量，token数为字符数"""
+    return [[float(len(text))] for text in texts], sum(len(text) for text in texts)
+
+
+class TestPackBatches:
+    """批次打包测试"""
+    
+    def test_packs_by_estimated_tokens_and_count(self):
+        """测试：按估算token数和文本数分批，保持顺序，超长文本独占一批"""
+        texts = ["a" * 40, "b" * 40, "c" * 40, "d" * 400, "e" * 4, "f" * 4, "g" * 4]
+        
+        assert pack_batches(texts, max_texts=10, max_tokens=25) == [(0, 2), (2, 3), (3, 4), (4, 7)]
+        assert pack_batches(texts[4:], max_texts=2, max_tokens=1000) == [(0, 2), (2, 3)]
+        assert pack_batches([], max_texts=2, max_tokens=10) == []
+
+
+class TestLocalTokenBucket:
+    """进程内令牌桶测试"""
+    
+    def test_requests_per_minute(self):
+        """测试：额度用完后返回等待时间，按速率恢复"""
+        clock = FakeClock()
+        bucket = LocalTokenBucket(rpm=2, tpm=0, clock=clock)
+        
+        assert bucket.try_acquire(1, 100, reserve=0) == 0
+        assert bucket.try_acquire(1, 100, reserve=0) == 0
+        assert bucket.try_acquire(1, 100, reserve=0) == pytest.approx(30.0)
+        clock.now += 30
+        assert bucket.try_acquire(1, 100, reserve=0) == 0
+    
+    def test_tokens_per_minute_and_oversized_requests(self):
+        """测试：token额度按估算token数扣减，超过桶容量的请求等到桶满即可发送"""
+        clock = FakeClock()
+        bucket = LocalTokenBucket(rpm=0, tpm=600, clock=clock)
+        
+        assert bucket.try_acquire(1, 500, reserve=0) == 0
+        assert bucket.try_acquire(1, 200, reserve=0) == pytest.approx(10.0)
+        clock.now += 60
+        assert bucket.try_acquire(1, 5000, reserve=0) == 0
+    
+    def test_background_leaves_interactive_reserve(self):
+        """测试：后台请求不能使用保留额度，查询请求可以"""
+        bucket = LocalTokenBucket(rpm=10, tpm=0, clock=FakeClock())
+        for _ in range(5):
+            assert bucket.try_acquire(1, 1, reserve=0.5) == 0
+        
+        assert bucket.try_acquire(1, 1, reserve=0.5) > 0
+        assert bucket.try_acquire(1, 1, reserve=0) == 0
+
+
+class TestSchedulerMetrics:
+    """吞吐量指标测试"""
+    
+    def test_sustained_throughput_over_window(self):
+        """测试：吞吐量按滑动窗口内的请求计算"""
+        clock = FakeClock()
+        metrics = SchedulerMetrics(window=10, clock=clock)
+        for _ in range(5):
+            clock.now += 2
+            metrics.record(texts=4, tokens=100)
+        
+        assert metrics.snapshot()["tokens_per_sec"] == pytest.approx(50.0)
+        clock.now += 20
+        snapshot = metrics.snapshot()
+        assert snapshot["tokens_per_sec"] == 0
+        assert snapshot["tokens"] == 500
+
+
+class TestEmbeddingScheduler:
+    """调度器测试"""
+    
+    @pytest.mark.asyncio
+    async def test_run_packs_batches_and_keeps_order(self):
+        """测试：按token数分为多个请求，结果按输入顺序返回"""
+        send = AsyncMock(side_effect=_echo)
+        scheduler = _scheduler(send, embedding_request_max_tokens=2, embedding_request_max_texts=100)
+        texts = ["aaaa", "bbbbbbbb", "cc", "d"]
+        
+        embeddings, tokens = await scheduler.run(texts)
+        
+        assert embeddings == [[4.0], [8.0], [2.0], [1.0]]
+        assert tokens == 15
+        assert [call.args[0] for call in send.await_args_list] == [["aaaa"], ["bbbbbbbb"], ["cc", "d"]]
+        assert scheduler.metrics.snapshot()["requests"] == 3
+    
+    @pytest.mark.asyncio
+    async def test_rate_limited_batch_is_retried(self):
+        """测试：429按Retry-After退避后只重试失败的批次"""
+        send = AsyncMock(side_effect=[_rate_limit_error({"retry-after-ms": "1"}), *[await _echo(["x"])]])
+        scheduler = _scheduler(send)
+        
+        embeddings, _ = await scheduler.run(["x"])
+        
+        assert embeddings == [[1.0]]
+        assert send.await_count == 2
+        assert scheduler.metrics.rate_limited_retries == 1
+    
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_retries(self):
+        """测试：超过最大重试次数后抛出429错误"""
+        send = AsyncMock(side_effect=_rate_limit_error({"retry-after": "0"}))
+        scheduler = _scheduler(send, embedding_max_retries=2)
+        
+        with pytest.raises(openai.RateLimitError):
+            await scheduler.run(["x"])
+        assert send.await_count == 3
+        assert scheduler.metrics.errors == 1
+    
+    @pytest.mark.asyncio
+    async def test_shared_budget_is_taken_in_redis(self):
+        """测试：配置了限额时在Redis中原子扣减，需要等待时按返回的秒数等待，后台请求带保留比例"""
+        redis = AsyncMock()
+        redis.eval = AsyncMock(side_effect=["0.01", "0"])
+        scheduler = _scheduler(AsyncMock(side_effect=_echo), embedding_rpm_limit=60, embedding_tpm_limit=1000)
+        
+        with patch("app.services.rag.embedding_scheduler.get_redis_client", new=AsyncMock(return_value=redis)):
+            await scheduler.run(["abcd"], EmbeddingPriority.BACKGROUND)
+        
+        assert redis.eval.await_count == 2
+        _, num_keys, requests_key, tokens_key, reserve, rpm, requests, tpm, tokens = redis.eval.await_args.args
+        assert (num_keys, requests_key, tokens_key) == (2, "embedding:ratelimit:test-embedding:requests",
+                                                        "embedding:ratelimit:test-embedding:tokens")
+        assert (reserve, rpm, requests, tpm, tokens) == (0.1, 60, 1, 1000, 1)
+        assert scheduler.metrics.throttled_seconds == pytest.approx(0.01)
+    
+    @pytest.mark.asyncio
+    async def test_falls_back_to_local_bucket_without_redis(self):
+        """测试：Redis不可用时使用进程内令牌桶，查询请求不扣减保留比例"""
+        scheduler = _scheduler(AsyncMock(side_effect=_echo), embedding_rpm_limit=2)
+        failing = AsyncMock(side_effect=ConnectionError("redis down"))
+        
+        with patch("app.services.rag.embedding_scheduler.get_redis_client", new=failing):
+            await scheduler.run(["a"], EmbeddingPriority.INTERACTIVE)
+            await scheduler.run(["b"], EmbeddingPriority.INTERACTIVE)
+        
+        assert failing.await_count == 1
+        assert scheduler._local_bucket.try_acquire(1, 1, reserve=0) > 0
+    
+    @pytest.mark.asyncio
+    async def test_interactive_request_overtakes_queued_background_batches(self):
+        """测试：并发槽位占满时，后到的查询请求先于已排队的导入批次发送"""
+        sent = []
+        release = asyncio.Event()
+        
+        async def send(batch):
+            sent.append(batch[0])
+            if batch[0].startswith("bg"):
+                await release.wait()
+            return [[1.0] for _ in batch], len(batch)
+        
+        scheduler = _scheduler(send, embedding_max_concurrent_requests=1, embedding_interactive_reserved_requests=0)
+        background = [asyncio.create_task(scheduler.run([f"bg{i}"])) for i in range(3)]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(scheduler.run(["query"], EmbeddingPriority.INTERACTIVE))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(interactive, *background)
+        
+        assert sent == ["bg0", "query", "bg1", "bg2"]
+    
+    @pytest.mark.asyncio
+    async def test_background_cannot_take_reserved_slots(self):
+        """测试：导入批次占满非保留槽位时，查询请求使用保留槽位立即发送"""
+        release = asyncio.Event()
+        in_flight = []
+        
+        async def send(batch):
+            in_flight.append(batch[0])
+            if batch[0].startswith("bg"):
+                await release.wait()
+            return [[1.0] for _ in batch], len(batch)
+        
+        scheduler = _scheduler(send, embedding_max_concurrent_requests=3, embedding_interactive_reserved_requests=1)
+        background = [asyncio.create_task(scheduler.run([f"bg{i}"])) for i in range(4)]
+        await asyncio.sleep(0)
+        
+        embeddings, _ = await asyncio.wait_for(scheduler.run(["query"], EmbeddingPriority.INTERACTIVE), timeout=1)
+        
+        assert embeddings == [[1.0]]
+        assert in_flight == ["bg0", "bg1", "query"]
+        release.set()
+        await asyncio.gather(*background)
+        assert in_flight[3:] == ["bg2", "bg3"]
@@ -0,0 +1,104 @@
+"""
+Embedding服务单元测试
+Unit tests for Embedding service micro-batching
+"""
+
+import os
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+# 设置环境变量
+os.environ.update({
+    "LLM_API_KEY": "test-llm-key",
+    "LLM_BASE_URL": "https://test-llm.com",
+    "LLM_MODEL_ID": "test-model",
+    "EMBEDDING_MODEL": "test-embedding",
+    "EMBEDDING_BASE_URL": "https://test-embedding.com",
+    "EMBEDDING_API_KEY": "test-embedding-key",
+    "COMPOSIO_API_KEY": "test-composio-key",
+    "MONGODB_CONNECTION_STRING": "mongodb://test:27017/testdb",
+    "REDIS_URL": "redis://test:6379",
+    "QDRANT_URL": "http://test:6333",
+})
+
+from app.services.rag.embedding_service import EmbeddingService
+
+
+def _fake_create(**kwargs):
+    """模拟embeddings.create：每个文本的向量为[长度]"""
+    texts = kwargs["input"] if isinstance(kwargs["input"], list) else [kwargs["input"]]
+    return SimpleNamespace(
+        data=[SimpleNamespace(index=i, embedding=[float(len(text))]) for i, text in enumerate(texts)],
+        usage=SimpleNamespace(total_tokens=sum(len(text) for text in texts)),
+    )
+
+
+@pytest.fixture
+def service():
+    """创建EmbeddingService实例（API被mock）"""
+    service = EmbeddingService()
+    service.client = SimpleNamespace(embeddings=SimpleNamespace(create=AsyncMock(side_effect=_fake_create)))
+    return service
+
+
+class TestEmbeddingBatching:
+    """Embedding微批处理测试"""
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_request(self, service):
+        """测试：并发的embed调用合并为一次请求，结果按调用方分发"""
+        texts = ["a", "bb", "ccc", "dddd"]
+        
+        results = await asyncio.gather(*[service.embed(text) for text in texts])
+        
+        assert service.client.embeddings.create.await_count == 1
+        assert service.client.embeddings.create.await_args.kwargs["input"] == texts
+        assert [embedding for embedding, _ in results] == [[1.0], [2.0], [3.0], [4.0]]
+        assert [tokens for _, tokens in results] == [1, 2, 3, 4]
+    
+    @pytest.mark.asyncio
+    async def test_batch_flushes_at_max_size(self, service):
+        """测试：达到最大批次大小时立即发送"""
+        service.max_batch_size = 4
+        service.max_batch_wait = 10
+        
+        results = await asyncio.wait_for(
+            asyncio.gather(*[service.embed(f"text-{i}") for i in range(8)]),
+            timeout=1,
+        )
+        
+        assert len(results) == 8
+        assert service.client.embeddings.create.await_count == 2
+        assert service.metrics.snapshot()["max_batch_size"] == 4
+    
+    @pytest.mark.asyncio
+    async def test_duplicate_texts_are_requested_once(self, service):
+        """测试：同一批次中的重复文本只请求一次"""
+        results = await asyncio.gather(service.embed("same"), service.embed("same"))
+        
+        assert service.client.embeddings.create.await_args.kwargs["input"] == ["same"]
+        assert results[0] == results[1]
+    
+    @pytest.mark.asyncio
+    async def test_batch_error_propagates_to_all_callers(self, service):
+        """测试：批量请求失败时每个调用方都收到异常"""
+        service.client.embeddings.create = AsyncMock(side_effect=RuntimeError("boom"))
+        
+        results = await asyncio.gather(service.embed("a"), service.embed("b"), return_exceptions=True)
+        
+        assert all("生成嵌入向量失败" in str(result) for result in results)
+        assert service.metrics.snapshot()["errors"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_metrics_record_batches_and_wait(self, service):
+        """测试：记录批次大小和队列等待时间"""
+        await asyncio.gather(*[service.embed(str(i)) for i in range(3)])
+        await service.embed("later")
+        
+        snapshot = service.metrics.snapshot()
+        assert snapshot["batches"] == 2
+        assert snapshot["texts"] == 4
+        assert snapshot["avg_batch_size"] == 2.0
+        assert snapshot["max_queue_wait_ms"] > 0
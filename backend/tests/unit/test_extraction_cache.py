@@ -0,0 +1,80 @@
+"""
+文件提取结果缓存单元测试
+Unit tests for the content-addressed extraction cache
+"""
+
+import hashlib
+import os
+
+# 设置环境变量
+os.environ.update({
+    "LLM_API_KEY": "test-llm-key",
+    "LLM_BASE_URL": "https://test-llm.com",
+    "LLM_MODEL_ID": "test-model",
+    "EMBEDDING_MODEL": "test-embedding",
+    "EMBEDDING_BASE_URL": "https://test-embedding.com",
+    "EMBEDDING_API_KEY": "test-embedding-key",
+    "COMPOSIO_API_KEY": "test-composio-key",
+    "MONGODB_CONNECTION_STRING": "mongodb://test:27017/testdb",
+    "REDIS_URL": "redis://test:6379",
+    "QDRANT_URL": "http://test:6333",
+})
+
+from app.services.rag.extraction_cache import ExtractionCache, file_sha256
+from app.services.rag.text_splitter import TextSplitterService
+
+
+FILE_HASH = "ab" + "0" * 62
+
+
+class TestExtractionCache:
+    """提取结果缓存测试"""
+    
+    def test_file_sha256(self, tmp_path):
+        """测试：文件哈希与整体计算的SHA-256一致"""
+        path = tmp_path / "doc.txt"
+        path.write_bytes(b"hello world" * 1000)
+        
+        assert file_sha256(path) == hashlib.sha256(b"hello world" * 1000).hexdigest()
+    
+    def test_text_and_chunks_round_trip(self, tmp_path):
+        """测试：文本按格式缓存，分块按格式和分块配置缓存"""
+        cache = ExtractionCache(tmp_path)
+        default_key = TextSplitterService().config_key
+        small_key = TextSplitterService(chunk_size=64).config_key
+        
+        assert cache.get_text(FILE_HASH, "csv") is None
+        cache.put_text(FILE_HASH, "csv", "列: 值\n\n")
+        cache.put_chunks(FILE_HASH, "csv", default_key, ["列: 值"])
+        
+        assert cache.get_text(FILE_HASH, "csv") == "列: 值\n\n"
+        assert cache.get_text(FILE_HASH, "text") is None
+        assert cache.get_chunks(FILE_HASH, "csv", default_key) == ["列: 值"]
+        assert cache.get_chunks(FILE_HASH, "csv", small_key) is None
+        assert not list(tmp_path.rglob(".tmp-*"))
+    
+    def test_embeddings_are_merged_per_model(self, tmp_path):
+        """测试：向量按模型隔离，多次写入时合并"""
+        cache = ExtractionCache(tmp_path)
+        
+        cache.put_embeddings(FILE_HASH, "text-embedding-3-small", {"h1": [1.0, 0.0]})
+        cache.put_embeddings(FILE_HASH, "text-embedding-3-small", {"h2": [0.0, 1.0]})
+        
+        assert cache.get_embeddings(FILE_HASH, "text-embedding-3-small") == {"h1": [1.0, 0.0], "h2": [0.0, 1.0]}
+        assert cache.get_embeddings(FILE_HASH, "other/model") == {}
+    
+    def test_prune_evicts_least_recently_used(self, tmp_path):
+        """测试：超过大小上限时淘汰最久未使用的条目"""
+        cache = ExtractionCache(tmp_path, max_bytes=150)
+        hashes = [f"{i:02d}" + "f" * 62 for i in range(3)]
+        for i, file_hash in enumerate(hashes):
+            cache.put_text(file_hash, "text", "x" * 100)
+            entry = tmp_path / file_hash[:2] / file_hash
+            os.utime(entry, (1000 + i, 1000 + i))
+        # 读取第一个条目后它成为最近使用的
+        assert cache.get_text(hashes[0], "text") is not None
+        
+        assert cache.prune() == 2
+        assert cache.get_text(hashes[0], "text") is not None
+        assert cache.get_text(hashes[1], "text") is None
+        assert cache.get_text(hashes[2], "text") is None
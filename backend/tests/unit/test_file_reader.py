@@ -0,0 +1,108 @@
+"""
+本地文件流式读取单元测试
+Unit tests for the memory-mapped streaming file reader
+"""
+
+import codecs
+import json
+import time
+
+import pytest
+
+from app.services.rag.file_reader import detect_format, iter_file_bytes, iter_file_text, read_file_text
+
+
+class TestDetectFormat:
+    """文件格式判断测试"""
+    
+    def test_extension_then_mime_type(self):
+        """测试：优先按扩展名判断，其次按MIME类型，无法判断时按文本处理"""
+        assert detect_format("notes.MD") == "markdown"
+        assert detect_format("rows.tsv", "text/plain") == "tsv"
+        assert detect_format("export", "application/x-ndjson") == "jsonl"
+        assert detect_format("data.csv", None) == "csv"
+        assert detect_format("blob.bin", "application/octet-stream") == "text"
+
+
+class TestIterFileText:
+    """流式读取测试"""
+    
+    def test_text_blocks_match_whole_file(self, tmp_path):
+        """测试：多字节字符跨越块边界时，流式解码结果与整体解码一致"""
+        text = "中文段落，包含多字节字符。\nplain ascii line\n" * 200
+        path = tmp_path / "doc.txt"
+        path.write_text(text, encoding="utf-8")
+        
+        assert "".join(iter_file_text(path, block_size=7)) == text
+        assert sum(len(block) for block in iter_file_bytes(path, block_size=4096)) == path.stat().st_size
+    
+    def test_empty_file(self, tmp_path):
+        """测试：空文件不输出任何内容"""
+        path = tmp_path / "empty.txt"
+        path.write_bytes(b"")
+        
+        assert list(iter_file_text(path)) == []
+    
+    def test_bom_selects_encoding(self, tmp_path):
+        """测试：UTF-8和UTF-16的BOM被识别且不出现在文本中"""
+        utf8 = tmp_path / "utf8.md"
+        utf8.write_bytes(codecs.BOM_UTF8 + "# 标题\n".encode("utf-8"))
+        utf16 = tmp_path / "utf16.txt"
+        utf16.write_text("双字节文本", encoding="utf-16")
+        
+        assert read_file_text(utf8) == "# 标题\n"
+        assert read_file_text(utf16) == "双字节文本"
+    
+    def test_falls_back_to_gb18030_mid_file(self, tmp_path):
+        """测试：开头是ASCII、后面出现GB18030字节时，从该位置起改用GB18030解码"""
+        text = "ascii header line\n" * 10 + "后面是国标编码的中文内容\n"
+        path = tmp_path / "legacy.txt"
+        path.write_bytes(text.encode("gb18030"))
+        
+        assert read_file_text(path) == text
+        assert "".join(iter_file_text(path, block_size=5)) == text
+    
+    def test_binary_file_is_rejected(self, tmp_path):
+        """测试：二进制文件被拒绝"""
+        path = tmp_path / "image.txt"
+        path.write_bytes(b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR")
+        
+        with pytest.raises(ValueError):
+            read_file_text(path)
+    
+    def test_csv_rows_are_rendered_with_header(self, tmp_path):
+        """测试：CSV每行渲染为带列名的段落，引号内的换行和分隔符被正确处理"""
+        path = tmp_path / "rows.csv"
+        path.write_text('name,city,note\nAlice,Paris,"likes\nbread, cheese"\nBob,,tall\n', encoding="utf-8")
+        
+        assert read_file_text(path) == (
+            "name: Alice; city: Paris; note: likes\nbread, cheese\n\n"
+            "name: Bob; note: tall\n\n"
+        )
+        assert "".join(iter_file_text(path, block_size=3)) == read_file_text(path)
+    
+    def test_long_single_line_is_linear(self, tmp_path):
+        """测试：没有换行的数MB单行（压缩JSON）分成很多小块读取时，耗时与长度线性相关"""
+        path = tmp_path / "minified.jsonl"
+        value = "x" * (8 * 1024 * 1024)
+        path.write_text(json.dumps({"blob": value}) + "\n" + json.dumps({"id": 2}), encoding="utf-8")
+        
+        started = time.monotonic()
+        records = "".join(iter_file_text(path, block_size=1024)).split("\n\n")
+        elapsed = time.monotonic() - started
+        
+        assert records[0] == f"blob: {value}"
+        assert records[1] == "id: 2"
+        assert elapsed < 5
+    
+    def test_jsonl_records_are_flattened(self, tmp_path):
+        """测试：JSONL记录展开为字段文本，嵌套字段以点号连接，无法解析的行原样保留"""
+        path = tmp_path / "events.jsonl"
+        lines = [
+            json.dumps({"id": 1, "user": {"name": "张三", "tags": ["a", "b"]}}, ensure_ascii=False),
+            "",
+            "not json",
+        ]
+        path.write_text("\n".join(lines), encoding="utf-8")
+        
+        assert read_file_text(path) == 'id: 1; user.name: 张三; user.tags: ["a", "b"]\n\nnot json\n\n'
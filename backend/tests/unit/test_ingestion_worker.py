@@ -0,0 +1,648 @@
+"""
+数据源导入Worker单元测试
+Unit tests for the data source ingestion worker
+"""
+
+import asyncio
+import os
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# 设置环境变量
+os.environ.update({
+    "LLM_API_KEY": "test-llm-key",
+    "LLM_BASE_URL": "https://test-llm.com",
+    "LLM_MODEL_ID": "test-model",
+    "EMBEDDING_MODEL": "test-embedding",
+    "EMBEDDING_BASE_URL": "https://test-embedding.com",
+    "EMBEDDING_API_KEY": "test-embedding-key",
+    "COMPOSIO_API_KEY": "test-composio-key",
+    "MONGODB_CONNECTION_STRING": "mongodb://test:27017/testdb",
+    "REDIS_URL": "redis://test:6379",
+    "QDRANT_URL": "http://test:6333",
+})
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import Distance, VectorParams
+
+from app.models.schemas import DataSource, DataSourceDoc
+from app.services.rag.extraction_cache import ExtractionCache
+from app.services.rag.rag_service import RAGService
+from app.services.rag.text_splitter import TextSplitterService
+from app.services.rag.url_crawler import CrawlResult
+from app.workers.ingestion_worker import IngestionWorker, _gather_or_cancel
+
+
+class FakeDataSourcesRepository:
+    """内存中的数据源Repository"""
+    
+    def __init__(self, sources, deleted_sources=()):
+        self.pending = list(sources)
+        self.deleting = list(deleted_sources)
+        self.existing_ids = {source.id for source in [*sources, *deleted_sources]}
+        self.released = {}
+    
+    async def poll_pending_job(self, lease_seconds, max_attempts=3):
+        return self.pending.pop(0) if self.pending else None
+    
+    async def poll_delete_job(self, lease_seconds, max_attempts=3):
+        return self.deleting.pop(0) if self.deleting else None
+    
+    async def delete(self, source_id):
+        self.existing_ids.discard(source_id)
+        return True
+    
+    async def find_existing_ids(self, source_ids):
+        return set(source_ids) & self.existing_ids
+    
+    async def renew_lease(self, source_id, version):
+        return True
+    
+    async def release(self, source_id, version, data):
+        self.released[source_id] = data
+
+
+class FakeDocsRepository:
+    """内存中的数据源文档Repository"""
+    
+    def __init__(self, docs):
+        self.docs = {doc.id: doc for doc in docs}
+        self.updates = {}
+    
+    async def list_all(self, source_id, statuses):
+        return [doc for doc in self.docs.values() if doc.source_id == source_id and doc.status in statuses]
+    
+    async def update_by_version(self, doc_id, version, data):
+        self.updates[doc_id] = data
+        return self.docs[doc_id]
+    
+    async def delete(self, doc_id):
+        return self.docs.pop(doc_id, None) is not None
+    
+    async def delete_by_source_id(self, source_id):
+        self.docs = {doc_id: doc for doc_id, doc in self.docs.items() if doc.source_id != source_id}
+
+
+class StubEmbeddingService:
+    """根据文本长度生成确定性向量的embedding服务"""
+    
+    model = "stub"
+    
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.fail_on = fail_on
+    
+    async def embed_many(self, texts):
+        self.calls.append(list(texts))
+        if self.fail_on and any(self.fail_on in text for text in texts):
+            raise RuntimeError("embedding failed")
+        return [[float(len(text)), 1.0, 0.0, 0.0] for text in texts], sum(len(text) for text in texts)
+
+
+class FakeUrlCrawler:
+    """返回预设页面的URL抓取器：etag为页面版本号，带相同etag请求时返回304"""
+    
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+    
+    async def fetch(self, url, etag=None, last_modified=None):
+        self.requests.append((url, etag))
+        version, text = self.pages[url]
+        if version is not None and etag == version:
+            return CrawlResult(url, 304, etag=etag)
+        return CrawlResult(url, 200, text, etag=version)
+
+
+def _source(source_id="src-1", source_type="text") -> DataSource:
+    """创建测试数据源"""
+    return DataSource(
+        id=source_id, name="source", description="", projectId="proj-1", status="pending",
+        version=1, createdAt=datetime.now(), attempts=1, data={"type": source_type},
+    )
+
+
+def _doc(doc_id, data, source_id="src-1") -> DataSourceDoc:
+    """创建测试文档"""
+    return DataSourceDoc(
+        id=doc_id, sourceId=source_id, projectId="proj-1", name=f"{doc_id}.txt", version=1,
+        status="pending", createdAt=datetime.now(), data=data,
+    )
+
+
+@pytest.fixture
+async def qdrant_client():
+    """创建本地内存模式的Qdrant客户端"""
+    client = AsyncQdrantClient(location=":memory:")
+    await client.create_collection(
+        collection_name=RAGService.COLLECTION_NAME,
+        vectors_config=VectorParams(size=4, distance=Distance.DOT),
+    )
+    yield client
+    await client.close()
+
+
+def _build_worker(qdrant_client, sources, docs, embedding_service, deleted_sources=()) -> IngestionWorker:
+    """创建使用本地Qdrant、内存Repository和桩embedding的Worker"""
+    with patch("app.services.rag.rag_service.get_qdrant_client", return_value=qdrant_client), \
+         patch("app.services.rag.rag_service.get_embedding_service", return_value=embedding_service), \
+         patch("app.services.rag.rag_service.get_embedding_cache"):
+        rag_service = RAGService()
+    
+    with patch("app.workers.ingestion_worker.get_embedding_service", return_value=embedding_service), \
+         patch("app.workers.ingestion_worker.get_rag_service", return_value=rag_service), \
+         patch("app.workers.ingestion_worker.get_text_splitter_service",
+               return_value=TextSplitterService(chunk_size=40, chunk_overlap=0)), \
+         patch("app.workers.ingestion_worker.DataSourcesRepository", return_value=FakeDataSourcesRepository(sources, deleted_sources)), \
+         patch("app.workers.ingestion_worker.DataSourceDocsRepository", return_value=FakeDocsRepository(docs)):
+        worker = IngestionWorker(worker_id="test")
+    worker.settings = worker.settings.model_copy(update={"ingestion_embed_batch_size": 2, "ingestion_queue_size": 1})
+    worker.extraction_cache = None
+    return worker
+
+
+async def _points(qdrant_client):
+    """获取集合中的所有点"""
+    points, _ = await qdrant_client.scroll(RAGService.COLLECTION_NAME, limit=1000)
+    return points
+
+
+class TestIngestionWorker:
+    """导入Worker测试"""
+    
+    @pytest.mark.asyncio
+    async def test_text_source_is_ingested(self, qdrant_client):
+        """测试：text数据源的文档被切分、批量embedding并写入Qdrant，数据源标记为ready"""
+        text = "First paragraph about apples.\n\nSecond paragraph about pears.\n\nThird one about plums."
+        embedder = StubEmbeddingService()
+        worker = _build_worker(qdrant_client, [_source()], [_doc("doc-1", {"type": "text", "content": text})], embedder)
+        
+        assert await worker.run_once() is True
+        
+        points = await _points(qdrant_client)
+        assert len(points) == 3
+        assert {point.payload["docId"] for point in points} == {"doc-1"}
+        assert {point.payload["projectId"] for point in points} == {"proj-1"}
+        assert [len(batch) for batch in embedder.calls] == [2, 1]
+        assert worker.docs_repository.updates["doc-1"]["status"] == "ready"
+        assert worker.docs_repository.updates["doc-1"]["content"] == text
+        assert worker.data_sources_repository.released["src-1"]["status"] == "ready"
+    
+    @pytest.mark.asyncio
+    async def test_files_local_source_reads_uploads_dir(self, qdrant_client, tmp_path):
+        """测试：files_local文档从上传目录读取"""
+        (tmp_path / "doc-2").write_text("uploaded file body", encoding="utf-8")
+        doc = _doc("doc-2", {
+            "type": "file_local", "name": "notes.txt", "size": 18, "mimeType": "text/plain", "path": "/api/uploads/doc-2",
+        })
+        worker = _build_worker(qdrant_client, [_source(source_type="files_local")], [doc], StubEmbeddingService())
+        worker.settings = worker.settings.model_copy(update={"rag_uploads_dir": str(tmp_path)})
+        
+        await worker.run_once()
+        
+        points = await _points(qdrant_client)
+        assert [point.payload["content"] for point in points] == ["uploaded file body"]
+        assert worker.data_sources_repository.released["src-1"]["status"] == "ready"
+    
+    @pytest.mark.asyncio
+    async def test_large_local_file_is_streamed(self, qdrant_client, tmp_path):
+        """测试：超过阈值的本地文件流式分块导入，文档不保存全文，重新导入时复用已有的块"""
+        rows = "".join(f"item {i},value {i}\n" for i in range(12))
+        (tmp_path / "doc-3").write_text("name,value\n" + rows, encoding="utf-8")
+        doc = _doc("doc-3", {
+            "type": "file_local", "name": "items.csv", "size": 1, "mimeType": "text/csv", "path": "/api/uploads/doc-3",
+        })
+        embedder = StubEmbeddingService()
+        worker = _build_worker(qdrant_client, [_source(source_type="files_local")] * 2, [doc], embedder)
+        worker.settings = worker.settings.model_copy(update={
+            "rag_uploads_dir": str(tmp_path), "ingestion_stream_min_bytes": 0,
+        })
+        
+        await worker.run_once()
+        
+        points = await _points(qdrant_client)
+        assert len(points) == 12
+        assert sorted(point.payload["chunkIndex"] for point in points) == list(range(12))
+        assert "name: item 0; value: value 0" in {point.payload["content"] for point in points}
+        assert all(len(batch) <= 2 for batch in embedder.calls)
+        assert worker.docs_repository.updates["doc-3"]["status"] == "ready"
+        assert worker.docs_repository.updates["doc-3"]["content"] is None
+        
+        embedder.calls.clear()
+        await worker.run_once()
+        
+        assert embedder.calls == []
+        assert len(await _points(qdrant_client)) == 12
+    
+    @pytest.mark.asyncio
+    async def test_oversized_content_is_not_stored_on_doc(self, qdrant_client):
+        """测试：全文按UTF-8编码后超过上限时文档记录不保存全文（多字节字符按编码后的大小计算）"""
+        text = "中文内容。" * 8
+        worker = _build_worker(qdrant_client, [_source()], [_doc("doc-1", {"type": "text", "content": text})],
+                               StubEmbeddingService())
+        worker.settings = worker.settings.model_copy(update={"ingestion_doc_content_max_bytes": len(text) * 2})
+        
+        await worker.run_once()
+        
+        assert worker.docs_repository.updates["doc-1"]["status"] == "ready"
+        assert worker.docs_repository.updates["doc-1"]["content"] is None
+        assert len(await _points(qdrant_client)) > 0
+    
+    @pytest.mark.asyncio
+    async def test_same_file_in_another_source_reuses_extraction_cache(self, qdrant_client, tmp_path):
+        """测试：同一文件上传到另一个数据源时，复用缓存的文本、分块和向量，不再调用embedding"""
+        body = "Shared handbook intro.\n\nShared handbook details.\n\nShared handbook appendix."
+        uploads = tmp_path / "uploads"
+        uploads.mkdir()
+        (uploads / "upload-a").write_text(body, encoding="utf-8")
+        (uploads / "upload-b").write_text(body, encoding="utf-8")
+        docs = [
+            _doc("doc-a", {"type": "file_local", "name": "handbook.md", "size": 1, "mimeType": "text/markdown",
+                           "path": "/api/uploads/upload-a"}),
+            _doc("doc-b", {"type": "file_local", "name": "handbook.md", "size": 1, "mimeType": "text/markdown",
+                           "path": "/api/uploads/upload-b"}, source_id="src-2"),
+        ]
+        embedder = StubEmbeddingService()
+        worker = _build_worker(qdrant_client, [_source(), _source("src-2")], docs, embedder)
+        worker.settings = worker.settings.model_copy(update={"rag_uploads_dir": str(uploads)})
+        worker.extraction_cache = ExtractionCache(tmp_path / "cache")
+        
+        await worker.run_once()
+        assert sum(len(batch) for batch in embedder.calls) == 3
+        embedder.calls.clear()
+        
+        with patch("app.workers.ingestion_worker.read_file_text") as read_file_text:
+            await worker.run_once()
+        
+        read_file_text.assert_not_called()
+        assert embedder.calls == []
+        points = await _points(qdrant_client)
+        assert sorted(point.payload["sourceId"] for point in points) == ["src-1"] * 3 + ["src-2"] * 3
+        assert worker.docs_repository.updates["doc-b"]["content"] == body
+    
+    @pytest.mark.asyncio
+    async def test_url_source_skips_unchanged_pages(self, qdrant_client):
+        """测试：URL文档抓取后导入并保存校验值；304或内容哈希未变化时跳过分块和embedding"""
+        url = "https://docs.example.com/guide"
+        crawler = FakeUrlCrawler({url: ('"v1"', "Guide intro paragraph.\n\nGuide details paragraph.")})
+        embedder = StubEmbeddingService()
+        worker = _build_worker(qdrant_client, [_source(source_type="urls")] * 3, [_doc("doc-u", {"type": "url", "url": url})], embedder)
+        worker.url_crawler = crawler
+        
+        await worker.run_once()
+        
+        update = worker.docs_repository.updates["doc-u"]
+        assert update["status"] == "ready"
+        assert update["data.etag"] == '"v1"'
+        assert update["data.contentHash"]
+        assert len(await _points(qdrant_client)) == 2
+        
+        # 模拟MongoDB应用更新后的文档：再次导入时带上ETag，服务器返回304
+        data = {"type": "url", "url": url, "etag": '"v1"', "contentHash": update["data.contentHash"]}
+        worker.docs_repository.docs["doc-u"] = _doc("doc-u", data)
+        embedder.calls.clear()
+        await worker.run_once()
+        
+        assert crawler.requests[-1] == (url, '"v1"')
+        assert embedder.calls == []
+        assert worker.docs_repository.updates["doc-u"]["status"] == "ready"
+        
+        # 服务器不支持条件请求时，按内容哈希判断未变化
+        crawler.pages[url] = (None, crawler.pages[url][1])
+        await worker.run_once()
+        
+        assert embedder.calls == []
+        assert len(await _points(qdrant_client)) == 2
+    
+    @pytest.mark.asyncio
+    async def test_bare_304_keeps_stored_validators(self, qdrant_client):
+        """测试：只支持Last-Modified的服务器返回不带校验头的304时，保留已保存的Last-Modified"""
+        url = "https://static.example.com/faq"
+        last_modified = "Wed, 21 Oct 2026 07:28:00 GMT"
+        requests = []
+        
+        class LastModifiedOnlyCrawler:
+            async def fetch(self, url, etag=None, if_modified_since=None):
+                requests.append(if_modified_since)
+                if if_modified_since is not None:
+                    return CrawlResult(url, 304)
+                return CrawlResult(url, 200, "FAQ body paragraph.", last_modified=last_modified)
+        
+        embedder = StubEmbeddingService()
+        worker = _build_worker(qdrant_client, [_source(source_type="urls")] * 3, [_doc("doc-f", {"type": "url", "url": url})], embedder)
+        worker.url_crawler = LastModifiedOnlyCrawler()
+        
+        await worker.run_once()
+        content_hash = worker.docs_repository.updates["doc-f"]["data.contentHash"]
+        for _ in range(2):
+            # 模拟MongoDB应用上一次的更新
+            update = worker.docs_repository.updates["doc-f"]
+            worker.docs_repository.docs["doc-f"] = _doc("doc-f", {
+                "type": "url", "url": url, "etag": update["data.etag"],
+                "lastModified": update["data.lastModified"], "contentHash": content_hash,
+            })
+            await worker.run_once()
+        
+        assert requests == [None, last_modified, last_modified]
+        assert worker.docs_repository.updates["doc-f"]["data.lastModified"] == last_modified
+        assert worker.docs_repository.updates["doc-f"]["data.etag"] is None
+        assert len(embedder.calls) == 1
+    
+    @pytest.mark.asyncio
+    async def test_failed_doc_is_recorded_and_others_continue(self, qdrant_client):
+        """测试：单个文档失败时记录错误，其他文档继续处理，数据源标记为error"""
+        docs = [
+            _doc("doc-ok", {"type": "text", "content": "fine content"}),
+            _doc("doc-bad", {"type": "text", "content": "poison content"}),
+            _doc("doc-s3", {"type": "file_s3", "name": "a.pdf", "size": 1, "mimeType": "application/pdf", "s3Key": "a"}),
+        ]
+        worker = _build_worker(qdrant_client, [_source()], docs, StubEmbeddingService(fail_on="poison"))
+        
+        await worker.run_once()
+        
+        updates = worker.docs_repository.updates
+        assert updates["doc-ok"]["status"] == "ready"
+        assert updates["doc-bad"]["status"] == "error"
+        assert "embedding failed" in updates["doc-bad"]["error"]
+        assert updates["doc-s3"]["status"] == "error"
+        assert [point.payload["docId"] for point in await _points(qdrant_client)] == ["doc-ok"]
+        released = worker.data_sources_repository.released["src-1"]
+        assert released["status"] == "error"
+        assert released["error"]
+    
+    @pytest.mark.asyncio
+    async def test_failed_error_status_write_does_not_stall_pipeline(self, qdrant_client):
+        """测试：写入文档错误状态失败时只记录日志，流水线继续处理其他文档并正常结束"""
+        docs = [
+            _doc("doc-bad", {"type": "text", "content": "poison content"}),
+            _doc("doc-ok", {"type": "text", "content": "fine content"}),
+        ]
+        worker = _build_worker(qdrant_client, [_source()], docs, StubEmbeddingService(fail_on="poison"))
+        update_by_version = worker.docs_repository.update_by_version
+        
+        async def flaky_update(doc_id, version, data):
+            if data["status"] == "error":
+                raise RuntimeError("mongo unavailable")
+            return await update_by_version(doc_id, version, data)
+        
+        worker.docs_repository.update_by_version = flaky_update
+        
+        await asyncio.wait_for(worker.run_once(), timeout=5)
+        
+        assert worker.docs_repository.updates["doc-ok"]["status"] == "ready"
+        assert worker.data_sources_repository.released["src-1"]["status"] == "error"
+    
+    @pytest.mark.asyncio
+    async def test_stage_failure_cancels_other_stages(self):
+        """测试：一个阶段异常退出时取消其他阶段，阻塞在队列上的消费者不会永远挂起"""
+        inbox = asyncio.Queue()
+        blocked = asyncio.create_task(inbox.get())
+        
+        async def broken_stage():
+            await asyncio.sleep(0)
+            raise RuntimeError("stage crashed")
+        
+        with pytest.raises(RuntimeError, match="stage crashed"):
+            await asyncio.wait_for(_gather_or_cancel(blocked, broken_stage()), timeout=5)
+        assert blocked.cancelled()
+    
+    @pytest.mark.asyncio
+    async def test_slow_upsert_records_progress(self, qdrant_client):
+        """测试：写入较慢时定期把进度记录到文档，完成后记录最终进度"""
+        text = "First paragraph about apples.\n\nSecond paragraph about pears.\n\nThird one about plums."
+        worker = _build_worker(qdrant_client, [_source()], [_doc("doc-1", {"type": "text", "content": text})], StubEmbeddingService())
+        worker.settings = worker.settings.model_copy(update={"ingestion_progress_interval": 0.005})
+        worker.rag_service.settings = worker.rag_service.settings.model_copy(update={
+            "ingestion_upsert_batch_size": 1, "qdrant_upsert_concurrency": 1,
+        })
+        upsert = qdrant_client.upsert
+        
+        async def slow_upsert(**kwargs):
+            await asyncio.sleep(0.02)
+            return await upsert(**kwargs)
+        
+        worker.rag_service.qdrant_client.upsert = AsyncMock(side_effect=slow_upsert)
+        updates = []
+        update_by_version = worker.docs_repository.update_by_version
+        
+        async def record_update(doc_id, version, data):
+            updates.append(data)
+            return await update_by_version(doc_id, version, data)
+        
+        worker.docs_repository.update_by_version = record_update
+        
+        await worker.run_once()
+        
+        progress = [update["data.upsertProgress"] for update in updates if "data.upsertProgress" in update]
+        assert len(progress) >= 2
+        assert progress[-1] == {"upserted": 3, "total": 3}
+        assert updates[-1]["status"] == "ready"
+    
+    @pytest.mark.asyncio
+    async def test_reingest_only_embeds_changed_chunks(self, qdrant_client):
+        """测试：重新导入时只embedding变化的块，消失的块被删除，未变化的块不重复"""
+        original = "Alpha paragraph stays.\n\nBeta paragraph goes.\n\nGamma paragraph stays."
+        changed = "Alpha paragraph stays.\n\nDelta paragraph is new.\n\nGamma paragraph stays."
+        embedder = StubEmbeddingService()
+        worker = _build_worker(qdrant_client, [_source(), _source()], [_doc("doc-1", {"type": "text", "content": original})], embedder)
+        await worker.run_once()
+        first_points = {point.id for point in await _points(qdrant_client)}
+        
+        worker.docs_repository.docs["doc-1"] = _doc("doc-1", {"type": "text", "content": changed})
+        embedder.calls.clear()
+        await worker.run_once()
+        
+        points = await _points(qdrant_client)
+        assert embedder.calls == [["Delta paragraph is new."]]
+        assert sorted(point.payload["content"] for point in points) == [
+            "Alpha paragraph stays.", "Delta paragraph is new.", "Gamma paragraph stays.",
+        ]
+        assert len(first_points & {point.id for point in points}) == 2
+    
+    @pytest.mark.asyncio
+    async def test_reingest_updates_positions_of_reused_chunks(self, qdrant_client):
+        """测试：文档开头插入内容后，复用块的chunkIndex随之更新而不重新embedding"""
+        original = "Alpha paragraph stays.\n\nGamma paragraph stays."
+        changed = "Delta paragraph is new.\n\nAlpha paragraph stays.\n\nGamma paragraph stays."
+        embedder = StubEmbeddingService()
+        worker = _build_worker(qdrant_client, [_source(), _source()], [_doc("doc-1", {"type": "text", "content": original})], embedder)
+        await worker.run_once()
+        
+        worker.docs_repository.docs["doc-1"] = _doc("doc-1", {"type": "text", "content": changed})
+        embedder.calls.clear()
+        await worker.run_once()
+        
+        positions = {point.payload["content"]: point.payload["chunkIndex"] for point in await _points(qdrant_client)}
+        assert embedder.calls == [["Delta paragraph is new."]]
+        assert positions == {"Delta paragraph is new.": 0, "Alpha paragraph stays.": 1, "Gamma paragraph stays.": 2}
+    
+    @pytest.mark.asyncio
+    async def test_reingest_unchanged_doc_is_free(self, qdrant_client):
+        """测试：内容未变化时不调用embedding，也不产生重复向量"""
+        text = "Same content in the first part.\n\nStill the same in the second part."
+        embedder = StubEmbeddingService()
+        worker = _build_worker(qdrant_client, [_source(), _source()], [_doc("doc-1", {"type": "text", "content": text})], embedder)
+        await worker.run_once()
+        first_points = {point.id for point in await _points(qdrant_client)}
+        embedder.calls.clear()
+        
+        await worker.run_once()
+        
+        assert embedder.calls == []
+        assert {point.id for point in await _points(qdrant_client)} == first_points
+        assert worker.docs_repository.updates["doc-1"]["status"] == "ready"
+    
+    @pytest.mark.asyncio
+    async def test_no_pending_source(self, qdrant_client):
+        """测试：没有待处理数据源时返回False"""
+        worker = _build_worker(qdrant_client, [], [], StubEmbeddingService())
+        
+        assert await worker.run_once() is False
+    
+    @pytest.mark.asyncio
+    async def test_deleted_source_is_cleaned_up(self, qdrant_client):
+        """测试：软删除的数据源被优先认领，向量、文档和记录都被删除"""
+        worker = _build_worker(
+            qdrant_client, [_source()], [_doc("doc-1", {"type": "text", "content": "hello world"})],
+            StubEmbeddingService(),
+        )
+        await worker.run_once()
+        assert len(await _points(qdrant_client)) == 1
+        
+        worker.data_sources_repository.deleting.append(_source())
+        assert await worker.run_once() is True
+        
+        assert await _points(qdrant_client) == []
+        assert worker.docs_repository.docs == {}
+        assert worker.data_sources_repository.existing_ids == set()
+    
+    @pytest.mark.asyncio
+    async def test_deleted_doc_is_removed(self, qdrant_client):
+        """测试：标记为deleted的文档在处理数据源时删除其向量"""
+        docs = [
+            _doc("doc-1", {"type": "text", "content": "keep me"}),
+            _doc("doc-2", {"type": "text", "content": "drop me"}),
+        ]
+        worker = _build_worker(qdrant_client, [_source()], docs, StubEmbeddingService())
+        await worker.run_once()
+        
+        worker.docs_repository.docs["doc-2"].status = "deleted"
+        worker.data_sources_repository.pending.append(_source())
+        await worker.run_once()
+        
+        assert {point.payload["docId"] for point in await _points(qdrant_client)} == {"doc-1"}
+        assert set(worker.docs_repository.docs) == {"doc-1"}
+    
+    @pytest.mark.asyncio
+    async def test_sweep_orphans(self, qdrant_client):
+        """测试：孤儿清理删除数据源记录已不存在的向量"""
+        worker = _build_worker(
+            qdrant_client, [_source("src-1"), _source("src-2")],
+            [
+                _doc("doc-1", {"type": "text", "content": "first"}, source_id="src-1"),
+                _doc("doc-2", {"type": "text", "content": "second"}, source_id="src-2"),
+            ],
+            StubEmbeddingService(),
+        )
+        await worker.run_once()
+        await worker.run_once()
+        worker.data_sources_repository.existing_ids.discard("src-2")
+        
+        swept = await worker.sweep_orphans()
+        
+        assert swept == 1
+        assert {point.payload["sourceId"] for point in await _points(qdrant_client)} == {"src-1"}
+
+
+class FakeCursor:
+    """模拟motor游标的异步迭代"""
+    
+    def __init__(self, docs):
+        self.docs = list(docs)
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self):
+        if not self.docs:
+            raise StopAsyncIteration
+        return self.docs.pop(0)
+
+
+class TestPollPendingJob:
+    """数据源租约认领测试"""
+    
+    @pytest.mark.asyncio
+    async def test_poll_uses_atomic_lease(self):
+        """测试：通过find_one_and_update原子认领，并增加attempts"""
+        from app.repositories.data_sources import DataSourcesRepository
+        
+        repo = DataSourcesRepository()
+        with patch("app.repositories.data_sources.get_mongodb_db") as mock_db:
+            mock_collection = MagicMock()
+            mock_collection.find = MagicMock(return_value=FakeCursor([]))
+            mock_collection.find_one_and_update = AsyncMock(return_value={
+                **_source().model_dump(by_alias=True, exclude={"id"}), "_id": "5f1b2c3d4e5f6a7b8c9d0e1f",
+            })
+            mock_db.return_value.__getitem__ = MagicMock(return_value=mock_collection)
+            
+            source = await repo.poll_pending_job(lease_seconds=300, max_attempts=3)
+        
+        assert source.id == "5f1b2c3d4e5f6a7b8c9d0e1f"
+        query, update = mock_collection.find_one_and_update.await_args.args
+        assert {"status": "pending", "attempts": 0} in query["$or"]
+        assert {"status": "error", "attempts": {"$lt": 3}} in query["$or"]
+        assert update["$inc"] == {"attempts": 1}
+        assert update["$set"]["lastAttemptAt"].endswith("Z")
+        reclaim = [branch for branch in query["$or"] if "lastAttemptAt" in branch]
+        assert reclaim and reclaim[0]["attempts"] == {"$lt": 3}
+        assert reclaim[0]["lastAttemptAt"]["$lt"] < update["$set"]["lastAttemptAt"]
+    
+    @pytest.mark.asyncio
+    async def test_update_writes_utc_timestamp(self):
+        """测试：update与租约使用同一种UTC时间格式，按字符串比较时顺序正确"""
+        from app.repositories.data_sources import DataSourcesRepository
+        from app.repositories.timestamps import utc_iso
+        
+        repo = DataSourcesRepository()
+        repo.cache_service = MagicMock()
+        repo.cache_service.delete = AsyncMock()
+        with patch("app.repositories.data_sources.get_mongodb_db") as mock_db:
+            mock_collection = MagicMock()
+            mock_collection.find_one_and_update = AsyncMock(return_value=None)
+            mock_db.return_value.__getitem__ = MagicMock(return_value=mock_collection)
+            
+            before = utc_iso()
+            await repo.update("5f1b2c3d4e5f6a7b8c9d0e1f", {"status": "pending"})
+        
+        _, update = mock_collection.find_one_and_update.await_args.args
+        assert update["$set"]["lastUpdatedAt"].endswith("Z")
+        assert update["$set"]["lastUpdatedAt"] >= before
+    
+    @pytest.mark.asyncio
+    async def test_exhausted_expired_lease_is_marked_error(self):
+        """测试：租约过期且已用完尝试次数的任务（如每次都让worker崩溃）被标记为error，不再被认领"""
+        from app.repositories.data_sources import DataSourcesRepository
+        
+        repo = DataSourcesRepository()
+        repo.cache_service = MagicMock()
+        repo.cache_service.delete = AsyncMock()
+        with patch("app.repositories.data_sources.get_mongodb_db") as mock_db:
+            mock_collection = MagicMock()
+            mock_collection.find = MagicMock(return_value=FakeCursor([{"_id": "5f1b2c3d4e5f6a7b8c9d0e1f"}]))
+            mock_collection.update_many = AsyncMock()
+            mock_collection.find_one_and_update = AsyncMock(return_value=None)
+            mock_db.return_value.__getitem__ = MagicMock(return_value=mock_collection)
+            
+            source = await repo.poll_pending_job(lease_seconds=300, max_attempts=3)
+        
+        assert source is None
+        exhausted_query = mock_collection.find.call_args.args[0]
+        assert exhausted_query["status"] == "pending"
+        assert exhausted_query["attempts"] == {"$gte": 3}
+        query, update = mock_collection.update_many.await_args.args
+        assert query["_id"] == {"$in": ["5f1b2c3d4e5f6a7b8c9d0e1f"]}
+        assert update["$set"]["status"] == "error"
+        assert update["$set"]["error"]
+        repo.cache_service.delete.assert_awaited_once()
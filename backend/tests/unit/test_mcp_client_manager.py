@@ -0,0 +1,216 @@
+"""
+MCP客户端管理器单元测试
+Unit tests for MCP client manager (against a local streamable-HTTP MCP server)
+"""
+
+import os
+import asyncio
+import socket
+import threading
+import time
+import pytest
+
+# 设置环境变量
+os.environ.update({
+    "LLM_API_KEY": "test-llm-key",
+    "LLM_BASE_URL": "https://test-llm.com",
+    "LLM_MODEL_ID": "test-model",
+    "EMBEDDING_MODEL": "test-embedding",
+    "EMBEDDING_BASE_URL": "https://test-embedding.com",
+    "EMBEDDING_API_KEY": "test-embedding-key",
+    "COMPOSIO_API_KEY": "test-composio-key",
+    "MONGODB_CONNECTION_STRING": "mongodb://test:27017/testdb",
+    "REDIS_URL": "redis://test:6379",
+    "QDRANT_URL": "http://test:6333",
+})
+
+import uvicorn
+from mcp import ClientSession
+from mcp.server.fastmcp import FastMCP
+
+from app.services.mcp import mcp_client_manager as manager_module
+from app.services.mcp.mcp_client_manager import McpClientManager
+
+
+SERVER_STATS = {"list_tools": 0, "create_ticket": 0}
+
+
+def _build_server() -> FastMCP:
+    """创建测试用MCP服务器"""
+    server = FastMCP("test-server")
+    
+    @server.tool(structured_output=False)
+    async def echo(text: str) -> str:
+        """Echo the input"""
+        return text
+    
+    @server.tool(structured_output=False)
+    async def slow_echo(text: str) -> str:
+        """Echo the input after a short delay"""
+        await asyncio.sleep(0.2)
+        return text
+    
+    @server.tool(structured_output=False)
+    async def create_ticket(title: str) -> str:
+        """Create a ticket (not idempotent)"""
+        SERVER_STATS["create_ticket"] += 1
+        return f"ticket {SERVER_STATS['create_ticket']}: {title}"
+    
+    original_list_tools = server.list_tools
+    
+    async def counting_list_tools():
+        SERVER_STATS["list_tools"] += 1
+        return await original_list_tools()
+    
+    server._mcp_server.list_tools()(counting_list_tools)
+    return server
+
+
+def _free_port() -> int:
+    """获取空闲端口"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    """在后台线程中启动streamable-HTTP MCP服务器"""
+    port = _free_port()
+    config = uvicorn.Config(_build_server().streamable_http_app(), host="127.0.0.1", port=port, log_level="error")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started and time.monotonic() < deadline:
+        time.sleep(0.05)
+    yield f"http://127.0.0.1:{port}/mcp"
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def connect_counter(monkeypatch):
+    """统计建立连接的次数"""
+    calls = []
+    original = manager_module.connect_mcp_session
+    
+    async def counting_connect(server_url, connect_timeout):
+        calls.append(server_url)
+        return await original(server_url, connect_timeout)
+    
+    monkeypatch.setattr(manager_module, "connect_mcp_session", counting_connect)
+    return calls
+
+
+class TestMcpClientManager:
+    """MCP会话池测试"""
+    
+    @pytest.mark.asyncio
+    async def test_session_is_reused_across_calls(self, server_url, connect_counter):
+        """测试：多次调用复用同一个会话"""
+        manager = McpClientManager()
+        try:
+            first = await manager.call_tool("proj-1", "srv", server_url, "echo", {"text": "a"})
+            second = await manager.call_tool("proj-1", "srv", server_url, "echo", {"text": "b"})
+        finally:
+            await manager.close_all()
+        
+        assert first.content[0].text == "a"
+        assert second.content[0].text == "b"
+        assert len(connect_counter) == 1
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_are_multiplexed(self, server_url, connect_counter):
+        """测试：并发调用在同一个会话上多路复用"""
+        manager = McpClientManager()
+        try:
+            started = time.monotonic()
+            results = await asyncio.gather(*[
+                manager.call_tool("proj-1", "srv", server_url, "slow_echo", {"text": str(i)})
+                for i in range(5)
+            ])
+            elapsed = time.monotonic() - started
+        finally:
+            await manager.close_all()
+        
+        assert [result.content[0].text for result in results] == [str(i) for i in range(5)]
+        assert len(connect_counter) == 1
+        assert elapsed < 5 * 0.2
+    
+    @pytest.mark.asyncio
+    async def test_tool_list_is_cached(self, server_url):
+        """测试：工具列表在TTL内命中缓存"""
+        manager = McpClientManager()
+        SERVER_STATS["list_tools"] = 0
+        try:
+            tools = await manager.list_tools("proj-1", "srv", server_url)
+            await manager.list_tools("proj-1", "srv", server_url)
+            cached_count = SERVER_STATS["list_tools"]
+            await manager.list_tools("proj-1", "srv", server_url, refresh=True)
+        finally:
+            await manager.close_all()
+        
+        assert {tool.name for tool in tools} == {"echo", "slow_echo", "create_ticket"}
+        assert cached_count == 1
+        assert SERVER_STATS["list_tools"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_idle_sessions_are_swept(self, server_url):
+        """测试：后台清理关闭空闲超时的会话并移除其锁，仍在使用的会话保留"""
+        manager = McpClientManager()
+        manager.settings = manager.settings.model_copy(update={"mcp_session_sweep_interval": 0.05})
+        try:
+            await manager.call_tool("proj-1", "idle", server_url, "echo", {"text": "a"})
+            await manager.call_tool("proj-1", "busy", server_url, "echo", {"text": "b"})
+            idle = manager._sessions[("proj-1", "idle")]
+            idle.last_used_at -= manager.settings.mcp_session_idle_timeout
+            
+            await asyncio.sleep(0.2)
+            
+            assert set(manager._sessions) == {("proj-1", "busy")}
+            assert set(manager._locks) == {("proj-1", "busy")}
+            assert not idle.is_alive
+        finally:
+            await manager.close_all()
+        
+        assert manager._sweeper is None
+    
+    @pytest.mark.asyncio
+    async def test_reconnects_after_session_dies(self, server_url, connect_counter):
+        """测试：会话断开后自动重连"""
+        manager = McpClientManager()
+        try:
+            await manager.call_tool("proj-1", "srv", server_url, "echo", {"text": "a"})
+            await manager._sessions[("proj-1", "srv")].close()
+            result = await manager.call_tool("proj-1", "srv", server_url, "echo", {"text": "b"})
+        finally:
+            await manager.close_all()
+        
+        assert result.content[0].text == "b"
+        assert len(connect_counter) == 2
+    
+    @pytest.mark.asyncio
+    async def test_tool_call_is_not_repeated_after_mid_call_failure(self, server_url, connect_counter, monkeypatch):
+        """测试：请求已发出后连接断开时工具调用不会重试（避免重复执行），失败的会话被丢弃"""
+        original_call_tool = ClientSession.call_tool
+        
+        async def call_then_disconnect(self, *args, **kwargs):
+            await original_call_tool(self, *args, **kwargs)
+            raise ConnectionResetError("connection lost before the response was read")
+        
+        manager = McpClientManager()
+        SERVER_STATS["create_ticket"] = 0
+        try:
+            with monkeypatch.context() as patched:
+                patched.setattr(ClientSession, "call_tool", call_then_disconnect)
+                with pytest.raises(ConnectionResetError):
+                    await manager.call_tool("proj-1", "srv", server_url, "create_ticket", {"title": "refund"})
+            assert ("proj-1", "srv") not in manager._sessions
+            result = await manager.call_tool("proj-1", "srv", server_url, "create_ticket", {"title": "next"})
+        finally:
+            await manager.close_all()
+        
+        assert SERVER_STATS["create_ticket"] == 2
+        assert result.content[0].text == "ticket 2: next"
+        assert len(connect_counter) == 2
@@ -0,0 +1,270 @@
+"""
+OpenAI Agent工具服务单元测试
+Unit tests for OpenAI Agent tools service
+"""
+
+import os
+import json
+import hashlib
+import pytest
+import httpx
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# 设置环境变量
+os.environ.update({
+    "LLM_API_KEY": "test-llm-key",
+    "LLM_BASE_URL": "https://test-llm.com",
+    "LLM_MODEL_ID": "test-model",
+    "EMBEDDING_MODEL": "test-embedding",
+    "EMBEDDING_BASE_URL": "https://test-embedding.com",
+    "EMBEDDING_API_KEY": "test-embedding-key",
+    "COMPOSIO_API_KEY": "test-composio-key",
+    "MONGODB_CONNECTION_STRING": "mongodb://test:27017/testdb",
+    "REDIS_URL": "redis://test:6379",
+    "QDRANT_URL": "http://test:6333",
+})
+
+from jose import jwt
+
+from mcp.types import CallToolResult, TextContent
+
+from app.models.schemas import DataSource, Project, Workflow, WorkflowAgent, WorkflowTool
+from app.services.agents.openai_agent_tools import OpenAIAgentToolsService
+from app.services.rag.rag_service import RAGResult
+from app.services.rag.semantic_cache import SemanticSearchCache
+
+
+WEBHOOK_URL = "https://hooks.example.com/tool_call"
+SECRET = "project-secret"
+
+
+def _project() -> Project:
+    """创建测试项目"""
+    empty_workflow = Workflow(agents=[], prompts=[], tools=[])
+    return Project(
+        id="proj-1",
+        name="test",
+        createdAt=datetime.now(),
+        createdByUserId="user-1",
+        secret=SECRET,
+        draftWorkflow=empty_workflow,
+        liveWorkflow=empty_workflow,
+        webhookUrl=WEBHOOK_URL,
+        customMcpServers={"crm": {"serverUrl": "http://mcp.example.com/mcp"}},
+        composioConnectedAccounts={
+            "gmail": {
+                "id": "ca-1",
+                "authConfigId": "ac-1",
+                "status": "ACTIVE",
+                "createdAt": datetime.now(),
+                "lastUpdatedAt": datetime.now(),
+            },
+        },
+    )
+
+
+@pytest.fixture
+def tools_service():
+    """创建OpenAIAgentToolsService实例（依赖被mock）"""
+    with patch("app.services.agents.openai_agent_tools.get_composio_service") as mock_composio, \
+         patch("app.services.agents.openai_agent_tools.get_rag_service"):
+        mock_composio.return_value = MagicMock()
+        service = OpenAIAgentToolsService()
+    service.projects_repository = MagicMock()
+    service.projects_repository.get_by_id = AsyncMock(return_value=_project())
+    service.data_sources_repository = MagicMock()
+    service.data_sources_repository.fetch = AsyncMock(return_value=None)
+    return service
+
+
+class TestWebhookTool:
+    """Webhook工具测试"""
+    
+    @pytest.mark.asyncio
+    async def test_webhook_request_is_signed(self, tools_service):
+        """测试：Webhook请求带有可被tools_webhook校验的签名"""
+        captured = []
+        
+        async def handler(request: httpx.Request) -> httpx.Response:
+            captured.append(request)
+            return httpx.Response(200, json={"result": "ok"})
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        tool = tools_service._create_webhook_tool("proj-1", WorkflowTool(
+            name="lookup_order", description="Look up an order", parameters={"properties": {"id": {"type": "string"}}},
+        ))
+        
+        with patch("app.services.agents.openai_agent_tools.get_http_client", return_value=client):
+            output = await tool.on_invoke_tool(MagicMock(tool_call_id="call-1"), json.dumps({"id": "42"}))
+        
+        assert json.loads(output) == {"result": "ok"}
+        body = json.loads(captured[0].content)
+        decoded = jwt.decode(
+            captured[0].headers["x-signature-jwt"], SECRET, algorithms=["HS256"], audience=WEBHOOK_URL,
+        )
+        assert decoded["bodyHash"] == hashlib.sha256(body["content"].encode("utf-8")).hexdigest()
+        assert decoded["requestId"] == body["requestId"]
+        assert json.loads(body["content"])["toolCall"]["function"]["name"] == "lookup_order"
+    
+    @pytest.mark.asyncio
+    async def test_webhook_retry_reuses_jwt(self, tools_service):
+        """测试：服务端返回503时重试，重试复用同一个JWT"""
+        tokens = []
+        
+        async def handler(request: httpx.Request) -> httpx.Response:
+            tokens.append(request.headers["x-signature-jwt"])
+            if len(tokens) == 1:
+                return httpx.Response(503, headers={"retry-after": "0"})
+            return httpx.Response(200, json={"result": "ok"})
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        
+        with patch("app.services.agents.openai_agent_tools.get_http_client", return_value=client):
+            result = await tools_service._invoke_webhook_tool("proj-1", "lookup_order", {"id": "42"}, "call-1")
+        
+        assert result == {"result": "ok"}
+        assert len(tokens) == 2
+        assert len(set(tokens)) == 1
+    
+    @pytest.mark.asyncio
+    async def test_webhook_is_not_retried_after_request_was_sent(self, tools_service):
+        """测试：请求已发出后读超时或返回500时不重试，避免重复执行有副作用的Webhook"""
+        requests = []
+        
+        async def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            raise httpx.ReadTimeout("read timed out", request=request)
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        
+        with patch("app.services.agents.openai_agent_tools.get_http_client", return_value=client):
+            with pytest.raises(httpx.ReadTimeout):
+                await tools_service._invoke_webhook_tool("proj-1", "create_order", {"id": "42"}, "call-1")
+        
+        assert len(requests) == 1
+    
+    @pytest.mark.asyncio
+    async def test_webhook_failure_returns_error(self, tools_service):
+        """测试：Webhook失败时返回错误信息而不是抛出异常"""
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(500)
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        tool = tools_service._create_webhook_tool("proj-1", WorkflowTool(
+            name="lookup_order", description="Look up an order", parameters={},
+        ))
+        
+        with patch("app.services.agents.openai_agent_tools.get_http_client", return_value=client):
+            output = await tool.on_invoke_tool(MagicMock(tool_call_id="call-2"), "{}")
+        
+        assert "error" in json.loads(output)
+
+
+class TestComposioTool:
+    """Composio工具测试"""
+    
+    @pytest.mark.asyncio
+    async def test_composio_tool_uses_connected_account(self, tools_service):
+        """测试：需要认证的Composio工具使用项目的已连接账户"""
+        tools_service.composio_service.execute_tool = AsyncMock(
+            return_value={"successful": True, "data": {"sent": True}}
+        )
+        tool = tools_service._create_composio_tool("proj-1", WorkflowTool(
+            name="send_email",
+            description="Send an email",
+            parameters={"properties": {"to": {"type": "string"}}},
+            isComposio=True,
+            composioData={
+                "slug": "GMAIL_SEND_EMAIL", "noAuth": False,
+                "toolkitName": "Gmail", "toolkitSlug": "gmail", "logo": "",
+            },
+        ))
+        
+        output = await tool.on_invoke_tool(MagicMock(tool_call_id="call-3"), json.dumps({"to": "a@b.c"}))
+        
+        assert json.loads(output) == {"sent": True}
+        call = tools_service.composio_service.execute_tool.await_args
+        assert call.args[0] == "GMAIL_SEND_EMAIL"
+        assert call.kwargs["connected_account_id"] == "ca-1"
+        assert call.kwargs["user_id"] == "proj-1"
+
+
+class TestMcpTool:
+    """MCP工具测试"""
+    
+    @pytest.mark.asyncio
+    async def test_mcp_tool_uses_pooled_session(self, tools_service):
+        """测试：MCP工具通过会话池调用项目配置的服务器"""
+        tools_service.mcp_client_manager = MagicMock()
+        tools_service.mcp_client_manager.call_tool = AsyncMock(return_value=CallToolResult(
+            content=[TextContent(type="text", text="found")],
+        ))
+        tool = tools_service._create_workflow_tool("proj-1", WorkflowTool(
+            name="find_customer",
+            description="Find a customer",
+            parameters={"properties": {"email": {"type": "string"}}},
+            isMcp=True,
+            mcpServerName="crm",
+        ))
+        
+        output = await tool.on_invoke_tool(MagicMock(tool_call_id="call-4"), json.dumps({"email": "a@b.c"}))
+        
+        assert json.loads(output)["content"][0]["text"] == "found"
+        tools_service.mcp_client_manager.call_tool.assert_awaited_once_with(
+            "proj-1", "crm", "http://mcp.example.com/mcp", "find_customer", {"email": "a@b.c"},
+        )
+
+
+class TestRAGTool:
+    """RAG检索工具测试"""
+    
+    @pytest.mark.asyncio
+    async def test_rag_search_accepts_query_list(self, tools_service):
+        """测试：传入多个查询时一次批量检索，结果按查询分组"""
+        tools_service.rag_service.search_many = AsyncMock(return_value=[
+            [RAGResult(title="A", name="A", content="alpha", doc_id="d1", source_id="s1")],
+            [],
+        ])
+        tool = tools_service._create_rag_tool("proj-1", WorkflowAgent(
+            name="support", type="conversation", description="Support docs", instructions="", model="m",
+            ragDataSources=["s1"],
+        ))
+        
+        output = await tool.on_invoke_tool(MagicMock(), json.dumps({"query": ["alpha", "beta"]}))
+        
+        assert [group["query"] for group in json.loads(output)] == ["alpha", "beta"]
+        assert json.loads(output)[0]["results"][0]["content"] == "alpha"
+        assert tools_service.rag_service.search_many.await_args.kwargs["queries"] == ["alpha", "beta"]
+    
+    @pytest.mark.asyncio
+    async def test_rag_search_reuses_results_for_paraphrases(self, tools_service):
+        """测试：相似查询命中语义缓存，数据源版本变化后重新检索"""
+        source = DataSource(
+            id="s1", name="docs", description="", projectId="proj-1", status="ready", version=1,
+            createdAt=datetime.now(), attempts=0, data={"type": "text"},
+        )
+        tools_service.data_sources_repository.fetch = AsyncMock(return_value=source)
+        tools_service.semantic_cache = SemanticSearchCache(threshold=0.95)
+        vectors = {"how do refunds work": [1.0, 0.0], "how does a refund work": [0.99, 0.05], "shipping": [0.0, 1.0]}
+        tools_service.rag_service.embed_queries = AsyncMock(side_effect=lambda queries: [vectors[q] for q in queries])
+        tools_service.rag_service.search_many = AsyncMock(side_effect=lambda queries, **kwargs: [
+            [RAGResult(title="A", name="A", content=query, doc_id="d1", source_id="s1")] for query in queries
+        ])
+        tool = tools_service._create_rag_tool("proj-1", WorkflowAgent(
+            name="support", type="conversation", description="Support docs", instructions="", model="m",
+            ragDataSources=["s1"],
+        ))
+        
+        first = await tool.on_invoke_tool(MagicMock(), json.dumps({"query": "how do refunds work"}))
+        paraphrase = await tool.on_invoke_tool(MagicMock(), json.dumps({"query": ["how does a refund work", "shipping"]}))
+        
+        assert json.loads(paraphrase)[0]["results"] == json.loads(first)
+        assert tools_service.rag_service.search_many.await_count == 2
+        assert tools_service.rag_service.search_many.await_args.kwargs["queries"] == ["shipping"]
+        assert tools_service.rag_service.search_many.await_args.kwargs["embeddings"] == [[0.0, 1.0]]
+        
+        tools_service.data_sources_repository.fetch = AsyncMock(return_value=source.model_copy(update={"version": 2}))
+        await tool.on_invoke_tool(MagicMock(), json.dumps({"query": "how does a refund work"}))
+        
+        assert tools_service.rag_service.search_many.await_count == 3
@@ -0,0 +1,111 @@
+"""
+RAG检索后处理单元测试
+Unit tests for RAG post-retrieval processing
+"""
+
+from app.services.rag.postprocess import excerpt_window, merge_adjacent_chunks, mmr_select
+from app.services.rag.tokens import estimate_tokens
+
+
+class TestMMR:
+    """MMR选择测试"""
+    
+    def test_near_duplicates_are_skipped(self):
+        """测试：与已选结果几乎相同的候选让位于相关性稍低但不同的候选"""
+        query = [1.0, 0.2, 0.0]
+        candidates = [
+            [1.0, 0.0, 0.0],
+            [0.99, 0.0, 0.1],
+            [0.6, 0.8, 0.0],
+        ]
+        
+        assert mmr_select(query, candidates, k=2, lambda_mult=0.5) == [0, 2]
+    
+    def test_lambda_one_is_pure_relevance(self):
+        """测试：lambda为1时按相关性排序"""
+        query = [1.0, 0.0]
+        candidates = [[0.0, 1.0], [1.0, 0.0], [0.7, 0.7]]
+        
+        assert mmr_select(query, candidates, k=3, lambda_mult=1.0) == [1, 2, 0]
+    
+    def test_explicit_relevance_overrides_similarity(self):
+        """测试：传入融合分时以融合分作为相关性"""
+        query = [1.0, 0.0]
+        candidates = [[1.0, 0.0], [0.0, 1.0]]
+        
+        assert mmr_select(query, candidates, k=1, relevance=[0.01, 0.03]) == [1]
+    
+    def test_empty_candidates(self):
+        """测试：没有候选时返回空列表"""
+        assert mmr_select([1.0], [], k=3) == []
+
+
+class TestMergeAdjacentChunks:
+    """相邻块合并测试"""
+    
+    def test_adjacent_chunks_merge_without_overlap_duplication(self):
+        """测试：同一文档的相邻块合并，并去掉分割时的重叠部分"""
+        payloads = [
+            {"docId": "d1", "chunkIndex": 2, "content": "third part of text"},
+            {"docId": "d2", "chunkIndex": 3, "content": "other doc"},
+            {"docId": "d1", "chunkIndex": 1, "content": "second part, third part"},
+        ]
+        
+        merged = merge_adjacent_chunks(payloads)
+        
+        assert [p["docId"] for p in merged] == ["d1", "d2"]
+        assert merged[0]["content"] == "second part, third part of text"
+    
+    def test_non_adjacent_and_legacy_chunks_stay_separate(self):
+        """测试：不相邻或缺少chunkIndex的块不合并"""
+        payloads = [
+            {"docId": "d1", "chunkIndex": 0, "content": "a"},
+            {"docId": "d1", "chunkIndex": 5, "content": "b"},
+            {"docId": "d1", "content": "legacy"},
+        ]
+        
+        assert [p["content"] for p in merge_adjacent_chunks(payloads)] == ["a", "b", "legacy"]
+    
+    def test_out_of_order_chunks_merge_transitively(self):
+        """测试：乱序到达的三个块（3、1、2）在桥接块出现后合并为一段，位于排名最靠前的位置"""
+        payloads = [
+            {"sourceId": "s1", "docId": "d1", "chunkIndex": 3, "content": "gamma"},
+            {"sourceId": "s1", "docId": "d2", "chunkIndex": 2, "content": "other doc"},
+            {"sourceId": "s1", "docId": "d1", "chunkIndex": 1, "content": "alpha"},
+            {"sourceId": "s1", "docId": "d1", "chunkIndex": 2, "content": "beta"},
+            {"sourceId": "s1", "docId": "d1", "chunkIndex": 2, "content": "beta"},
+        ]
+        
+        merged = merge_adjacent_chunks(payloads)
+        
+        assert [p["docId"] for p in merged] == ["d1", "d2"]
+        assert merged[0]["content"] == "alpha\nbeta\ngamma"
+        assert merged[0]["chunkIndex"] == 1
+
+
+class TestExcerptWindow:
+    """命中片段截取测试"""
+    
+    def test_short_document_is_returned_whole(self):
+        """测试：全文不超过上限时返回全文"""
+        assert excerpt_window("short doc", "short", 100) == "short doc"
+    
+    def test_window_is_centered_on_hit_and_capped(self):
+        """测试：片段包含命中块、两端带截断标记且不超过token上限"""
+        content = " ".join(f"word{i}" for i in range(400)) + " HIT CHUNK " + " ".join(f"tail{i}" for i in range(400))
+        
+        excerpt = excerpt_window(content, "HIT CHUNK", 50)
+        
+        assert "HIT CHUNK" in excerpt
+        assert excerpt.startswith("…") and excerpt.endswith("…")
+        assert estimate_tokens(excerpt.strip("…")) <= 50
+        assert " word" in excerpt and " tail" in excerpt
+    
+    def test_missing_hit_falls_back_to_chunk(self):
+        """测试：命中块不在全文中（文档已更新）时返回命中块本身"""
+        assert excerpt_window("x " * 1000, "gone", 10) == "gone"
+    
+    def test_cjk_tokens_are_counted_per_character(self):
+        """测试：中文按字估算token"""
+        assert estimate_tokens("质信智购") == 4
+        assert estimate_tokens("abcdefgh") == 2
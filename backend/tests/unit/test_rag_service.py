@@ -0,0 +1,446 @@
+"""
+RAG服务单元测试
+Unit tests for RAG service (against qdrant-client's local in-memory mode)
+"""
+
+import asyncio
+import os
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# 设置环境变量
+os.environ.update({
+    "LLM_API_KEY": "test-llm-key",
+    "LLM_BASE_URL": "https://test-llm.com",
+    "LLM_MODEL_ID": "test-model",
+    "EMBEDDING_MODEL": "test-embedding",
+    "EMBEDDING_BASE_URL": "https://test-embedding.com",
+    "EMBEDDING_API_KEY": "test-embedding-key",
+    "COMPOSIO_API_KEY": "test-composio-key",
+    "MONGODB_CONNECTION_STRING": "mongodb://test:27017/testdb",
+    "REDIS_URL": "redis://test:6379",
+    "QDRANT_URL": "http://test:6333",
+})
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.exceptions import ResponseHandlingException
+from qdrant_client.models import Distance, Modifier, SparseVectorParams, VectorParams
+
+from app.models.schemas import RAGReturnType, RAGSearchMode, RAGSearchParams, RAGSearchPreset
+from app.services.rag.embedding_projection import EmbeddingProjection
+from app.services.rag.rag_service import RAGService, resolve_search_params
+
+
+VECTORS = {
+    "alpha": [1.0, 0.0, 0.0, 0.0],
+    "beta": [0.0, 1.0, 0.0, 0.0],
+    "gamma": [0.0, 0.0, 1.0, 0.0],
+    "AB-1234 spec": [1.0, 0.5, 0.0, 0.0],
+}
+
+
+@pytest.fixture
+async def qdrant_client():
+    """创建本地内存模式的Qdrant客户端"""
+    client = AsyncQdrantClient(location=":memory:")
+    await client.create_collection(
+        collection_name=RAGService.COLLECTION_NAME,
+        vectors_config=VectorParams(size=4, distance=Distance.DOT),
+    )
+    yield client
+    await client.close()
+
+
+@pytest.fixture
+def rag_service(qdrant_client):
+    """创建RAGService实例（embedding服务被mock）"""
+    with patch("app.services.rag.rag_service.get_qdrant_client", return_value=qdrant_client), \
+         patch("app.services.rag.rag_service.get_embedding_service") as mock_embedding, \
+         patch("app.services.rag.rag_service.get_embedding_cache") as mock_cache:
+        mock_embedding.return_value = MagicMock(model="test-embedding")
+        mock_cache.return_value = MagicMock()
+        mock_cache.return_value.get = AsyncMock(return_value=None)
+        mock_cache.return_value.set = AsyncMock()
+        service = RAGService()
+    service.embedding_service.embed = AsyncMock(side_effect=lambda text: (VECTORS[text], 1))
+    return service
+
+
+class TestRAGService:
+    """RAG服务测试"""
+    
+    @pytest.mark.asyncio
+    async def test_upsert_then_search(self, rag_service):
+        """测试：写入后可以按项目和数据源过滤搜索"""
+        await rag_service.upsert_embeddings(
+            "proj-1", "src-1", "doc-1", "Doc 1", ["alpha chunk", "beta chunk"],
+            [VECTORS["alpha"], VECTORS["beta"]],
+        )
+        await rag_service.upsert_embeddings(
+            "proj-2", "src-1", "doc-2", "Doc 2", ["other project"], [VECTORS["alpha"]],
+        )
+        
+        results = await rag_service.search("proj-1", "alpha", ["src-1"], k=1)
+        
+        assert [result.content for result in results] == ["alpha chunk"]
+        assert results[0].doc_id == "doc-1"
+    
+    @pytest.mark.asyncio
+    async def test_search_filters_sources(self, rag_service):
+        """测试：不在source_ids中的数据源不会被返回"""
+        await rag_service.upsert_embeddings(
+            "proj-1", "src-1", "doc-1", "Doc 1", ["alpha chunk"], [VECTORS["alpha"]],
+        )
+        
+        results = await rag_service.search("proj-1", "alpha", ["src-2"])
+        
+        assert results == []
+    
+    @pytest.mark.asyncio
+    async def test_search_missing_collection_returns_empty(self, rag_service, qdrant_client):
+        """测试：集合不存在时返回空列表"""
+        await qdrant_client.delete_collection(RAGService.COLLECTION_NAME)
+        
+        results = await rag_service.search("proj-1", "alpha", ["src-1"])
+        
+        assert results == []
+    
+    @pytest.mark.asyncio
+    async def test_search_uses_cached_query_embedding(self, rag_service):
+        """测试：查询嵌入向量命中缓存时不调用embedding服务"""
+        await rag_service.upsert_embeddings(
+            "proj-1", "src-1", "doc-1", "Doc 1", ["beta chunk"], [VECTORS["beta"]],
+        )
+        rag_service.embedding_cache.get = AsyncMock(return_value=VECTORS["beta"])
+        
+        results = await rag_service.search("proj-1", "beta", ["src-1"])
+        
+        assert [result.content for result in results] == ["beta chunk"]
+        rag_service.embedding_service.embed.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_delete_embeddings_by_filter(self, rag_service, qdrant_client):
+        """测试：按项目、数据源、文档过滤删除，并回调进度"""
+        await rag_service.upsert_embeddings(
+            "proj-1", "src-1", "doc-1", "Doc 1", ["alpha chunk", "beta chunk"],
+            [VECTORS["alpha"], VECTORS["beta"]],
+        )
+        await rag_service.upsert_embeddings(
+            "proj-1", "src-1", "doc-2", "Doc 2", ["gamma chunk"], [VECTORS["gamma"]],
+        )
+        await rag_service.upsert_embeddings(
+            "proj-1", "src-2", "doc-3", "Doc 3", ["alpha again"], [VECTORS["alpha"]],
+        )
+        await rag_service.upsert_embeddings(
+            "proj-2", "src-3", "doc-4", "Doc 4", ["other project"], [VECTORS["alpha"]],
+        )
+        progress = []
+        
+        assert await rag_service.delete_embeddings(
+            "proj-1", "src-1", "doc-1", on_progress=lambda done, total: progress.append((done, total)),
+        ) == 2
+        assert progress[-1] == (2, 2)
+        assert await rag_service.delete_embeddings("proj-1", "src-1") == 1
+        assert await rag_service.delete_embeddings("proj-1") == 1
+        assert await rag_service.delete_embeddings("proj-1") == 0
+        
+        points, _ = await qdrant_client.scroll(RAGService.COLLECTION_NAME, limit=100)
+        assert [point.payload["projectId"] for point in points] == ["proj-2"]
+        assert await rag_service.list_indexed_source_ids() == {"src-3"}
+    
+    @pytest.mark.asyncio
+    async def test_promote_project_collection(self, rag_service, qdrant_client):
+        """测试：项目超过阈值后迁移到独立集合，读写和删除都路由到独立集合"""
+        rag_service.settings = rag_service.settings.model_copy(update={"qdrant_project_collection_threshold": 2})
+        await rag_service.upsert_embeddings(
+            "proj-1", "src-1", "doc-1", "Doc 1", ["alpha chunk", "beta chunk"],
+            [VECTORS["alpha"], VECTORS["beta"]],
+        )
+        await rag_service.upsert_embeddings(
+            "proj-2", "src-2", "doc-2", "Doc 2", ["other project"], [VECTORS["alpha"]],
+        )
+        
+        assert await rag_service.promote_project_collection("proj-2") is False
+        assert await rag_service.promote_project_collection("proj-1") is True
+        
+        shared, _ = await qdrant_client.scroll(RAGService.COLLECTION_NAME, limit=100)
+        assert [point.payload["projectId"] for point in shared] == ["proj-2"]
+        results = await rag_service.search("proj-1", "beta", ["src-1"], k=1)
+        assert [result.content for result in results] == ["beta chunk"]
+        assert await rag_service.list_indexed_source_ids() == {"src-1", "src-2"}
+        
+        assert await rag_service.delete_embeddings("proj-1") == 2
+        assert not await qdrant_client.collection_exists("embeddings_proj-1")
+    
+    @pytest.mark.asyncio
+    async def test_search_with_stale_route_falls_back_to_promoted_collection(self, rag_service):
+        """测试：其他进程拆分项目后，路由缓存仍指向共享集合时检索回退到独立集合"""
+        rag_service.settings = rag_service.settings.model_copy(update={"qdrant_project_collection_threshold": 2})
+        await rag_service.upsert_embeddings(
+            "proj-1", "src-1", "doc-1", "Doc 1", ["alpha chunk", "beta chunk"],
+            [VECTORS["alpha"], VECTORS["beta"]],
+        )
+        assert await rag_service.promote_project_collection("proj-1") is True
+        
+        rag_service._project_collections.set("proj-1", RAGService.COLLECTION_NAME)
+        results = await rag_service.search("proj-1", "beta", ["src-1"], k=1)
+        
+        assert [result.content for result in results] == ["beta chunk"]
+        assert await rag_service.collection_for("proj-1") == "embeddings_proj-1"
+    
+    @pytest.mark.asyncio
+    async def test_promotion_keeps_writes_that_race_the_copy(self, rag_service, qdrant_client):
+        """测试：迁移复制期间其他worker写入共享集合的点不会丢失，路由缓存过期前的写入也进入独立集合"""
+        rag_service.settings = rag_service.settings.model_copy(update={"qdrant_project_collection_threshold": 2})
+        await rag_service.upsert_embeddings(
+            "proj-1", "src-1", "doc-1", "Doc 1", ["alpha chunk", "beta chunk"],
+            [VECTORS["alpha"], VECTORS["beta"]],
+        )
+        scroll = qdrant_client.scroll
+        raced = []
+        
+        async def scroll_with_concurrent_write(**kwargs):
+            page = await scroll(**kwargs)
+            if not raced and kwargs["collection_name"] == RAGService.COLLECTION_NAME:
+                # 另一个worker在拆分前解析了路由，写入在复制之后才到达共享集合
+                other_worker = RAGService.__new__(RAGService)
+                other_worker.__dict__.update(rag_service.__dict__)
+                other_worker.collection_for = AsyncMock(return_value=RAGService.COLLECTION_NAME)
+                await other_worker.upsert_embeddings(
+                    "proj-1", "src-1", "doc-2", "Doc 2", ["gamma chunk"], [VECTORS["gamma"]],
+                )
+                raced.append(True)
+            return page
+        
+        rag_service.qdrant_client.scroll = AsyncMock(side_effect=scroll_with_concurrent_write)
+        assert await rag_service.promote_project_collection("proj-1") is True
+        rag_service.qdrant_client.scroll = scroll
+        
+        # 其他进程的路由缓存仍指向共享集合，写入前重新检查
+        rag_service._project_collections.set("proj-1", RAGService.COLLECTION_NAME)
+        await rag_service.upsert_embeddings("proj-1", "src-1", "doc-3", "Doc 3", ["delta chunk"], [VECTORS["alpha"]])
+        
+        shared, _ = await qdrant_client.scroll(RAGService.COLLECTION_NAME, limit=100)
+        dedicated, _ = await qdrant_client.scroll("embeddings_proj-1", limit=100)
+        assert raced
+        assert shared == []
+        assert sorted(point.payload["content"] for point in dedicated) == [
+            "alpha chunk", "beta chunk", "delta chunk", "gamma chunk",
+        ]
+    
+    @pytest.mark.asyncio
+    async def test_hybrid_search_ranks_exact_part_number(self, rag_service, qdrant_client):
+        """测试：混合检索通过BM25把零件号精确匹配的块排到稠密检索结果之前"""
+        await qdrant_client.delete_collection(RAGService.COLLECTION_NAME)
+        await qdrant_client.create_collection(
+            collection_name=RAGService.COLLECTION_NAME,
+            vectors_config=VectorParams(size=4, distance=Distance.DOT),
+            sparse_vectors_config={"bm25": SparseVectorParams(modifier=Modifier.IDF)},
+        )
+        await rag_service.upsert_embeddings(
+            "proj-1", "src-1", "doc-1", "Doc 1", ["alpha chunk", "bearing AB-1234 spec sheet"],
+            [VECTORS["alpha"], VECTORS["beta"]],
+        )
+        
+        dense = await rag_service.search("proj-1", "AB-1234 spec", ["src-1"], k=1)
+        hybrid = await rag_service.search(
+            "proj-1", "AB-1234 spec", ["src-1"], k=1, search_mode=RAGSearchMode.HYBRID,
+        )
+        
+        assert [result.content for result in dense] == ["alpha chunk"]
+        assert [result.content for result in hybrid] == ["bearing AB-1234 spec sheet"]
+    
+    @pytest.mark.asyncio
+    async def test_hybrid_search_falls_back_without_sparse_vectors(self, rag_service):
+        """测试：集合没有稀疏向量时混合检索退化为稠密检索"""
+        await rag_service.upsert_embeddings(
+            "proj-1", "src-1", "doc-1", "Doc 1", ["alpha chunk"], [VECTORS["alpha"]],
+        )
+        
+        results = await rag_service.search(
+            "proj-1", "alpha", ["src-1"], search_mode=RAGSearchMode.HYBRID,
+        )
+        
+        assert [result.content for result in results] == ["alpha chunk"]
+    
+    @pytest.mark.asyncio
+    async def test_diversify_drops_near_duplicates_and_merges_neighbours(self, rag_service):
+        """测试：后处理去掉近似重复块，并合并同一文档的相邻块"""
+        rag_service.settings = rag_service.settings.model_copy(update={"rag_mmr_lambda": 0.3})
+        rag_service.embedding_service.embed = AsyncMock(return_value=([1.0, 0.1, 0.0, 0.0], 1))
+        await rag_service.upsert_embeddings(
+            "proj-1", "src-1", "doc-1", "Doc 1",
+            ["intro to valves", "valve sizing table", "valve sizing table (copy)", "valve appendix"],
+            [[1.0, 0.0, 0.0, 0.0], [0.9, 0.3, 0.0, 0.0], [0.9, 0.3, 0.0, 0.05], [0.6, 0.0, 0.8, 0.0]],
+            chunk_indices=[0, 1, 5, 9],
+        )
+        
+        plain = await rag_service.search("proj-1", "valves", ["src-1"], k=3)
+        diverse = await rag_service.search("proj-1", "valves", ["src-1"], k=2, diversify=True)
+        rag_service.settings = rag_service.settings.model_copy(update={"rag_mmr_lambda": 1.0})
+        merged = await rag_service.search("proj-1", "valves", ["src-1"], k=2, diversify=True)
+        
+        assert "valve sizing table (copy)" in [result.content for result in plain]
+        assert [result.content for result in diverse] == ["intro to valves", "valve appendix"]
+        assert [result.content for result in merged] == ["intro to valves\nvalve sizing table"]
+    
+    @pytest.mark.asyncio
+    async def test_content_return_type_fetches_docs_once(self, rag_service):
+        """测试：content返回类型按文档去重、一次批量获取全文，并缓存热点文档"""
+        await rag_service.upsert_embeddings(
+            "proj-1", "src-1", "507f1f77bcf86cd799439011", "Doc 1",
+            ["alpha chunk", "beta chunk"], [VECTORS["alpha"], VECTORS["beta"]],
+        )
+        rag_service.docs_repository = MagicMock()
+        rag_service.docs_repository.bulk_fetch_content = AsyncMock(return_value={
+            "507f1f77bcf86cd799439011": {
+                "name": "Doc 1", "content": "full text: alpha chunk, beta chunk", "sourceId": "src-1",
+            },
+        })
+        
+        first = await rag_service.search("proj-1", "alpha", ["src-1"], return_type=RAGReturnType.CONTENT)
+        second = await rag_service.search("proj-1", "beta", ["src-1"], return_type=RAGReturnType.CONTENT)
+        
+        assert [result.content for result in first] == ["full text: alpha chunk, beta chunk"]
+        assert [result.content for result in second] == ["full text: alpha chunk, beta chunk"]
+        rag_service.docs_repository.bulk_fetch_content.assert_awaited_once_with(["507f1f77bcf86cd799439011"])
+    
+    @pytest.mark.asyncio
+    async def test_search_many_embeds_once_and_returns_per_query(self, rag_service):
+        """测试：批量搜索只发起一次embedding请求，结果与查询一一对应"""
+        await rag_service.upsert_embeddings(
+            "proj-1", "src-1", "doc-1", "Doc 1",
+            ["alpha chunk", "beta chunk"], [VECTORS["alpha"], VECTORS["beta"]],
+        )
+        rag_service.embedding_service.embed_many = AsyncMock(
+            side_effect=lambda texts, priority: ([VECTORS[text] for text in texts], 2),
+        )
+        
+        dense = await rag_service.search_many("proj-1", ["alpha", "beta"], ["src-1"], k=1)
+        hybrid = await rag_service.search_many(
+            "proj-1", ["beta", "alpha"], ["src-1"], k=1, search_mode=RAGSearchMode.HYBRID,
+        )
+        
+        assert [[result.content for result in results] for results in dense] == [["alpha chunk"], ["beta chunk"]]
+        assert [[result.content for result in results] for results in hybrid] == [["beta chunk"], ["alpha chunk"]]
+        rag_service.embedding_service.embed.assert_not_awaited()
+        assert rag_service.embedding_service.embed_many.await_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_search_preset_and_overrides_reach_qdrant(self, rag_service, qdrant_client):
+        """测试：智能体的搜索预设和覆盖参数传给Qdrant"""
+        await rag_service.upsert_embeddings("proj-1", "src-1", "doc-1", "Doc 1", ["alpha chunk"], [VECTORS["alpha"]])
+        rag_service.qdrant_client.search_batch = AsyncMock(wraps=qdrant_client.search_batch)
+        
+        results = await rag_service.search(
+            "proj-1", "alpha", ["src-1"],
+            search_preset=RAGSearchPreset.FAST,
+            search_params=RAGSearchParams(hnswEf=48),
+        )
+        
+        params = rag_service.qdrant_client.search_batch.await_args.kwargs["requests"][0].params
+        assert [result.content for result in results] == ["alpha chunk"]
+        assert params.hnsw_ef == 48
+        assert params.quantization.rescore is False
+    
+    @pytest.mark.asyncio
+    async def test_projection_applies_to_stored_and_query_vectors(self, rag_service, qdrant_client):
+        """测试：启用降维时写入和查询都使用投影后的向量，查询缓存保存原始向量"""
+        rag_service.projection = EmbeddingProjection.fit("test-embedding", list(VECTORS.values()), 2)
+        await qdrant_client.delete_collection(RAGService.COLLECTION_NAME)
+        await qdrant_client.create_collection(
+            collection_name=RAGService.COLLECTION_NAME,
+            vectors_config=VectorParams(size=2, distance=Distance.DOT),
+        )
+        await rag_service.upsert_embeddings(
+            "proj-1", "src-1", "doc-1", "Doc 1", ["alpha chunk", "beta chunk"],
+            [VECTORS["alpha"], VECTORS["beta"]],
+        )
+        
+        results = await rag_service.search("proj-1", "beta", ["src-1"], k=1)
+        
+        points, _ = await qdrant_client.scroll(RAGService.COLLECTION_NAME, with_vectors=True)
+        assert [result.content for result in results] == ["beta chunk"]
+        assert {len(point.vector) for point in points} == {2}
+        rag_service.embedding_cache.set.assert_awaited_once_with("test-embedding", "beta", VECTORS["beta"])
+
+    
+    @pytest.mark.asyncio
+    async def test_upsert_in_concurrent_batches_without_wait(self, rag_service, qdrant_client):
+        """测试：按批次并发写入，wait=False时全部提交后确认可见，每批完成后回调进度"""
+        rag_service.settings = rag_service.settings.model_copy(update={
+            "ingestion_upsert_batch_size": 2, "qdrant_upsert_concurrency": 2, "qdrant_upsert_wait": False,
+        })
+        upsert = qdrant_client.upsert
+        running = []
+        peak = 0
+        
+        async def slow_upsert(**kwargs):
+            nonlocal peak
+            running.append(kwargs)
+            peak = max(peak, len(running))
+            await asyncio.sleep(0.01)
+            running.remove(kwargs)
+            return await upsert(**kwargs)
+        
+        rag_service.qdrant_client.upsert = AsyncMock(side_effect=slow_upsert)
+        rag_service.qdrant_client.count = AsyncMock(wraps=qdrant_client.count)
+        progress = []
+        chunks = [f"chunk {i}" for i in range(5)]
+        
+        await rag_service.upsert_embeddings(
+            "proj-1", "src-1", "doc-1", "Doc 1", chunks, [VECTORS["alpha"]] * 5,
+            on_progress=lambda done, total: progress.append((done, total)),
+        )
+        
+        calls = rag_service.qdrant_client.upsert.await_args_list
+        assert sorted(len(call.kwargs["points"]) for call in calls) == [1, 2, 2]
+        assert {call.kwargs["wait"] for call in calls} == {False}
+        assert peak == 2
+        assert progress[-1] == (5, 5) and len(progress) == 3
+        rag_service.qdrant_client.count.assert_awaited()
+        assert (await qdrant_client.count(RAGService.COLLECTION_NAME)).count == 5
+    
+    @pytest.mark.asyncio
+    async def test_upsert_retries_transient_errors(self, rag_service, qdrant_client):
+        """测试：网络错误等临时故障重试后写入成功，其他错误不重试"""
+        rag_service.settings = rag_service.settings.model_copy(update={"qdrant_upsert_retry_backoff": 0})
+        upsert = qdrant_client.upsert
+        failures = [ResponseHandlingException(ConnectionError("connection reset"))]
+        
+        async def flaky_upsert(**kwargs):
+            if failures:
+                raise failures.pop()
+            return await upsert(**kwargs)
+        
+        rag_service.qdrant_client.upsert = AsyncMock(side_effect=flaky_upsert)
+        
+        await rag_service.upsert_embeddings("proj-1", "src-1", "doc-1", "Doc 1", ["alpha chunk"], [VECTORS["alpha"]])
+        
+        assert rag_service.qdrant_client.upsert.await_count == 2
+        assert (await qdrant_client.count(RAGService.COLLECTION_NAME)).count == 1
+        
+        rag_service.qdrant_client.upsert = AsyncMock(side_effect=ValueError("bad vector size"))
+        with pytest.raises(Exception, match="存储嵌入向量失败"):
+            await rag_service.upsert_embeddings("proj-1", "src-1", "doc-1", "Doc 1", ["beta chunk"], [VECTORS["beta"]])
+        assert rag_service.qdrant_client.upsert.await_count == 1
+
+
+class TestSearchPresets:
+    """向量搜索预设测试"""
+    
+    def test_presets_trade_speed_for_recall(self):
+        """测试：预设的hnsw_ef依次增大，fast不做重排序"""
+        fast, balanced, accurate = (resolve_search_params(preset) for preset in RAGSearchPreset)
+        
+        assert fast.hnsw_ef < balanced.hnsw_ef < accurate.hnsw_ef
+        assert fast.quantization.rescore is False
+        assert accurate.quantization.oversampling > balanced.quantization.oversampling
+    
+    def test_overrides_replace_only_set_fields(self):
+        """测试：覆盖参数只替换设置了的项"""
+        params = resolve_search_params(RAGSearchPreset.ACCURATE, RAGSearchParams(exact=True))
+        
+        assert params.exact is True
+        assert params.hnsw_ef == resolve_search_params(RAGSearchPreset.ACCURATE).hnsw_ef
+
@@ -0,0 +1,85 @@
+"""
+RAG检索结果语义缓存单元测试
+Unit tests for the semantic RAG result cache
+"""
+
+import os
+
+# 设置环境变量
+os.environ.update({
+    "LLM_API_KEY": "test-llm-key",
+    "LLM_BASE_URL": "https://test-llm.com",
+    "LLM_MODEL_ID": "test-model",
+    "EMBEDDING_MODEL": "test-embedding",
+    "EMBEDDING_BASE_URL": "https://test-embedding.com",
+    "EMBEDDING_API_KEY": "test-embedding-key",
+    "COMPOSIO_API_KEY": "test-composio-key",
+    "MONGODB_CONNECTION_STRING": "mongodb://test:27017/testdb",
+    "REDIS_URL": "redis://test:6379",
+    "QDRANT_URL": "http://test:6333",
+})
+
+from app.models.schemas import RAGSearchParams
+from app.services.rag.semantic_cache import SemanticSearchCache, semantic_cache_scope
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestSemanticSearchCache:
+    """语义缓存测试"""
+    
+    def test_similar_query_hits_above_threshold(self):
+        """测试：相似度超过阈值时返回最相似查询的结果"""
+        cache = SemanticSearchCache(threshold=0.9)
+        cache.store("scope", [1.0, 0.0, 0.0], "v1", ["refunds"])
+        cache.store("scope", [0.0, 1.0, 0.0], "v1", ["shipping"])
+        
+        assert cache.lookup("scope", [0.95, 0.1, 0.0], "v1") == ["refunds"]
+        assert cache.lookup("scope", [0.1, 2.0, 0.0], "v1") == ["shipping"]
+        assert cache.lookup("scope", [0.6, 0.6, 0.5], "v1") is None
+        assert cache.lookup("other-scope", [1.0, 0.0, 0.0], "v1") is None
+        assert cache.snapshot()["hits"] == 2
+    
+    def test_signature_change_invalidates_scope(self):
+        """测试：数据源签名变化后该范围的条目全部失效"""
+        cache = SemanticSearchCache(threshold=0.9)
+        cache.store("scope", [1.0, 0.0], "s1:1", ["old"])
+        
+        assert cache.lookup("scope", [1.0, 0.0], "s1:2") is None
+        assert cache.lookup("scope", [1.0, 0.0], "s1:1") is None
+        cache.store("scope", [1.0, 0.0], "s1:2", ["new"])
+        assert cache.lookup("scope", [1.0, 0.0], "s1:2") == ["new"]
+    
+    def test_expired_and_evicted_entries(self):
+        """测试：过期条目不会命中，超过条目上限时淘汰最早的条目"""
+        clock = FakeClock()
+        cache = SemanticSearchCache(threshold=0.9, ttl=60, max_entries=2, clock=clock)
+        cache.store("scope", [1.0, 0.0, 0.0], "v1", ["a"])
+        clock.now += 61
+        assert cache.lookup("scope", [1.0, 0.0, 0.0], "v1") is None
+        
+        cache.store("scope", [0.0, 1.0, 0.0], "v1", ["b"])
+        cache.store("scope", [0.0, 0.0, 1.0], "v1", ["c"])
+        cache.store("scope", [1.0, 0.0, 0.0], "v1", ["d"])
+        assert cache.lookup("scope", [0.0, 1.0, 0.0], "v1") is None
+        assert cache.lookup("scope", [0.0, 0.0, 1.0], "v1") == ["c"]
+        assert cache.lookup("scope", [1.0, 0.0, 0.0], "v1") == ["d"]
+    
+    def test_scope_depends_on_sources_and_options(self):
+        """测试：范围键与数据源顺序无关，检索参数不同时范围不同"""
+        scope = semantic_cache_scope("proj-1", source_ids=["s1", "s2"], k=3, search_params=None)
+        
+        assert scope == semantic_cache_scope("proj-1", source_ids=["s2", "s1"], k=3, search_params=None)
+        assert scope != semantic_cache_scope("proj-1", source_ids=["s1", "s2"], k=5, search_params=None)
+        assert scope != semantic_cache_scope("proj-2", source_ids=["s1", "s2"], k=3, search_params=None)
+        assert scope != semantic_cache_scope(
+            "proj-1", source_ids=["s1", "s2"], k=3, search_params=RAGSearchParams(hnswEf=48),
+        )
@@ -0,0 +1,64 @@
+"""
+稀疏向量编码服务单元测试
+Unit tests for the BM25 sparse encoder
+"""
+
+import os
+
+# 设置环境变量
+os.environ.update({
+    "LLM_API_KEY": "test-llm-key",
+    "LLM_BASE_URL": "https://test-llm.com",
+    "LLM_MODEL_ID": "test-model",
+    "EMBEDDING_MODEL": "test-embedding",
+    "EMBEDDING_BASE_URL": "https://test-embedding.com",
+    "EMBEDDING_API_KEY": "test-embedding-key",
+    "COMPOSIO_API_KEY": "test-composio-key",
+    "MONGODB_CONNECTION_STRING": "mongodb://test:27017/testdb",
+    "REDIS_URL": "redis://test:6379",
+    "QDRANT_URL": "http://test:6333",
+})
+
+from app.services.rag.sparse_encoder import SparseEncoderService, token_index, tokenize
+
+
+class TestTokenize:
+    """分词测试"""
+    
+    def test_part_numbers_yield_parts_and_joined_form(self):
+        """测试：带连接符的零件号同时生成完整、去连接符和拆分后的词元"""
+        tokens = tokenize("Bearing 6204-2RS")
+        
+        assert tokens == ["bearing", "6204-2rs", "62042rs", "6204", "2rs"]
+    
+    def test_stopwords_are_dropped(self):
+        """测试：英文停用词被过滤"""
+        assert tokenize("the price of the valve") == ["price", "valve"]
+    
+    def test_cjk_bigrams(self):
+        """测试：中文按字二元组切分"""
+        assert tokenize("供应商 审") == ["供应", "应商", "审"]
+
+
+class TestSparseEncoder:
+    """BM25编码测试"""
+    
+    def test_document_term_frequency_saturates(self):
+        """测试：词频越高权重越大，但增长趋于饱和"""
+        encoder = SparseEncoderService(avg_doc_len=4)
+        index = token_index("valve")
+        
+        def weight(text):
+            vector = encoder.encode_document(text)
+            return dict(zip(vector.indices, vector.values))[index]
+        
+        once, twice, many = weight("valve pump"), weight("valve valve pump"), weight("valve " * 20 + "pump")
+        
+        assert once < twice < many < encoder.k1 + 1
+    
+    def test_query_uses_unit_weights(self):
+        """测试：查询向量每个不同词元权重为1"""
+        vector = SparseEncoderService().encode_query("valve valve DN50")
+        
+        assert sorted(vector.indices) == sorted({token_index("valve"), token_index("dn50")})
+        assert vector.values == [1.0, 1.0]
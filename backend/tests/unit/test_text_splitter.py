@@ -0,0 +1,114 @@
+"""
+文本分割服务单元测试
+Unit tests for the streaming recursive text splitter
+"""
+
+import os
+import random
+
+import pytest
+
+# 设置环境变量
+os.environ.update({
+    "LLM_API_KEY": "test-llm-key",
+    "LLM_BASE_URL": "https://test-llm.com",
+    "LLM_MODEL_ID": "test-model",
+    "EMBEDDING_MODEL": "test-embedding",
+    "EMBEDDING_BASE_URL": "https://test-embedding.com",
+    "EMBEDDING_API_KEY": "test-embedding-key",
+    "COMPOSIO_API_KEY": "test-composio-key",
+    "MONGODB_CONNECTION_STRING": "mongodb://test:27017/testdb",
+    "REDIS_URL": "redis://test:6379",
+    "QDRANT_URL": "http://test:6333",
+})
+
+from app.services.rag.tokens import estimate_tokens
+from app.services.rag.text_splitter import TextSplitterService
+
+
+def _random_text(rng: random.Random, length: int) -> str:
+    """由词、句号、换行和空行组成的随机文本"""
+    parts = ["alpha", "beta", "gamma", " ", ".", ". ", "\n", "\n\n", "\n\n\n", "质信"]
+    return "".join(rng.choice(parts) for _ in range(length))
+
+
+def _blocks(text: str, rng: random.Random):
+    """把文本切成随机大小的块（模拟流式读取）"""
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 9)
+        yield text[i:i + size]
+        i += size
+
+
+class TestTextSplitter:
+    """文本分割测试"""
+    
+    def test_matches_langchain_recursive_splitter(self):
+        """测试：字符模式与langchain的RecursiveCharacterTextSplitter结果一致（已有向量的内容哈希不变）"""
+        text_splitters = pytest.importorskip("langchain_text_splitters")
+        rng = random.Random(7)
+        for _ in range(300):
+            text = _random_text(rng, rng.randint(0, 300))
+            chunk_size = rng.randint(5, 120)
+            chunk_overlap = rng.randint(0, chunk_size - 1)
+            expected = text_splitters.RecursiveCharacterTextSplitter(
+                separators=['\n\n', '\n', '. ', '.', ''], chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+            ).split_text(text)
+            
+            assert TextSplitterService(chunk_size, chunk_overlap).split_text(text) == expected
+    
+    def test_streaming_matches_whole_text(self):
+        """测试：流式分割与整段分割结果一致（分隔符跨越块边界时也能识别）"""
+        rng = random.Random(11)
+        for _ in range(200):
+            text = _random_text(rng, rng.randint(0, 300))
+            splitter = TextSplitterService(chunk_size=rng.randint(5, 80), chunk_overlap=rng.randint(0, 4))
+            
+            assert list(splitter.iter_chunks(_blocks(text, rng))) == splitter.split_text(text)
+    
+    def test_streaming_is_lazy(self):
+        """测试：流式分割边读边输出，不需要先读完整个文本"""
+        consumed = []
+        
+        def stream():
+            for i in range(10_000):
+                consumed.append(i)
+                yield f"paragraph {i} " * 5 + "\n\n"
+        
+        chunks = TextSplitterService(chunk_size=100, chunk_overlap=0).iter_chunks(stream())
+        first = next(chunks)
+        
+        assert first.startswith("paragraph 0")
+        assert len(consumed) < 10
+    
+    def test_token_unit_caps_estimated_tokens(self):
+        """测试：按token计量时每个块的估算token数不超过块大小"""
+        text = "质量信息智能采购。" * 200 + "\n\n" + "supplier quality audit report " * 100
+        splitter = TextSplitterService(chunk_size=64, chunk_overlap=8, length_unit="tokens")
+        
+        chunks = splitter.split_text(text)
+        
+        assert len(chunks) > 1
+        assert all(estimate_tokens(chunk) <= 64 for chunk in chunks)
+    
+    def test_overlap_is_kept(self):
+        """测试：相邻块之间保留重叠"""
+        text = " ".join(f"w{i}" for i in range(60))
+        chunks = TextSplitterService(chunk_size=30, chunk_overlap=10, separators=[" ", ""]).split_text(text)
+        
+        assert all(prev.split()[-1] in curr.split() for prev, curr in zip(chunks, chunks[1:]))
+    
+    def test_split_documents_in_process_pool(self):
+        """测试：大批量分割使用进程池，结果与顺序分割一致"""
+        rng = random.Random(3)
+        texts = [_random_text(rng, 200) for _ in range(8)]
+        splitter = TextSplitterService(chunk_size=50, chunk_overlap=5, parallel_min_chars=0, max_workers=2)
+        
+        try:
+            chunks = splitter.split_documents(texts)
+            assert splitter._process_pool is not None
+        finally:
+            splitter.close()
+        
+        assert chunks == [chunk for text in texts for chunk in splitter.split_text(text)]
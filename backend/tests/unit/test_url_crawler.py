@@ -0,0 +1,175 @@
+"""
+URL抓取器单元测试（本地HTTP服务器）
+Unit tests for the URL crawler against a local HTTP fixture server
+"""
+
+import asyncio
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# 设置环境变量
+os.environ.update({
+    "LLM_API_KEY": "test-llm-key",
+    "LLM_BASE_URL": "https://test-llm.com",
+    "LLM_MODEL_ID": "test-model",
+    "EMBEDDING_MODEL": "test-embedding",
+    "EMBEDDING_BASE_URL": "https://test-embedding.com",
+    "EMBEDDING_API_KEY": "test-embedding-key",
+    "COMPOSIO_API_KEY": "test-composio-key",
+    "MONGODB_CONNECTION_STRING": "mongodb://test:27017/testdb",
+    "REDIS_URL": "redis://test:6379",
+    "QDRANT_URL": "http://test:6333",
+})
+
+from app.services.rag.url_crawler import UrlCrawler, content_hash
+
+
+PAGE_HTML = """<html><head><title>Fixture  Page</title><style>body { color: red }</style></head>
+<body><nav>Home</nav><h1>Heading</h1><p>First   paragraph
+with a wrapped line.</p><script>var hidden = 1;</script><ul><li>one</li><li>two</li></ul>
+<pre>keep   spacing</pre></body></html>"""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """按server.pages返回页面，支持ETag条件请求，并记录并发数"""
+    
+    def do_GET(self):
+        server = self.server
+        with server.counter_lock:
+            server.requests.append((self.path, self.headers.get("If-None-Match")))
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delay)
+            page = server.pages.get(self.path)
+            if page is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            content_type, body, etag = page
+            if etag and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            if etag:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with server.counter_lock:
+                server.active -= 1
+    
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    """在后台线程运行的本地HTTP服务器"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.pages = {}
+    server.requests = []
+    server.delay = 0.0
+    server.active = server.max_active = 0
+    server.counter_lock = threading.Lock()
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+async def crawler():
+    """不限制请求间隔的抓取器"""
+    crawler = UrlCrawler(per_host_concurrency=2, host_delay=0)
+    yield crawler
+    await crawler.close()
+
+
+class TestUrlCrawler:
+    """URL抓取测试"""
+    
+    @pytest.mark.asyncio
+    async def test_html_text_is_extracted(self, http_server, crawler):
+        """测试：HTML提取为文本，跳过脚本和样式，块级元素之间空一行"""
+        http_server.pages["/page"] = ("text/html; charset=utf-8", PAGE_HTML, None)
+        
+        result = await crawler.fetch(f"{http_server.base_url}/page")
+        
+        assert result.title == "Fixture Page"
+        assert result.text == "Home\n\nHeading\n\nFirst paragraph with a wrapped line.\n\none\ntwo\n\nkeep   spacing"
+        assert result.content_hash == content_hash(result.text)
+        assert not result.not_modified
+    
+    @pytest.mark.asyncio
+    async def test_conditional_get_returns_not_modified(self, http_server, crawler):
+        """测试：带上次的ETag请求时，未变化的页面返回304"""
+        http_server.pages["/doc.txt"] = ("text/plain", "plain body", '"v1"')
+        
+        first = await crawler.fetch(f"{http_server.base_url}/doc.txt")
+        second = await crawler.fetch(f"{http_server.base_url}/doc.txt", etag=first.etag)
+        
+        assert first.text == "plain body"
+        assert first.etag == '"v1"'
+        assert second.not_modified
+        assert second.content_hash is None
+        assert http_server.requests[-1] == ("/doc.txt", '"v1"')
+    
+    @pytest.mark.asyncio
+    async def test_per_host_concurrency_is_limited(self, http_server, crawler):
+        """测试：同一host的并发请求数不超过限制"""
+        http_server.delay = 0.05
+        for i in range(6):
+            http_server.pages[f"/p{i}"] = ("text/plain", f"page {i}", None)
+        
+        results = await asyncio.gather(*[crawler.fetch(f"{http_server.base_url}/p{i}") for i in range(6)])
+        
+        assert [result.text for result in results] == [f"page {i}" for i in range(6)]
+        assert http_server.max_active == 2
+    
+    @pytest.mark.asyncio
+    async def test_robots_txt_is_respected(self, http_server, crawler):
+        """测试：robots.txt禁止的路径不抓取，robots.txt每个host只获取一次"""
+        http_server.pages["/robots.txt"] = ("text/plain", "User-agent: *\nDisallow: /private", None)
+        http_server.pages["/public"] = ("text/plain", "ok", None)
+        http_server.pages["/private/page"] = ("text/plain", "secret", None)
+        
+        assert (await crawler.fetch(f"{http_server.base_url}/public")).text == "ok"
+        with pytest.raises(ValueError):
+            await crawler.fetch(f"{http_server.base_url}/private/page")
+        assert [path for path, _ in http_server.requests] == ["/robots.txt", "/public"]
+    
+    @pytest.mark.asyncio
+    async def test_oversized_page_is_truncated(self, http_server):
+        """测试：超过最大字节数的页面被截断"""
+        http_server.pages["/big"] = ("text/plain", "x" * 5000, None)
+        crawler = UrlCrawler(host_delay=0, max_bytes=1000)
+        
+        result = await crawler.fetch(f"{http_server.base_url}/big")
+        await crawler.close()
+        
+        assert result.truncated
+        assert result.text == "x" * 1000
+    
+    @pytest.mark.asyncio
+    async def test_errors_and_unsupported_types(self, http_server, crawler):
+        """测试：404、不支持的内容类型和无效URL抛出ValueError"""
+        http_server.pages["/file.pdf"] = ("application/pdf", "%PDF", None)
+        
+        with pytest.raises(ValueError):
+            await crawler.fetch(f"{http_server.base_url}/missing")
+        with pytest.raises(ValueError):
+            await crawler.fetch(f"{http_server.base_url}/file.pdf")
+        with pytest.raises(ValueError):
+            await crawler.fetch("ftp://example.com/file")